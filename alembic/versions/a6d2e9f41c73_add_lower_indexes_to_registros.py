@@ -0,0 +1,41 @@
+"""add lower indexes to registros
+
+Revision ID: a6d2e9f41c73
+Revises: f3c9a1d7e2b4
+Create Date: 2026-10-17 16:05:12.318842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d2e9f41c73'
+down_revision: Union[str, Sequence[str], None] = 'f3c9a1d7e2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Índices sobre lower(col) (deben coincidir con app.db.models.Registro)
+LOWER_INDEXES = {
+    'idx_region_ciudad_lower': ('region', 'ciudad'),
+    'idx_ciudad_lower': ('ciudad',),
+    'idx_tecnologia_lower': ('tecnologia',),
+    'idx_flota_lower': ('flota',),
+    'idx_uso_lower': ('uso',),
+    'idx_mac_sn_lower': ('mac_sn',),
+    'idx_id_servicio_lower': ('id_servicio',),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, columns in LOWER_INDEXES.items():
+        op.create_index(name, 'registros', [sa.text(f'lower({column})') for column in columns], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in reversed(list(LOWER_INDEXES)):
+        op.drop_index(name, table_name='registros')
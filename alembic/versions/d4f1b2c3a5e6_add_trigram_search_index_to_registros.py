@@ -0,0 +1,74 @@
+"""add trigram search index to registros
+
+Revision ID: d4f1b2c3a5e6
+Revises: 759611e96df7
+Create Date: 2026-10-17 09:12:44.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f1b2c3a5e6'
+down_revision: Union[str, Sequence[str], None] = '759611e96df7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Columnas con búsqueda por subcadena (debe coincidir con app.db.search.SEARCH_COLUMNS)
+SEARCH_COLUMNS = (
+    "numero_inspector", "uuid", "nombre", "observaciones", "status", "region", "flota",
+    "encargado", "celular", "correo", "direccion", "uso", "departamento", "ciudad",
+    "tecnologia", "cmts_olt", "id_servicio", "mac_sn",
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    cols = ", ".join(SEARCH_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+
+    if dialect == "sqlite":
+        # Tabla FTS5 externa (no duplica el contenido) con tokenizer trigram
+        op.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS registros_fts USING fts5("
+            f"{cols}, content='registros', content_rowid='id', tokenize='trigram')"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS registros_fts_ai AFTER INSERT ON registros BEGIN "
+            f"INSERT INTO registros_fts(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS registros_fts_ad AFTER DELETE ON registros BEGIN "
+            f"INSERT INTO registros_fts(registros_fts, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS registros_fts_au AFTER UPDATE ON registros BEGIN "
+            f"INSERT INTO registros_fts(registros_fts, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+            f"INSERT INTO registros_fts(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+        )
+        op.execute("INSERT INTO registros_fts(registros_fts) VALUES ('rebuild')")
+    elif dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for col in SEARCH_COLUMNS:
+            expr = f"(CAST({col} AS VARCHAR))" if col == "numero_inspector" else col
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_registros_{col}_trgm ON registros USING gin ({expr} gin_trgm_ops)"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        for trigger in ("registros_fts_ai", "registros_fts_ad", "registros_fts_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS registros_fts")
+    elif dialect == "postgresql":
+        for col in SEARCH_COLUMNS:
+            op.execute(f"DROP INDEX IF EXISTS idx_registros_{col}_trgm")
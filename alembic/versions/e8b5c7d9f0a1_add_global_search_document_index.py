@@ -0,0 +1,42 @@
+"""add global search document index
+
+Revision ID: e8b5c7d9f0a1
+Revises: d4f1b2c3a5e6
+Create Date: 2026-10-17 11:40:03.512961
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b5c7d9f0a1'
+down_revision: Union[str, Sequence[str], None] = 'd4f1b2c3a5e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Columnas del documento de búsqueda (debe coincidir con app.db.search.postgresql_document)
+SEARCH_COLUMNS = (
+    "numero_inspector", "uuid", "nombre", "observaciones", "status", "region", "flota",
+    "encargado", "celular", "correo", "direccion", "uso", "departamento", "ciudad",
+    "tecnologia", "cmts_olt", "id_servicio", "mac_sn",
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # En SQLite la búsqueda global usa la tabla registros_fts existente (d4f1b2c3a5e6)
+    if op.get_bind().dialect.name == "postgresql":
+        document = " || E'\\x1f' || ".join(f"coalesce(CAST({col} AS VARCHAR), '')" for col in SEARCH_COLUMNS)
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_registros_search_document_trgm ON registros "
+            f"USING gin (({document}) gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS idx_registros_search_document_trgm")
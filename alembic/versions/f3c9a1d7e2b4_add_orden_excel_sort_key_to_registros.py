@@ -0,0 +1,41 @@
+"""add orden_excel sort key to registros
+
+Revision ID: f3c9a1d7e2b4
+Revises: e8b5c7d9f0a1
+Create Date: 2026-10-17 14:22:51.047310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c9a1d7e2b4'
+down_revision: Union[str, Sequence[str], None] = 'e8b5c7d9f0a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Grupo del ordenamiento tipo Excel (debe coincidir con app.db.models.EXCEL_GROUP_SQL)
+EXCEL_GROUP_SQL = "CASE WHEN numero_inspector < 0 THEN 2 ELSE 1 END"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "sqlite":
+        # SQLite no admite agregar columnas STORED con ALTER TABLE; una VIRTUAL indexada
+        # ordena igual (el valor se guarda en el índice)
+        op.execute(
+            f"ALTER TABLE registros ADD COLUMN orden_excel INTEGER "
+            f"GENERATED ALWAYS AS ({EXCEL_GROUP_SQL}) VIRTUAL"
+        )
+    else:
+        op.add_column('registros', sa.Column('orden_excel', sa.Integer(), sa.Computed(EXCEL_GROUP_SQL, persisted=True)))
+    op.create_index('idx_orden_excel', 'registros', ['orden_excel', 'numero_inspector', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_orden_excel', table_name='registros')
+    op.drop_column('registros', 'orden_excel')
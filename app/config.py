@@ -24,6 +24,7 @@ load_dotenv()
 # ===== CONFIGURACIÓN DE BASE DE DATOS =====
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./inspector.db")
 TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "sqlite+aiosqlite:///./test_inspector.db")
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() == "true"  # FTS5 trigram / pg_trgm para ILIKE '%x%'
 
 # ===== CONFIGURACIÓN DE AUTENTICACIÓN JWT =====
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
@@ -42,6 +43,10 @@ LOG_FORMAT = os.getenv("LOG_FORMAT", "%(asctime)s %(levelname)s %(name)s: %(mess
 # ===== CONFIGURACIÓN DE CACHE =====
 CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
 CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))  # 0 = sin límite
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", "67108864"))  # 64MB por defecto, 0 = sin límite
+CACHE_EVICTION_POLICY = os.getenv("CACHE_EVICTION_POLICY", "lru")  # lru, lfu o tinylfu
+CACHE_REAPER_INTERVAL = float(os.getenv("CACHE_REAPER_INTERVAL", "5"))  # segundos, 0 = deshabilitado
 
 # ===== CONFIGURACIÓN DE SERVIDOR =====
 HOST = os.getenv("HOST", "0.0.0.0")
@@ -54,6 +59,11 @@ MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "5242880"))  # 5MB por defecto
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "app/static/uploads")
 ALLOWED_EXTENSIONS_STR = os.getenv("ALLOWED_EXTENSIONS", "jpg,jpeg,png,gif,pdf,xlsx,xls,csv")
 ALLOWED_EXTENSIONS = [ext.strip() for ext in ALLOWED_EXTENSIONS_STR.split(",")]
+CSV_SNIFF_BYTES = int(os.getenv("CSV_SNIFF_BYTES", "65536"))  # muestra para detectar encoding y separador
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "10000"))  # filas por bloque al leer un CSV de carga masiva
+BULK_INSERT_BATCH_SIZE = int(os.getenv("BULK_INSERT_BATCH_SIZE", "5000"))  # filas por executemany / COPY en la carga masiva
+CSV_REPLACE_MODE = os.getenv("CSV_REPLACE_MODE", "directo")  # directo, intercambio (tabla de carga y cambio de nombre) o diferencias
+CSV_DIFF_INVALIDATION_LIMIT = int(os.getenv("CSV_DIFF_INVALIDATION_LIMIT", "500"))  # cambios a partir de los que se invalida todo el cache
 
 # ===== CONFIGURACIÓN DE SEGURIDAD =====
 BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
@@ -70,6 +80,15 @@ EMAIL_ENABLED = os.getenv("EMAIL_ENABLED", "false").lower() == "true"
 # ===== CONFIGURACIÓN DE REDIS (OPCIONAL) =====
 REDIS_URL = os.getenv("REDIS_URL")
 REDIS_ENABLED = os.getenv("REDIS_ENABLED", "false").lower() == "true"
+CACHE_L1_ENABLED = os.getenv("CACHE_L1_ENABLED", "true").lower() == "true"  # L1 en memoria delante de Redis
+CACHE_L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "1000"))
+CACHE_L1_TTL = int(os.getenv("CACHE_L1_TTL", "30"))  # segundos
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "inspector:cache:invalidations")
+CACHE_REDIS_CLEANUP_INTERVAL = float(os.getenv("CACHE_REDIS_CLEANUP_INTERVAL", "60"))  # segundos entre limpiezas de índices en Redis, 0 = deshabilitado
+
+# ===== SNAPSHOT COLUMNAR DE REGISTROS (OPCIONAL, requiere numpy) =====
+REGISTROS_SNAPSHOT_ENABLED = os.getenv("REGISTROS_SNAPSHOT_ENABLED", "false").lower() == "true"
+REGISTROS_SNAPSHOT_MAX_AGE = float(os.getenv("REGISTROS_SNAPSHOT_MAX_AGE", "300"))  # segundos, 0 = sin recarga periódica
 
 # ===== CONFIGURACIÓN DE MONITORING =====
 ENABLE_METRICS = os.getenv("ENABLE_METRICS", "true").lower() == "true"
@@ -36,6 +36,9 @@ async def get_async_session() -> AsyncSession:
         async with async_session_factory() as session:
             logger.info("Sesión asíncrona obtenida correctamente.")
             yield session
+    except HTTPException:
+        # Errores HTTP de la propia ruta (400, 404...) que atraviesan la dependencia
+        raise
     except OperationalError as oe:
         logger.error(f"Error de conexión a la base de datos: {oe}")
         raise HTTPException(status_code=503, detail="Base de datos no disponible. Intenta más tarde.")
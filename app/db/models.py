@@ -14,8 +14,9 @@ Autor: Daniel Bermúdez
 Versión: 1.0.0
 """
 
-from sqlalchemy import Column, Integer, String, Index, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Index, DateTime, ForeignKey, Boolean, Computed, func
 from app.db.base import Base
+from app.db.search import register_search_index
 import logging
 import datetime
 from sqlalchemy.orm import relationship
@@ -23,6 +24,9 @@ from sqlalchemy.orm import relationship
 # Configuración básica del logger
 logger = logging.getLogger(__name__)
 
+# numero_inspector es entero: su texto empieza por un dígito salvo si es negativo
+EXCEL_GROUP_SQL = "CASE WHEN numero_inspector < 0 THEN 2 ELSE 1 END"
+
 class Registro(Base):
     """
     Modelo para almacenar registros de inspección.
@@ -72,6 +76,10 @@ class Registro(Base):
     id_servicio = Column(String, nullable=False)
     mac_sn = Column(String, nullable=False)
     uuid = Column(String, nullable=True)
+    # Grupo del ordenamiento tipo Excel de numero_inspector (1 si el texto empieza por
+    # un dígito, 2 si no, ver app.services.pagination): columna generada e indexada
+    # para que ORDER BY numero_inspector + LIMIT recorra el índice en lugar de ordenar
+    orden_excel = Column(Integer, Computed(EXCEL_GROUP_SQL, persisted=True))
 
     # Índices para optimizar consultas frecuentes
     __table_args__ = (
@@ -82,6 +90,15 @@ class Registro(Base):
         Index('idx_mac_sn', 'mac_sn'),
         Index('idx_id_servicio', 'id_servicio'),
         Index('idx_nombre', 'nombre'),
+        Index('idx_orden_excel', 'orden_excel', 'numero_inspector', 'id'),
+        # Índices sobre lower(col) para los filtros de igualdad sin distinguir mayúsculas de /view
+        Index('idx_region_ciudad_lower', func.lower(region), func.lower(ciudad)),
+        Index('idx_ciudad_lower', func.lower(ciudad)),
+        Index('idx_tecnologia_lower', func.lower(tecnologia)),
+        Index('idx_flota_lower', func.lower(flota)),
+        Index('idx_uso_lower', func.lower(uso)),
+        Index('idx_mac_sn_lower', func.lower(mac_sn)),
+        Index('idx_id_servicio_lower', func.lower(id_servicio)),
         # Índices únicos para prevenir duplicados
         Index('idx_numero_inspector_unique', 'numero_inspector', unique=True),
         Index('idx_nombre_unique', 'nombre', unique=True),
@@ -133,6 +150,9 @@ class Registro(Base):
             logger.error(f"Error en as_dict para Registro ID={getattr(self, 'id', None)}: {e}")
             raise
 
+# Índice de trigramas para los filtros ILIKE '%valor%' (FTS5 en SQLite, pg_trgm en PostgreSQL)
+register_search_index(Registro.__table__)
+
 class Usuario(Base):
     """
     Modelo para gestionar usuarios del sistema.
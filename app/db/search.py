@@ -0,0 +1,298 @@
+"""
+Índice de búsqueda por subcadena para los filtros ILIKE '%valor%' de registros.
+
+Un patrón con comodín inicial no puede usar los índices B-tree de
+Registro.__table_args__, así que cada filtro de la grilla recorría la tabla completa.
+Este módulo crea un índice de trigramas y compila los filtros para usarlo:
+
+- SQLite: tabla FTS5 externa 'registros_fts' (tokenizer trigram) sincronizada
+  con triggers; el filtro se resuelve como id IN (SELECT rowid ... LIKE).
+- PostgreSQL: índices GIN pg_trgm por columna; ILIKE los usa directamente.
+- Otros motores (o SEARCH_INDEX_ENABLED=false): CAST(col AS VARCHAR) ILIKE, como antes.
+
+La búsqueda global (parámetro q=) usa el mismo índice como un único documento por
+registro: en SQLite una sola consulta MATCH sobre todas las columnas de registros_fts
+(ordenable por bm25) y en PostgreSQL un índice GIN sobre la concatenación de las columnas.
+
+Las migraciones d4f1b2c3a5e6 y e8b5c7d9f0a1 crean los mismos objetos en bases existentes.
+"""
+import logging
+import re
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import (
+    Boolean, DDL, Float, Select, String, Table, bindparam, cast, column, event, literal, literal_column, or_,
+    table as table_clause,
+)
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+from app.config import SEARCH_INDEX_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Columnas con búsqueda por subcadena en la grilla (orden de las columnas de registros_fts)
+SEARCH_COLUMNS = (
+    "numero_inspector", "uuid", "nombre", "observaciones", "status", "region", "flota",
+    "encargado", "celular", "correo", "direccion", "uso", "departamento", "ciudad",
+    "tecnologia", "cmts_olt", "id_servicio", "mac_sn",
+)
+
+# Con menos de 3 caracteres no hay trigramas que buscar: el índice no ayuda
+MIN_TRIGRAM_LENGTH = 3
+
+# Separador entre columnas del documento de PostgreSQL: evita coincidencias que crucen dos campos
+DOCUMENT_SEPARATOR = "\\x1f"
+
+
+@lru_cache(maxsize=1024)
+def like_regex(value: str, prefix: bool = False) -> "re.Pattern":
+    """
+    Traduce ILIKE '%value%' a una expresión regular (% y _ son comodines);
+    con prefix=True, ILIKE 'value%'
+    """
+    body = "".join(".*" if ch == "%" else "." if ch == "_" else re.escape(ch) for ch in value)
+    return re.compile(f"{'' if prefix else '.*'}{body}.*", re.IGNORECASE | re.DOTALL)
+
+
+def _phrase(value: str) -> str:
+    """Frase FTS5 con las comillas dobles escapadas"""
+    return '"' + value.replace('"', '""') + '"'
+
+
+class InfixMatch(ColumnElement):
+    """Filtro CAST(col AS VARCHAR) ILIKE '%valor%' compilado según el motor"""
+    type = Boolean()
+    inherit_cache = True
+    # Es un predicado: en motores sin booleano nativo no se compara con '= 1'
+    _is_implicitly_boolean = True
+    _traverse_internals = [
+        ("column", InternalTraversal.dp_clauseelement),
+        ("pattern", InternalTraversal.dp_clauseelement),
+        ("phrase", InternalTraversal.dp_clauseelement),
+        ("literal", InternalTraversal.dp_boolean),
+    ]
+
+    def __init__(self, column: ColumnElement, value: Any):
+        value = str(value)
+        self.column = column
+        self.pattern = bindparam(None, f"%{value}%", type_=String, unique=True)
+        # Sin comodines, la subcadena es una frase de trigramas: MATCH no relee cada fila candidata
+        self.phrase = bindparam(None, f"{column.key} : {_phrase(value)}", type_=String, unique=True)
+        self.literal = "%" not in value and "_" not in value
+
+
+def infix_match(column: ColumnElement, value: Any) -> ColumnElement:
+    """
+    Filtro de subcadena (ILIKE '%valor%', '%' y '_' siguen siendo comodines)
+    que usa el índice de trigramas cuando existe para la columna.
+    """
+    if len(str(value)) < MIN_TRIGRAM_LENGTH or column.key not in SEARCH_COLUMNS:
+        return cast(column, String).ilike(f"%{value}%")
+    return InfixMatch(column, value)
+
+
+@compiles(InfixMatch)
+def _compile_default(element: InfixMatch, compiler, **kw) -> str:
+    return compiler.process(cast(element.column, String).ilike(element.pattern), **kw)
+
+
+@compiles(InfixMatch, "sqlite")
+def _compile_sqlite(element: InfixMatch, compiler, **kw) -> str:
+    if not SEARCH_INDEX_ENABLED:
+        return _compile_default(element, compiler, **kw)
+    table = element.column.table.name
+    # El tokenizer trigram resuelve con el índice tanto la frase (MATCH) como LIKE con
+    # comodines sobre la columna FTS; ambos sin distinguir mayúsculas
+    if element.literal:
+        condition = f"{table}_fts MATCH {compiler.process(element.phrase, **kw)}"
+    else:
+        condition = f"{table}_fts.{element.column.key} LIKE {compiler.process(element.pattern, **kw)}"
+    return f"{table}.id IN (SELECT rowid FROM {table}_fts WHERE {condition})"
+
+
+@compiles(InfixMatch, "postgresql")
+def _compile_postgresql(element: InfixMatch, compiler, **kw) -> str:
+    if not SEARCH_INDEX_ENABLED or not isinstance(element.column.type, String):
+        # Las columnas no textuales tienen índice de expresión sobre CAST(col AS VARCHAR)
+        return _compile_default(element, compiler, **kw)
+    # Sin CAST para que coincida con el índice GIN (col gin_trgm_ops)
+    return compiler.process(element.column.ilike(element.pattern), **kw)
+
+
+class GlobalMatch(ColumnElement):
+    """Búsqueda global: alguna de las columnas contiene el valor (OR de ILIKE '%valor%')"""
+    type = Boolean()
+    inherit_cache = True
+    _is_implicitly_boolean = True
+    _traverse_internals = [
+        ("columns", InternalTraversal.dp_clauseelement_tuple),
+        ("pattern", InternalTraversal.dp_clauseelement),
+        ("phrase", InternalTraversal.dp_clauseelement),
+        ("literal", InternalTraversal.dp_boolean),
+    ]
+
+    def __init__(self, columns: Sequence[ColumnElement], value: Any):
+        value = str(value)
+        self.columns = tuple(columns)
+        self.pattern = bindparam(None, f"%{value}%", type_=String, unique=True)
+        keys = [column.key for column in self.columns]
+        # Todas las columnas: frase sin filtro; un subconjunto: filtro de columnas {a b} de FTS5
+        scope = "" if set(keys) == set(SEARCH_COLUMNS) else "{" + " ".join(keys) + "} : "
+        self.phrase = bindparam(None, scope + _phrase(value), type_=String, unique=True)
+        self.literal = "%" not in value and "_" not in value
+
+
+def global_match(columns: Sequence[ColumnElement], value: Any) -> ColumnElement:
+    """
+    Filtro de búsqueda global sobre `columns` (alguna contiene el valor) resuelto
+    con una sola consulta al índice en lugar de un OR de un filtro por columna
+    """
+    columns = list(columns)
+    if len(str(value)) < MIN_TRIGRAM_LENGTH or any(c.key not in SEARCH_COLUMNS for c in columns):
+        return or_(*(infix_match(column, value) for column in columns))
+    return GlobalMatch(columns, value)
+
+
+@compiles(GlobalMatch)
+def _compile_global_default(element: GlobalMatch, compiler, **kw) -> str:
+    return compiler.process(or_(*(cast(c, String).ilike(element.pattern) for c in element.columns)), **kw)
+
+
+@compiles(GlobalMatch, "sqlite")
+def _compile_global_sqlite(element: GlobalMatch, compiler, **kw) -> str:
+    if not SEARCH_INDEX_ENABLED:
+        return _compile_global_default(element, compiler, **kw)
+    table = element.columns[0].table.name
+    fts = f"{table}_fts"
+    if element.literal:
+        # Una sola frase sobre todas las columnas: un único recorrido del índice
+        subquery = f"SELECT rowid FROM {fts} WHERE {fts} MATCH {compiler.process(element.phrase, **kw)}"
+    else:
+        # LIKE con comodines sólo usa el índice por columna
+        pattern = compiler.process(element.pattern, **kw)
+        subquery = " UNION ".join(
+            f"SELECT rowid FROM {fts} WHERE {fts}.{c.key} LIKE {pattern}" for c in element.columns
+        )
+    return f"{table}.id IN ({subquery})"
+
+
+@compiles(GlobalMatch, "postgresql")
+def _compile_global_postgresql(element: GlobalMatch, compiler, **kw) -> str:
+    keys = {column.key for column in element.columns}
+    if not SEARCH_INDEX_ENABLED or keys != set(SEARCH_COLUMNS):
+        # Un subconjunto de columnas usa los índices GIN de cada columna
+        return compiler.process(or_(*(
+            c.ilike(element.pattern) if isinstance(c.type, String) and SEARCH_INDEX_ENABLED
+            else cast(c, String).ilike(element.pattern)
+            for c in element.columns
+        )), **kw)
+    document = postgresql_document(element.columns[0].table.name)
+    return f"{document} ILIKE {compiler.process(element.pattern, **kw)}"
+
+
+class SearchRank(ColumnElement):
+    """Distancia de relevancia de un registro en PostgreSQL (menor es más relevante)"""
+    type = Float()
+    inherit_cache = True
+    _traverse_internals = [
+        ("table", InternalTraversal.dp_clauseelement),
+        ("value", InternalTraversal.dp_clauseelement),
+    ]
+
+    def __init__(self, table: Table, value: Any):
+        self.table = table
+        self.value = bindparam(None, str(value), type_=String, unique=True)
+
+
+def order_by_relevance(query: Select, table: Table, value: Any, dialect: str) -> Select:
+    """
+    Ordena por relevancia (y luego por id) una consulta filtrada con global_match().
+    En SQLite se une con registros_fts y ordena por su columna rank (bm25), que FTS5
+    calcula en el mismo recorrido del índice; en PostgreSQL ordena por la distancia
+    <<-> de pg_trgm. Sin índice se conserva el orden por id.
+    """
+    value = str(value)
+    if dialect == "sqlite" and SEARCH_INDEX_ENABLED and len(value) >= MIN_TRIGRAM_LENGTH:
+        fts = table_clause(f"{table.name}_fts", column("rowid"), column("rank"))
+        phrase = bindparam(None, _phrase(value), type_=String, unique=True)
+        return (query.join(fts, fts.c.rowid == table.c.id)
+                .where(literal_column(fts.name).op("MATCH")(phrase))
+                .order_by(fts.c.rank, table.c.id))
+    return query.order_by(SearchRank(table, value), table.c.id)
+
+
+@compiles(SearchRank)
+def _compile_rank_default(element: SearchRank, compiler, **kw) -> str:
+    # Sin índice no hay puntuación: se conserva el orden por id
+    return compiler.process(literal(0.0), **kw)
+
+
+@compiles(SearchRank, "postgresql")
+def _compile_rank_postgresql(element: SearchRank, compiler, **kw) -> str:
+    if not SEARCH_INDEX_ENABLED:
+        return _compile_rank_default(element, compiler, **kw)
+    # <<-> es 1 - word_similarity (pg_trgm)
+    return f"({compiler.process(element.value, **kw)} <<-> {postgresql_document(element.table.name)})"
+
+
+def postgresql_document(table: Optional[str] = None) -> str:
+    """
+    Documento de búsqueda de un registro en PostgreSQL: todas las columnas de búsqueda
+    concatenadas. Sólo usa funciones IMMUTABLE para poder indexarlo; la consulta y el
+    índice deben usar exactamente la misma expresión.
+    """
+    prefix = f"{table}." if table else ""
+    parts = [f"coalesce(CAST({prefix}{col} AS VARCHAR), '')" for col in SEARCH_COLUMNS]
+    return "(" + f" || E'{DOCUMENT_SEPARATOR}' || ".join(parts) + ")"
+
+
+def sqlite_search_ddl(table: str = "registros", fts: Optional[str] = None) -> List[str]:
+    """
+    Sentencias que crean registros_fts y sus triggers de sincronización en SQLite
+    (`fts` cambia el nombre de la tabla FTS5, por defecto {table}_fts)
+    """
+    cols = ", ".join(SEARCH_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+    fts = fts or f"{table}_fts"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        # Indexa las filas que ya existían
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def postgresql_search_ddl(table: str = "registros") -> List[str]:
+    """Sentencias que crean los índices GIN pg_trgm en PostgreSQL"""
+    statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+    for col in SEARCH_COLUMNS:
+        # numero_inspector es entero: índice sobre la misma expresión que usa el filtro
+        expr = f"(CAST({col} AS VARCHAR))" if col == "numero_inspector" else col
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_{col}_trgm ON {table} USING gin ({expr} gin_trgm_ops)"
+        )
+    # Documento combinado para la búsqueda global
+    statements.append(
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_search_document_trgm ON {table} "
+        f"USING gin ({postgresql_document()} gin_trgm_ops)"
+    )
+    return statements
+
+
+def register_search_index(table: Table) -> None:
+    """Crea el índice de búsqueda junto con la tabla en metadata.create_all()"""
+    for statement in sqlite_search_ddl(table.name):
+        event.listen(table, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+    for statement in postgresql_search_ddl(table.name):
+        event.listen(table, "after_create", DDL(statement).execute_if(dialect="postgresql"))
@@ -35,6 +35,9 @@ from app.routes import excel_export  # ✅ sin cambios
 from app.routes import usuarios
 from app.routes import auth
 from app.routes import cache_monitor
+from app.services.cache import cache
+from app.services.registro_snapshot import registro_snapshot
+from app.services.distinct_values import distinct_values
 
 try:
     from app.routes import historial
@@ -69,6 +72,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
 # Configuración de compresión Gzip para mejorar rendimiento
@@ -140,7 +144,8 @@ async def startup_event():
     Evento de inicio de la aplicación.
     
     Se ejecuta cuando la aplicación FastAPI se inicia y registra información
-    sobre el estado de la aplicación y las rutas disponibles.
+    sobre el estado de la aplicación y las rutas disponibles. Arranca el reaper
+    del cache y, si REGISTROS_SNAPSHOT_ENABLED, la carga del snapshot de registros.
     
     Returns:
         None
@@ -148,6 +153,26 @@ async def startup_event():
     logger.info("Aplicación FastAPI iniciada correctamente")
     logger.info("CORS habilitado")
     logger.info("Rutas montadas: /registros, /view, /upload_excel, /excel_export, /usuarios, /auth" + (", /historial" if HAS_HISTORIAL else ""))
+    cache.start_reaper()
+    registro_snapshot.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Evento de cierre de la aplicación.
+    
+    Detiene las tareas en segundo plano (reaper de TTL del cache, carga del
+    snapshot y relecturas del índice de valores distintos) y cierra las
+    conexiones del backend de cache.
+    
+    Returns:
+        None
+    """
+    await cache.stop_reaper()
+    await registro_snapshot.stop()
+    await distinct_values.stop()
+    cache.close()
+    logger.info("Aplicación FastAPI detenida correctamente")
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -23,7 +23,7 @@ router = APIRouter()
 async def get_cache_stats(user=Depends(require_admin)):
     """Endpoint para obtener estadísticas del cache"""
     try:
-        stats = registro_cache_service.get_cache_stats()
+        stats = await registro_cache_service.get_cache_stats()
         return {
             "message": "Estadísticas del cache obtenidas exitosamente",
             "stats": stats,
@@ -43,11 +43,11 @@ async def clear_cache(user=Depends(require_admin)):
     """Endpoint para limpiar todo el cache"""
     try:
         # Limpiar cache general
-        cache.clear()
+        await cache.aclear()
         
         # Limpiar cache específico de registros
-        registro_cache_service.invalidate_registro_cache()
-        registro_cache_service.invalidate_estadisticas_cache()
+        await registro_cache_service.invalidate_registro_cache()
+        await registro_cache_service.invalidate_estadisticas_cache()
         
         return {
             "message": "Cache limpiado exitosamente",
@@ -67,7 +67,7 @@ async def cleanup_expired_cache(user=Depends(require_admin)):
     """Endpoint para limpiar entradas expiradas del cache"""
     try:
         # Limpiar entradas expiradas del cache general
-        expired_count = cache.cleanup_expired()
+        expired_count = await cache.acleanup_expired()
         
         return {
             "message": "Limpieza de cache completada",
@@ -87,7 +87,7 @@ async def cleanup_expired_cache(user=Depends(require_admin)):
 async def invalidate_registros_cache(user=Depends(require_admin)):
     """Endpoint para invalidar cache de registros"""
     try:
-        invalidated = registro_cache_service.invalidate_registro_cache()
+        invalidated = await registro_cache_service.invalidate_registro_cache()
         
         return {
             "message": "Cache de registros invalidado exitosamente",
@@ -107,7 +107,7 @@ async def invalidate_registros_cache(user=Depends(require_admin)):
 async def invalidate_estadisticas_cache(user=Depends(require_admin)):
     """Endpoint para invalidar cache de estadísticas"""
     try:
-        invalidated = registro_cache_service.invalidate_estadisticas_cache()
+        invalidated = await registro_cache_service.invalidate_estadisticas_cache()
         
         return {
             "message": "Cache de estadísticas invalidado exitosamente",
@@ -127,7 +127,7 @@ async def invalidate_estadisticas_cache(user=Depends(require_admin)):
 async def cache_health_check(user=Depends(require_admin)):
     """Endpoint para verificar la salud del cache"""
     try:
-        stats = registro_cache_service.get_cache_stats()
+        stats = await registro_cache_service.get_cache_stats()
         
         # Calcular métricas de salud
         total_requests = stats.get('total_requests', 0)
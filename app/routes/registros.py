@@ -8,12 +8,15 @@ import logging
 from app.db.connection import get_async_session
 from app.db.models import Registro, Base, HistorialCambio
 from app.schemas.registro import RegistroCreate, RegistroUpdate, RegistroOut
-from app.services.cache import cache
-from app.services.registro_cache_service import registro_cache_service
+from app.services.cache import cache, asave_to_cache
+from app.services.registro_cache_service import registro_cache_service, encode_registro, FACET_COLUMNS
+from app.services.registro_filters import RegistroFilterSpec, registro_filters
+from app.services.distinct_values import MATCH_INFIX, MATCH_MODES, ORDER_ALPHABETICAL, ORDERS, UNIQUE_VALUES_COLUMNS
+from app.services.pagination import InvalidCursorError
 from app.services.deps import require_admin, require_user_or_admin
 from app.services.validation import validate_single_registro, ValidationError
 from app.schemas.respuesta import TotalRegistrosResponse
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
 import csv
 import io
 from fastapi import File, UploadFile
@@ -57,6 +60,9 @@ async def actualizar_registro(
                 detail="ERROR Registro no encontrado: No existe un registro con el ID especificado para actualizar. Verifica el ID e intenta nuevamente."
             )
 
+        # Valores previos, para invalidar sólo el cache que el cambio afecta
+        valores_anteriores = registro.as_dict()
+
         # Preparar datos para validación (combinar datos existentes con nuevos)
         registro_data = {
             "numero_inspector": registro.numero_inspector,
@@ -128,9 +134,8 @@ async def actualizar_registro(
         await session.refresh(registro)
         logger.info(f"Registro ID={id} actualizado correctamente.")
         
-        # Invalidar cache de registros usando el servicio avanzado
-        from app.services.registro_cache_service import registro_cache_service
-        registro_cache_service.invalidate_registro_cache(id)
+        # Invalidar sólo las entradas de cache afectadas por el cambio
+        await registro_cache_service.invalidate_registro_change(valores_anteriores, registro.as_dict())
         logger.info("Cache invalidated after update")
         
         return registro
@@ -208,9 +213,8 @@ async def crear_registro(
         session.add(historial)
         await session.commit()
         
-        # Invalidar cache de registros usando el servicio avanzado
-        from app.services.registro_cache_service import registro_cache_service
-        registro_cache_service.invalidate_registro_cache()
+        # Invalidar sólo las entradas de cache en las que entra el nuevo registro
+        await registro_cache_service.invalidate_registro_change(None, nuevo_registro.as_dict())
         logger.info("Cache invalidated after create")
         
         return nuevo_registro
@@ -244,24 +248,7 @@ async def crear_registro(
     description="Devuelve el número total de registros en la base de datos. Requiere autenticación: usuario o admin."
 )
 async def contar_registros(
-    numero_inspector: str = Query(None),
-    uuid: str = Query(None),
-    nombre: str = Query(None),
-    observaciones: str = Query(None),
-    status: str = Query(None),
-    region: str = Query(None),
-    flota: str = Query(None),
-    encargado: str = Query(None),
-    celular: str = Query(None),
-    correo: str = Query(None),
-    direccion: str = Query(None),
-    uso: str = Query(None),
-    departamento: str = Query(None),
-    ciudad: str = Query(None),
-    tecnologia: str = Query(None),
-    cmts_olt: str = Query(None),
-    id_servicio: str = Query(None),
-    mac_sn: str = Query(None),
+    filtros: RegistroFilterSpec = Depends(registro_filters),
     session: AsyncSession = Depends(get_async_session),
     user=Depends(require_user_or_admin)
 ):
@@ -270,170 +257,19 @@ async def contar_registros(
         from app.services.registro_cache_service import registro_cache_service
         
         # Intentar obtener del cache primero
-        cached_result = await registro_cache_service.get_cached_total_registros(
-            session,
-            numero_inspector=numero_inspector,
-            uuid=uuid,
-            nombre=nombre,
-            observaciones=observaciones,
-            status=status,
-            region=region,
-            flota=flota,
-            encargado=encargado,
-            celular=celular,
-            correo=correo,
-            direccion=direccion,
-            uso=uso,
-            departamento=departamento,
-            ciudad=ciudad,
-            tecnologia=tecnologia,
-            cmts_olt=cmts_olt,
-            id_servicio=id_servicio,
-            mac_sn=mac_sn
-        )
+        cached_result = await registro_cache_service.get_cached_total_registros(session, filtros)
         
         if cached_result is not None:
             logger.info(f"Cache hit para total de registros")
             return cached_result
         
-        # Si no está en cache, calcular desde BD (código original)
-        from sqlalchemy import func
-        filtros = []
-        if numero_inspector:
-            if str(numero_inspector).startswith("__EXACT__"):
-                valor = str(numero_inspector)[9:]
-                filtros.append(cast(Registro.numero_inspector, String) == valor)
-            else:
-                filtros.append(cast(Registro.numero_inspector, String).ilike(f"%{numero_inspector}%"))
-        if uuid:
-            if str(uuid).startswith("__EXACT__"):
-                valor = str(uuid)[9:]
-                filtros.append(cast(Registro.uuid, String) == valor)
-            else:
-                filtros.append(Registro.uuid.ilike(f"%{uuid}%"))
-        if nombre:
-            if str(nombre).startswith("__EXACT__"):
-                valor = str(nombre)[9:]
-                filtros.append(cast(Registro.nombre, String) == valor)
-            else:
-                filtros.append(Registro.nombre.ilike(f"%{nombre}%"))
-        if observaciones:
-            if str(observaciones).startswith("__EXACT__"):
-                valor = str(observaciones)[9:]
-                filtros.append(cast(Registro.observaciones, String) == valor)
-            else:
-                filtros.append(cast(Registro.observaciones, String).ilike(f"%{observaciones}%"))
-        if status:
-            if str(status).startswith("__EXACT__"):
-                valor = str(status)[9:]
-                filtros.append(cast(Registro.status, String) == valor)
-            else:
-                filtros.append(cast(Registro.status, String).ilike(f"%{status}%"))
-        if region:
-            if str(region).startswith("__EXACT__"):
-                valor = str(region)[9:]
-                filtros.append(cast(Registro.region, String) == valor)
-            else:
-                filtros.append(cast(Registro.region, String).ilike(f"%{region}%"))
-        if flota:
-            if str(flota).startswith("__EXACT__"):
-                valor = str(flota)[9:]
-                filtros.append(cast(Registro.flota, String) == valor)
-            else:
-                filtros.append(cast(Registro.flota, String).ilike(f"%{flota}%"))
-        if encargado:
-            if str(encargado).startswith("__EXACT__"):
-                valor = str(encargado)[9:]
-                filtros.append(cast(Registro.encargado, String) == valor)
-            else:
-                filtros.append(cast(Registro.encargado, String).ilike(f"%{encargado}%"))
-        if celular:
-            if str(celular).startswith("__EXACT__"):
-                valor = str(celular)[9:]
-                filtros.append(cast(Registro.celular, String) == valor)
-            else:
-                filtros.append(cast(Registro.celular, String).ilike(f"%{celular}%"))
-        if correo:
-            if str(correo).startswith("__EXACT__"):
-                valor = str(correo)[9:]
-                filtros.append(cast(Registro.correo, String) == valor)
-            else:
-                filtros.append(cast(Registro.correo, String).ilike(f"%{correo}%"))
-        if direccion:
-            if str(direccion).startswith("__EXACT__"):
-                valor = str(direccion)[9:]
-                filtros.append(cast(Registro.direccion, String) == valor)
-            else:
-                filtros.append(cast(Registro.direccion, String).ilike(f"%{direccion}%"))
-        if uso:
-            if str(uso).startswith("__EXACT__"):
-                valor = str(uso)[9:]
-                filtros.append(cast(Registro.uso, String) == valor)
-            else:
-                filtros.append(cast(Registro.uso, String).ilike(f"%{uso}%"))
-        if departamento:
-            if str(departamento).startswith("__EXACT__"):
-                valor = str(departamento)[9:]
-                filtros.append(cast(Registro.departamento, String) == valor)
-            else:
-                filtros.append(cast(Registro.departamento, String).ilike(f"%{departamento}%"))
-        if ciudad:
-            if str(ciudad).startswith("__EXACT__"):
-                valor = str(ciudad)[9:]
-                filtros.append(cast(Registro.ciudad, String) == valor)
-            else:
-                filtros.append(cast(Registro.ciudad, String).ilike(f"%{ciudad}%"))
-        if tecnologia:
-            if str(tecnologia).startswith("__EXACT__"):
-                valor = str(tecnologia)[9:]
-                filtros.append(cast(Registro.tecnologia, String) == valor)
-            else:
-                filtros.append(cast(Registro.tecnologia, String).ilike(f"%{tecnologia}%"))
-        if cmts_olt:
-            if str(cmts_olt).startswith("__EXACT__"):
-                valor = str(cmts_olt)[9:]
-                filtros.append(cast(Registro.cmts_olt, String) == valor)
-            else:
-                filtros.append(cast(Registro.cmts_olt, String).ilike(f"%{cmts_olt}%"))
-        if id_servicio:
-            if str(id_servicio).startswith("__EXACT__"):
-                valor = str(id_servicio)[9:]
-                filtros.append(cast(Registro.id_servicio, String) == valor)
-            else:
-                filtros.append(cast(Registro.id_servicio, String).ilike(f"%{id_servicio}%"))
-        if mac_sn:
-            if str(mac_sn).startswith("__EXACT__"):
-                valor = str(mac_sn)[9:]
-                filtros.append(cast(Registro.mac_sn, String) == valor)
-            else:
-                filtros.append(cast(Registro.mac_sn, String).ilike(f"%{mac_sn}%"))
-        stmt = select(func.count()).select_from(Registro)
-        if filtros:
-            stmt = stmt.where(*filtros)
-        total = await session.scalar(stmt)
+        # Si no está en cache, calcular desde BD (mismos filtros, combinados con AND)
+        filtros = filtros._replace(global_or=False)
+        total = await session.scalar(filtros.count_statement())
         result = {"total": total}
         
         # Guardar en cache para futuras consultas
-        registro_cache_service.save_to_cache("total_registros", result, **{
-            "numero_inspector": numero_inspector,
-            "uuid": uuid,
-            "nombre": nombre,
-            "observaciones": observaciones,
-            "status": status,
-            "region": region,
-            "flota": flota,
-            "encargado": encargado,
-            "celular": celular,
-            "correo": correo,
-            "direccion": direccion,
-            "uso": uso,
-            "departamento": departamento,
-            "ciudad": ciudad,
-            "tecnologia": tecnologia,
-            "cmts_olt": cmts_olt,
-            "id_servicio": id_servicio,
-            "mac_sn": mac_sn
-        })
+        await asave_to_cache("total_registros", result, None, **filtros.params)
         
         logger.info(f"Conteo de registros exitoso. Total: {total}")
         return result
@@ -451,261 +287,143 @@ from app.schemas.registro import RegistroOut  # Ya importado arriba
     "/registros",
     response_model=List[RegistroOut],
     summary="Filtrar y ordenar registros",
-    description="Devuelve una lista paginada de registros, permitiendo filtrar por cualquier columna y ordenar por cualquier campo. Requiere autenticación: usuario o admin."
+    description="Devuelve una lista paginada de registros, permitiendo filtrar por cualquier columna y ordenar por cualquier campo. Si hay más resultados, el cursor de la siguiente página viene en la cabecera X-Next-Cursor; con include_total el total filtrado viene en X-Total-Count (evita la llamada a /registros/total). q busca el texto en todas las columnas con una sola consulta al índice de búsqueda; con sort_by=relevancia los resultados se ordenan por relevancia (paginar con offset). Requiere autenticación: usuario o admin."
 )
 async def listar_registros(
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
     sort_by: str = Query("id"),
     sort_dir: str = Query("asc"),
-    numero_inspector: str = Query(None),
-    uuid: str = Query(None),
-    nombre: str = Query(None),
-    observaciones: str = Query(None),
-    status: str = Query(None),
-    region: str = Query(None),
-    flota: str = Query(None),
-    encargado: str = Query(None),
-    celular: str = Query(None),
-    correo: str = Query(None),
-    direccion: str = Query(None),
-    uso: str = Query(None),
-    departamento: str = Query(None),
-    ciudad: str = Query(None),
-    tecnologia: str = Query(None),
-    cmts_olt: str = Query(None),
-    id_servicio: str = Query(None),
-    mac_sn: str = Query(None),
+    cursor: str = Query(None, description="Cursor de X-Next-Cursor; continúa tras la página anterior (ignora offset)"),
+    include_total: bool = Query(False, description="Devuelve también el total filtrado en la cabecera X-Total-Count"),
+    filtros: RegistroFilterSpec = Depends(registro_filters),
     session: AsyncSession = Depends(get_async_session),
     user=Depends(require_user_or_admin)
 ):
     try:
-        query = select(Registro)
-        # Filtros dinámicos
-        filtros = []
-        filtro_valores = []
-        filtro_columnas = []
-        # Construir filtros y recolectar valores para lógica OR
-        if numero_inspector:
-            if str(numero_inspector).startswith("__EXACT__"):
-                valor = str(numero_inspector)[9:]
-                expr = cast(Registro.numero_inspector, String) == valor
-            else:
-                expr = cast(Registro.numero_inspector, String).ilike(f"%{numero_inspector}%")
-            filtros.append(expr)
-            filtro_valores.append(numero_inspector)
-            filtro_columnas.append("numero_inspector")
-        if uuid:
-            if str(uuid).startswith("__EXACT__"):
-                valor = str(uuid)[9:]
-                expr = cast(Registro.uuid, String) == valor
-            else:
-                expr = Registro.uuid.ilike(f"%{uuid}%")
-            filtros.append(expr)
-            filtro_valores.append(uuid)
-            filtro_columnas.append("uuid")
-        if nombre:
-            if str(nombre).startswith("__EXACT__"):
-                valor = str(nombre)[9:]
-                expr = cast(Registro.nombre, String) == valor
-            else:
-                expr = Registro.nombre.ilike(f"%{nombre}%")
-            filtros.append(expr)
-            filtro_valores.append(nombre)
-            filtro_columnas.append("nombre")
-        if observaciones:
-            if str(observaciones).startswith("__EXACT__"):
-                valor = str(observaciones)[9:]
-                expr = cast(Registro.observaciones, String) == valor
-            else:
-                expr = Registro.observaciones.ilike(f"%{observaciones}%")
-            filtros.append(expr)
-            filtro_valores.append(observaciones)
-            filtro_columnas.append("observaciones")
-        if status:
-            if str(status).startswith("__EXACT__"):
-                valor = str(status)[9:]
-                expr = cast(Registro.status, String) == valor
-            else:
-                expr = Registro.status.ilike(f"%{status}%")
-            filtros.append(expr)
-            filtro_valores.append(status)
-            filtro_columnas.append("status")
-        if region:
-            if str(region).startswith("__EXACT__"):
-                valor = str(region)[9:]
-                expr = cast(Registro.region, String) == valor
-            else:
-                expr = Registro.region.ilike(f"%{region}%")
-            filtros.append(expr)
-            filtro_valores.append(region)
-            filtro_columnas.append("region")
-        if flota:
-            if str(flota).startswith("__EXACT__"):
-                valor = str(flota)[9:]
-                expr = cast(Registro.flota, String) == valor
-            else:
-                expr = Registro.flota.ilike(f"%{flota}%")
-            filtros.append(expr)
-            filtro_valores.append(flota)
-            filtro_columnas.append("flota")
-        if encargado:
-            if str(encargado).startswith("__EXACT__"):
-                valor = str(encargado)[9:]
-                expr = cast(Registro.encargado, String) == valor
-            else:
-                expr = Registro.encargado.ilike(f"%{encargado}%")
-            filtros.append(expr)
-            filtro_valores.append(encargado)
-            filtro_columnas.append("encargado")
-        if celular:
-            if str(celular).startswith("__EXACT__"):
-                valor = str(celular)[9:]
-                expr = cast(Registro.celular, String) == valor
-            else:
-                expr = Registro.celular.ilike(f"%{celular}%")
-            filtros.append(expr)
-            filtro_valores.append(celular)
-            filtro_columnas.append("celular")
-        if correo:
-            if str(correo).startswith("__EXACT__"):
-                valor = str(correo)[9:]
-                expr = cast(Registro.correo, String) == valor
-            else:
-                expr = Registro.correo.ilike(f"%{correo}%")
-            filtros.append(expr)
-            filtro_valores.append(correo)
-            filtro_columnas.append("correo")
-        if direccion:
-            if str(direccion).startswith("__EXACT__"):
-                valor = str(direccion)[9:]
-                expr = cast(Registro.direccion, String) == valor
-            else:
-                expr = Registro.direccion.ilike(f"%{direccion}%")
-            filtros.append(expr)
-            filtro_valores.append(direccion)
-            filtro_columnas.append("direccion")
-        if uso:
-            if str(uso).startswith("__EXACT__"):
-                valor = str(uso)[9:]
-                expr = cast(Registro.uso, String) == valor
-            else:
-                expr = Registro.uso.ilike(f"%{uso}%")
-            filtros.append(expr)
-            filtro_valores.append(uso)
-            filtro_columnas.append("uso")
-        if departamento:
-            if str(departamento).startswith("__EXACT__"):
-                valor = str(departamento)[9:]
-                expr = cast(Registro.departamento, String) == valor
-            else:
-                expr = Registro.departamento.ilike(f"%{departamento}%")
-            filtros.append(expr)
-            filtro_valores.append(departamento)
-            filtro_columnas.append("departamento")
-        if ciudad:
-            if str(ciudad).startswith("__EXACT__"):
-                valor = str(ciudad)[9:]
-                expr = cast(Registro.ciudad, String) == valor
-            else:
-                expr = Registro.ciudad.ilike(f"%{ciudad}%")
-            filtros.append(expr)
-            filtro_valores.append(ciudad)
-            filtro_columnas.append("ciudad")
-        if tecnologia:
-            if str(tecnologia).startswith("__EXACT__"):
-                valor = str(tecnologia)[9:]
-                expr = cast(Registro.tecnologia, String) == valor
-            else:
-                expr = Registro.tecnologia.ilike(f"%{tecnologia}%")
-            filtros.append(expr)
-            filtro_valores.append(tecnologia)
-            filtro_columnas.append("tecnologia")
-        if cmts_olt:
-            if str(cmts_olt).startswith("__EXACT__"):
-                valor = str(cmts_olt)[9:]
-                expr = cast(Registro.cmts_olt, String) == valor
-            else:
-                expr = Registro.cmts_olt.ilike(f"%{cmts_olt}%")
-            filtros.append(expr)
-            filtro_valores.append(cmts_olt)
-            filtro_columnas.append("cmts_olt")
-        if id_servicio:
-            if str(id_servicio).startswith("__EXACT__"):
-                valor = str(id_servicio)[9:]
-                expr = cast(Registro.id_servicio, String) == valor
-            else:
-                expr = Registro.id_servicio.ilike(f"%{id_servicio}%")
-            filtros.append(expr)
-            filtro_valores.append(id_servicio)
-            filtro_columnas.append("id_servicio")
-        if mac_sn:
-            if str(mac_sn).startswith("__EXACT__"):
-                valor = str(mac_sn)[9:]
-                expr = cast(Registro.mac_sn, String) == valor
-            else:
-                expr = Registro.mac_sn.ilike(f"%{mac_sn}%")
-            filtros.append(expr)
-            filtro_valores.append(mac_sn)
-            filtro_columnas.append("mac_sn")
+        # El servicio aplica la búsqueda global (q o lógica OR) y el ordenamiento tipo Excel
+        page = await registro_cache_service.get_cached_registros_list(
+            session,
+            limit=limit,
+            offset=0 if cursor else offset,
+            sort_by=sort_by,
+            sort_dir=sort_dir,
+            cursor=cursor,
+            include_total=include_total,
+            spec=filtros
+        )
+        if page is None:
+            raise HTTPException(status_code=500, detail="Error al obtener registros")
+
+        # JSON ya validado con RegistroOut: se devuelve sin volver a serializar
+        headers = {}
+        if page.next_cursor:
+            headers["X-Next-Cursor"] = page.next_cursor
+        if page.total is not None:
+            headers["X-Total-Count"] = str(page.total)
+        return Response(content=page.payload, media_type="application/json", headers=headers)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error al listar registros: {e}")
+        raise HTTPException(status_code=500, detail="Error al obtener registros")
 
-        # Lógica OR para búsqueda global
-        use_or = False
-        if filtros and len(set(filtro_valores)) == 1 and len(filtro_valores) > 1:
-            # Todos los filtros tienen el mismo valor y hay más de uno (búsqueda global)
-            use_or = True
-        if filtros:
-            if use_or:
-                query = query.where(or_(*filtros))
-            else:
-                query = query.where(and_(*filtros))
+@router.get(
+    "/registros/unique_values",
+    summary="Valores únicos de columna",
+    description="Devuelve los valores únicos de una columna de registros, opcionalmente filtrados por texto (modo contiene o prefijo). Con orden=frecuencia y limit devuelve los N valores más usados; con counts=true incluye el número de registros de cada valor. Requiere autenticación: usuario o admin."
+)
+async def unique_values(
+    col: Union[str, list] = Query(..., min_length=1),
+    search: str = Query('', min_length=0),
+    modo: str = Query(MATCH_INFIX, pattern=f"^({'|'.join(MATCH_MODES)})$", description="contiene (subcadena) o prefijo"),
+    orden: str = Query(ORDER_ALPHABETICAL, pattern=f"^({'|'.join(ORDERS)})$", description="alfabetico o frecuencia (más registros primero)"),
+    limit: int = Query(None, ge=1, description="Máximo de valores a devolver"),
+    counts: bool = Query(False, description="Incluye 'counts': registros por valor, en el mismo orden que 'values'"),
+    session: AsyncSession = Depends(get_async_session),
+    user=Depends(require_user_or_admin)
+):
+    # Si col es lista, toma el primer valor
+    if isinstance(col, list):
+        col = col[0]
+    logging.info(f"[unique_values] col: '{col}', search: '{search}', modo: '{modo}', orden: '{orden}'")
+    
+    # Índice de valores distintos: una lectura por columna, las búsquedas en memoria
+    result = await registro_cache_service.get_cached_unique_values(
+        session, col, search, mode=modo, order=orden, limit=limit, counts=counts
+    )
+    if result is None:
+        logging.error(f"[unique_values] Columna no permitida o vacía: '{col}'")
+        raise HTTPException(status_code=400, detail=f"Columna no permitida: '{col}'")
+    return result
 
-        # Ordenamiento especial para numero_inspector estilo Excel
-        if sort_by == "numero_inspector":
-            # Ordenamiento tipo Excel para SQLite
-            # Primero números, luego texto, luego otros
-            case_expr = case(
-                (Registro.numero_inspector.cast(String).like('0%'), 1),
-                (Registro.numero_inspector.cast(String).like('1%'), 1),
-                (Registro.numero_inspector.cast(String).like('2%'), 1),
-                (Registro.numero_inspector.cast(String).like('3%'), 1),
-                (Registro.numero_inspector.cast(String).like('4%'), 1),
-                (Registro.numero_inspector.cast(String).like('5%'), 1),
-                (Registro.numero_inspector.cast(String).like('6%'), 1),
-                (Registro.numero_inspector.cast(String).like('7%'), 1),
-                (Registro.numero_inspector.cast(String).like('8%'), 1),
-                (Registro.numero_inspector.cast(String).like('9%'), 1),
-                else_=2
-            )
-            
-            if sort_dir == "asc":
-                query = query.order_by(
-                    case_expr,
-                    Registro.numero_inspector.asc()
-                )
-            else:
-                query = query.order_by(
-                    case_expr.desc(),
-                    Registro.numero_inspector.desc()
-                )
-        else:
-            # Ordenamiento genérico
-            col = getattr(Registro, sort_by, None)
-            if col is not None:
-                if sort_dir == "asc":
-                    query = query.order_by(col.asc())
-                else:
-                    query = query.order_by(col.desc())
-            else:
-                query = query.order_by(Registro.id.asc())
+@router.get(
+    "/registros/facets",
+    summary="Conteos por valor para los filtros",
+    description="Devuelve, en una sola consulta, cuántos registros tiene cada valor de varias columnas (por defecto region, ciudad, tecnologia, flota, uso y status) bajo los mismos filtros y búsqueda q que /registros. Los valores van de más a menos registros. Requiere autenticación: usuario o admin."
+)
+async def facetas_registros(
+    columns: str = Query(",".join(FACET_COLUMNS), description="Columnas separadas por comas"),
+    filtros: RegistroFilterSpec = Depends(registro_filters),
+    session: AsyncSession = Depends(get_async_session),
+    user=Depends(require_user_or_admin)
+):
+    columnas = [columna.strip() for columna in columns.split(",") if columna.strip()]
+    no_permitidas = [columna for columna in columnas if columna not in UNIQUE_VALUES_COLUMNS]
+    if not columnas or no_permitidas:
+        raise HTTPException(status_code=400, detail=f"Columnas no permitidas: {no_permitidas or columns}")
+
+    result = await registro_cache_service.get_cached_facets(session, columnas, filtros)
+    if result is None:
+        raise HTTPException(status_code=500, detail="Error al obtener los conteos de los filtros")
+    return result
 
-        query = query.offset(offset).limit(limit)
+@router.get(
+    "/registros/exportar",
+    summary="Exportar registros como CSV",
+    description="Devuelve los registros en formato CSV para descarga; acepta los mismos filtros y búsqueda q que /registros. Requiere autenticación: solo admin."
+)
+async def exportar_registros_csv(
+    filtros: RegistroFilterSpec = Depends(registro_filters),
+    session: AsyncSession = Depends(get_async_session),
+    user=Depends(require_admin)
+):
+    try:
+        query = select(Registro).order_by(Registro.id)
+        where = filtros.where()
+        if where is not None:
+            query = query.where(where)
         result = await session.execute(query)
         registros = result.scalars().all()
-        return registros
+
+        # Crear archivo CSV en memoria
+        output = io.StringIO()
+        writer = csv.writer(output)
+
+        # Escribir encabezados
+        headers = [
+            "id", "numero_inspector", "uuid", "nombre", "observaciones", "status", "region", "flota",
+            "encargado", "celular", "correo", "direccion", "uso", "departamento",
+            "ciudad", "tecnologia", "cmts_olt", "id_servicio", "mac_sn"
+        ]
+        writer.writerow(headers)
+
+        # Escribir registros
+        for r in registros:
+            writer.writerow([
+                r.id, r.numero_inspector, r.uuid, r.nombre, r.observaciones, r.status, r.region, r.flota,
+                r.encargado, r.celular, r.correo, r.direccion, r.uso, r.departamento,
+                r.ciudad, r.tecnologia, r.cmts_olt, r.id_servicio, r.mac_sn
+            ])
+
+        output.seek(0)
+        return StreamingResponse(output, media_type="text/csv", headers={"Content-Disposition": "attachment; filename=registros.csv"})
+
     except Exception as e:
-        logger.error(f"Error al listar registros: {e}")
-        raise HTTPException(status_code=500, detail="Error al obtener registros")
+        logger.error(f"Error al exportar registros: {e}")
+        raise HTTPException(status_code=500, detail="Error al exportar registros")
 
 @router.get(
     "/registros/{numero_inspector}/historial",
@@ -757,7 +475,7 @@ async def obtener_historial_registro(
         ]
         
         # Guardar en cache para futuras consultas
-        registro_cache_service.save_to_cache("historial", historial_json, numero_inspector=numero_inspector)
+        await asave_to_cache("historial", historial_json, None, numero_inspector=numero_inspector, days=15)
         
         return historial_json
     except Exception as e:
@@ -782,27 +500,22 @@ async def obtener_registro_por_id(
         # Usar el servicio de cache avanzado de manera transparente
         from app.services.registro_cache_service import registro_cache_service
         
-        # Intentar obtener del cache primero
-        cached_registro = await registro_cache_service.get_cached_registro_by_id(session, id)
-        
-        if cached_registro is not None:
-            logger.info(f"Cache hit para registro ID={id}")
-            return cached_registro
-        
-        # Si no está en cache, consultar BD (código original)
-        result = await session.execute(select(Registro).where(Registro.id == id))
-        registro = result.scalar_one_or_none()
-        
-        if not registro:
-            raise HTTPException(
-                status_code=404, 
-                detail="ERROR Registro no encontrado: No existe un registro con el ID especificado. Verifica el ID e intenta nuevamente."
-            )
+        # JSON ya serializado (desde cache o recién consultado y cacheado)
+        payload = await registro_cache_service.get_cached_registro_by_id(session, id)
         
-        # Guardar en cache para futuras consultas
-        registro_cache_service.save_to_cache("registro_individual", registro, id=id)
+        if payload is None:
+            # No existe o falló la consulta del servicio: comprobar directamente en BD
+            result = await session.execute(select(Registro).where(Registro.id == id))
+            registro = result.scalar_one_or_none()
+            
+            if not registro:
+                raise HTTPException(
+                    status_code=404, 
+                    detail="ERROR Registro no encontrado: No existe un registro con el ID especificado. Verifica el ID e intenta nuevamente."
+                )
+            payload = encode_registro(registro)
         
-        return registro
+        return Response(content=payload, media_type="application/json")
     except HTTPException:
         raise
     except SQLAlchemyError as se:
@@ -843,6 +556,7 @@ async def eliminar_registro(
             )
 
         # Registrar eliminación en el historial
+        valores_anteriores = registro.as_dict()
         historial = HistorialCambio(
             registro_id=registro.id,
             numero_inspector=registro.numero_inspector,
@@ -850,7 +564,7 @@ async def eliminar_registro(
             usuario=user["sub"] if isinstance(user, dict) and "sub" in user else str(user),
             accion="eliminacion",
             campo=None,
-            valor_anterior=json.dumps(registro.as_dict(), ensure_ascii=False),
+            valor_anterior=json.dumps(valores_anteriores, ensure_ascii=False),
             valor_nuevo=None,
             descripcion="Registro eliminado"
         )
@@ -860,9 +574,8 @@ async def eliminar_registro(
         await session.commit()
         logger.info(f"Registro ID={id} eliminado correctamente.")
         
-        # Invalidar cache usando el servicio avanzado
-        from app.services.registro_cache_service import registro_cache_service
-        registro_cache_service.invalidate_registro_cache(id)
+        # Invalidar sólo las entradas de cache que contenían el registro
+        await registro_cache_service.invalidate_registro_change(valores_anteriores, None)
         logger.info("Cache invalidated after delete")
         
         return {"mensaje": f"Registro con ID={id} eliminado exitosamente"}
@@ -883,46 +596,6 @@ async def eliminar_registro(
         )
 
 
-@router.get(
-    "/registros/exportar",
-    summary="Exportar registros como CSV",
-    description="Devuelve todos los registros en formato CSV para descarga. Requiere autenticación: solo admin."
-)
-async def exportar_registros_csv(
-    session: AsyncSession = Depends(get_async_session),
-    user=Depends(require_admin)
-):
-    try:
-        result = await session.execute(select(Registro))
-        registros = result.scalars().all()
-
-        # Crear archivo CSV en memoria
-        output = io.StringIO()
-        writer = csv.writer(output)
-
-        # Escribir encabezados
-        headers = [
-            "id", "numero_inspector", "uuid", "nombre", "observaciones", "status", "region", "flota",
-            "encargado", "celular", "correo", "direccion", "uso", "departamento",
-            "ciudad", "tecnologia", "cmts_olt", "id_servicio", "mac_sn"
-        ]
-        writer.writerow(headers)
-
-        # Escribir registros
-        for r in registros:
-            writer.writerow([
-                r.id, r.numero_inspector, r.uuid, r.nombre, r.observaciones, r.status, r.region, r.flota,
-                r.encargado, r.celular, r.correo, r.direccion, r.uso, r.departamento,
-                r.ciudad, r.tecnologia, r.cmts_olt, r.id_servicio, r.mac_sn
-            ])
-
-        output.seek(0)
-        return StreamingResponse(output, media_type="text/csv", headers={"Content-Disposition": "attachment; filename=registros.csv"})
-
-    except Exception as e:
-        logger.error(f"Error al exportar registros: {e}")
-        raise HTTPException(status_code=500, detail="Error al exportar registros")
-
 @router.post(
     "/registros/cargar",
     summary="Cargar registros desde CSV",
@@ -952,61 +625,13 @@ async def cargar_registros_csv(
                 logger.warning(f"Fila inválida omitida: {row} - Error: {e}")
 
         await session.commit()
+        await registro_cache_service.invalidate_registro_cache()
         return {"mensaje": f"{len(nuevos_registros)} registros cargados correctamente"}
 
     except Exception as e:
         logger.error(f"Error al cargar CSV: {e}")
         raise HTTPException(status_code=500, detail="Error al procesar archivo CSV")
 
-@router.get(
-    "/registros/unique_values",
-    summary="Valores únicos de columna",
-    description="Devuelve los valores únicos de una columna de registros, opcionalmente filtrados por texto. Requiere autenticación: usuario o admin."
-)
-async def unique_values(
-    col: Union[str, list] = Query(..., min_length=1),
-    search: str = Query('', min_length=0),
-    session: AsyncSession = Depends(get_async_session)
-):
-    # Si col es lista, toma el primer valor
-    if isinstance(col, list):
-        col = col[0]
-    logging.info(f"[unique_values] col: '{col}', search: '{search}'")
-    
-    try:
-        # Usar el servicio de cache avanzado de manera transparente
-        from app.services.registro_cache_service import registro_cache_service
-        
-        # Intentar obtener del cache primero
-        cached_result = await registro_cache_service.get_cached_unique_values(session, col, search)
-        
-        if cached_result is not None:
-            logger.info(f"Cache hit para valores únicos columna {col}")
-            return cached_result
-        
-        # Si no está en cache, consultar BD (código original)
-        allowed_cols = [
-            "numero_inspector", "nombre", "observaciones", "status", "region", "flota", "encargado", "celular", "correo", "direccion", "uso", "departamento", "ciudad", "tecnologia", "cmts_olt", "id_servicio", "mac_sn"
-        ]
-        if not col or col not in allowed_cols:
-            logging.error(f"[unique_values] Columna no permitida o vacía: '{col}'")
-            raise HTTPException(status_code=400, detail=f"Columna no permitida: '{col}'")
-        model_col = getattr(Registro, col)
-        stmt = select(model_col).distinct().order_by(model_col)
-        if search:
-            stmt = stmt.where(cast(model_col, String).ilike(f"%{search}%"))
-        result = await session.execute(stmt)
-        values = [row[0] for row in result.fetchall() if row[0] is not None]
-        result_dict = {"values": values}
-        
-        # Guardar en cache para futuras consultas
-        registro_cache_service.save_to_cache("valores_unicos", result_dict, column=col, search=search)
-        
-        return result_dict
-    except Exception as e:
-        logger.error(f"Error al obtener valores únicos para columna {col}: {e}")
-        raise HTTPException(status_code=500, detail=f"Error al obtener valores únicos: {str(e)}")
-
 @router.get(
     "/historial-cambios/exportar",
     summary="Exportar historial de cambios global a JSON",
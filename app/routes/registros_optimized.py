@@ -10,10 +10,11 @@ from app.db.models import Registro, Base, HistorialCambio
 from app.schemas.registro import RegistroCreate, RegistroUpdate, RegistroOut
 from app.services.cache import cache
 from app.services.registro_cache_service import registro_cache_service
+from app.services.registro_filters import RegistroFilterSpec, registro_filters
 from app.services.deps import require_admin, require_user_or_admin
 from app.services.validation import validate_single_registro, ValidationError
 from app.schemas.respuesta import TotalRegistrosResponse
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
 import csv
 import io
 from fastapi import File, UploadFile
@@ -129,7 +130,7 @@ async def actualizar_registro(
         logger.info(f"Registro ID={id} actualizado correctamente.")
         
         # Invalidar cache de registros usando el servicio avanzado
-        registro_cache_service.invalidate_registro_cache(id)
+        await registro_cache_service.invalidate_registro_cache(id)
         logger.info("Cache invalidated after update")
         
         return registro
@@ -208,7 +209,7 @@ async def crear_registro(
         await session.commit()
         
         # Invalidar cache de registros usando el servicio avanzado
-        registro_cache_service.invalidate_registro_cache()
+        await registro_cache_service.invalidate_registro_cache()
         logger.info("Cache invalidated after create")
         
         return nuevo_registro
@@ -242,24 +243,7 @@ async def crear_registro(
     description="Devuelve el número total de registros en la base de datos. Requiere autenticación: usuario o admin."
 )
 async def contar_registros(
-    numero_inspector: str = Query(None),
-    uuid: str = Query(None),
-    nombre: str = Query(None),
-    observaciones: str = Query(None),
-    status: str = Query(None),
-    region: str = Query(None),
-    flota: str = Query(None),
-    encargado: str = Query(None),
-    celular: str = Query(None),
-    correo: str = Query(None),
-    direccion: str = Query(None),
-    uso: str = Query(None),
-    departamento: str = Query(None),
-    ciudad: str = Query(None),
-    tecnologia: str = Query(None),
-    cmts_olt: str = Query(None),
-    id_servicio: str = Query(None),
-    mac_sn: str = Query(None),
+    filtros: RegistroFilterSpec = Depends(registro_filters),
     session: AsyncSession = Depends(get_async_session),
     user=Depends(require_user_or_admin)
 ):
@@ -267,24 +251,7 @@ async def contar_registros(
         # Usar el servicio de cache avanzado
         result = await registro_cache_service.get_cached_total_registros(
             session,
-            numero_inspector=numero_inspector,
-            uuid=uuid,
-            nombre=nombre,
-            observaciones=observaciones,
-            status=status,
-            region=region,
-            flota=flota,
-            encargado=encargado,
-            celular=celular,
-            correo=correo,
-            direccion=direccion,
-            uso=uso,
-            departamento=departamento,
-            ciudad=ciudad,
-            tecnologia=tecnologia,
-            cmts_olt=cmts_olt,
-            id_servicio=id_servicio,
-            mac_sn=mac_sn
+            filtros
         )
         
         if result is None:
@@ -311,59 +278,27 @@ async def listar_registros(
     offset: int = Query(0, ge=0),
     sort_by: str = Query("id"),
     sort_dir: str = Query("asc"),
-    numero_inspector: str = Query(None),
-    uuid: str = Query(None),
-    nombre: str = Query(None),
-    observaciones: str = Query(None),
-    status: str = Query(None),
-    region: str = Query(None),
-    flota: str = Query(None),
-    encargado: str = Query(None),
-    celular: str = Query(None),
-    correo: str = Query(None),
-    direccion: str = Query(None),
-    uso: str = Query(None),
-    departamento: str = Query(None),
-    ciudad: str = Query(None),
-    tecnologia: str = Query(None),
-    cmts_olt: str = Query(None),
-    id_servicio: str = Query(None),
-    mac_sn: str = Query(None),
+    filtros: RegistroFilterSpec = Depends(registro_filters),
     session: AsyncSession = Depends(get_async_session),
     user=Depends(require_user_or_admin)
 ):
     try:
         # Usar el servicio de cache avanzado
-        registros = await registro_cache_service.get_cached_registros_list(
+        page = await registro_cache_service.get_cached_registros_list(
             session,
             limit=limit,
             offset=offset,
             sort_by=sort_by,
             sort_dir=sort_dir,
-            numero_inspector=numero_inspector,
-            uuid=uuid,
-            nombre=nombre,
-            observaciones=observaciones,
-            status=status,
-            region=region,
-            flota=flota,
-            encargado=encargado,
-            celular=celular,
-            correo=correo,
-            direccion=direccion,
-            uso=uso,
-            departamento=departamento,
-            ciudad=ciudad,
-            tecnologia=tecnologia,
-            cmts_olt=cmts_olt,
-            id_servicio=id_servicio,
-            mac_sn=mac_sn
+            spec=filtros
         )
         
-        if registros is None:
+        if page is None:
             raise HTTPException(status_code=500, detail="Error al obtener registros")
         
-        return registros
+        # JSON ya validado con RegistroOut
+        headers = {"X-Next-Cursor": page.next_cursor} if page.next_cursor else None
+        return Response(content=page.payload, media_type="application/json", headers=headers)
         
     except HTTPException:
         raise
@@ -482,7 +417,7 @@ async def eliminar_registro(
         logger.info(f"Registro ID={id} eliminado correctamente.")
         
         # Invalidar cache usando el servicio avanzado
-        registro_cache_service.invalidate_registro_cache(id)
+        await registro_cache_service.invalidate_registro_cache(id)
         logger.info("Cache invalidated after delete")
         
         return {"mensaje": f"Registro con ID={id} eliminado exitosamente"}
@@ -545,7 +480,7 @@ async def unique_values(
 async def get_cache_stats(user=Depends(require_admin)):
     """Endpoint para obtener estadísticas del cache"""
     try:
-        stats = registro_cache_service.get_cache_stats()
+        stats = await registro_cache_service.get_cache_stats()
         return {
             "message": "Estadísticas del cache obtenidas exitosamente",
             "stats": stats
@@ -564,11 +499,11 @@ async def clear_cache(user=Depends(require_admin)):
     """Endpoint para limpiar todo el cache"""
     try:
         # Limpiar cache general
-        cache.clear()
+        await cache.aclear()
         
         # Limpiar cache específico de registros
-        registro_cache_service.invalidate_registro_cache()
-        registro_cache_service.invalidate_estadisticas_cache()
+        await registro_cache_service.invalidate_registro_cache()
+        await registro_cache_service.invalidate_estadisticas_cache()
         
         return {
             "message": "Cache limpiado exitosamente",
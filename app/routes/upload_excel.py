@@ -1,18 +1,24 @@
+import asyncio
+import itertools
 import logging
-import pandas as pd
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
+import time
+from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from typing import List, Dict, Tuple
 from pandas.errors import ParserError
-import io
 from sqlalchemy import text
 
+from app.config import CSV_REPLACE_MODE
 from app.db.connection import get_async_session
-from app.db.models import Registro
 from app.schemas.registro import RegistroCreate
 from app.services.validation import validate_bulk_registros
+from app.services.bulk_load import bulk_insert_registros
+from app.services.csv_ingest import CsvFormatError, ingest_report, iter_registros, sniff_csv_format, validate_csv
 from app.services.deps import require_admin
+from app.services.registro_cache_service import registro_cache_service
+from app.services.registro_diff import apply_registro_diff
+from app.services.registro_swap import REPLACE_DIFF, REPLACE_MODES, REPLACE_SWAP, replace_registros_by_swap
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -145,13 +151,25 @@ def validate_required_columns(df_columns: List[str], column_mapping: Dict[str, s
 @router.post("/upload_csv", summary="Carga masiva de registros desde archivo CSV")
 async def upload_csv(
     file: UploadFile = File(...),
+    modo: str = Query(
+        CSV_REPLACE_MODE, pattern=f"^({'|'.join(REPLACE_MODES)})$",
+        description="directo (DELETE e INSERT en una transacción), intercambio (tabla de carga que reemplaza a registros) "
+                    "o diferencias (sólo inserta, actualiza y elimina lo que cambió)"
+    ),
     session: AsyncSession = Depends(get_async_session),
     user=Depends(require_admin)
 ):
     """
     Endpoint para cargar registros desde un archivo CSV.
     Realiza todas las validaciones ANTES de modificar la base de datos.
-    Si todo es válido, borra e inserta en una sola transacción.
+    Si todo es válido, reemplaza los registros: con modo=directo borra e inserta en
+    una sola transacción; con modo=intercambio carga una tabla aparte y la cambia
+    por registros (ver app.services.registro_swap); con modo=diferencias aplica sólo
+    los cambios y registra su historial (ver app.services.registro_diff).
+    El archivo se lee por bloques (ver app.services.csv_ingest) y se inserta con
+    executemany o COPY (ver app.services.bulk_load); la respuesta incluye la
+    duración y las filas por segundo de toda la petición y de la inserción, y la
+    ventana de bloqueo de registros.
     """
     logger.info(f"INICIO ===== CARGA MASIVA INICIADA =====")
     logger.info(f"Archivo recibido: {file.filename} ({file.content_type})")
@@ -167,29 +185,12 @@ async def upload_csv(
             }
         )
     try:
-        content = await file.read()
-        logger.info(f"Archivo leído: {len(content)} bytes")
-        # Leer el CSV detectando automáticamente el separador correcto (al menos 2 columnas)
-        df = None
-        separadores = [',', ';', '\t', '|']
-        encodings = ['utf-8', 'latin-1', 'cp1252']
-        for encoding in encodings:
-            for sep in separadores:
-                try:
-                    temp_df = pd.read_csv(io.BytesIO(content), encoding=encoding, sep=sep)
-                    if len(temp_df.columns) >= 2:
-                        df = temp_df
-                        logger.info(f"DataFrame creado con encoding '{encoding}' y separador '{sep}': {len(df)} filas, {len(df.columns)} columnas")
-                        break
-                    else:
-                        logger.debug(f"Intento con encoding '{encoding}' y separador '{sep}' resultó en {len(temp_df.columns)} columna(s), probando siguiente...")
-                except Exception as e:
-                    logger.debug(f"Error con encoding '{encoding}' y separador '{sep}': {str(e)}")
-                    continue
-            if df is not None:
-                break
-        if df is None or len(df.columns) < 2:
-            logger.error(f"ERROR No se pudo leer el archivo CSV correctamente. Se intentaron encodings: {encodings} y separadores: {separadores}")
+        inicio = time.perf_counter()
+        # Encoding y separador a partir de los primeros KB; el archivo se lee después por bloques
+        try:
+            formato = sniff_csv_format(file.file)
+        except CsvFormatError as e:
+            logger.error(f"ERROR No se pudo leer el archivo CSV correctamente: {e}")
             raise HTTPException(
                 status_code=400,
                 detail={
@@ -197,61 +198,33 @@ async def upload_csv(
                     "message": "No se pudo detectar el formato correcto del archivo CSV. Verifica el separador (coma, punto y coma, tabulador, etc.)."
                 }
             )
+        # Primera pasada: duplicados y validaciones por columna, sin tocar la base
+        # (en un hilo: el parseo no bloquea el event loop)
+        try:
+            scan = await asyncio.to_thread(validate_csv, file.file, formato)
+        except CsvFormatError as e:
+            logger.error(f"ERROR No se pudo leer el archivo CSV correctamente: {e}")
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "Error al leer archivo CSV",
+                    "message": "No se pudo leer el archivo CSV con ninguna de las codificaciones admitidas."
+                }
+            )
+        logger.info(f"CSV validado con encoding '{scan.format.encoding}' y separador '{scan.format.sep}': {scan.rows} filas")
         # Validación: No deben haber filas duplicadas en 'Número de inspector'
-        if 'Número de inspector' in df.columns:
-            duplicados = df['Número de inspector'][df['Número de inspector'].duplicated(keep=False)]
-            if not duplicados.empty:
-                filas_duplicadas = duplicados.unique().tolist()
-                logger.error(f"ERROR: Se encontraron valores duplicados en 'Número de inspector': {filas_duplicadas}")
-                raise HTTPException(
-                    status_code=400,
-                    detail={
-                        "error": "Duplicados en Número de inspector",
-                        "message": f"No se permite cargar el archivo porque hay valores duplicados en la columna 'Número de inspector': {filas_duplicadas}",
-                        "duplicados": filas_duplicadas
-                    }
-                )
-        # Filtrar solo las columnas requeridas
-        columnas_requeridas = [
-            'Número de inspector', 'Nombre', 'Observaciones', 'Status', 'Región', 'Flota', 'Encargado',
-            'Celular', 'Correo', 'Dirección', 'Uso', 'Departamento', 'Ciudad', 'Tecnología', 'CMTS/OLT',
-            'ID Servicio', 'MAC/SN', 'UUID'
-        ]
-        columnas_presentes = [col for col in columnas_requeridas if col in df.columns]
-        df = df[columnas_presentes]
-        # Validaciones por columna
-        errores_validacion = []
-        import re
-        email_regex = re.compile(r"^[\w\.-]+@[\w\.-]+\.\w+$")
-        for idx, row in df.iterrows():
-            fila = idx + 2  # Considerando encabezado
-            num_inspector = str(row.get('Número de inspector', '')).strip()
-            celular = str(row.get('Celular', '')).strip()
-            correo = str(row.get('Correo', '')).strip()
-            # Validar Número de inspector
-            if not num_inspector.isdigit():
-                errores_validacion.append({"fila": fila, "columna": "Número de inspector", "valor": num_inspector, "error": "Debe ser numérico"})
-            # Validar Celular
-            if celular and (not celular.isdigit() or len(celular) != 10):
-                errores_validacion.append({"fila": fila, "columna": "Celular", "valor": celular, "error": "Debe ser numérico de 10 dígitos"})
-            # Validar Correo
-            if correo and not email_regex.match(correo):
-                errores_validacion.append({"fila": fila, "columna": "Correo", "valor": correo, "error": "Debe ser un correo válido"})
-        # Validación especial: 'Número de inspector' debe coincidir con el número después de 'ins' en 'Nombre'
-        for idx, row in df.iterrows():
-            fila = idx + 2
-            num_inspector = str(row.get('Número de inspector', '')).strip()
-            nombre = str(row.get('Nombre', '')).strip()
-            if num_inspector.isdigit():
-                if len(num_inspector) == 1:
-                    patron1 = f"ins{num_inspector}"  # ins3
-                    patron2 = f"ins0{num_inspector}" # ins03
-                    if patron1 not in nombre and patron2 not in nombre:
-                        errores_validacion.append({"fila": fila, "columna": "Nombre", "valor": nombre, "error": f"Debe contener 'ins{num_inspector}' o 'ins0{num_inspector}'"})
-                else:
-                    patron = f"ins{num_inspector}"
-                    if patron not in nombre:
-                        errores_validacion.append({"fila": fila, "columna": "Nombre", "valor": nombre, "error": f"Debe contener 'ins{num_inspector}'"})
+        if scan.duplicates:
+            filas_duplicadas = scan.duplicates
+            logger.error(f"ERROR: Se encontraron valores duplicados en 'Número de inspector': {filas_duplicadas}")
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "Duplicados en Número de inspector",
+                    "message": f"No se permite cargar el archivo porque hay valores duplicados en la columna 'Número de inspector': {filas_duplicadas}",
+                    "duplicados": filas_duplicadas
+                }
+            )
+        errores_validacion = scan.errors
         if errores_validacion:
             logger.error(f"Errores de validación por columna: {errores_validacion}")
             raise HTTPException(
@@ -261,36 +234,42 @@ async def upload_csv(
                     "errores": errores_validacion
                 }
             )
-        # Si no hay errores, borrar e insertar
-        from app.db.models import Registro
-        async with session.begin():
-            await session.execute(text("DELETE FROM registros"))
-            nuevos_registros = []
-            for _, row in df.iterrows():
-                nuevo = Registro(
-                    numero_inspector=int(row.get('Número de inspector', 0)),
-                    nombre=str(row.get('Nombre', '')),
-                    observaciones=str(row.get('Observaciones', '')),
-                    status=str(row.get('Status', '')),
-                    region=str(row.get('Región', '')),
-                    flota=str(row.get('Flota', '')),
-                    encargado=str(row.get('Encargado', '')),
-                    celular=str(row.get('Celular', '')),
-                    correo=str(row.get('Correo', '')),
-                    direccion=str(row.get('Dirección', '')),
-                    uso=str(row.get('Uso', '')),
-                    departamento=str(row.get('Departamento', '')),
-                    ciudad=str(row.get('Ciudad', '')),
-                    tecnologia=str(row.get('Tecnología', '')),
-                    cmts_olt=str(row.get('CMTS/OLT', '')),
-                    id_servicio=str(row.get('ID Servicio', '')),
-                    mac_sn=str(row.get('MAC/SN', '')),
-                    uuid=str(row.get('UUID', '')) if 'UUID' in row else None
-                )
-                nuevos_registros.append(nuevo)
-            session.add_all(nuevos_registros)
-            await session.commit()
-        return {"mensaje": "Carga masiva exitosa. Se reemplazaron todos los registros.", "total_registros": len(df)}
+        # Si no hay errores, reemplazar (segunda pasada, bloque a bloque, sin objetos ORM)
+        filas = itertools.chain.from_iterable(iter_registros(file.file, scan.format))
+        if modo == REPLACE_DIFF:
+            usuario = user["sub"] if isinstance(user, dict) and "sub" in user else str(user)
+            inicio_bloqueo = time.perf_counter()
+            async with session.begin():
+                diferencias = await apply_registro_diff(session, filas, usuario)
+                await session.commit()
+            carga = {**diferencias.as_dict(), "ventana_bloqueo_segundos": round(time.perf_counter() - inicio_bloqueo, 3)}
+            # Sólo cambiaron algunos registros: se invalidan las entradas que afectan
+            await registro_cache_service.invalidate_registro_changes(diferencias.changes)
+            return {
+                "mensaje": "Carga incremental exitosa. Se aplicaron sólo los cambios.",
+                "total_registros": scan.rows,
+                "modo": modo,
+                **ingest_report(scan.rows, inicio),
+                **carga
+            }
+        if modo == REPLACE_SWAP:
+            carga = (await replace_registros_by_swap(session, filas)).as_dict()
+        else:
+            inicio_bloqueo = time.perf_counter()
+            async with session.begin():
+                await session.execute(text("DELETE FROM registros"))
+                carga = (await bulk_insert_registros(session, filas)).as_dict()
+                await session.commit()
+            carga["ventana_bloqueo_segundos"] = round(time.perf_counter() - inicio_bloqueo, 3)
+        # Se reemplazó toda la tabla: ninguna entrada cacheada sigue siendo válida
+        await registro_cache_service.invalidate_bulk_replace()
+        return {
+            "mensaje": "Carga masiva exitosa. Se reemplazaron todos los registros.",
+            "total_registros": scan.rows,
+            "modo": modo,
+            **ingest_report(scan.rows, inicio),
+            **carga
+        }
 
     except HTTPException:
         raise
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import or_, func, cast, String
+from sqlalchemy import or_, func
 from sqlalchemy.exc import SQLAlchemyError
 from typing import Optional
 import logging
@@ -9,7 +9,7 @@ import logging
 from app.db.connection import get_async_session
 from app.db.models import Registro
 from app.schemas.registro import RegistroListResponse
-from app.services.cache import cache
+from app.services.cache import cache, generate_cache_key, asave_to_cache
 
 
 # Configuración básica del logger
@@ -17,6 +17,27 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Filtros de igualdad sin distinguir mayúsculas: lower(col) = valor usa los índices
+# idx_*_lower (ver app.db.models), por eso la expresión debe ser exactamente lower(col)
+EQUALITY_FILTERS = ("region", "ciudad", "tecnologia", "flota", "uso", "mac_sn", "id_servicio")
+
+
+def view_filters(busqueda: Optional[str] = None, **filters: Optional[str]) -> list:
+    """Condiciones WHERE de /view/registros"""
+    conditions = []
+    if busqueda:
+        like_filter = f"%{busqueda.lower()}%"
+        conditions.append(or_(*(
+            func.lower(getattr(Registro, column)).like(like_filter)
+            for column in ("nombre", "region", "ciudad", "tecnologia", "flota", "uso", "mac_sn", "id_servicio")
+        )))
+    for column in EQUALITY_FILTERS:
+        value = filters.get(column)
+        if value:
+            conditions.append(func.lower(getattr(Registro, column)) == value.lower())
+    return conditions
+
+
 @router.get("/registros", response_model=RegistroListResponse)
 async def listar_registros(
     busqueda: Optional[str] = Query(None),
@@ -35,11 +56,15 @@ async def listar_registros(
     try:
         logger.info(f"GET /registros | Filtros: busqueda={busqueda}, region={region}, ciudad={ciudad}, tecnologia={tecnologia}, flota={flota}, uso={uso}, mac_sn={mac_sn}, id_servicio={id_servicio}, skip={skip}, limit={limit}")
         
-        # Crear clave de cache basada en los parámetros
-        cache_key = f"registros:{busqueda}:{region}:{ciudad}:{tecnologia}:{flota}:{uso}:{mac_sn}:{id_servicio}:{skip}:{limit}"
+        # Crear clave de cache canónica basada en los parámetros
+        params = dict(
+            busqueda=busqueda, region=region, ciudad=ciudad, tecnologia=tecnologia, flota=flota,
+            uso=uso, mac_sn=mac_sn, id_servicio=id_servicio, skip=skip, limit=limit,
+        )
+        cache_key = generate_cache_key("view_registros", **params)
         
         # Intentar obtener del cache primero
-        cached_result = cache.get(cache_key)
+        cached_result = await cache.aget(cache_key)
         if cached_result:
             logger.info(f"Cache hit for key: {cache_key}")
             return cached_result
@@ -70,35 +95,12 @@ async def listar_registros(
             Registro.mac_sn
         )
 
-        if busqueda:
-            like_filter = f"%{busqueda.lower()}%"
-            query = query.where(
-                or_(
-                    func.lower(Registro.nombre).like(like_filter),
-                    func.lower(Registro.region).like(like_filter),
-                    func.lower(Registro.ciudad).like(like_filter),
-                    func.lower(Registro.tecnologia).like(like_filter),
-                    func.lower(Registro.flota).like(like_filter),
-                    func.lower(Registro.uso).like(like_filter),
-                    func.lower(Registro.mac_sn).like(like_filter),
-                    func.lower(cast(Registro.id_servicio, String)).like(like_filter),
-                )
-            )
-
-        if region:
-            query = query.where(func.lower(Registro.region) == region.lower())
-        if ciudad:
-            query = query.where(func.lower(Registro.ciudad) == ciudad.lower())
-        if tecnologia:
-            query = query.where(func.lower(Registro.tecnologia) == tecnologia.lower())
-        if flota:
-            query = query.where(func.lower(Registro.flota) == flota.lower())
-        if uso:
-            query = query.where(func.lower(Registro.uso) == uso.lower())
-        if mac_sn:
-            query = query.where(func.lower(Registro.mac_sn) == mac_sn.lower())
-        if id_servicio:
-            query = query.where(func.lower(cast(Registro.id_servicio, String)) == id_servicio.lower())
+        conditions = view_filters(
+            busqueda, region=region, ciudad=ciudad, tecnologia=tecnologia, flota=flota,
+            uso=uso, mac_sn=mac_sn, id_servicio=id_servicio,
+        )
+        if conditions:
+            query = query.where(*conditions)
 
         # Optimización: Conteo total más eficiente usando la misma consulta filtrada
         total_query = select(func.count()).select_from(query.subquery())
@@ -117,7 +119,7 @@ async def listar_registros(
         result = {"total_records": total_records, "registros": registros}
         
         # Guardar en cache
-        cache.set(cache_key, result, ttl=300)
+        await asave_to_cache("view_registros", result, 300, **params)
         
         return result
     except HTTPException:
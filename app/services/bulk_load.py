@@ -0,0 +1,108 @@
+"""
+Carga masiva de registros sin pasar por el ORM.
+
+/upload_csv inserta decenas de miles de filas ya validadas: crear un Registro
+por fila y pasar por el unit of work de la sesión cuesta más que la inserción
+misma. bulk_insert_registros() las inserta con Core, en lotes de
+BULK_INSERT_BATCH_SIZE filas, sobre la conexión (y transacción) de la sesión:
+
+- PostgreSQL (asyncpg): COPY registros FROM STDIN (copy_records_to_table),
+  un COPY por lote
+- Otros motores (SQLite): INSERT con executemany, un executemany por lote
+
+Devuelve un BulkLoadReport con el método, las filas, los lotes y las filas por
+segundo de la carga.
+"""
+import itertools
+import logging
+import time
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import Table, insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.config import BULK_INSERT_BATCH_SIZE
+from app.db.models import Registro
+
+logger = logging.getLogger(__name__)
+
+REGISTRO_TABLE = Registro.__table__
+
+# Columnas que se cargan: todas menos el id (autoincremental) y las generadas
+LOAD_COLUMNS = tuple(
+    column.name for column in REGISTRO_TABLE.columns if not column.primary_key and column.computed is None
+)
+
+
+class BulkLoadReport(NamedTuple):
+    """Resultado de una carga masiva"""
+    method: str
+    rows: int
+    batches: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Campos de la respuesta de /upload_csv"""
+        return {
+            "metodo_carga": self.method,
+            "lotes_carga": self.batches,
+            "duracion_carga_segundos": round(self.seconds, 3),
+            "filas_por_segundo_carga": round(self.rows_per_second),
+        }
+
+
+def batched(rows: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Agrupa las filas en lotes de hasta batch_size (el último puede ser menor)"""
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, batch_size)):
+        yield batch
+
+
+def copy_records(batch: List[Dict[str, Any]], columns: Sequence[str] = LOAD_COLUMNS) -> List[Tuple[Any, ...]]:
+    """Filas de un lote como tuplas en el orden de `columns` (formato de COPY)"""
+    return [tuple(row[column] for column in columns) for row in batch]
+
+
+async def _insert_batch(conn: AsyncConnection, table: Table, columns: Sequence[str], batch: List[Dict[str, Any]]) -> None:
+    # Una lista de parámetros: executemany del driver, sin objetos ORM
+    await conn.execute(insert(table), batch)
+
+
+async def _copy_batch(conn: AsyncConnection, table: Table, columns: Sequence[str], batch: List[Dict[str, Any]]) -> None:
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        table.name, records=copy_records(batch, columns), columns=list(columns), schema_name=table.schema
+    )
+
+
+async def bulk_insert_registros(
+    session: AsyncSession, rows: Iterable[Dict[str, Any]], batch_size: Optional[int] = None,
+    table: Table = REGISTRO_TABLE, columns: Sequence[str] = LOAD_COLUMNS
+) -> BulkLoadReport:
+    """
+    Inserta filas (con las claves de `columns`) en registros, o en otra tabla con sus
+    columnas, en lotes de batch_size (por defecto BULK_INSERT_BATCH_SIZE). No hace
+    commit: la carga queda en la transacción de la sesión.
+    """
+    batch_size = batch_size or BULK_INSERT_BATCH_SIZE
+    conn = await session.connection()
+    if conn.dialect.driver == "asyncpg":
+        method, load_batch = "copy", _copy_batch
+    else:
+        method, load_batch = "executemany", _insert_batch
+    loaded = batches = 0
+    started = time.perf_counter()
+    for batch in batched(rows, batch_size):
+        await load_batch(conn, table, columns, batch)
+        loaded += len(batch)
+        batches += 1
+    report = BulkLoadReport(method, loaded, batches, time.perf_counter() - started)
+    logger.info(
+        f"Bulk load ({method}) into {table.name}: {report.rows} rows in {report.batches} batches of up to {batch_size}, "
+        f"{report.seconds:.2f}s ({report.rows_per_second:.0f} rows/s)"
+    )
+    return report
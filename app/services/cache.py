@@ -1,31 +1,425 @@
 import time
+import sys
+import math
+import random
+import bisect
+import heapq
 import logging
 import hashlib
 import json
-from typing import Any, Optional, Dict, Tuple, List, Set, Callable
+from collections import OrderedDict
+from typing import Any, Optional, Dict, Tuple, List, Set, Callable, Awaitable, Iterable
 from functools import wraps
 import asyncio
 from datetime import datetime, timedelta
 
+from app.config import (
+    CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_EVICTION_POLICY, CACHE_REAPER_INTERVAL,
+    REDIS_URL, REDIS_ENABLED, CACHE_L1_ENABLED
+)
+
 logger = logging.getLogger(__name__)
 
-class AdvancedCache:
+
+class _CacheEntry:
+    """
+    Entrada interna del cache (valor, expiración, tags y tamaño estimado).
+    fresh_until marca el fin del TTL; entre fresh_until y expiry la entrada está
+    vencida pero puede servirse mientras se recalcula (stale-while-revalidate).
+    delta es lo que tardó en calcularse el valor (para la expiración temprana).
+    meta describe con qué parámetros (filtros) se calculó, para invalidate_where().
+    """
+    __slots__ = ('value', 'expiry', 'tags', 'size', 'fresh_until', 'delta', 'meta')
+
+    def __init__(self, value: Any, expiry: float, tags: Set[str], size: int,
+                 fresh_until: Optional[float] = None, delta: float = 0.0,
+                 meta: Optional[Dict[str, Any]] = None):
+        self.value = value
+        self.expiry = expiry
+        self.tags = tags
+        self.size = size
+        self.fresh_until = expiry if fresh_until is None else fresh_until
+        self.delta = delta
+        self.meta = meta
+
+
+def _estimate_size(value: Any, _seen: Optional[Set[int]] = None, _depth: int = 0) -> int:
+    """
+    Estima el tamaño en bytes de un valor recorriendo contenedores y atributos.
+    No pretende ser exacto: sirve para aplicar el presupuesto de memoria del cache.
+    """
+    if _seen is None:
+        _seen = set()
+    obj_id = id(value)
+    if obj_id in _seen or _depth > 6:
+        return 0
+    _seen.add(obj_id)
+
+    size = sys.getsizeof(value, 64)
+    if isinstance(value, (str, bytes, bytearray, int, float, bool)) or value is None:
+        return size
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += _estimate_size(k, _seen, _depth + 1) + _estimate_size(v, _seen, _depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += _estimate_size(item, _seen, _depth + 1)
+    elif hasattr(value, '__dict__'):
+        # Objetos (p.ej. instancias ORM): contar atributos, ignorando el estado interno de SQLAlchemy
+        for k, v in vars(value).items():
+            if not k.startswith('_sa_'):
+                size += _estimate_size(v, _seen, _depth + 1)
+    return size
+
+
+class EvictionPolicy:
+    """
+    Interfaz de las políticas de desalojo del cache.
+    La política sólo lleva el orden/frecuencia de las claves; el cache decide cuándo desalojar.
+    """
+    name = "base"
+
+    def record_request(self, key: str) -> None:
+        """Se llama en cada lectura (hit o miss)"""
+
+    def record_insert(self, key: str) -> None:
+        """Se llama cuando una clave entra al cache"""
+
+    def record_access(self, key: str) -> None:
+        """Se llama en cada hit"""
+
+    def record_remove(self, key: str) -> None:
+        """Se llama cuando una clave sale del cache"""
+
+    def victim(self) -> Optional[str]:
+        """Devuelve la clave candidata a desalojar"""
+        raise NotImplementedError
+
+    def admit(self, candidate: str, victim: str) -> bool:
+        """Decide si una clave nueva merece desplazar a la víctima"""
+        return True
+
+    def clear(self) -> None:
+        """Reinicia el estado de la política"""
+
+
+class LRUPolicy(EvictionPolicy):
+    """Desaloja la clave usada hace más tiempo"""
+    name = "lru"
+
     def __init__(self):
-        self._cache: Dict[str, Tuple[Any, float, Set[str]]] = {}  # key -> (value, expiry, tags)
-        self._tags: Dict[str, Set[str]] = {}  # tag -> set of keys
-        self._patterns: Dict[str, Set[str]] = {}  # pattern -> set of keys
-        self._stats = {
-            'hits': 0,
-            'misses': 0,
-            'sets': 0,
-            'deletes': 0,
-            'invalidations': 0
-        }
+        self._order: "OrderedDict[str, None]" = OrderedDict()
+
+    def record_insert(self, key: str) -> None:
+        self._order[key] = None
+        self._order.move_to_end(key)
+
+    def record_access(self, key: str) -> None:
+        if key in self._order:
+            self._order.move_to_end(key)
+
+    def record_remove(self, key: str) -> None:
+        self._order.pop(key, None)
+
+    def victim(self) -> Optional[str]:
+        return next(iter(self._order), None)
+
+    def clear(self) -> None:
+        self._order.clear()
+
+
+class LFUPolicy(EvictionPolicy):
+    """Desaloja la clave menos usada (empates resueltos por antigüedad), en O(1)"""
+    name = "lfu"
+
+    def __init__(self):
+        self._freq: Dict[str, int] = {}
+        self._buckets: Dict[int, "OrderedDict[str, None]"] = {}
+        self._min_freq = 0
+
+    def _move(self, key: str, old: int, new: int) -> None:
+        if old:
+            bucket = self._buckets[old]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[old]
+                if self._min_freq == old:
+                    self._min_freq = new
+        self._buckets.setdefault(new, OrderedDict())[key] = None
+        self._freq[key] = new
+
+    def record_insert(self, key: str) -> None:
+        self._move(key, self._freq.get(key, 0), 1)
+        self._min_freq = 1
+
+    def record_access(self, key: str) -> None:
+        freq = self._freq.get(key)
+        if freq is not None:
+            self._move(key, freq, freq + 1)
+
+    def record_remove(self, key: str) -> None:
+        freq = self._freq.pop(key, None)
+        if freq is None:
+            return
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+
+    def victim(self) -> Optional[str]:
+        if not self._buckets:
+            return None
+        if self._min_freq not in self._buckets:
+            self._min_freq = min(self._buckets)
+        return next(iter(self._buckets[self._min_freq]))
+
+    def clear(self) -> None:
+        self._freq.clear()
+        self._buckets.clear()
+        self._min_freq = 0
+
+
+class _CountMinSketch:
+    """Sketch de frecuencias aproximadas con envejecimiento periódico (contadores de 4 bits)"""
+
+    def __init__(self, width: int, depth: int = 4):
+        self._width = 1 << max(4, (width - 1).bit_length())
+        self._mask = self._width - 1
+        self._depth = depth
+        self._rows = [bytearray(self._width) for _ in range(depth)]
+        self._additions = 0
+        self._sample_size = 10 * self._width
+
+    def _indexes(self, key: str):
+        h = hash(key)
+        for i in range(self._depth):
+            yield (h ^ (h >> (7 * (i + 1))) ^ (0x9E3779B1 * (i + 1))) & self._mask
+
+    def add(self, key: str) -> None:
+        for row, idx in zip(self._rows, self._indexes(key)):
+            if row[idx] < 15:
+                row[idx] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._reset()
+
+    def estimate(self, key: str) -> int:
+        return min(row[idx] for row, idx in zip(self._rows, self._indexes(key)))
+
+    def _reset(self) -> None:
+        # Envejecimiento: divide todos los contadores a la mitad
+        for row in self._rows:
+            for i in range(self._width):
+                row[i] >>= 1
+        self._additions //= 2
+
+    def clear(self) -> None:
+        for row in self._rows:
+            row[:] = bytes(self._width)
+        self._additions = 0
+
+
+class TinyLFUPolicy(LRUPolicy):
+    """
+    LRU con filtro de admisión TinyLFU: una clave nueva sólo desplaza a la víctima
+    LRU si su frecuencia estimada (incluyendo misses) es mayor.
+    """
+    name = "tinylfu"
+
+    def __init__(self, capacity_hint: int = 1024):
+        super().__init__()
+        self._sketch = _CountMinSketch(max(capacity_hint, 16))
+
+    def record_request(self, key: str) -> None:
+        self._sketch.add(key)
+
+    def admit(self, candidate: str, victim: str) -> bool:
+        return self._sketch.estimate(candidate) > self._sketch.estimate(victim)
+
+    def clear(self) -> None:
+        super().clear()
+        self._sketch.clear()
+
+
+EVICTION_POLICIES = {
+    LRUPolicy.name: LRUPolicy,
+    LFUPolicy.name: LFUPolicy,
+    TinyLFUPolicy.name: TinyLFUPolicy,
+}
+
+
+def create_eviction_policy(name: str, capacity_hint: int = 1024) -> EvictionPolicy:
+    """Crea una política de desalojo por nombre ('lru', 'lfu' o 'tinylfu')"""
+    name = (name or "lru").lower()
+    if name not in EVICTION_POLICIES:
+        raise ValueError(f"Política de desalojo desconocida: '{name}'. Opciones: {sorted(EVICTION_POLICIES)}")
+    if name == TinyLFUPolicy.name:
+        return TinyLFUPolicy(capacity_hint)
+    return EVICTION_POLICIES[name]()
+
+
+class _KeyTrie:
+    """
+    Índice de prefijos sobre las claves del cache, por segmentos separados por ':'.
+    Permite encontrar las claves con un prefijo dado sin recorrer todo el cache.
+    Insertar y borrar sólo tocan el dict de hijos de cada nodo; la lista ordenada
+    de segmentos hijos (para prefijos que cortan un segmento) se construye al
+    consultarla y se descarta cuando cambian los hijos.
+    """
+    SEPARATOR = ':'
+    __slots__ = ('_root',)
+
+    class _Node:
+        __slots__ = ('children', 'names', 'key')
+
+        def __init__(self):
+            self.children: Dict[str, "_KeyTrie._Node"] = {}
+            self.names: Optional[List[str]] = None  # segmentos hijos ordenados (se calcula al consultar)
+            self.key: Optional[str] = None
+
+        def sorted_names(self) -> List[str]:
+            if self.names is None:
+                self.names = sorted(self.children)
+            return self.names
+
+    def __init__(self):
+        self._root = self._Node()
+
+    def insert(self, key: str) -> None:
+        node = self._root
+        for segment in key.split(self.SEPARATOR):
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = self._Node()
+                node.names = None
+            node = child
+        node.key = key
+
+    def remove(self, key: str) -> None:
+        path = []
+        node = self._root
+        for segment in key.split(self.SEPARATOR):
+            child = node.children.get(segment)
+            if child is None:
+                return
+            path.append((node, segment))
+            node = child
+        node.key = None
+        # Podar nodos vacíos de abajo hacia arriba
+        for parent, segment in reversed(path):
+            child = parent.children[segment]
+            if child.key is not None or child.children:
+                break
+            del parent.children[segment]
+            parent.names = None
+
+    def iter_prefix(self, prefix: str, segment_aligned: bool = False):
+        """
+        Itera las claves que empiezan por el prefijo.
+        :param segment_aligned: Si es True el último segmento del prefijo debe coincidir completo
+                                (p.ej. 'registro_individual:id=5' no incluye 'registro_individual:id=50')
+        """
+        if segment_aligned and prefix.endswith(self.SEPARATOR):
+            prefix = prefix[:-1]
+        segments = prefix.split(self.SEPARATOR)
+        node = self._root
+        for segment in segments[:-1]:
+            node = node.children.get(segment)
+            if node is None:
+                return
+        last = segments[-1]
+        if segment_aligned:
+            stack = [node.children[last]] if last in node.children else []
+        else:
+            stack = []
+            names = node.sorted_names()
+            i = bisect.bisect_left(names, last)
+            while i < len(names) and names[i].startswith(last):
+                stack.append(node.children[names[i]])
+                i += 1
+        while stack:
+            current = stack.pop()
+            if current.key is not None:
+                yield current.key
+            stack.extend(current.children.values())
+
+    def clear(self) -> None:
+        self._root = self._Node()
+
+
+class SingleFlight:
+    """
+    Coalescencia de peticiones por clave (single-flight).
+
+    Si varias corrutinas piden la misma clave mientras se está calculando, sólo la
+    primera ejecuta la función; las demás esperan su resultado (o su excepción).
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = {'executions': 0, 'coalesced': 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Ejecuta fn() una sola vez por clave entre las llamadas concurrentes
+        :param key: Clave que identifica el cálculo (normalmente la clave de cache)
+        :param fn: Función asíncrona sin argumentos que calcula el valor
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self._stats['coalesced'] += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # Se canceló la corrutina que calculaba el valor, no ésta: reintentar
+                return await self.do(key, fn)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._stats['executions'] += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Marcar la excepción como consultada si nadie más estaba esperando
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def in_flight(self, key: str) -> bool:
+        """Indica si la clave se está calculando en este momento"""
+        return key in self._inflight
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self._stats, 'inflight': len(self._inflight)}
+
+
+# Instancia compartida para el decorador de cache y RegistroCacheService
+single_flight = SingleFlight()
+
+
+class CacheBackend:
+    """
+    Interfaz común de los backends de cache.
+    AdvancedCache es la implementación en memoria del proceso; RedisCacheBackend
+    (app.services.cache_redis) comparte el cache entre workers.
+    """
+    name = "base"
     
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
-        """Genera una clave única basada en argumentos"""
-        key_data = f"{prefix}:{args}:{sorted(kwargs.items())}"
-        return hashlib.md5(key_data.encode()).hexdigest()
+        """Genera una clave única basada en argumentos, conservando el prefijo legible"""
+        key_data = f"{args!r}\x1f{sorted(kwargs.items())!r}"
+        return f"{prefix}:{hashlib.blake2b(key_data.encode(), digest_size=8).hexdigest()}"
     
     def _extract_tags(self, *args, **kwargs) -> Set[str]:
         """Extrae tags automáticamente de los argumentos"""
@@ -46,8 +440,208 @@ class AdvancedCache:
         
         return tags
     
+    def set(self, key: str, value: Any, ttl: int = 300, tags: Optional[Set[str]] = None,
+            pattern: Optional[str] = None, stale_ttl: int = 0, delta: float = 0.0,
+            meta: Optional[Dict[str, Any]] = None) -> None:
+        raise NotImplementedError
+    
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+    
+    def get_with_meta(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """
+        Obtiene (valor, fresh_until, delta), incluyendo entradas vencidas que
+        siguen dentro de su ventana de gracia
+        """
+        value = self.get(key)
+        if value is None:
+            return None
+        return value, float('inf'), 0.0
+    
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+    
+    def invalidate_by_tag(self, tag: str) -> int:
+        raise NotImplementedError
+    
+    def invalidate_by_pattern(self, pattern: str) -> int:
+        raise NotImplementedError
+    
+    def invalidate_by_tags(self, tags: Iterable[str]) -> int:
+        """
+        Invalida de una vez las claves de varios tags (operaciones masivas)
+        :return: Número de claves invalidadas
+        """
+        return sum(self.invalidate_by_tag(tag) for tag in tags)
+    
+    def invalidate_where(self, tag: str, predicate: Callable[[Optional[Dict[str, Any]]], bool]) -> int:
+        """
+        Invalida las claves de un tag cuyo meta cumple el predicado
+        (las entradas sin meta se pasan como None)
+        """
+        raise NotImplementedError
+    
+    def invalidate_registros(self) -> int:
+        """
+        Invalida todo el cache relacionado con registros
+        :return: Número de claves invalidadas
+        """
+        return self.invalidate_by_tag('registros')
+    
+    def invalidate_estadisticas(self) -> int:
+        """
+        Invalida todo el cache relacionado con estadísticas
+        :return: Número de claves invalidadas
+        """
+        return self.invalidate_by_tag('estadisticas')
+    
+    def clear(self) -> None:
+        raise NotImplementedError
+    
+    def cleanup_expired(self) -> int:
+        raise NotImplementedError
+    
+    def get_stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+    
+    def start_reaper(self, interval: float = CACHE_REAPER_INTERVAL) -> Optional[asyncio.Task]:
+        """Los backends con expiración propia no necesitan reaper"""
+        return None
+    
+    async def stop_reaper(self) -> None:
+        return None
+    
+    def close(self) -> None:
+        """Libera conexiones o hilos del backend (no-op en memoria)"""
+        return None
+
+    # ----- variantes para el event loop -----
+    # Los backends con cliente de red síncrono (Redis) marcan blocking = True y
+    # sus operaciones se ejecutan en un hilo; en memoria se llaman directamente.
+    blocking = False
+
+    async def _call(self, fn: Callable, *args, **kwargs) -> Any:
+        if self.blocking:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        return fn(*args, **kwargs)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await self._call(self.get, key)
+
+    async def aget_with_meta(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        return await self._call(self.get_with_meta, key)
+
+    async def aset(self, key: str, value: Any, ttl: int = 300, tags: Optional[Set[str]] = None,
+                   pattern: Optional[str] = None, stale_ttl: int = 0, delta: float = 0.0,
+                   meta: Optional[Dict[str, Any]] = None) -> None:
+        await self._call(self.set, key, value, ttl, tags, pattern, stale_ttl, delta, meta)
+
+    async def adelete(self, key: str) -> bool:
+        return await self._call(self.delete, key)
+
+    async def ainvalidate_by_tag(self, tag: str) -> int:
+        return await self._call(self.invalidate_by_tag, tag)
+
+    async def ainvalidate_by_tags(self, tags: Iterable[str]) -> int:
+        return await self._call(self.invalidate_by_tags, list(tags))
+
+    async def ainvalidate_by_pattern(self, pattern: str) -> int:
+        return await self._call(self.invalidate_by_pattern, pattern)
+
+    async def ainvalidate_where(self, tag: str, predicate: Callable[[Optional[Dict[str, Any]]], bool]) -> int:
+        return await self._call(self.invalidate_where, tag, predicate)
+
+    async def aclear(self) -> None:
+        await self._call(self.clear)
+
+    async def acleanup_expired(self) -> int:
+        return await self._call(self.cleanup_expired)
+
+    async def aget_stats(self) -> Dict[str, Any]:
+        return await self._call(self.get_stats)
+
+    def cache_decorator(self, ttl: int = 300, key_prefix: str = "func", 
+                       tags: Optional[Set[str]] = None):
+        """
+        Decorador para cachear funciones.
+        Las llamadas concurrentes con la misma clave ejecutan la función una sola vez.
+        """
+        def decorator(func: Callable):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                # Generar clave única
+                cache_key = self._generate_key(key_prefix, *args, **kwargs)
+                
+                # Intentar obtener del cache
+                cached_result = await self.aget(cache_key)
+                if cached_result is not None:
+                    return cached_result
+                
+                async def compute():
+                    # Ejecutar función
+                    result = await func(*args, **kwargs)
+                    
+                    # Guardar en cache
+                    auto_tags = tags or self._extract_tags(*args, **kwargs)
+                    await self.aset(cache_key, result, ttl, auto_tags)
+                    return result
+                
+                return await single_flight.do(cache_key, compute)
+            
+            return wrapper
+        return decorator
+
+
+class AdvancedCache(CacheBackend):
+    """Backend de cache en memoria del proceso"""
+    name = "memory"
+    
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 eviction_policy: Any = "lru"):
+        """
+        :param max_entries: Número máximo de entradas (None o 0 = sin límite)
+        :param max_bytes: Presupuesto aproximado de memoria en bytes (None o 0 = sin límite)
+        :param eviction_policy: Nombre de la política ('lru', 'lfu', 'tinylfu') o instancia de EvictionPolicy
+        """
+        self._cache: Dict[str, _CacheEntry] = {}  # key -> entry
+        self._tags: Dict[str, Set[str]] = {}  # tag -> set of keys
+        self._patterns: Dict[str, Set[str]] = {}  # pattern -> set of keys
+        self._key_patterns: Dict[str, Set[str]] = {}  # key -> set of patterns (índice inverso)
+        self._key_index = _KeyTrie()  # índice de prefijos sobre las claves
+        self.max_entries = max_entries or None
+        self.max_bytes = max_bytes or None
+        if isinstance(eviction_policy, EvictionPolicy):
+            self._policy = eviction_policy
+        else:
+            self._policy = create_eviction_policy(eviction_policy, self.max_entries or 1024)
+        self._current_bytes = 0
+        self._expiry_heap: List[Tuple[float, str]] = []  # (expiry, key), ordenado por expiración
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._reaper_stats = {
+            'running': False,
+            'interval': None,
+            'passes': 0,
+            'reaped': 0,
+            'last_pass_at': None,
+            'last_pass_ms': 0.0,
+            'last_lag_ms': 0.0,
+            'max_lag_ms': 0.0
+        }
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'deletes': 0,
+            'invalidations': 0,
+            'evictions': 0,
+            'admission_rejections': 0,
+            'expirations': 0,
+            'stale_hits': 0
+        }
+    
     def set(self, key: str, value: Any, ttl: int = 300, tags: Optional[Set[str]] = None, 
-            pattern: Optional[str] = None) -> None:
+            pattern: Optional[str] = None, stale_ttl: int = 0, delta: float = 0.0,
+            meta: Optional[Dict[str, Any]] = None) -> None:
         """
         Almacena un valor en el cache con TTL y tags
         :param key: Clave del cache
@@ -55,15 +649,35 @@ class AdvancedCache:
         :param ttl: Tiempo de vida en segundos
         :param tags: Tags para invalidación selectiva
         :param pattern: Patrón para invalidación por patrones
+        :param stale_ttl: Segundos adicionales en los que el valor vencido aún puede servirse
+        :param delta: Segundos que tomó calcular el valor
+        :param meta: Parámetros con los que se calculó el valor (ver invalidate_where)
         """
-        expiry_time = time.time() + ttl
+        fresh_until = time.time() + ttl
+        expiry_time = fresh_until + stale_ttl
         tags = tags or set()
         
         # Agregar tags automáticos si no se proporcionan
         if not tags:
             tags = self._extract_tags(key)
         
-        self._cache[key] = (value, expiry_time, tags)
+        size = _estimate_size(value) if self.max_bytes else 0
+        
+        # Reemplazar limpiamente una entrada previa con la misma clave
+        is_update = key in self._cache
+        if is_update:
+            self._remove_entry(key)
+        
+        if not self._make_room(key, size, is_update):
+            self._stats['admission_rejections'] += 1
+            logger.info(f"Cache admission rejected: {key}")
+            return
+        
+        self._cache[key] = _CacheEntry(value, expiry_time, tags, size, fresh_until, delta, meta)
+        self._current_bytes += size
+        self._policy.record_insert(key)
+        self._key_index.insert(key)
+        heapq.heappush(self._expiry_heap, (expiry_time, key))
         
         # Registrar tags
         for tag in tags:
@@ -76,6 +690,7 @@ class AdvancedCache:
             if pattern not in self._patterns:
                 self._patterns[pattern] = set()
             self._patterns[pattern].add(key)
+            self._key_patterns.setdefault(key, set()).add(pattern)
         
         self._stats['sets'] += 1
         logger.info(f"Cache set: {key} (TTL: {ttl}s, Tags: {tags})")
@@ -86,20 +701,53 @@ class AdvancedCache:
         :param key: Clave del cache
         :return: Valor cacheado o None si no existe o expiró
         """
-        if key not in self._cache:
+        self._policy.record_request(key)
+        entry = self._cache.get(key)
+        if entry is None:
             self._stats['misses'] += 1
             return None
         
-        value, expiry_time, tags = self._cache[key]
-        if time.time() > expiry_time:
+        now = time.time()
+        if now > entry.expiry:
             # El valor expiró, eliminarlo
             self.delete(key)
             self._stats['misses'] += 1
             return None
         
+        if now > entry.fresh_until:
+            # Vencido pero en ventana de gracia: sólo get_with_meta() lo sirve
+            self._stats['misses'] += 1
+            return None
+        
+        self._policy.record_access(key)
         self._stats['hits'] += 1
         logger.info(f"Cache hit: {key}")
-        return value
+        return entry.value
+    
+    def get_with_meta(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """
+        Obtiene (valor, fresh_until, delta) aunque la entrada esté vencida,
+        siempre que siga dentro de su ventana de gracia
+        :param key: Clave del cache
+        :return: Tupla con el valor y sus metadatos, o None si no existe o expiró
+        """
+        self._policy.record_request(key)
+        entry = self._cache.get(key)
+        now = time.time()
+        if entry is None or now > entry.expiry:
+            if entry is not None:
+                self.delete(key)
+            self._stats['misses'] += 1
+            return None
+        
+        self._policy.record_access(key)
+        if now > entry.fresh_until:
+            self._stats['stale_hits'] += 1
+            logger.info(f"Cache stale hit: {key}")
+        else:
+            self._stats['hits'] += 1
+            logger.info(f"Cache hit: {key}")
+        return entry.value, entry.fresh_until, entry.delta
     
     def delete(self, key: str) -> bool:
         """
@@ -108,28 +756,64 @@ class AdvancedCache:
         :return: True si existía y se eliminó, False si no existía
         """
         if key in self._cache:
-            _, _, tags = self._cache[key]
-            
-            # Limpiar tags
-            for tag in tags:
-                if tag in self._tags and key in self._tags[tag]:
-                    self._tags[tag].remove(key)
-                    if not self._tags[tag]:
-                        del self._tags[tag]
-            
-            # Limpiar patrones
-            for pattern, keys in self._patterns.items():
-                if key in keys:
-                    keys.remove(key)
-                    if not keys:
-                        del self._patterns[pattern]
-            
-            del self._cache[key]
+            self._remove_entry(key)
             self._stats['deletes'] += 1
             logger.info(f"Cache deleted: {key}")
             return True
         return False
     
+    def _remove_entry(self, key: str) -> None:
+        """Elimina una entrada y sus referencias en los índices (sin tocar estadísticas)"""
+        entry = self._cache.pop(key)
+        self._current_bytes -= entry.size
+        self._policy.record_remove(key)
+        
+        # Limpiar tags
+        for tag in entry.tags:
+            if tag in self._tags and key in self._tags[tag]:
+                self._tags[tag].remove(key)
+                if not self._tags[tag]:
+                    del self._tags[tag]
+        
+        # Limpiar patrones usando el índice inverso (sólo los patrones de esta clave)
+        for pattern in self._key_patterns.pop(key, ()):
+            keys = self._patterns.get(pattern)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._patterns[pattern]
+        
+        self._key_index.remove(key)
+    
+    def _over_budget(self, extra_entries: int = 0, extra_bytes: int = 0) -> bool:
+        if self.max_entries and len(self._cache) + extra_entries > self.max_entries:
+            return True
+        if self.max_bytes and self._current_bytes + extra_bytes > self.max_bytes:
+            return True
+        return False
+    
+    def _make_room(self, key: str, size: int, is_update: bool = False) -> bool:
+        """
+        Desaloja entradas hasta que quepa una nueva del tamaño indicado.
+        :return: False si la entrada no debe almacenarse (demasiado grande o no admitida)
+        """
+        if self.max_bytes and size > self.max_bytes:
+            return False
+        
+        first = True
+        while self._over_budget(1, size):
+            victim = self._policy.victim()
+            if victim is None or victim not in self._cache:
+                return False
+            # El filtro de admisión sólo compara contra la primera víctima
+            if first and not is_update and not self._policy.admit(key, victim):
+                return False
+            first = False
+            self._remove_entry(victim)
+            self._stats['evictions'] += 1
+            logger.info(f"Cache evicted: {victim} (policy: {self._policy.name})")
+        return True
+    
     def invalidate_by_tag(self, tag: str) -> int:
         """
         Invalida todas las claves con un tag específico
@@ -147,37 +831,55 @@ class AdvancedCache:
         logger.info(f"Invalidated {len(keys_to_delete)} keys by tag: {tag}")
         return len(keys_to_delete)
     
-    def invalidate_by_pattern(self, pattern: str) -> int:
+    def invalidate_by_tags(self, tags: Iterable[str]) -> int:
         """
-        Invalida todas las claves que coinciden con un patrón
-        :param pattern: Patrón a invalidar
+        Invalida las claves de varios tags en una sola pasada (una clave con
+        varios de los tags se cuenta una vez)
+        :param tags: Tags a invalidar
         :return: Número de claves invalidadas
         """
-        keys_to_delete = []
-        for key in list(self._cache.keys()):
-            if pattern in key:
-                keys_to_delete.append(key)
-        
+        tags = list(tags)
+        keys_to_delete = set().union(*(self._tags.get(tag, ()) for tag in tags))
         for key in keys_to_delete:
             self.delete(key)
         
         self._stats['invalidations'] += len(keys_to_delete)
-        logger.info(f"Invalidated {len(keys_to_delete)} keys by pattern: {pattern}")
+        logger.info(f"Invalidated {len(keys_to_delete)} keys by tags: {tags}")
         return len(keys_to_delete)
     
-    def invalidate_registros(self) -> int:
+    def invalidate_where(self, tag: str, predicate: Callable[[Optional[Dict[str, Any]]], bool]) -> int:
         """
-        Invalida todo el cache relacionado con registros
+        Invalida sólo las claves de un tag cuyo meta cumple el predicado
+        :param tag: Tag cuyas claves se evalúan
+        :param predicate: Recibe el meta de la entrada (None si no tiene) y decide si invalidarla
         :return: Número de claves invalidadas
         """
-        return self.invalidate_by_tag('registros')
+        keys_to_delete = [key for key in self._tags.get(tag, ()) if predicate(self._cache[key].meta)]
+        for key in keys_to_delete:
+            self.delete(key)
+        
+        self._stats['invalidations'] += len(keys_to_delete)
+        logger.info(f"Invalidated {len(keys_to_delete)} of the keys tagged {tag} by predicate")
+        return len(keys_to_delete)
     
-    def invalidate_estadisticas(self) -> int:
+    def invalidate_by_pattern(self, pattern: str) -> int:
         """
-        Invalida todo el cache relacionado con estadísticas
+        Invalida todas las claves que coinciden con un patrón.
+        Un patrón coincide con las claves registradas bajo ese patrón en set() y con
+        las claves que empiezan por él; el costo depende de las claves afectadas, no
+        del tamaño del cache.
+        :param pattern: Patrón a invalidar
         :return: Número de claves invalidadas
         """
-        return self.invalidate_by_tag('estadisticas')
+        keys_to_delete = set(self._patterns.get(pattern, ()))
+        keys_to_delete.update(self._key_index.iter_prefix(pattern))
+        
+        for key in keys_to_delete:
+            self.delete(key)
+        
+        self._stats['invalidations'] += len(keys_to_delete)
+        logger.info(f"Invalidated {len(keys_to_delete)} keys by pattern: {pattern}")
+        return len(keys_to_delete)
     
     def clear(self) -> None:
         """
@@ -186,6 +888,11 @@ class AdvancedCache:
         self._cache.clear()
         self._tags.clear()
         self._patterns.clear()
+        self._key_patterns.clear()
+        self._key_index.clear()
+        self._expiry_heap.clear()
+        self._policy.clear()
+        self._current_bytes = 0
         logger.info("Cache cleared")
     
     def cleanup_expired(self) -> int:
@@ -193,19 +900,98 @@ class AdvancedCache:
         Limpia entradas expiradas del cache
         :return: Número de entradas eliminadas
         """
-        current_time = time.time()
-        expired_keys = [
-            key for key, (_, expiry_time, _) in self._cache.items()
-            if current_time > expiry_time
-        ]
+        removed = self.reap_expired()
         
-        for key in expired_keys:
-            self.delete(key)
+        if removed:
+            logger.info(f"Cleaned up {removed} expired cache entries")
         
-        if expired_keys:
-            logger.info(f"Cleaned up {len(expired_keys)} expired cache entries")
+        return removed
+    
+    def reap_expired(self, now: Optional[float] = None, max_items: Optional[int] = None) -> int:
+        """
+        Elimina las entradas expiradas usando el heap de expiraciones: el costo es
+        proporcional a las entradas expiradas, no al tamaño del cache.
+        :param now: Instante de referencia (por defecto time.time())
+        :param max_items: Máximo de entradas a eliminar en esta llamada
+        :return: Número de entradas eliminadas
+        """
+        now = time.time() if now is None else now
+        heap = self._expiry_heap
+        removed = 0
+        max_lag = 0.0
+        while heap and heap[0][0] <= now:
+            if max_items is not None and removed >= max_items:
+                break
+            expiry, key = heapq.heappop(heap)
+            entry = self._cache.get(key)
+            # Las entradas del heap quedan obsoletas si la clave se reemplazó o eliminó
+            if entry is None or entry.expiry != expiry:
+                continue
+            self._remove_entry(key)
+            removed += 1
+            max_lag = max(max_lag, now - expiry)
+        
+        self._stats['expirations'] += removed
+        if removed:
+            self._reaper_stats['last_lag_ms'] = round(max_lag * 1000, 3)
+            self._reaper_stats['max_lag_ms'] = max(self._reaper_stats['max_lag_ms'], self._reaper_stats['last_lag_ms'])
         
-        return len(expired_keys)
+        # Compactar si el heap acumula demasiadas entradas obsoletas
+        if len(heap) > 2 * len(self._cache) + 1024:
+            self._expiry_heap = [(entry.expiry, key) for key, entry in self._cache.items()]
+            heapq.heapify(self._expiry_heap)
+        
+        return removed
+    
+    async def run_reaper(self, interval: float, batch_size: int = 1000) -> None:
+        """
+        Bucle del reaper de TTL: cada `interval` segundos elimina las entradas expiradas
+        en lotes, cediendo el event loop entre lotes.
+        """
+        self._reaper_stats['running'] = True
+        self._reaper_stats['interval'] = interval
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                start = time.perf_counter()
+                reaped = 0
+                while True:
+                    removed = self.reap_expired(max_items=batch_size)
+                    reaped += removed
+                    if removed < batch_size:
+                        break
+                    await asyncio.sleep(0)
+                self._reaper_stats['passes'] += 1
+                self._reaper_stats['reaped'] += reaped
+                self._reaper_stats['last_pass_at'] = datetime.utcnow().isoformat()
+                self._reaper_stats['last_pass_ms'] = round((time.perf_counter() - start) * 1000, 3)
+                if reaped:
+                    logger.info(f"Cache reaper removed {reaped} expired entries")
+        finally:
+            self._reaper_stats['running'] = False
+    
+    def start_reaper(self, interval: float = CACHE_REAPER_INTERVAL) -> Optional[asyncio.Task]:
+        """
+        Inicia el reaper de TTL en segundo plano (requiere un event loop activo)
+        :param interval: Segundos entre pasadas; 0 lo deshabilita
+        """
+        if not interval or interval <= 0:
+            return None
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.get_running_loop().create_task(self.run_reaper(interval))
+            logger.info(f"Cache reaper started (interval: {interval}s)")
+        return self._reaper_task
+    
+    async def stop_reaper(self) -> None:
+        """Detiene el reaper de TTL si está corriendo"""
+        task, self._reaper_task = self._reaper_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            logger.info("Cache reaper stopped")
     
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -221,39 +1007,41 @@ class AdvancedCache:
             'hit_rate': f"{hit_rate:.2f}%",
             'cache_size': len(self._cache),
             'tags_count': len(self._tags),
-            'patterns_count': len(self._patterns)
+            'patterns_count': len(self._patterns),
+            'cache_bytes': self._current_bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'eviction_policy': self._policy.name,
+            'backend': self.name,
+            'reaper': dict(self._reaper_stats)
         }
     
-    def cache_decorator(self, ttl: int = 300, key_prefix: str = "func", 
-                       tags: Optional[Set[str]] = None):
-        """
-        Decorador para cachear funciones
-        """
-        def decorator(func: Callable):
-            @wraps(func)
-            async def wrapper(*args, **kwargs):
-                # Generar clave única
-                cache_key = self._generate_key(key_prefix, *args, **kwargs)
-                
-                # Intentar obtener del cache
-                cached_result = self.get(cache_key)
-                if cached_result is not None:
-                    return cached_result
-                
-                # Ejecutar función
-                result = await func(*args, **kwargs)
-                
-                # Guardar en cache
-                auto_tags = tags or self._extract_tags(*args, **kwargs)
-                self.set(cache_key, result, ttl, auto_tags)
-                
-                return result
-            
-            return wrapper
-        return decorator
+def create_cache_backend() -> CacheBackend:
+    """
+    Crea el backend de cache según la configuración: Redis si REDIS_ENABLED y
+    REDIS_URL están definidos (con un L1 en memoria delante si CACHE_L1_ENABLED),
+    o el cache en memoria en caso contrario.
+    """
+    if REDIS_ENABLED and REDIS_URL:
+        try:
+            from app.services.cache_redis import RedisCacheBackend, TwoTierCache
+            backend = RedisCacheBackend(url=REDIS_URL)
+            if CACHE_L1_ENABLED:
+                logger.info("Using two-tier cache backend (memory L1 + Redis L2)")
+                return TwoTierCache(backend)
+            logger.info("Using Redis cache backend")
+            return backend
+        except Exception as e:
+            logger.error(f"Could not create Redis cache backend, falling back to memory: {e}")
+    
+    return AdvancedCache(
+        max_entries=CACHE_MAX_ENTRIES,
+        max_bytes=CACHE_MAX_BYTES,
+        eviction_policy=CACHE_EVICTION_POLICY
+    )
 
 # Instancia global del cache avanzado
-cache = AdvancedCache()
+cache = create_cache_backend()
 
 # Configuración de TTL por tipo de operación
 TTL_CONFIG = {
@@ -265,11 +1053,53 @@ TTL_CONFIG = {
     'exportacion': 30,          # 30 segundos para exportaciones
 }
 
+# Stale-while-revalidate por operación (complementa a TTL_CONFIG):
+# - grace: segundos tras el TTL en los que se sirve el valor vencido mientras se
+#   recalcula en segundo plano (0 = recalcular de forma síncrona)
+# - beta: agresividad de la expiración temprana probabilística tipo XFetch
+#   (0 = deshabilitada, 1 = recomendado, >1 refresca antes)
+SWR_CONFIG = {
+    'total_registros': {'grace': 120, 'beta': 1.0},
+    'registros_total': {'grace': 120, 'beta': 1.0},
+    'registros_facetas': {'grace': 120, 'beta': 1.0},
+    'valores_unicos': {'grace': 600, 'beta': 1.0},
+}
+
+# Tareas de refresco en segundo plano (se guarda la referencia para que no las recoja el GC)
+_refresh_tasks: Set[asyncio.Task] = set()
+refresh_stats = {'background_refreshes': 0, 'early_refreshes': 0, 'refresh_errors': 0}
+
+# Parámetros que se copian legibles en la clave, tras la operación, para poder
+# invalidar por prefijo (p.ej. 'registro_individual:id=5:' o 'historial:numero_inspector=7:')
+CACHE_KEY_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'registro_individual': ('id',),
+    'historial': ('numero_inspector',),
+    'valores_unicos': ('column',),
+}
+
 # Función helper para generar claves de cache
 def generate_cache_key(operation: str, **params) -> str:
-    """Genera una clave de cache basada en la operación y parámetros"""
-    param_str = "&".join(f"{k}={v}" for k, v in sorted(params.items()) if v is not None)
-    return f"{operation}:{hashlib.md5(param_str.encode()).hexdigest()}"
+    """
+    Genera la clave canónica de cache de una operación:
+    '{operation}[:{campo}={valor}...]:{digest}'.
+    El digest (blake2b de 8 bytes) cubre todos los parámetros no nulos con su
+    repr, así que el tipo cuenta (5 y '5' son claves distintas) y un valor con
+    '&' o '=' no puede hacerse pasar por otro parámetro.
+    """
+    param_str = "\x1f".join(f"{k}={v!r}" for k, v in sorted(params.items()) if v is not None)
+    digest = hashlib.blake2b(param_str.encode(), digest_size=8).hexdigest()
+    return f"{cache_key_prefix(operation, **params)}{digest}"
+
+def cache_key_prefix(operation: str, **fields) -> str:
+    """
+    Prefijo legible de las claves de una operación (ver CACHE_KEY_FIELDS).
+    Termina en ':' para que invalidar 'registro_individual:id=5:' no alcance a id=50.
+    """
+    readable = "".join(
+        f":{name}={fields[name]}" for name in CACHE_KEY_FIELDS.get(operation, ())
+        if fields.get(name) is not None
+    )
+    return f"{operation}{readable}:"
 
 # Función helper para cachear consultas de registros
 async def cached_registro_query(operation: str, ttl: int = None, **params):
@@ -280,7 +1110,7 @@ async def cached_registro_query(operation: str, ttl: int = None, **params):
     ttl = ttl or TTL_CONFIG.get(operation, 300)
     
     # Intentar obtener del cache
-    cached_result = cache.get(cache_key)
+    cached_result = await cache.aget(cache_key)
     if cached_result is not None:
         return cached_result
     
@@ -289,19 +1119,104 @@ async def cached_registro_query(operation: str, ttl: int = None, **params):
 # Función helper para guardar resultados en cache
 def save_to_cache(operation: str, result: Any, ttl: int = None, **params):
     """
-    Helper para guardar resultados en cache
+    Helper para guardar resultados en cache.
+    La operación y sus parámetros se guardan como meta de la entrada para
+    la invalidación selectiva (invalidate_where).
+    """
+    cache_key = generate_cache_key(operation, **params)
+    ttl = ttl or TTL_CONFIG.get(operation, 300)
+    
+    cache.set(cache_key, result, ttl, operation_tags(operation), meta=operation_meta(operation, params))
+    return result
+
+async def asave_to_cache(operation: str, result: Any, ttl: int = None, **params):
+    """
+    Como save_to_cache, para el event loop: con un backend de red la escritura
+    se hace en un hilo
     """
     cache_key = generate_cache_key(operation, **params)
     ttl = ttl or TTL_CONFIG.get(operation, 300)
     
-    # Determinar tags basados en la operación
+    await cache.aset(cache_key, result, ttl, operation_tags(operation), meta=operation_meta(operation, params))
+    return result
+
+def operation_meta(operation: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Meta de una entrada: operación y parámetros (sin los None) con que se calculó"""
+    return {'operation': operation, 'params': {k: v for k, v in params.items() if v is not None}}
+
+# Operaciones derivadas de la tabla registros cuyo nombre no contiene 'registro'
+REGISTRO_DERIVED_OPERATIONS = frozenset({'valores_unicos'})
+
+def operation_tags(operation: str) -> Set[str]:
+    """Determina los tags de invalidación de una operación"""
     tags = {operation}
-    if 'registro' in operation:
+    if 'registro' in operation or operation in REGISTRO_DERIVED_OPERATIONS:
         tags.add('registros')
     if 'estadistica' in operation or 'total' in operation:
         tags.add('estadisticas')
     if 'historial' in operation:
         tags.add('historial')
-    
-    cache.set(cache_key, result, ttl, tags)
-    return result 
\ No newline at end of file
+    return tags
+
+def _should_refresh_early(fresh_until: float, delta: float, beta: float, now: float) -> bool:
+    """
+    Expiración temprana probabilística (XFetch): la probabilidad de refrescar crece
+    a medida que se acerca fresh_until, y antes para valores caros de calcular (delta)
+    """
+    if beta <= 0 or delta <= 0:
+        return False
+    return now - delta * beta * math.log(1.0 - random.random()) >= fresh_until
+
+async def cached_with_refresh(operation: str, cache_key: str, ttl: int,
+                              load: Callable[[], Awaitable[Any]],
+                              refresh: Optional[Callable[[], Awaitable[Any]]] = None,
+                              params: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Obtiene un valor del cache con stale-while-revalidate según SWR_CONFIG[operation].
+
+    - Fresco: se devuelve; con XFetch puede lanzar un refresco anticipado en segundo plano.
+    - Vencido dentro de la ventana de gracia: se devuelve y se refresca en segundo plano.
+    - Ausente: se calcula con load() (una sola vez por clave) y se guarda.
+
+    :param load: Calcula el valor con la sesión de la petición actual (None = no cachear)
+    :param refresh: Calcula el valor en segundo plano con su propia sesión (por defecto load)
+    :param params: Parámetros de la consulta, guardados como meta para invalidate_where
+    """
+    config = SWR_CONFIG.get(operation, {})
+    grace = config.get('grace', 0)
+    tags = operation_tags(operation)
+    meta = operation_meta(operation, params or {})
+
+    async def compute(fn: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.perf_counter()
+        value = await fn()
+        if value is not None:
+            await cache.aset(cache_key, value, ttl, tags, stale_ttl=grace, delta=time.perf_counter() - start,
+                             meta=meta)
+        return value
+
+    cached = await cache.aget_with_meta(cache_key)
+    if cached is None:
+        return await single_flight.do(cache_key, lambda: compute(load))
+
+    value, fresh_until, delta = cached
+    now = time.time()
+    if now > fresh_until:
+        refresh_stats['background_refreshes'] += 1
+    elif _should_refresh_early(fresh_until, delta, config.get('beta', 0), now):
+        refresh_stats['early_refreshes'] += 1
+    else:
+        return value
+
+    if not single_flight.in_flight(cache_key):
+        async def background():
+            try:
+                await single_flight.do(cache_key, lambda: compute(refresh or load))
+            except Exception as e:
+                refresh_stats['refresh_errors'] += 1
+                logger.error(f"Background cache refresh failed for {cache_key}: {e}")
+
+        task = asyncio.create_task(background())
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+    return value 
\ No newline at end of file
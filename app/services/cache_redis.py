@@ -0,0 +1,789 @@
+"""
+Backend de cache compartido en Redis para despliegues con varios workers
+"""
+import asyncio
+import time
+import pickle
+import logging
+import json
+import uuid
+import threading
+from datetime import datetime
+from typing import Any, Optional, Dict, Set, Iterable, List, Tuple, Callable
+
+from app.services.cache import CacheBackend, AdvancedCache
+from app.config import (
+    CACHE_L1_MAX_ENTRIES, CACHE_L1_TTL, CACHE_INVALIDATION_CHANNEL, CACHE_REAPER_INTERVAL,
+    CACHE_REDIS_CLEANUP_INTERVAL
+)
+
+try:
+    import redis
+except ImportError:  # Dependencia opcional: sólo se necesita con REDIS_ENABLED
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Backend de cache en Redis.
+
+    Cada entrada se guarda con SET ... EX ttl. Los tags y patrones se indexan en
+    sets de Redis (tag -> claves), de modo que invalidate_by_tag() es un SMEMBERS
+    seguido de un único pipeline de DEL, visible para todos los workers. Cada
+    entrada tiene además un hash con sus tags y patrón (con el mismo EX) para
+    retirarla de todos sus sets al borrarla; las referencias a entradas que
+    expiraron las limpia cleanup_expired(), que start_reaper() programa.
+
+    El cliente es síncrono: desde el event loop se usan las variantes aget/aset/...
+    de CacheBackend, que hacen cada llamada en un hilo (blocking = True).
+    """
+    name = "redis"
+    blocking = True
+
+    def __init__(self, url: Optional[str] = None, client: Any = None,
+                 namespace: str = "inspector:cache:", index_ttl: int = 86400,
+                 batch_size: int = 500):
+        """
+        :param url: URL de conexión (p.ej. redis://localhost:6379/0)
+        :param client: Cliente Redis ya creado (útil para tests con fakeredis)
+        :param namespace: Prefijo de todas las claves que maneja el backend
+        :param index_ttl: Vida mínima en segundos de los sets de tags/patrones
+        :param batch_size: Tamaño de lote para los pipelines de borrado
+        """
+        if client is None:
+            if redis is None:
+                raise RuntimeError("El paquete 'redis' no está instalado")
+            client = redis.Redis.from_url(url)
+        self._redis = client
+        self._ns = namespace
+        self._index_ttl = index_ttl
+        self._batch_size = batch_size
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'deletes': 0,
+            'invalidations': 0,
+            'stale_hits': 0,
+            'errors': 0
+        }
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._reaper_stats = {
+            'running': False,
+            'interval': None,
+            'passes': 0,
+            'reaped': 0,
+            'last_pass_at': None
+        }
+
+    # ----- nombres de claves en Redis -----
+    def _k(self, key: str) -> str:
+        return f"{self._ns}k:{key}"
+
+    def _t(self, tag: str) -> str:
+        return f"{self._ns}t:{tag}"
+
+    def _p(self, pattern: str) -> str:
+        return f"{self._ns}p:{pattern}"
+
+    def _i(self, key: str) -> str:
+        """Hash con los tags, el patrón y el meta (JSON) de una entrada, para invalidate_where()"""
+        return f"{self._ns}i:{key}"
+
+    @staticmethod
+    def _decode(member: Any) -> str:
+        return member.decode() if isinstance(member, bytes) else member
+
+    def _strip(self, redis_key: Any) -> str:
+        if isinstance(redis_key, bytes):
+            redis_key = redis_key.decode()
+        return redis_key[len(self._ns) + 2:]
+
+    def _errors(self):
+        return (redis.RedisError,) if redis is not None else (Exception,)
+
+    def _delete_keys(self, keys: Iterable[str], extra: Iterable[str] = ()) -> int:
+        """
+        Borra claves del cache (y claves de índice extra) en pipelines por lotes,
+        retirándolas de los sets de tags y patrones a los que pertenecen
+        """
+        keys = list(keys)
+        extra = list(extra)
+        deleted = 0
+        for i in range(0, len(keys), self._batch_size):
+            batch = keys[i:i + self._batch_size]
+            pipe = self._redis.pipeline(transaction=False)
+            for key in batch:
+                pipe.hmget(self._i(key), "tags", "pattern")
+            indexes = pipe.execute()
+            pipe = self._redis.pipeline(transaction=False)
+            for key in batch:
+                pipe.delete(self._k(key), self._i(key))
+            for key, (tags, pattern) in zip(batch, indexes):
+                index_keys = {self._t(tag) for tag in json.loads(tags)} if tags else set()
+                if pattern:
+                    index_keys.add(self._p(self._decode(pattern)))
+                for index_key in index_keys.difference(extra):
+                    pipe.srem(index_key, key)
+            # DEL cuenta la entrada y su hash de índice: basta saber si borró algo
+            deleted += sum(1 for removed in pipe.execute()[:len(batch)] if removed)
+        if extra:
+            self._redis.delete(*extra)
+        return deleted
+
+    def set(self, key: str, value: Any, ttl: int = 300, tags: Optional[Set[str]] = None,
+            pattern: Optional[str] = None, stale_ttl: int = 0, delta: float = 0.0,
+            meta: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Almacena un valor en Redis con TTL, tags y patrón.
+        Con stale_ttl la clave vive ttl + stale_ttl y el fin del TTL se guarda en el payload.
+        """
+        tags = tags or self._extract_tags(key)
+        try:
+            fresh_until = time.time() + ttl
+            payload = pickle.dumps((value, tuple(tags), pattern, fresh_until, delta),
+                                   protocol=pickle.HIGHEST_PROTOCOL)
+            index_ttl = max(int(ttl + stale_ttl), self._index_ttl)
+            expires = max(int(ttl + stale_ttl), 1)
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.set(self._k(key), payload, ex=expires)
+            pipe.hset(self._i(key), mapping={
+                "tags": json.dumps(sorted(tags)), "pattern": pattern or "", "meta": json.dumps(meta or None)
+            })
+            pipe.expire(self._i(key), expires)
+            for tag in tags:
+                pipe.sadd(self._t(tag), key)
+                pipe.expire(self._t(tag), index_ttl)
+            if pattern:
+                pipe.sadd(self._p(pattern), key)
+                pipe.expire(self._p(pattern), index_ttl)
+            pipe.execute()
+            self._stats['sets'] += 1
+            logger.info(f"Cache set (redis): {key} (TTL: {ttl}s, Tags: {tags})")
+        except self._errors() as e:
+            self._stats['errors'] += 1
+            logger.warning(f"Redis cache set failed for {key}: {e}")
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Obtiene un valor de Redis; los errores de conexión se tratan como miss
+        """
+        try:
+            payload = self._redis.get(self._k(key))
+        except self._errors() as e:
+            self._stats['errors'] += 1
+            self._stats['misses'] += 1
+            logger.warning(f"Redis cache get failed for {key}: {e}")
+            return None
+
+        if payload is None:
+            self._stats['misses'] += 1
+            return None
+
+        value, _, _, fresh_until, _ = self._loads(payload)
+        if time.time() > fresh_until:
+            # Vencida pero en ventana de gracia: sólo get_with_meta() la sirve
+            self._stats['misses'] += 1
+            return None
+        self._stats['hits'] += 1
+        logger.info(f"Cache hit (redis): {key}")
+        return value
+
+    @staticmethod
+    def _loads(payload: bytes) -> Tuple[Any, Any, Optional[str], float, float]:
+        """Decodifica un payload; los escritos sin metadatos de frescura nunca quedan vencidos"""
+        value, tags, pattern, *meta = pickle.loads(payload)
+        fresh_until, delta = meta if meta else (float('inf'), 0.0)
+        return value, tags, pattern, fresh_until, delta
+
+    def get_with_meta(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """
+        Obtiene (valor, fresh_until, delta) aunque la entrada esté en su ventana de gracia
+        """
+        entry = self.get_entry(key)
+        if entry is None:
+            return None
+        value, _, _, _, fresh_until, delta = entry
+        return value, fresh_until, delta
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, Set[str], Optional[str], float, float, float]]:
+        """
+        Obtiene valor, tags, patrón, TTL restante (segundos), fresh_until y delta en un
+        solo round-trip. Lo usa TwoTierCache para poblar su L1 con los mismos tags que
+        la entrada en Redis.
+        """
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.get(self._k(key))
+            pipe.pttl(self._k(key))
+            payload, pttl = pipe.execute()
+        except self._errors() as e:
+            self._stats['errors'] += 1
+            self._stats['misses'] += 1
+            logger.warning(f"Redis cache get failed for {key}: {e}")
+            return None
+
+        if payload is None:
+            self._stats['misses'] += 1
+            return None
+
+        value, tags, pattern, fresh_until, delta = self._loads(payload)
+        if time.time() > fresh_until:
+            self._stats['stale_hits'] += 1
+        else:
+            self._stats['hits'] += 1
+        remaining = pttl / 1000 if pttl and pttl > 0 else 0
+        return value, set(tags), pattern, remaining, fresh_until, delta
+
+    def delete(self, key: str) -> bool:
+        """
+        Elimina una clave y la retira de sus sets de tags y patrones
+        """
+        try:
+            deleted = self._delete_keys([key])
+        except self._errors() as e:
+            self._stats['errors'] += 1
+            logger.warning(f"Redis cache delete failed for {key}: {e}")
+            return False
+
+        if deleted:
+            self._stats['deletes'] += 1
+            logger.info(f"Cache deleted (redis): {key}")
+        return bool(deleted)
+
+    def invalidate_by_tag(self, tag: str) -> int:
+        """
+        Invalida todas las claves de un tag con un pipeline de DEL (retirándolas
+        también de sus otros sets de tags y patrones)
+        """
+        try:
+            keys = [self._decode(m) for m in self._redis.smembers(self._t(tag))]
+            deleted = self._delete_keys(keys, extra=[self._t(tag)])
+        except self._errors() as e:
+            self._stats['errors'] += 1
+            logger.warning(f"Redis cache invalidate_by_tag failed for {tag}: {e}")
+            return 0
+
+        self._stats['invalidations'] += deleted
+        logger.info(f"Invalidated {deleted} keys by tag (redis): {tag}")
+        return deleted
+
+    def invalidate_by_tags(self, tags: Iterable[str]) -> int:
+        """
+        Invalida las claves de varios tags: un pipeline de SMEMBERS y los DEL por lotes
+        """
+        tags = list(tags)
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for tag in tags:
+                pipe.smembers(self._t(tag))
+            keys = {self._decode(m) for members in pipe.execute() for m in members}
+            deleted = self._delete_keys(keys, extra=[self._t(tag) for tag in tags])
+        except self._errors() as e:
+            self._stats['errors'] += 1
+            logger.warning(f"Redis cache invalidate_by_tags failed for {tags}: {e}")
+            return 0
+
+        self._stats['invalidations'] += deleted
+        logger.info(f"Invalidated {deleted} keys by tags (redis): {tags}")
+        return deleted
+
+    def invalidate_by_pattern(self, pattern: str) -> int:
+        """
+        Invalida las claves registradas bajo el patrón y las que empiezan por él
+        """
+        try:
+            keys = {self._decode(m) for m in self._redis.smembers(self._p(pattern))}
+            match = self._k(self._escape_glob(pattern)) + "*"
+            keys.update(self._strip(k) for k in self._redis.scan_iter(match=match, count=1000))
+            deleted = self._delete_keys(keys, extra=[self._p(pattern)])
+        except self._errors() as e:
+            self._stats['errors'] += 1
+            logger.warning(f"Redis cache invalidate_by_pattern failed for {pattern}: {e}")
+            return 0
+
+        self._stats['invalidations'] += deleted
+        logger.info(f"Invalidated {deleted} keys by pattern (redis): {pattern}")
+        return deleted
+
+    def matching_keys(self, tag: str, predicate: Callable[[Optional[Dict[str, Any]]], bool]) -> List[str]:
+        """
+        Claves del tag cuyo meta cumple el predicado (leyendo los metas por lotes).
+        Las claves sin hash de índice (entradas que ya expiraron) se incluyen siempre,
+        así invalidate_keys() las retira del set del tag.
+        """
+        keys = [self._decode(m) for m in self._redis.smembers(self._t(tag))]
+        matching = []
+        for i in range(0, len(keys), self._batch_size):
+            batch = keys[i:i + self._batch_size]
+            pipe = self._redis.pipeline(transaction=False)
+            for key in batch:
+                pipe.hmget(self._i(key), "tags", "meta")
+            for key, (tags, raw) in zip(batch, pipe.execute()):
+                if tags is None or predicate(json.loads(raw) if raw else None):
+                    matching.append(key)
+        return matching
+
+    def invalidate_keys(self, keys: List[str], tag: Optional[str] = None) -> int:
+        """Elimina una lista de claves (retirándolas del set del tag si se indica)"""
+        deleted = self._delete_keys(keys)
+        if tag and keys:
+            self._redis.srem(self._t(tag), *keys)
+        self._stats['invalidations'] += deleted
+        return deleted
+
+    def invalidate_where(self, tag: str, predicate: Callable[[Optional[Dict[str, Any]]], bool]) -> int:
+        """
+        Invalida sólo las claves de un tag cuyo meta cumple el predicado
+        """
+        try:
+            deleted = self.invalidate_keys(self.matching_keys(tag, predicate), tag)
+        except self._errors() as e:
+            self._stats['errors'] += 1
+            logger.warning(f"Redis cache invalidate_where failed for {tag}: {e}")
+            return 0
+
+        logger.info(f"Invalidated {deleted} of the keys tagged {tag} by predicate (redis)")
+        return deleted
+
+    @staticmethod
+    def _escape_glob(value: str) -> str:
+        for ch in ('\\', '*', '?', '[', ']'):
+            value = value.replace(ch, '\\' + ch)
+        return value
+
+    def clear(self) -> None:
+        """
+        Limpia todas las claves del namespace (no toca otras claves de la base Redis)
+        """
+        try:
+            batch: List[Any] = []
+            for redis_key in self._redis.scan_iter(match=self._escape_glob(self._ns) + "*", count=1000):
+                batch.append(redis_key)
+                if len(batch) >= self._batch_size:
+                    self._redis.delete(*batch)
+                    batch = []
+            if batch:
+                self._redis.delete(*batch)
+            logger.info("Cache cleared (redis)")
+        except self._errors() as e:
+            self._stats['errors'] += 1
+            logger.warning(f"Redis cache clear failed: {e}")
+
+    def cleanup_expired(self) -> int:
+        """
+        Redis expira las claves por sí mismo; aquí sólo se retiran de los sets de
+        tags y patrones las referencias a claves que ya no existen.
+        :return: Número de referencias eliminadas
+        """
+        removed = 0
+        try:
+            for prefix in (self._t(''), self._p('')):
+                for index_key in self._redis.scan_iter(match=self._escape_glob(prefix) + "*", count=1000):
+                    members = list(self._redis.smembers(index_key))
+                    if not members:
+                        continue
+                    pipe = self._redis.pipeline(transaction=False)
+                    for member in members:
+                        pipe.exists(self._k(member.decode() if isinstance(member, bytes) else member))
+                    dead = [m for m, exists in zip(members, pipe.execute()) if not exists]
+                    if dead:
+                        removed += self._redis.srem(index_key, *dead)
+            # Hash único de metas de versiones anteriores, sin TTL: ahora va en el hash de cada entrada
+            self._redis.delete(f"{self._ns}meta")
+        except self._errors() as e:
+            self._stats['errors'] += 1
+            logger.warning(f"Redis cache cleanup failed: {e}")
+
+        if removed:
+            logger.info(f"Cleaned up {removed} stale cache index references (redis)")
+        return removed
+
+    async def run_reaper(self, interval: float) -> None:
+        """
+        Bucle de limpieza: cada `interval` segundos ejecuta cleanup_expired() en un
+        hilo (el cliente Redis es síncrono) para no bloquear el event loop
+        """
+        self._reaper_stats['running'] = True
+        self._reaper_stats['interval'] = interval
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                removed = await asyncio.to_thread(self.cleanup_expired)
+                self._reaper_stats['passes'] += 1
+                self._reaper_stats['reaped'] += removed
+                self._reaper_stats['last_pass_at'] = datetime.utcnow().isoformat()
+        finally:
+            self._reaper_stats['running'] = False
+
+    def start_reaper(self, interval: float = CACHE_REDIS_CLEANUP_INTERVAL) -> Optional[asyncio.Task]:
+        """
+        Redis expira las entradas por sí mismo, pero las referencias en los sets de
+        tags y patrones se limpian aquí periódicamente (requiere un event loop activo)
+        :param interval: Segundos entre pasadas; 0 lo deshabilita
+        """
+        if not interval or interval <= 0:
+            return None
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.get_running_loop().create_task(self.run_reaper(interval))
+            logger.info(f"Redis cache index cleanup started (interval: {interval}s)")
+        return self._reaper_task
+
+    async def stop_reaper(self) -> None:
+        """Detiene la limpieza periódica si está corriendo"""
+        task, self._reaper_task = self._reaper_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            logger.info("Redis cache index cleanup stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas del cache: contadores de este worker (sets, deletes,
+        invalidations...). No informa el tamaño compartido: contarlo exige
+        recorrer el namespace con SCAN en cada consulta.
+        """
+        total_requests = self._stats['hits'] + self._stats['misses']
+        hit_rate = (self._stats['hits'] / total_requests * 100) if total_requests > 0 else 0
+
+        return {
+            **self._stats,
+            'total_requests': total_requests,
+            'hit_rate': f"{hit_rate:.2f}%",
+            'backend': self.name,
+            'reaper': dict(self._reaper_stats)
+        }
+
+
+class TwoTierCache(CacheBackend):
+    """
+    Cache de dos niveles: un L1 pequeño en memoria de cada worker delante del
+    L2 compartido en Redis.
+
+    Las lecturas se resuelven en L1 y sólo en caso de miss se consulta Redis
+    (poblando L1 con un TTL corto). Toda invalidación se aplica en L2 y se
+    publica en un canal pub/sub; cada worker escucha el canal en un hilo y
+    aplica la misma invalidación a su L1.
+    """
+    name = "two_tier"
+    blocking = True
+
+    def __init__(self, l2: RedisCacheBackend, l1_max_entries: int = CACHE_L1_MAX_ENTRIES,
+                 l1_ttl: int = CACHE_L1_TTL, channel: str = CACHE_INVALIDATION_CHANNEL,
+                 listen: bool = True):
+        """
+        :param l2: Backend Redis compartido
+        :param l1_max_entries: Máximo de entradas del L1 de este worker
+        :param l1_ttl: TTL máximo en segundos de una entrada en L1
+        :param channel: Canal pub/sub para difundir invalidaciones
+        :param listen: Arrancar el hilo que escucha el canal
+        """
+        self.l1 = AdvancedCache(max_entries=l1_max_entries, eviction_policy="lru")
+        self.l2 = l2
+        self._l1_ttl = l1_ttl
+        self._channel = channel
+        self._origin = uuid.uuid4().hex
+        # El L1 se modifica desde el event loop y desde el hilo del listener
+        self._lock = threading.RLock()
+        self._stats = {
+            'l1_hits': 0,
+            'l2_hits': 0,
+            'misses': 0,
+            'published': 0,
+            'received': 0,
+            'publish_errors': 0
+        }
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._pubsub = None
+        self._listener = None
+        if listen:
+            self._start_listener()
+
+    # ----- pub/sub -----
+    def _start_listener(self) -> None:
+        try:
+            self._pubsub = self.l2._redis.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{self._channel: self._on_message})
+            self._listener = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+            logger.info(f"Listening for cache invalidations on channel {self._channel}")
+        except self.l2._errors() as e:
+            logger.error(f"Could not subscribe to cache invalidation channel: {e}")
+
+    def _publish(self, op: str, arg: Any = None) -> None:
+        message = json.dumps({'origin': self._origin, 'op': op, 'arg': arg})
+        try:
+            self.l2._redis.publish(self._channel, message)
+            self._stats['published'] += 1
+        except self.l2._errors() as e:
+            self._stats['publish_errors'] += 1
+            logger.warning(f"Could not publish cache invalidation {op}({arg}): {e}")
+
+    def _on_message(self, message: Dict[str, Any]) -> None:
+        try:
+            data = json.loads(message['data'])
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring malformed cache invalidation message: {message!r}")
+            return
+        if data.get('origin') == self._origin:
+            return
+        self._stats['received'] += 1
+        self._apply_local(data.get('op'), data.get('arg'))
+
+    def _apply_local(self, op: Optional[str], arg: Any) -> int:
+        """Aplica una invalidación sólo al L1 de este worker"""
+        with self._lock:
+            if op == 'delete':
+                return int(self.l1.delete(arg))
+            if op == 'delete_many':
+                return sum(int(self.l1.delete(key)) for key in arg)
+            if op == 'tag':
+                return self.l1.invalidate_by_tag(arg)
+            if op == 'tags':
+                return self.l1.invalidate_by_tags(arg)
+            if op == 'pattern':
+                return self.l1.invalidate_by_pattern(arg)
+            if op == 'clear':
+                self.l1.clear()
+                return 0
+        logger.warning(f"Unknown cache invalidation operation: {op}")
+        return 0
+
+    # ----- operaciones del cache -----
+    def set(self, key: str, value: Any, ttl: int = 300, tags: Optional[Set[str]] = None,
+            pattern: Optional[str] = None, stale_ttl: int = 0, delta: float = 0.0,
+            meta: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Escribe en L2 y en el L1 local (con TTL acotado a l1_ttl)
+        """
+        tags = tags or self._extract_tags(key)
+        self.l2.set(key, value, ttl, tags, pattern, stale_ttl, delta, meta)
+        self._set_l1(key, value, ttl, set(tags), pattern, stale_ttl, delta, meta)
+
+    def _set_l1(self, key: str, value: Any, ttl: float, tags: Set[str], pattern: Optional[str],
+                stale_ttl: float = 0, delta: float = 0.0, meta: Optional[Dict[str, Any]] = None) -> None:
+        # Si el TTL se recorta, la entrada de L1 no debe parecer vencida antes que la de L2
+        l1_stale = min(stale_ttl, self._l1_ttl) if ttl <= self._l1_ttl else 0
+        with self._lock:
+            self.l1.set(key, value, min(ttl, self._l1_ttl), tags, pattern, l1_stale, delta, meta)
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Busca en L1 y, si no está, en L2 (promoviendo la entrada a L1)
+        """
+        value = self._get_l1(key)
+        if value is not None:
+            return value
+        return self._get_fresh_l2(key)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """Como get(); un hit de L1 se resuelve sin salir del event loop"""
+        value = self._get_l1(key)
+        if value is not None:
+            return value
+        return await asyncio.to_thread(self._get_fresh_l2, key)
+
+    def _get_l1(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self.l1.get(key)
+        if value is not None:
+            self._stats['l1_hits'] += 1
+        return value
+
+    def _get_fresh_l2(self, key: str) -> Optional[Any]:
+        entry = self._get_l2(key)
+        if entry is None or time.time() > entry[1]:
+            self._stats['misses'] += 1
+            return None
+        self._stats['l2_hits'] += 1
+        return entry[0]
+
+    def get_with_meta(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """
+        Como get(), pero también devuelve entradas en su ventana de gracia con sus metadatos
+        """
+        meta = self._get_l1_with_meta(key)
+        if meta is not None:
+            return meta
+        return self._get_l2_with_meta(key)
+
+    async def aget_with_meta(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """Como get_with_meta(); un hit de L1 se resuelve sin salir del event loop"""
+        meta = self._get_l1_with_meta(key)
+        if meta is not None:
+            return meta
+        return await asyncio.to_thread(self._get_l2_with_meta, key)
+
+    def _get_l1_with_meta(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        with self._lock:
+            meta = self.l1.get_with_meta(key)
+        if meta is not None:
+            self._stats['l1_hits'] += 1
+        return meta
+
+    def _get_l2_with_meta(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        entry = self._get_l2(key)
+        if entry is None:
+            self._stats['misses'] += 1
+            return None
+        self._stats['l2_hits'] += 1
+        return entry
+
+    def _get_l2(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """Lee de L2 y promueve a L1 las entradas todavía frescas"""
+        entry = self.l2.get_entry(key)
+        if entry is None:
+            return None
+
+        value, tags, pattern, remaining, fresh_until, delta = entry
+        fresh_for = min(fresh_until - time.time(), remaining or self._l1_ttl)
+        if fresh_for >= 1:
+            self._set_l1(key, value, int(fresh_for), tags, pattern, 0, delta)
+        return value, fresh_until, delta
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            self.l1.delete(key)
+        deleted = self.l2.delete(key)
+        self._publish('delete', key)
+        return deleted
+
+    def invalidate_by_tag(self, tag: str) -> int:
+        self._apply_local('tag', tag)
+        invalidated = self.l2.invalidate_by_tag(tag)
+        self._publish('tag', tag)
+        return invalidated
+
+    def invalidate_by_tags(self, tags: Iterable[str]) -> int:
+        tags = list(tags)
+        self._apply_local('tags', tags)
+        invalidated = self.l2.invalidate_by_tags(tags)
+        self._publish('tags', tags)
+        return invalidated
+
+    def invalidate_by_pattern(self, pattern: str) -> int:
+        self._apply_local('pattern', pattern)
+        invalidated = self.l2.invalidate_by_pattern(pattern)
+        self._publish('pattern', pattern)
+        return invalidated
+
+    def invalidate_where(self, tag: str, predicate: Callable[[Optional[Dict[str, Any]]], bool]) -> int:
+        """
+        Evalúa el predicado contra los metas de L2 y difunde las claves afectadas;
+        los demás workers sólo tienen que borrarlas de su L1
+        """
+        with self._lock:
+            self.l1.invalidate_where(tag, predicate)
+        try:
+            keys = self.l2.matching_keys(tag, predicate)
+            invalidated = self.l2.invalidate_keys(keys, tag)
+        except self.l2._errors() as e:
+            logger.warning(f"Redis cache invalidate_where failed for {tag}: {e}")
+            return 0
+        if keys:
+            self._publish('delete_many', keys)
+        return invalidated
+
+    def clear(self) -> None:
+        self._apply_local('clear', None)
+        self.l2.clear()
+        self._publish('clear')
+
+    def cleanup_expired(self) -> int:
+        with self._lock:
+            expired = self.l1.cleanup_expired()
+        return expired + self.l2.cleanup_expired()
+
+    async def run_reaper(self, interval: float, batch_size: int = 1000) -> None:
+        """
+        Reaper de TTL del L1: como AdvancedCache.run_reaper, pero cada lote se
+        elimina con el lock tomado, porque el hilo del listener también modifica el L1
+        """
+        stats = self.l1._reaper_stats
+        stats['running'] = True
+        stats['interval'] = interval
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                start = time.perf_counter()
+                reaped = 0
+                while True:
+                    with self._lock:
+                        removed = self.l1.reap_expired(max_items=batch_size)
+                    reaped += removed
+                    if removed < batch_size:
+                        break
+                    await asyncio.sleep(0)
+                stats['passes'] += 1
+                stats['reaped'] += reaped
+                stats['last_pass_at'] = datetime.utcnow().isoformat()
+                stats['last_pass_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        finally:
+            stats['running'] = False
+
+    def start_reaper(self, interval: float = CACHE_REAPER_INTERVAL,
+                     l2_interval: float = CACHE_REDIS_CLEANUP_INTERVAL) -> Optional[asyncio.Task]:
+        """
+        Inicia el reaper de TTL del L1 y la limpieza de índices de Redis
+        :return: La tarea del reaper del L1
+        """
+        self.l2.start_reaper(l2_interval)
+        if not interval or interval <= 0:
+            return None
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.get_running_loop().create_task(self.run_reaper(interval))
+            logger.info(f"L1 cache reaper started (interval: {interval}s)")
+        return self._reaper_task
+
+    async def stop_reaper(self) -> None:
+        task, self._reaper_task = self._reaper_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            logger.info("L1 cache reaper stopped")
+        await self.l2.stop_reaper()
+
+    def close(self) -> None:
+        """Detiene el hilo que escucha el canal de invalidaciones"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas por nivel: tasa de aciertos de L1, de L2 (sobre los misses de L1)
+        y global, más las estadísticas propias de cada backend
+        """
+        l1_hits = self._stats['l1_hits']
+        l2_hits = self._stats['l2_hits']
+        total_requests = l1_hits + l2_hits + self._stats['misses']
+        l2_requests = l2_hits + self._stats['misses']
+
+        def rate(hits: int, total: int) -> str:
+            return f"{(hits / total * 100) if total > 0 else 0:.2f}%"
+
+        with self._lock:
+            l1_stats = self.l1.get_stats()
+
+        return {
+            **self._stats,
+            'hits': l1_hits + l2_hits,
+            'total_requests': total_requests,
+            'hit_rate': rate(l1_hits + l2_hits, total_requests),
+            'l1_hit_rate': rate(l1_hits, total_requests),
+            'l2_hit_rate': rate(l2_hits, l2_requests),
+            'listening': self._listener is not None,
+            'backend': self.name,
+            'l1': l1_stats,
+            'l2': self.l2.get_stats()
+        }
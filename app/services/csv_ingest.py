@@ -0,0 +1,268 @@
+"""
+Lectura por bloques de los CSV de carga masiva (/upload_csv).
+
+El archivo llega como SpooledTemporaryFile (en disco a partir de cierto
+tamaño). En lugar de leerlo entero en memoria y probar cada combinación de
+encoding y separador sobre el archivo completo:
+
+- sniff_csv_format() detecta encoding y separador con los primeros
+  CSV_SNIFF_BYTES bytes
+- validate_csv() recorre el archivo en bloques de CSV_CHUNK_ROWS filas y junta
+  duplicados y errores de validación, sin tocar la base; si más adelante
+  aparece un byte que no es del encoding detectado, vuelve a empezar con el
+  siguiente (como hacía la lectura completa)
+- iter_registros() lo recorre otra vez en bloques, con las filas listas para
+  insertar
+
+Las columnas se leen como texto: los valores se validan y se guardan tal como
+vienen en el archivo, sin depender de los tipos que pandas infiera en cada
+bloque. La validación y la conversión a filas operan sobre columnas enteras
+(métodos .str de pandas y NumPy), sin recorrer el bloque fila por fila. La memoria depende del tamaño del bloque y no del archivo, salvo por
+los números de inspector ya vistos (duplicados) y la lista de errores.
+"""
+import codecs
+import io
+import logging
+import re
+import time
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.config import CSV_CHUNK_ROWS, CSV_SNIFF_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Se prueban en este orden, como la lectura anterior
+ENCODINGS = ("utf-8", "latin-1", "cp1252")
+SEPARATORS = (",", ";", "\t", "|")
+
+# Encabezados del CSV (exportación de la grilla) -> columnas de registros
+CSV_COLUMNS = {
+    "Número de inspector": "numero_inspector",
+    "Nombre": "nombre",
+    "Observaciones": "observaciones",
+    "Status": "status",
+    "Región": "region",
+    "Flota": "flota",
+    "Encargado": "encargado",
+    "Celular": "celular",
+    "Correo": "correo",
+    "Dirección": "direccion",
+    "Uso": "uso",
+    "Departamento": "departamento",
+    "Ciudad": "ciudad",
+    "Tecnología": "tecnologia",
+    "CMTS/OLT": "cmts_olt",
+    "ID Servicio": "id_servicio",
+    "MAC/SN": "mac_sn",
+    "UUID": "uuid",
+}
+
+NUMERO_COLUMN = "Número de inspector"
+
+EMAIL_REGEX = re.compile(r"^[\w\.-]+@[\w\.-]+\.\w+$")
+
+
+class CsvFormatError(Exception):
+    """No se pudo detectar el encoding o el separador del CSV"""
+
+
+class CsvFormat(NamedTuple):
+    encoding: str
+    sep: str
+
+
+class CsvScan(NamedTuple):
+    """Resultado de la pasada de validación"""
+    format: CsvFormat
+    rows: int
+    duplicates: List[Any]
+    errors: List[Dict[str, Any]]
+
+
+def sniff_csv_format(stream: BinaryIO, sample_bytes: int = CSV_SNIFF_BYTES) -> CsvFormat:
+    """
+    Detecta encoding y separador (el primero que da al menos 2 columnas) con una
+    muestra del inicio del archivo; deja el archivo al principio.
+    :raises CsvFormatError: Si ninguna combinación sirve
+    """
+    stream.seek(0)
+    sample = stream.read(sample_bytes)
+    truncated = bool(stream.read(1))
+    stream.seek(0)
+    if truncated and b"\n" in sample:
+        # Sólo líneas completas: la última podría estar cortada (o a mitad de un carácter)
+        sample = sample[:sample.rindex(b"\n") + 1]
+    encodings = ENCODINGS
+    if sample.startswith(codecs.BOM_UTF8):
+        encodings = ("utf-8-sig",)
+    for encoding in encodings:
+        try:
+            text = sample.decode(encoding)
+        except UnicodeDecodeError:
+            logger.debug(f"CSV sample is not {encoding}")
+            continue
+        for sep in SEPARATORS:
+            try:
+                columns = pd.read_csv(io.StringIO(text), sep=sep, dtype=str).columns
+            except Exception as e:
+                logger.debug(f"CSV sample with encoding '{encoding}' and separator '{sep}' failed: {e}")
+                continue
+            if len(columns) >= 2:
+                logger.info(f"CSV format detected from {len(sample)} bytes: encoding '{encoding}', separator '{sep}'")
+                return CsvFormat(encoding, sep)
+    raise CsvFormatError(f"Could not detect CSV format (encodings {encodings}, separators {SEPARATORS})")
+
+
+def read_csv_chunks(stream: BinaryIO, fmt: CsvFormat, chunk_rows: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Bloques de hasta chunk_rows (por defecto CSV_CHUNK_ROWS) filas con las columnas de
+    CSV_COLUMNS presentes. El índice sigue la numeración del archivo (fila de datos 0 = línea 2).
+    Un BOM UTF-8 se salta aunque el encoding sea otro (reintento tras un byte inválido).
+    """
+    stream.seek(0)
+    if stream.read(len(codecs.BOM_UTF8)) != codecs.BOM_UTF8:
+        stream.seek(0)
+    chunksize = chunk_rows or CSV_CHUNK_ROWS
+    with pd.read_csv(stream, encoding=fmt.encoding, sep=fmt.sep, dtype=str, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk[[column for column in CSV_COLUMNS if column in chunk.columns]]
+
+
+def _text(df: pd.DataFrame, column: str) -> pd.Series:
+    """
+    Valores de una columna sin espacios alrededor, como str(valor).strip() fila por
+    fila: una celda vacía queda como 'nan' y una columna ausente como ''.
+    """
+    if column not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[column].fillna("nan").str.strip()
+
+
+def _contains(values: pd.Series, patterns: pd.Series) -> np.ndarray:
+    """Si cada valor contiene el patrón de su misma fila"""
+    return np.char.find(values.to_numpy(dtype=str), patterns.to_numpy(dtype=str)) >= 0
+
+
+def _error_records(checks: List[tuple]) -> List[Dict[str, Any]]:
+    """
+    Errores de (columna, valores inválidos, mensaje) ordenados por fila y, dentro de
+    cada fila, en el orden de `checks`; el mensaje puede ser un texto o una Series.
+    """
+    frames = [
+        pd.DataFrame({"columna": columna, "valor": valores, "error": error}, index=valores.index)
+        for columna, valores, error in checks
+    ]
+    errores = pd.concat(frames).sort_index(kind="stable")
+    errores.insert(0, "fila", errores.index + 2)  # Considerando encabezado
+    return errores.to_dict("records")
+
+
+def field_errors(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Errores de número de inspector, celular y correo de un bloque"""
+    num_inspector = _text(df, NUMERO_COLUMN)
+    celular = _text(df, "Celular")
+    correo = _text(df, "Correo")
+    return _error_records([
+        (NUMERO_COLUMN, num_inspector[~num_inspector.str.isdigit()], "Debe ser numérico"),
+        ("Celular", celular[(celular != "") & (~celular.str.isdigit() | (celular.str.len() != 10))],
+         "Debe ser numérico de 10 dígitos"),
+        ("Correo", correo[(correo != "") & ~correo.str.match(EMAIL_REGEX)], "Debe ser un correo válido"),
+    ])
+
+
+def nombre_errors(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Errores de un bloque en que 'Nombre' no contiene ins{Número de inspector}"""
+    num_inspector = _text(df, NUMERO_COLUMN)
+    num_inspector = num_inspector[num_inspector.str.isdigit()]
+    nombre = _text(df, "Nombre")[num_inspector.index]
+    patron = "ins" + num_inspector
+    # Un solo dígito también vale con cero a la izquierda: ins3 o ins03
+    un_digito = num_inspector.str.len() == 1
+    encontrado = _contains(nombre, patron) | (un_digito & _contains(nombre, "ins0" + num_inspector))
+    error = ("Debe contener '" + patron + "'").where(
+        ~un_digito, "Debe contener '" + patron + "' o 'ins0" + num_inspector + "'"
+    )
+    return _error_records([("Nombre", nombre[~encontrado], error[~encontrado])])
+
+
+def _numero_key(value: str) -> Any:
+    """Clave de un número de inspector: '7', '07' y ' 7' son el mismo número al guardarse"""
+    value = value.strip()
+    return int(value) if value.isdigit() else value
+
+
+def _validate(stream: BinaryIO, fmt: CsvFormat, chunk_rows: Optional[int]) -> CsvScan:
+    first_row: Dict[Any, int] = {}
+    duplicated = set()
+    # Se reportan como antes: todos los errores de campo y después los de nombre
+    errores_campo: List[Dict[str, Any]] = []
+    errores_nombre: List[Dict[str, Any]] = []
+    rows = 0
+    for chunk in read_csv_chunks(stream, fmt, chunk_rows):
+        rows += len(chunk)
+        if NUMERO_COLUMN in chunk.columns:
+            for idx, value in chunk[NUMERO_COLUMN].dropna().items():
+                key = _numero_key(value)
+                if key in first_row:
+                    duplicated.add(key)
+                else:
+                    first_row[key] = idx
+        errores_campo.extend(field_errors(chunk))
+        errores_nombre.extend(nombre_errors(chunk))
+    # En el orden de su primera aparición en el archivo
+    duplicates = sorted(duplicated, key=first_row.__getitem__)
+    return CsvScan(fmt, rows, duplicates, errores_campo + errores_nombre)
+
+
+def validate_csv(stream: BinaryIO, fmt: CsvFormat, chunk_rows: Optional[int] = None) -> CsvScan:
+    """
+    Primera pasada: filas, números de inspector duplicados y errores de validación.
+    CsvScan.format es el formato con el que se leyó el archivo completo.
+    """
+    while True:
+        try:
+            return _validate(stream, fmt, chunk_rows)
+        except UnicodeDecodeError as e:
+            # Con BOM se empezó por utf-8-sig: se sigue con los encodings posteriores a utf-8
+            encoding = "utf-8" if fmt.encoding == "utf-8-sig" else fmt.encoding
+            remaining = ENCODINGS[ENCODINGS.index(encoding) + 1:] if encoding in ENCODINGS else ()
+            if not remaining:
+                raise CsvFormatError(f"CSV is not valid {fmt.encoding}: {e}") from e
+            logger.info(f"CSV is not valid {fmt.encoding} past the sample ({e}); retrying with {remaining[0]}")
+            fmt = fmt._replace(encoding=remaining[0])
+
+
+# Columnas del CSV que se guardan siempre (UUID sólo si viene en el archivo)
+REGISTRO_COLUMNS = {column: field for column, field in CSV_COLUMNS.items() if column != "UUID"}
+
+
+def registros(chunk: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Filas de un bloque con las columnas de registros, como str(valor): una celda vacía
+    queda como 'nan' y una columna ausente como '' (0 el número de inspector, que ya se
+    validó).
+    """
+    frame = chunk.reindex(columns=list(REGISTRO_COLUMNS), fill_value="").fillna("nan")
+    frame = frame.rename(columns=REGISTRO_COLUMNS)
+    frame["numero_inspector"] = chunk[NUMERO_COLUMN].astype("int64") if NUMERO_COLUMN in chunk.columns else 0
+    frame["uuid"] = chunk["UUID"].fillna("nan") if "UUID" in chunk.columns else None
+    # Con tolist() los valores ya son int/str de Python; más rápido que to_dict("records")
+    fields = list(frame.columns)
+    return [dict(zip(fields, values)) for values in zip(*(frame[field].tolist() for field in fields))]
+
+
+def iter_registros(stream: BinaryIO, fmt: CsvFormat, chunk_rows: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Segunda pasada: bloques de filas (columnas de registros) listas para insertar"""
+    for chunk in read_csv_chunks(stream, fmt, chunk_rows):
+        yield registros(chunk)
+
+
+def ingest_report(rows: int, started: float) -> Dict[str, Any]:
+    """Duración y filas por segundo de una carga iniciada en `started` (time.perf_counter())"""
+    seconds = time.perf_counter() - started
+    rate = rows / seconds if seconds > 0 else 0.0
+    logger.info(f"CSV ingest: {rows} rows in {seconds:.2f}s ({rate:.0f} rows/s)")
+    return {"duracion_segundos": round(seconds, 3), "filas_por_segundo": round(rate)}
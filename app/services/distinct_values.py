@@ -0,0 +1,262 @@
+"""
+Índice de valores distintos por columna de registros (/registros/unique_values).
+
+Los filtros de la grilla piden los valores de una columna en cada pulsación de
+tecla. En lugar de un SELECT DISTINCT (y una entrada de cache) por cada
+(columna, búsqueda), cada columna se lee una vez con GROUP BY y se guarda:
+
+- counts: valor -> número de registros que lo tienen
+- values: los valores en el orden de ORDER BY col, y keys: los mismos en
+  minúsculas como texto, para buscar por subcadena sin recalcularlos.
+  ORDER BY col depende de la collation: en SQLite (BINARY) es el orden de
+  código de Unicode de sorted(); en PostgreSQL la collation lingüística se
+  aproxima con collation_key (sin mayúsculas ni tildes, y el valor desempata)
+- prefixes: (clave, valor) ordenado por clave, para buscar prefijos con bisect
+
+Las búsquedas (prefijo o subcadena, el top-N por frecuencia y limit) se
+resuelven en memoria. Los cambios de un registro actualizan los conteos en el
+lugar; las cargas masivas descartan el índice y cada columna se vuelve a leer
+en su siguiente consulta. Las columnas con más de DISTINCT_MAX_VALUES valores
+(correo, id_servicio, ...) no se guardan: su índice de trigramas responde mejor
+y get() devuelve None para que se consulten a la base. Cada worker tiene su propio índice: tras
+TTL_CONFIG['valores_unicos'] segundos la columna se relee en segundo plano
+mientras se sigue respondiendo con los datos actuales.
+"""
+import asyncio
+import bisect
+import heapq
+import logging
+import time
+import unicodedata
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from app.db.models import Registro
+from app.db.search import like_regex
+from app.services.cache import TTL_CONFIG, single_flight
+
+logger = logging.getLogger(__name__)
+
+# Columnas admitidas por /registros/unique_values
+UNIQUE_VALUES_COLUMNS = (
+    "numero_inspector", "nombre", "observaciones", "status", "region",
+    "flota", "encargado", "celular", "correo", "direccion", "uso",
+    "departamento", "ciudad", "tecnologia", "cmts_olt", "id_servicio", "mac_sn"
+)
+
+# Modos de búsqueda: ILIKE '%search%' (como antes) o ILIKE 'search%'
+MATCH_INFIX = "contiene"
+MATCH_PREFIX = "prefijo"
+MATCH_MODES = (MATCH_INFIX, MATCH_PREFIX)
+
+# Orden de los valores: el de ORDER BY col o de más a menos registros
+ORDER_ALPHABETICAL = "alfabetico"
+ORDER_FREQUENCY = "frecuencia"
+ORDERS = (ORDER_ALPHABETICAL, ORDER_FREQUENCY)
+
+# Máximo de valores distintos que se guardan en memoria por columna
+DISTINCT_MAX_VALUES = 50_000
+
+
+def _key(value: Any) -> str:
+    """Clave de búsqueda de un valor: su texto en minúsculas (ILIKE)"""
+    return str(value).lower()
+
+
+def collation_key(value: Any) -> Any:
+    """
+    Clave de orden que aproxima una collation lingüística (en_US.UTF-8, ICU):
+    primero el texto sin mayúsculas ni tildes y, en empate, el valor original
+    """
+    if not isinstance(value, str):
+        return value
+    folded = "".join(c for c in unicodedata.normalize("NFKD", value.casefold()) if not unicodedata.combining(c))
+    return folded, value
+
+
+def sort_key_for(dialect_name: str) -> Optional[Callable[[Any], Any]]:
+    """Clave de orden equivalente a ORDER BY col en el dialecto (None = orden natural de Python)"""
+    return None if dialect_name == "sqlite" else collation_key
+
+
+class ColumnValues:
+    """Valores distintos (no nulos) de una columna con su número de registros"""
+
+    def __init__(self, counts: Dict[Any, int], sort_key: Optional[Callable[[Any], Any]] = None):
+        self.counts = counts
+        self.sort_key = sort_key
+        self.values = sorted(counts, key=sort_key)
+        self.keys = [_key(value) for value in self.values]
+        self.prefixes = sorted(zip(self.keys, self.values))
+        self.built_at = time.monotonic()
+
+    def add(self, value: Any, delta: int) -> None:
+        """Suma delta registros a value; lo agrega o lo quita de los valores si hace falta"""
+        if value is None:
+            return
+        count = self.counts.get(value, 0) + delta
+        if count > 0:
+            if value not in self.counts:
+                pos = self._position(value)
+                self.values.insert(pos, value)
+                self.keys.insert(pos, _key(value))
+                bisect.insort(self.prefixes, (_key(value), value))
+            self.counts[value] = count
+        elif value in self.counts:
+            del self.counts[value]
+            pos = self._position(value)
+            del self.values[pos]
+            del self.keys[pos]
+            del self.prefixes[bisect.bisect_left(self.prefixes, (_key(value), value))]
+
+    def _position(self, value: Any) -> int:
+        if self.sort_key is None:
+            return bisect.bisect_left(self.values, value)
+        return bisect.bisect_left(self.values, self.sort_key(value), key=self.sort_key)
+
+    def _matches(self, search: str, mode: str, first: Optional[int] = None) -> Iterable[Any]:
+        """
+        Valores que coinciden con la búsqueda, en el orden de ORDER BY col
+        :param first: Si sólo hacen falta los primeros N (evita ordenar todos los prefijos)
+        """
+        if not search:
+            return self.values
+        literal = "%" not in search and "_" not in search
+        needle = search.lower()
+        if mode == MATCH_PREFIX and literal:
+            start = bisect.bisect_left(self.prefixes, (needle,))
+            found = []
+            for key, value in islice(self.prefixes, start, None):
+                if not key.startswith(needle):
+                    break
+                found.append(value)
+            # Vienen en el orden de las claves en minúsculas, no en el de ORDER BY col
+            if first is not None:
+                return heapq.nsmallest(first, found, key=self.sort_key)
+            return sorted(found, key=self.sort_key)
+        if literal:
+            return (value for value, key in zip(self.values, self.keys) if needle in key)
+        pattern = like_regex(search, prefix=mode == MATCH_PREFIX)
+        return (value for value in self.values if pattern.fullmatch(str(value)) is not None)
+
+    def lookup(self, search: str = "", mode: str = MATCH_INFIX, order: str = ORDER_ALPHABETICAL,
+               limit: Optional[int] = None) -> List[Tuple[Any, int]]:
+        """
+        Pares (valor, registros) que coinciden con search
+        :param mode: MATCH_INFIX (subcadena) o MATCH_PREFIX
+        :param order: ORDER_ALPHABETICAL u ORDER_FREQUENCY (empates en orden alfabético)
+        :param limit: Máximo de valores (None = todos)
+        """
+        if order == ORDER_FREQUENCY:
+            matches = self._matches(search, mode)
+            # Los valores llegan ordenados: el índice desempata como ORDER BY col
+            ranked = ((-self.counts[value], pos, value) for pos, value in enumerate(matches))
+            top = heapq.nsmallest(limit, ranked) if limit is not None else sorted(ranked)
+            return [(value, -count) for count, _, value in top]
+        matches = self._matches(search, mode, limit)
+        return [(value, self.counts[value]) for value in islice(matches, limit)]
+
+
+class DistinctValueIndex:
+    """Valores distintos por columna, leídos bajo demanda y mantenidos con los cambios"""
+
+    def __init__(self, max_age: Optional[float] = TTL_CONFIG['valores_unicos']):
+        self.max_age = max_age
+        self._columns: Dict[str, ColumnValues] = {}
+        # Columnas con demasiados valores: momento en que se comprobó (se revisa tras max_age)
+        self._oversized: Dict[str, float] = {}
+        # Cambia con cada escritura: una lectura que se cruza con un cambio no se guarda
+        self._generation = 0
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._session_factory: Optional[Callable[[], Any]] = None
+        self.stats = {"builds": 0, "changes": 0, "queries": 0}
+
+    async def _read(self, session, column: str, max_values: Optional[int] = None) -> Optional[ColumnValues]:
+        """Valores de la columna con su conteo (None si hay más de max_values)"""
+        model_col = getattr(Registro, column)
+        stmt = select(model_col, func.count()).where(model_col.isnot(None)).group_by(model_col)
+        if max_values is not None:
+            stmt = stmt.limit(max_values + 1)
+        counts = dict((await session.execute(stmt)).all())
+        if max_values is not None and len(counts) > max_values:
+            return None
+        return ColumnValues(counts, sort_key_for(session.bind.dialect.name))
+
+    async def _build(self, session, column: str) -> Optional[ColumnValues]:
+        generation = self._generation
+        values = await self._read(session, column, DISTINCT_MAX_VALUES)
+        self.stats["builds"] += 1
+        if values is None:
+            self._oversized[column] = time.monotonic()
+            self._columns.pop(column, None)
+            logger.info(f"Distinct value index skipped for {column}: more than {DISTINCT_MAX_VALUES} values")
+        elif generation == self._generation:
+            self._columns[column] = values
+            self._oversized.pop(column, None)
+            logger.info(f"Distinct value index built for {column}: {len(values.counts)} values")
+        return values
+
+    async def _refresh(self, column: str) -> None:
+        try:
+            session_factory = self._session_factory
+            if session_factory is None:
+                from app.db.connection import async_session_factory
+                session_factory = async_session_factory
+            async with session_factory() as session:
+                await self._build(session, column)
+        except Exception as e:
+            logger.error(f"Error refreshing distinct value index for {column}: {e}")
+        finally:
+            self._refreshing.pop(column, None)
+
+    async def get(self, session, column: str) -> Optional[ColumnValues]:
+        """
+        Valores de la columna; la primera vez (o tras una carga masiva) se leen de la base.
+        None si la columna tiene demasiados valores para guardarla en memoria.
+        """
+        self.stats["queries"] += 1
+        checked = self._oversized.get(column)
+        if checked is not None and not (self.max_age and time.monotonic() - checked > self.max_age):
+            return None
+        values = self._columns.get(column)
+        if values is None:
+            return await single_flight.do(f"distinct_values:{column}", lambda: self._build(session, column))
+        if self.max_age and time.monotonic() - values.built_at > self.max_age and column not in self._refreshing:
+            # Se sigue respondiendo con los valores actuales mientras se relee la columna
+            self._refreshing[column] = asyncio.get_running_loop().create_task(self._refresh(column))
+        return values
+
+    def apply(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """Aplica el cambio de un registro (old -> new, como invalidate_registro_change)"""
+        self._generation += 1
+        self.stats["changes"] += 1
+        for column, values in self._columns.items():
+            before = old.get(column) if old is not None else None
+            after = new.get(column) if new is not None else None
+            if before != after:
+                values.add(before, -1)
+                values.add(after, 1)
+
+    def clear(self) -> None:
+        """Descarta todas las columnas tras una carga masiva"""
+        self._generation += 1
+        self._columns.clear()
+        self._oversized.clear()
+
+    async def stop(self) -> None:
+        """Cancela las relecturas de columnas en curso (evento de cierre)"""
+        tasks = [task for task in self._refreshing.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refreshing.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, columns={column: len(values.counts) for column, values in self._columns.items()},
+                    oversized=sorted(self._oversized))
+
+
+# Instancia global (una por proceso)
+distinct_values = DistinctValueIndex()
@@ -0,0 +1,143 @@
+"""
+Paginación por cursor (keyset) para los listados de registros.
+
+En lugar de OFFSET, cada página continúa a partir de la clave de orden de la
+última fila vista: (clave_de_orden..., id). El cursor es un token opaco que
+codifica esa clave junto con el orden pedido, de modo que cada página es una
+búsqueda por rango sobre el índice sin importar qué tan profunda sea.
+"""
+import base64
+import json
+import logging
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import String, and_, case, or_, tuple_
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.db.models import Registro
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCursorError(ValueError):
+    """El cursor no se puede decodificar o no corresponde al orden pedido"""
+
+
+def excel_group_expr() -> ColumnElement:
+    """
+    Grupo del ordenamiento tipo Excel de numero_inspector:
+    1 si el número empieza por un dígito, 2 en otro caso.
+    Es la definición original; las consultas ordenan por la columna generada
+    Registro.orden_excel (EXCEL_GROUP_SQL), equivalente e indexada.
+    """
+    return case(
+        *[(Registro.numero_inspector.cast(String).like(f'{digit}%'), 1) for digit in range(10)],
+        else_=2
+    )
+
+
+def excel_group(numero_inspector: Any) -> int:
+    """Equivalente en Python de excel_group_expr() para una fila ya cargada"""
+    return 1 if str(numero_inspector)[:1].isdigit() else 2
+
+
+def _sort_column(sort_by: str) -> Optional[ColumnElement]:
+    """Columna de Registro por la que se ordena (None si no existe o es generada)"""
+    column = Registro.__table__.columns.get(sort_by)
+    if column is not None and column.computed is None:
+        return getattr(Registro, sort_by)
+    return None
+
+
+def is_descending(sort_by: str, sort_dir: str) -> bool:
+    """Las columnas desconocidas se ordenan por id ascendente, como antes"""
+    return sort_dir != "asc" and (sort_by == "numero_inspector" or _sort_column(sort_by) is not None)
+
+
+def sort_keys(sort_by: str) -> List[ColumnElement]:
+    """Expresiones de la clave de orden; id siempre va al final como desempate"""
+    if sort_by == "numero_inspector":
+        # Mismo orden que excel_group_expr(), servido por el índice idx_orden_excel
+        return [Registro.orden_excel, Registro.numero_inspector, Registro.id]
+    col = _sort_column(sort_by)
+    if col is None or col is Registro.id:
+        return [Registro.id]
+    return [col, Registro.id]
+
+
+def _is_nullable(sort_by: str) -> bool:
+    col = _sort_column(sort_by)
+    return col is not None and col is not Registro.id and col.nullable
+
+
+def order_by_clauses(sort_by: str, sort_dir: str) -> List[ColumnElement]:
+    """
+    ORDER BY de la clave de orden. Los nulos (sólo uuid admite nulos) van al
+    final en ambos sentidos, igual en SQLite y PostgreSQL.
+    """
+    descending = is_descending(sort_by, sort_dir)
+    clauses = []
+    for expr in sort_keys(sort_by):
+        clause = expr.desc() if descending else expr.asc()
+        clauses.append(clause.nulls_last() if expr is _sort_column(sort_by) and _is_nullable(sort_by) else clause)
+    return clauses
+
+
+def row_key(registro: Any, sort_by: str) -> List[Any]:
+    """Valores de la clave de orden de una fila (en el mismo orden que sort_keys)"""
+    if sort_by == "numero_inspector":
+        return [excel_group(registro.numero_inspector), registro.numero_inspector, registro.id]
+    col = _sort_column(sort_by)
+    if col is None or col is Registro.id:
+        return [registro.id]
+    return [getattr(registro, sort_by), registro.id]
+
+
+def seek_condition(sort_by: str, sort_dir: str, values: Sequence[Any]) -> ColumnElement:
+    """
+    Condición WHERE para continuar después de la fila con clave `values`.
+    Se compara la clave completa como row value, (a, b) > (x, y), que ambos
+    motores resuelven como un rango sobre el índice compuesto.
+    """
+    descending = is_descending(sort_by, sort_dir)
+    keys = sort_keys(sort_by)
+
+    def after(exprs, vals):
+        left = exprs[0] if len(exprs) == 1 else tuple_(*exprs)
+        right = vals[0] if len(vals) == 1 else tuple_(*vals)
+        return left < right if descending else left > right
+
+    if _is_nullable(sort_by):
+        col = keys[0]
+        value, last_id = values
+        if value is None:
+            # Dentro del grupo de nulos (al final) sólo queda desempatar por id
+            return and_(col.is_(None), after([Registro.id], [last_id]))
+        return or_(col.is_(None), after(keys, values))
+    return after(keys, values)
+
+
+def encode_cursor(sort_by: str, sort_dir: str, values: Sequence[Any]) -> str:
+    """Codifica la clave de la última fila como token opaco (base64 url-safe)"""
+    raw = json.dumps([sort_by, sort_dir, list(values)], separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_dir: str) -> List[Any]:
+    """
+    Decodifica un cursor y comprueba que corresponda al orden pedido.
+    :raises InvalidCursorError: Si el token está mal formado o es de otro orden
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort_by, cursor_sort_dir, values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Cursor inválido") from e
+
+    if (cursor_sort_by, cursor_sort_dir) != (sort_by, sort_dir):
+        raise InvalidCursorError("El cursor corresponde a otro ordenamiento")
+    if not isinstance(values, list) or len(values) != len(sort_keys(sort_by)):
+        raise InvalidCursorError("Cursor inválido")
+    if not isinstance(values[-1], int) or (None in values and not _is_nullable(sort_by)):
+        raise InvalidCursorError("Cursor inválido")
+    return values
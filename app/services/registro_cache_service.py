@@ -2,73 +2,207 @@
 Servicio especializado para cache de registros
 """
 import logging
-from typing import Optional, List, Dict, Any
+from types import SimpleNamespace
+from typing import Optional, List, Dict, Any, Callable, Awaitable, NamedTuple, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func, and_, or_, cast, String, desc
-from sqlalchemy import case
+from sqlalchemy import func, and_, cast, String, desc
+from pydantic import TypeAdapter
 
+from app.config import CSV_DIFF_INVALIDATION_LIMIT
 from app.db.models import Registro, HistorialCambio
-from app.services.cache import cache, generate_cache_key, save_to_cache, TTL_CONFIG
+from app.db.search import infix_match, like_regex, order_by_relevance
+from app.services.cache import (
+    cache, generate_cache_key, cache_key_prefix, asave_to_cache, TTL_CONFIG, single_flight, cached_with_refresh, refresh_stats
+)
+from app.services.distinct_values import (
+    MATCH_INFIX, MATCH_PREFIX, ORDER_ALPHABETICAL, ORDER_FREQUENCY, UNIQUE_VALUES_COLUMNS, distinct_values
+)
+from app.services.registro_filters import RegistroFilterSpec, column_condition, row_matches_filters
+from app.services.registro_snapshot import registro_snapshot
+from app.services.pagination import (
+    InvalidCursorError, decode_cursor, encode_cursor, order_by_clauses, row_key, seek_condition
+)
 from app.schemas.respuesta import TotalRegistrosResponse
+from app.schemas.registro import RegistroOut
 
 logger = logging.getLogger(__name__)
 
+# Serializador de RegistroOut (pydantic-core): mismo JSON que response_model
+_registro_adapter = TypeAdapter(RegistroOut)
+_registro_list_adapter = TypeAdapter(List[RegistroOut])
+
+
+def encode_registro(registro: Any) -> bytes:
+    """
+    Serializa un registro a JSON con el esquema RegistroOut (mismo contenido que
+    devolvería FastAPI con response_model=RegistroOut)
+    """
+    return _registro_adapter.dump_json(_registro_adapter.validate_python(registro, from_attributes=True))
+
+
+def encode_registros(registros: List[Any]) -> bytes:
+    """Serializa una lista de registros a JSON con el esquema RegistroOut"""
+    return _registro_list_adapter.dump_json(
+        _registro_list_adapter.validate_python(registros, from_attributes=True)
+    )
+
+
+class RegistroPage(NamedTuple):
+    """
+    Página de registros ya serializada y el cursor de la siguiente (None si es la última).
+    total sólo se rellena con include_total; el conteo se cachea aparte ('registros_total').
+    """
+    payload: bytes
+    next_cursor: Optional[str]
+    total: Optional[int] = None
+
+
+# Parámetros de paginación/orden que no forman parte del predicado de una lista
+_LIST_PARAMS = {"limit", "offset", "sort_by", "sort_dir", "cursor"}
+
+# sort_by que ordena los resultados de la búsqueda global (q=) por relevancia
+RELEVANCE_SORT = "relevancia"
+
+# Columnas de los desplegables de filtros de la grilla (facetas por defecto)
+FACET_COLUMNS = ("region", "ciudad", "tecnologia", "flota", "uso", "status")
+
+def change_affects_entry(meta: Optional[Dict[str, Any]], old: Optional[Dict[str, Any]],
+                         new: Optional[Dict[str, Any]]) -> bool:
+    """
+    Decide si el cambio de un registro (old -> new) puede alterar una entrada del cache.
+    Las entradas sin meta o de operaciones desconocidas se invalidan siempre.
+    """
+    if meta is None:
+        return True
+    operation = meta.get("operation")
+    params = meta.get("params", {})
+    
+    if operation == "registros_lista":
+        # La página cambia si el registro estaba o queda dentro del resultado
+        filters = {k: v for k, v in params.items() if k not in _LIST_PARAMS}
+        return row_matches_filters(filters, old) or row_matches_filters(filters, new)
+    if operation in ("total_registros", "registros_total"):
+        # El conteo sólo cambia si el registro entra o sale del resultado (/registros/total
+        # combina siempre los filtros con AND)
+        global_or = operation == "registros_total"
+        return row_matches_filters(params, old, global_or) != row_matches_filters(params, new, global_or)
+    if operation == "registros_facetas":
+        # Los conteos cambian si el registro entra o sale del resultado, o si dentro
+        # de él cambia el valor de alguna de las columnas contadas
+        filters = {k: v for k, v in params.items() if k != "facetas"}
+        before, after = row_matches_filters(filters, old), row_matches_filters(filters, new)
+        if before and after:
+            return any(old.get(column) != new.get(column) for column in params.get("facetas", "").split(","))
+        return before or after
+    if operation == "valores_unicos":
+        column = params.get("column")
+        search = params.get("search") or ""
+        pattern = like_regex(search, prefix=params.get("mode") == MATCH_PREFIX)
+        before = old.get(column) if old else None
+        after = new.get(column) if new else None
+        if old is not None and new is not None and before == after:
+            return False
+        return any(
+            value is not None and (not search or pattern.fullmatch(str(value)) is not None)
+            for value in (before, after)
+        )
+    if operation == "registro_individual":
+        return params.get("id") in {row.get("id") for row in (old, new) if row}
+    if operation == "historial":
+        numeros = {str(row.get("numero_inspector")) for row in (old, new) if row}
+        return str(params.get("numero_inspector")) in numeros
+    return True
+
+
+def _filter_spec(spec: Optional[RegistroFilterSpec], filters: Dict[str, Any]) -> RegistroFilterSpec:
+    """Filtros ya interpretados por la ruta (registro_filters) o a partir de los parámetros sueltos"""
+    return spec if spec is not None else RegistroFilterSpec.from_params(**filters)
+
 
 class RegistroCacheService:
     """Servicio especializado para cache de operaciones con registros"""
     
     @staticmethod
-    def _build_filters(**filters) -> List:
-        """Construye filtros para consultas de registros"""
-        filter_list = []
-        for field, value in filters.items():
-            if value is not None:
-                if str(value).startswith("__EXACT__"):
-                    valor = str(value)[9:]
-                    expr = cast(getattr(Registro, field), String) == valor
-                else:
-                    expr = cast(getattr(Registro, field), String).ilike(f"%{value}%")
-                filter_list.append(expr)
-        return filter_list
+    def _with_own_session(load: Callable[[AsyncSession], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+        """
+        Adapta un cálculo para ejecutarse en segundo plano con su propia sesión,
+        ya que la sesión de la petición se cierra al terminar la respuesta
+        """
+        async def run():
+            from app.db.connection import async_session_factory
+            async with async_session_factory() as db_session:
+                return await load(db_session)
+        return run
     
     @staticmethod
     async def get_cached_total_registros(
         session: AsyncSession, 
+        spec: Optional[RegistroFilterSpec] = None,
         **filters
     ) -> Optional[TotalRegistrosResponse]:
         """
-        Obtiene el total de registros desde cache o base de datos
+        Obtiene el total de registros desde cache o base de datos.
+        Los filtros de columna se combinan siempre con AND.
+        Al vencer se sigue sirviendo el valor anterior mientras se recalcula
+        en segundo plano (ver SWR_CONFIG).
         """
+        spec = _filter_spec(spec, filters)._replace(global_or=False)
+        filters = spec.params
+        
+        # Con el snapshot en memoria el conteo es una máscara vectorizada: no se cachea
+        if registro_snapshot.ready:
+            return {"total": registro_snapshot.count(filters, global_or=False)}
+        
         # Generar clave de cache
         cache_key = generate_cache_key("total_registros", **filters)
         
-        # Intentar obtener del cache
-        cached_result = cache.get(cache_key)
-        if cached_result is not None:
-            logger.info(f"Cache hit for total registros with filters: {filters}")
-            return cached_result
+        # Calcular desde BD (el resultado lo guarda cached_with_refresh)
+        async def load(db_session: AsyncSession):
+            try:
+                total = await db_session.scalar(spec.count_statement())
+                logger.info(f"Calculated total registros: {total}")
+                return {"total": total}
+                
+            except Exception as e:
+                logger.error(f"Error calculating total registros: {e}")
+                return None
         
-        # Si no está en cache, calcular desde BD
-        try:
-            filter_list = RegistroCacheService._build_filters(**filters)
-            stmt = select(func.count()).select_from(Registro)
-            
-            if filter_list:
-                stmt = stmt.where(and_(*filter_list))
-            
-            total = await session.scalar(stmt)
-            result = {"total": total}
-            
-            # Guardar en cache
-            save_to_cache("total_registros", result, TTL_CONFIG['estadisticas'], **filters)
-            logger.info(f"Calculated and cached total registros: {total}")
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error calculating total registros: {e}")
-            return None
+        return await cached_with_refresh(
+            "total_registros", cache_key, TTL_CONFIG['estadisticas'],
+            lambda: load(session), RegistroCacheService._with_own_session(load),
+            params=filters
+        )
+    
+    @staticmethod
+    async def get_cached_list_total(
+        session: AsyncSession,
+        spec: Optional[RegistroFilterSpec] = None,
+        **filters
+    ) -> Optional[Dict[str, int]]:
+        """
+        Total de registros del listado con los mismos filtros y la misma lógica
+        OR de búsqueda global que get_cached_registros_list (ver include_total)
+        """
+        spec = _filter_spec(spec, filters)
+        filters = spec.params
+        if registro_snapshot.ready:
+            return {"total": registro_snapshot.count(filters)}
+        
+        cache_key = generate_cache_key("registros_total", **filters)
+        
+        async def load(db_session: AsyncSession):
+            try:
+                return {"total": await db_session.scalar(spec.count_statement())}
+            except Exception as e:
+                logger.error(f"Error calculating registros list total: {e}")
+                return None
+        
+        return await cached_with_refresh(
+            "registros_total", cache_key, TTL_CONFIG['estadisticas'],
+            lambda: load(session), RegistroCacheService._with_own_session(load),
+            params=filters
+        )
     
     @staticmethod
     async def get_cached_registros_list(
@@ -77,11 +211,37 @@ class RegistroCacheService:
         offset: int = 0,
         sort_by: str = "id",
         sort_dir: str = "asc",
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+        spec: Optional[RegistroFilterSpec] = None,
         **filters
-    ) -> Optional[List[Registro]]:
+    ) -> Optional[RegistroPage]:
         """
-        Obtiene lista de registros desde cache o base de datos
+        Obtiene una página de registros desde cache o base de datos, ya serializada
+        como JSON (List[RegistroOut]) lista para devolver en un Response.
+        Con `cursor` la página continúa tras la última fila de la anterior
+        (keyset) y se ignora `offset`.
+        Con `include_total` también devuelve el total de registros que cumplen los
+        filtros; se calcula en la misma consulta con count(*) over() y se cachea
+        aparte de la página para que los cambios de página lo reutilicen.
+        Con la búsqueda global (`q` en filters) y sort_by="relevancia" las filas se
+        ordenan por relevancia; ese orden se pagina con offset, sin cursor.
+        :param spec: Filtros ya interpretados (si no, se leen de **filters)
+        :raises InvalidCursorError: Si el cursor no es válido para el orden pedido
         """
+        spec = _filter_spec(spec, filters)
+        filters = spec.params
+        by_relevance = sort_by == RELEVANCE_SORT and bool(filters.get("q"))
+        if by_relevance and cursor:
+            raise InvalidCursorError("El orden por relevancia no admite cursor; usar offset")
+        after = decode_cursor(cursor, sort_by, sort_dir) if cursor else None
+        
+        # El snapshot en memoria responde sin SQL ni cache (salvo el orden por relevancia, que usa el índice)
+        if registro_snapshot.ready and not by_relevance:
+            return RegistroCacheService._snapshot_page(
+                limit, offset, sort_by, sort_dir, after, include_total, filters
+            )
+        
         # Generar clave de cache
         cache_key = generate_cache_key(
             "registros_lista", 
@@ -89,126 +249,152 @@ class RegistroCacheService:
             offset=offset, 
             sort_by=sort_by, 
             sort_dir=sort_dir,
+            cursor=cursor,
             **filters
         )
         
         # Intentar obtener del cache
-        cached_result = cache.get(cache_key)
+        cached_result = await cache.aget(cache_key)
         if cached_result is not None:
             logger.info(f"Cache hit for registros list with params: limit={limit}, offset={offset}")
-            return cached_result
+            return await RegistroCacheService._with_list_total(session, cached_result, include_total, spec)
         
-        # Si no está en cache, consultar BD
-        try:
-            query = select(Registro)
-            filter_list = RegistroCacheService._build_filters(**filters)
-            
-            # Aplicar filtros
-            if filter_list:
-                # Lógica OR para búsqueda global
-                use_or = False
-                if len(filter_list) > 1:
-                    # Verificar si todos los filtros tienen el mismo valor (búsqueda global)
-                    filter_values = [f for f in filters.values() if f is not None]
-                    if len(set(filter_values)) == 1 and len(filter_values) > 1:
-                        use_or = True
+        # Si no está en cache, consultar BD (una sola vez por clave)
+        async def load():
+            try:
+                where = spec.where()
+                # El conteo por ventana sólo sirve sin cursor: el rango del cursor recortaría el total
+                with_total = (
+                    include_total and after is None
+                    and await cache.aget(generate_cache_key("registros_total", **filters)) is None
+                )
+                query = select(Registro, func.count().over().label("total")) if with_total else select(Registro)
+                if where is not None:
+                    query = query.where(where)
                 
-                if use_or:
-                    query = query.where(or_(*filter_list))
+                # Ordenamiento por (clave, id); numero_inspector usa el orden tipo Excel
+                if by_relevance:
+                    query = order_by_relevance(query, Registro.__table__, filters["q"], session.bind.dialect.name)
                 else:
-                    query = query.where(and_(*filter_list))
-            
-            # Aplicar ordenamiento
-            if sort_by == "numero_inspector":
-                # Ordenamiento especial tipo Excel
-                case_expr = case(
-                    (Registro.numero_inspector.cast(String).like('0%'), 1),
-                    (Registro.numero_inspector.cast(String).like('1%'), 1),
-                    (Registro.numero_inspector.cast(String).like('2%'), 1),
-                    (Registro.numero_inspector.cast(String).like('3%'), 1),
-                    (Registro.numero_inspector.cast(String).like('4%'), 1),
-                    (Registro.numero_inspector.cast(String).like('5%'), 1),
-                    (Registro.numero_inspector.cast(String).like('6%'), 1),
-                    (Registro.numero_inspector.cast(String).like('7%'), 1),
-                    (Registro.numero_inspector.cast(String).like('8%'), 1),
-                    (Registro.numero_inspector.cast(String).like('9%'), 1),
-                    else_=2
-                )
+                    query = query.order_by(*order_by_clauses(sort_by, sort_dir))
                 
-                if sort_dir == "asc":
-                    query = query.order_by(case_expr, Registro.numero_inspector.asc())
+                # Aplicar paginación: búsqueda por rango con cursor, OFFSET sin él
+                if after is not None:
+                    query = query.where(seek_condition(sort_by, sort_dir, after))
                 else:
-                    query = query.order_by(case_expr.desc(), Registro.numero_inspector.desc())
-            else:
-                # Ordenamiento genérico
-                col = getattr(Registro, sort_by, None)
-                if col is not None:
-                    if sort_dir == "asc":
-                        query = query.order_by(col.asc())
-                    else:
-                        query = query.order_by(col.desc())
+                    query = query.offset(offset)
+                query = query.limit(limit)
+                
+                result = await session.execute(query)
+                total = None
+                if with_total:
+                    rows = result.all()
+                    registros = [row[0] for row in rows]
+                    # Una página vacía más allá del final no dice cuántos hay
+                    total = rows[0].total if rows else (0 if offset == 0 else None)
+                    if total is not None:
+                        await asave_to_cache("registros_total", {"total": total}, TTL_CONFIG['estadisticas'], **filters)
                 else:
-                    query = query.order_by(Registro.id.asc())
-            
-            # Aplicar paginación
-            query = query.offset(offset).limit(limit)
-            
-            result = await session.execute(query)
-            registros = result.scalars().all()
-            
-            # Guardar en cache
-            save_to_cache(
-                "registros_lista", 
-                registros, 
-                TTL_CONFIG['registros_lista'],
-                limit=limit,
-                offset=offset,
-                sort_by=sort_by,
-                sort_dir=sort_dir,
-                **filters
-            )
-            
-            logger.info(f"Retrieved and cached {len(registros)} registros")
-            return registros
-            
-        except Exception as e:
-            logger.error(f"Error retrieving registros list: {e}")
-            return None
+                    registros = result.scalars().all()
+                next_cursor = None
+                if len(registros) == limit and not by_relevance:
+                    next_cursor = encode_cursor(sort_by, sort_dir, row_key(registros[-1], sort_by))
+                page = RegistroPage(encode_registros(registros), next_cursor)
+                
+                # Guardar en cache los bytes, no las instancias ORM
+                await asave_to_cache(
+                    "registros_lista", 
+                    page, 
+                    TTL_CONFIG['registros_lista'],
+                    limit=limit,
+                    offset=offset,
+                    sort_by=sort_by,
+                    sort_dir=sort_dir,
+                    cursor=cursor,
+                    **filters
+                )
+                
+                logger.info(f"Retrieved and cached {len(registros)} registros")
+                return page._replace(total=total)
+                
+            except Exception as e:
+                logger.error(f"Error retrieving registros list: {e}")
+                return None
+        
+        page = await single_flight.do(cache_key, load)
+        return await RegistroCacheService._with_list_total(session, page, include_total, spec)
+    
+    @staticmethod
+    def _snapshot_page(
+        limit: int,
+        offset: int,
+        sort_by: str,
+        sort_dir: str,
+        after: Optional[List[Any]],
+        include_total: bool,
+        filters: Dict[str, Any]
+    ) -> RegistroPage:
+        """Página del listado calculada sobre el snapshot columnar de registros"""
+        rows = registro_snapshot.page(filters, sort_by, sort_dir, offset, limit, after)
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = encode_cursor(sort_by, sort_dir, row_key(SimpleNamespace(**rows[-1]), sort_by))
+        total = registro_snapshot.count(filters) if include_total else None
+        return RegistroPage(encode_registros(rows), next_cursor, total)
+    
+    @staticmethod
+    async def _with_list_total(
+        session: AsyncSession,
+        page: Optional[RegistroPage],
+        include_total: bool,
+        spec: RegistroFilterSpec
+    ) -> Optional[RegistroPage]:
+        """Completa el total de la página desde su propia entrada de cache si hace falta"""
+        if not include_total or page is None or page.total is not None:
+            return page
+        total = await RegistroCacheService.get_cached_list_total(session, spec)
+        return page._replace(total=total["total"] if total else None)
     
     @staticmethod
     async def get_cached_registro_by_id(
         session: AsyncSession,
         registro_id: int
-    ) -> Optional[Registro]:
+    ) -> Optional[bytes]:
         """
-        Obtiene un registro individual desde cache o base de datos
+        Obtiene un registro individual desde cache o base de datos, ya serializado
+        como JSON (RegistroOut). Devuelve None si no existe.
         """
         # Generar clave de cache
         cache_key = generate_cache_key("registro_individual", id=registro_id)
         
         # Intentar obtener del cache
-        cached_result = cache.get(cache_key)
+        cached_result = await cache.aget(cache_key)
         if cached_result is not None:
             logger.info(f"Cache hit for registro ID: {registro_id}")
             return cached_result
         
-        # Si no está en cache, consultar BD
-        try:
-            result = await session.execute(
-                select(Registro).where(Registro.id == registro_id)
-            )
-            registro = result.scalar_one_or_none()
-            
-            if registro:
-                # Guardar en cache
-                save_to_cache("registro_individual", registro, TTL_CONFIG['registro_individual'], id=registro_id)
+        # Si no está en cache, consultar BD (una sola vez por clave)
+        async def load():
+            try:
+                result = await session.execute(
+                    select(Registro).where(Registro.id == registro_id)
+                )
+                registro = result.scalar_one_or_none()
+                
+                if registro is None:
+                    return None
+                
+                # Guardar en cache los bytes, no la instancia ORM
+                payload = encode_registro(registro)
+                await asave_to_cache("registro_individual", payload, TTL_CONFIG['registro_individual'], id=registro_id)
                 logger.info(f"Retrieved and cached registro ID: {registro_id}")
-            
-            return registro
-            
-        except Exception as e:
-            logger.error(f"Error retrieving registro {registro_id}: {e}")
-            return None
+                return payload
+                
+            except Exception as e:
+                logger.error(f"Error retrieving registro {registro_id}: {e}")
+                return None
+        
+        return await single_flight.do(cache_key, load)
     
     @staticmethod
     async def get_cached_historial(
@@ -223,141 +409,295 @@ class RegistroCacheService:
         cache_key = generate_cache_key("historial", numero_inspector=numero_inspector, days=days_back)
         
         # Intentar obtener del cache
-        cached_result = cache.get(cache_key)
+        cached_result = await cache.aget(cache_key)
         if cached_result is not None:
             logger.info(f"Cache hit for historial inspector: {numero_inspector}")
             return cached_result
         
-        # Si no está en cache, consultar BD
+        # Si no está en cache, consultar BD (una sola vez por clave)
+        async def load():
+            try:
+                from datetime import datetime, timedelta
+                hace_dias = datetime.utcnow() - timedelta(days=days_back)
+                
+                result = await session.execute(
+                    select(HistorialCambio)
+                    .where(and_(
+                        HistorialCambio.numero_inspector == numero_inspector,
+                        HistorialCambio.fecha >= hace_dias
+                    ))
+                    .order_by(desc(HistorialCambio.fecha))
+                )
+                historial = result.scalars().all()
+                
+                # Convertir a formato JSON
+                historial_json = [
+                    {
+                        "fecha": h.fecha.isoformat() if h.fecha else None,
+                        "usuario": h.usuario,
+                        "accion": h.accion,
+                        "campo": h.campo,
+                        "valor_anterior": h.valor_anterior,
+                        "valor_nuevo": h.valor_nuevo,
+                        "descripcion": h.descripcion
+                    }
+                    for h in historial
+                ]
+                
+                # Guardar en cache
+                await asave_to_cache(
+                    "historial", 
+                    historial_json, 
+                    TTL_CONFIG['historial'],
+                    numero_inspector=numero_inspector,
+                    days=days_back
+                )
+                
+                logger.info(f"Retrieved and cached {len(historial_json)} historial entries")
+                return historial_json
+                
+            except Exception as e:
+                logger.error(f"Error retrieving historial for inspector {numero_inspector}: {e}")
+                return None
+        
+        return await single_flight.do(cache_key, load)
+    
+    @staticmethod
+    async def get_cached_unique_values(
+        session: AsyncSession,
+        column: str,
+        search: str = "",
+        mode: str = MATCH_INFIX,
+        order: str = ORDER_ALPHABETICAL,
+        limit: Optional[int] = None,
+        counts: bool = False
+    ) -> Optional[Dict[str, List[Any]]]:
+        """
+        Obtiene valores únicos de una columna desde el índice de valores distintos
+        (una lectura por columna; las búsquedas se resuelven en memoria). Las
+        columnas con demasiados valores se consultan a la base, con cache.
+        :param mode: MATCH_INFIX (subcadena, por defecto) o MATCH_PREFIX
+        :param order: ORDER_ALPHABETICAL u ORDER_FREQUENCY (top-N con limit)
+        :param counts: Incluir el número de registros de cada valor
+        :return: {"values": [...]} (y "counts" en el mismo orden), o None si la columna no es válida
+        """
+        if column not in UNIQUE_VALUES_COLUMNS:
+            logger.error(f"Invalid column for unique values: {column}")
+            return None
         try:
-            from datetime import datetime, timedelta
-            hace_dias = datetime.utcnow() - timedelta(days=days_back)
-            
-            result = await session.execute(
-                select(HistorialCambio)
-                .where(and_(
-                    HistorialCambio.numero_inspector == numero_inspector,
-                    HistorialCambio.fecha >= hace_dias
-                ))
-                .order_by(desc(HistorialCambio.fecha))
-            )
-            historial = result.scalars().all()
-            
-            # Convertir a formato JSON
-            historial_json = [
-                {
-                    "fecha": h.fecha.isoformat() if h.fecha else None,
-                    "usuario": h.usuario,
-                    "accion": h.accion,
-                    "campo": h.campo,
-                    "valor_anterior": h.valor_anterior,
-                    "valor_nuevo": h.valor_nuevo,
-                    "descripcion": h.descripcion
-                }
-                for h in historial
-            ]
-            
-            # Guardar en cache
-            save_to_cache(
-                "historial", 
-                historial_json, 
-                TTL_CONFIG['historial'],
-                numero_inspector=numero_inspector,
-                days=days_back
-            )
-            
-            logger.info(f"Retrieved and cached {len(historial_json)} historial entries")
-            return historial_json
-            
+            column_values = await distinct_values.get(session, column)
         except Exception as e:
-            logger.error(f"Error retrieving historial for inspector {numero_inspector}: {e}")
+            logger.error(f"Error retrieving unique values for column {column}: {e}")
             return None
+        
+        if column_values is not None:
+            found = column_values.lookup(search, mode, order, limit)
+        else:
+            # Demasiados valores para el índice en memoria: consulta (cacheada) a la base
+            found = await RegistroCacheService._unique_values_from_db(session, column, search, mode, order, limit)
+            if found is None:
+                return None
+        result = {"values": [value for value, _ in found]}
+        if counts:
+            result["counts"] = [count for _, count in found]
+        return result
     
     @staticmethod
-    async def get_cached_unique_values(
+    async def _unique_values_from_db(
         session: AsyncSession,
         column: str,
-        search: str = ""
-    ) -> Optional[Dict[str, List[str]]]:
+        search: str,
+        mode: str,
+        order: str,
+        limit: Optional[int]
+    ) -> Optional[List[List[Any]]]:
         """
-        Obtiene valores únicos de una columna desde cache o base de datos
+        Pares [valor, registros] de una columna que no cabe en el índice de valores
+        distintos. Al vencer se sigue sirviendo el valor anterior mientras se
+        recalcula en segundo plano (ver SWR_CONFIG).
         """
-        # Generar clave de cache
-        cache_key = generate_cache_key("valores_unicos", column=column, search=search)
-        
-        # Intentar obtener del cache
-        cached_result = cache.get(cache_key)
-        if cached_result is not None:
-            logger.info(f"Cache hit for unique values column: {column}")
-            return cached_result
+        params = {"column": column, "search": search, "mode": mode, "order": order, "limit": limit}
+        cache_key = generate_cache_key("valores_unicos", **params)
         
-        # Si no está en cache, consultar BD
-        try:
-            allowed_cols = [
-                "numero_inspector", "nombre", "observaciones", "status", "region", 
-                "flota", "encargado", "celular", "correo", "direccion", "uso", 
-                "departamento", "ciudad", "tecnologia", "cmts_olt", "id_servicio", "mac_sn"
-            ]
-            
-            if column not in allowed_cols:
-                logger.error(f"Invalid column for unique values: {column}")
+        # Consultar BD (el resultado lo guarda cached_with_refresh)
+        async def load(db_session: AsyncSession):
+            try:
+                model_col = getattr(Registro, column)
+                stmt = select(model_col, func.count()).where(model_col.isnot(None)).group_by(model_col)
+                if search and mode == MATCH_PREFIX:
+                    stmt = stmt.where(cast(model_col, String).ilike(f"{search}%"))
+                elif search:
+                    stmt = stmt.where(infix_match(model_col, search))
+                if order == ORDER_FREQUENCY:
+                    stmt = stmt.order_by(desc(func.count()), model_col)
+                else:
+                    stmt = stmt.order_by(model_col)
+                result = await db_session.execute(stmt.limit(limit))
+                values = [[value, count] for value, count in result.all()]
+                
+                logger.info(f"Retrieved {len(values)} unique values for column: {column}")
+                return values
+                
+            except Exception as e:
+                logger.error(f"Error retrieving unique values for column {column}: {e}")
                 return None
-            
-            model_col = getattr(Registro, column)
-            stmt = select(model_col).distinct().order_by(model_col)
-            
-            if search:
-                stmt = stmt.where(cast(model_col, String).ilike(f"%{search}%"))
-            
-            result = await session.execute(stmt)
-            values = [row[0] for row in result.fetchall() if row[0] is not None]
-            
-            result_dict = {"values": values}
-            
-            # Guardar en cache
-            save_to_cache(
-                "valores_unicos", 
-                result_dict, 
-                TTL_CONFIG['valores_unicos'],
-                column=column,
-                search=search
-            )
-            
-            logger.info(f"Retrieved and cached {len(values)} unique values for column: {column}")
-            return result_dict
-            
-        except Exception as e:
-            logger.error(f"Error retrieving unique values for column {column}: {e}")
+        
+        return await cached_with_refresh(
+            "valores_unicos", cache_key, TTL_CONFIG['valores_unicos'],
+            lambda: load(session), RegistroCacheService._with_own_session(load),
+            params=params
+        )
+    
+    @staticmethod
+    async def get_cached_facets(
+        session: AsyncSession,
+        columns: List[str],
+        spec: Optional[RegistroFilterSpec] = None,
+        **filters
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Conteos por valor de varias columnas (desplegables de filtros) bajo los mismos
+        filtros y lógica de búsqueda que get_cached_registros_list, en una sola pasada.
+        :param columns: Columnas de UNIQUE_VALUES_COLUMNS
+        :return: {"total": n, "facets": {columna: [{"value": v, "count": n}, ...]}} con los
+                 valores de más a menos registros, o None si alguna columna no es válida
+        """
+        spec = _filter_spec(spec, filters)
+        filters = spec.params
+        invalid = [column for column in columns if column not in UNIQUE_VALUES_COLUMNS]
+        if invalid or not columns:
+            logger.error(f"Invalid facet columns: {invalid or columns}")
             return None
+        
+        def build(counts: Dict[str, List[Tuple[Any, int]]]) -> Dict[str, Any]:
+            facets = {
+                column: [{"value": value, "count": count}
+                         for value, count in sorted(counts.get(column, []), key=lambda vc: (-vc[1], vc[0]))]
+                for column in columns
+            }
+            # Columnas NOT NULL: cada registro del resultado cuenta una vez en cada faceta
+            return {"total": sum(item["count"] for item in facets[columns[0]]), "facets": facets}
+        
+        # Con el snapshot en memoria es una máscara y un conteo por columna: no se cachea
+        if registro_snapshot.ready:
+            return build(registro_snapshot.facets(filters, columns))
+        
+        params = {**filters, "facetas": ",".join(columns)}
+        cache_key = generate_cache_key("registros_facetas", **params)
+        
+        async def load(db_session: AsyncSession):
+            try:
+                stmt = spec.facets_statement(columns, db_session.bind.dialect.name)
+                counts: Dict[str, List[Tuple[Any, int]]] = {}
+                for column, *values, count in (await db_session.execute(stmt)).all():
+                    value = values[columns.index(column)]
+                    if value is not None:
+                        counts.setdefault(column, []).append((value, count))
+                return build(counts)
+            except Exception as e:
+                logger.error(f"Error calculating registro facets: {e}")
+                return None
+        
+        return await cached_with_refresh(
+            "registros_facetas", cache_key, TTL_CONFIG['estadisticas'],
+            lambda: load(session), RegistroCacheService._with_own_session(load),
+            params=params
+        )
     
     @staticmethod
-    def invalidate_registro_cache(registro_id: int = None):
+    async def invalidate_registro_cache(registro_id: int = None):
         """
-        Invalida cache relacionado con registros
+        Invalida todo el cache relacionado con registros.
+        Sólo para operaciones masivas (carga de CSV); para cambios de un registro
+        usar invalidate_registro_change().
         """
         if registro_id:
             # Invalidar cache específico del registro
-            cache.invalidate_by_pattern(f"registro_individual:id={registro_id}")
+            await cache.ainvalidate_by_pattern(cache_key_prefix("registro_individual", id=registro_id))
             logger.info(f"Invalidated cache for registro ID: {registro_id}")
         
+        # Una operación masiva deja el snapshot y el índice de valores desactualizados
+        registro_snapshot.mark_stale()
+        distinct_values.clear()
+        
         # Invalidar cache general de registros
-        invalidated = cache.invalidate_registros()
+        invalidated = await cache.ainvalidate_by_tag('registros')
+        invalidated += await cache.ainvalidate_by_tag('historial')
         logger.info(f"Invalidated {invalidated} registro-related cache entries")
+        return invalidated
+    
+    @staticmethod
+    async def invalidate_bulk_replace() -> int:
+        """
+        Invalida de una vez todo lo que depende de la tabla de registros (registros,
+        historial y estadísticas), para cuando se reemplaza completa (carga de CSV)
+        """
+        registro_snapshot.mark_stale()
+        distinct_values.clear()
+        invalidated = await cache.ainvalidate_by_tags(('registros', 'historial', 'estadisticas'))
+        logger.info(f"Invalidated {invalidated} cache entries after replacing all registros")
+        return invalidated
+    
+    @staticmethod
+    async def invalidate_registro_change(old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> int:
+        """
+        Invalida sólo las entradas que el cambio de un registro puede alterar,
+        evaluando el meta (filtros) de cada entrada contra la fila antes y después.
+        Incluye las estadísticas: las que no guardan meta se invalidan siempre.
+        :param old: Valores del registro antes del cambio (None si se creó)
+        :param new: Valores del registro después del cambio (None si se eliminó)
+        :return: Número de entradas invalidadas
+        """
+        registro_snapshot.apply(old, new)
+        distinct_values.apply(old, new)
+        
+        def affected(meta: Optional[Dict[str, Any]]) -> bool:
+            return change_affects_entry(meta, old, new)
+        
+        invalidated = await cache.ainvalidate_where('registros', affected)
+        invalidated += await cache.ainvalidate_where('historial', affected)
+        invalidated += await cache.ainvalidate_where('estadisticas', affected)
+        logger.info(f"Invalidated {invalidated} cache entries affected by registro change")
+        return invalidated
+    
+    @staticmethod
+    async def invalidate_registro_changes(changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]) -> int:
+        """
+        Invalida el cache tras una carga incremental: cambio por cambio como
+        invalidate_registro_change, o todo de una vez si son más de
+        CSV_DIFF_INVALIDATION_LIMIT (evaluar cada entrada por cada cambio cuesta más)
+        :param changes: Pares (antes, después) de los registros modificados
+        :return: Número de entradas invalidadas
+        """
+        if not changes:
+            return 0
+        if len(changes) > CSV_DIFF_INVALIDATION_LIMIT:
+            return await RegistroCacheService.invalidate_bulk_replace()
+        invalidated = 0
+        for old, new in changes:
+            invalidated += await RegistroCacheService.invalidate_registro_change(old, new)
+        logger.info(f"Invalidated {invalidated} cache entries affected by {len(changes)} registro changes")
+        return invalidated
     
     @staticmethod
-    def invalidate_estadisticas_cache():
+    async def invalidate_estadisticas_cache():
         """
         Invalida cache relacionado con estadísticas
         """
-        invalidated = cache.invalidate_estadisticas()
+        invalidated = await cache.ainvalidate_by_tag('estadisticas')
         logger.info(f"Invalidated {invalidated} estadisticas-related cache entries")
     
     @staticmethod
-    def get_cache_stats() -> Dict[str, Any]:
+    async def get_cache_stats() -> Dict[str, Any]:
         """
         Obtiene estadísticas del cache
         """
-        return cache.get_stats()
+        stats = await cache.aget_stats()
+        stats['single_flight'] = single_flight.get_stats()
+        stats['refresh'] = dict(refresh_stats)
+        stats['snapshot'] = registro_snapshot.get_stats()
+        stats['distinct_values'] = distinct_values.get_stats()
+        return stats
 
 
 # Instancia global del servicio de cache de registros
@@ -0,0 +1,224 @@
+"""
+Carga incremental de registros (modo "diferencias" de /upload_csv).
+
+En lugar de reemplazar la tabla completa, compara el archivo con los registros
+actuales y aplica sólo las diferencias:
+
+- Clave: el uuid de la fila si viene en el archivo y existe en la tabla; si no,
+  numero_inspector.
+- Huellas: cada fila (actual y del archivo) se resume en un hash de sus
+  columnas; sólo las filas con huella distinta se actualizan. De la tabla actual
+  se guardan en memoria sólo los ids por clave y las huellas. Un campo vacío
+  cuenta igual venga como None o '' (API) o como 'nan' (celda vacía del CSV).
+- Si el archivo no trae la columna UUID, el uuid de los registros no se compara
+  ni se modifica.
+- Aplicación, en la transacción de la sesión: DELETE de los registros que no
+  vienen en el archivo, un INSERT ... ON CONFLICT (id) DO UPDATE (executemany
+  por lotes) para los nuevos y los modificados, y el historial por lotes: una
+  fila 'edicion' por campo cambiado, 'creacion' y 'eliminacion' como en las
+  rutas de registros.
+
+DiffReport incluye los cambios (valores antes y después) para invalidar sólo
+las entradas de cache afectadas.
+"""
+import datetime
+import hashlib
+import itertools
+import json
+import logging
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.config import BULK_INSERT_BATCH_SIZE
+from app.db.models import HistorialCambio
+from app.services.bulk_load import LOAD_COLUMNS, REGISTRO_TABLE, batched
+
+logger = logging.getLogger(__name__)
+
+HISTORIAL_TABLE = HistorialCambio.__table__
+
+# Representaciones de un campo vacío: None o '' (API) y 'nan' (celda vacía del CSV)
+EMPTY_VALUES = (None, "", "nan")
+
+Row = Dict[str, Any]
+
+
+class DiffReport(NamedTuple):
+    """Resultado de una carga incremental"""
+    inserted: int
+    updated: int
+    deleted: int
+    unchanged: int
+    historial: int
+    seconds: float
+    # (antes, después) de cada registro modificado; None si se creó o se eliminó
+    changes: List[Tuple[Optional[Row], Optional[Row]]]
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Campos de la respuesta de /upload_csv"""
+        return {
+            "insertados": self.inserted,
+            "actualizados": self.updated,
+            "eliminados": self.deleted,
+            "sin_cambios": self.unchanged,
+            "historial_registrado": self.historial,
+            "duracion_carga_segundos": round(self.seconds, 3),
+        }
+
+
+def normalize(value: Any) -> Any:
+    """Valor comparable de un campo: los vacíos (EMPTY_VALUES) se igualan a None"""
+    return None if value in EMPTY_VALUES else value
+
+
+def fingerprint(row: Row, columns: Sequence[str]) -> bytes:
+    """
+    Hash de los valores normalizados de `columns` (distingue tipos: 1 y '1' no
+    son iguales, pero sí None, '' y 'nan')
+    """
+    payload = json.dumps([normalize(row[column]) for column in columns], ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+
+def _usable_uuid(value: Any) -> bool:
+    return normalize(value) is not None
+
+
+def _upsert(dialect: str, columns: Sequence[str]):
+    """INSERT ... ON CONFLICT (id) DO UPDATE de `columns` (SQLite y PostgreSQL)"""
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = dialect_insert(REGISTRO_TABLE)
+    return stmt.on_conflict_do_update(
+        index_elements=[REGISTRO_TABLE.c.id], set_={column: stmt.excluded[column] for column in columns}
+    )
+
+
+def _historial(registro: Row, usuario: str, fecha: datetime.datetime, accion: str, descripcion: str,
+               campo: Optional[str] = None, valor_anterior: Any = None, valor_nuevo: Any = None) -> Row:
+    return dict(
+        registro_id=registro["id"], numero_inspector=registro["numero_inspector"], fecha=fecha, usuario=usuario,
+        accion=accion, campo=campo,
+        valor_anterior=str(valor_anterior) if valor_anterior is not None else None,
+        valor_nuevo=str(valor_nuevo) if valor_nuevo is not None else None,
+        descripcion=descripcion,
+    )
+
+
+async def _rows_by_id(conn: AsyncConnection, ids: List[int], batch_size: int) -> Dict[int, Row]:
+    """Valores actuales (id y LOAD_COLUMNS) de los registros indicados"""
+    rows = {}
+    columns = [REGISTRO_TABLE.c.id, *(REGISTRO_TABLE.c[column] for column in LOAD_COLUMNS)]
+    for i in range(0, len(ids), batch_size):
+        result = await conn.execute(select(*columns).where(REGISTRO_TABLE.c.id.in_(ids[i:i + batch_size])))
+        rows.update((row["id"], dict(row)) for row in result.mappings())
+    return rows
+
+
+async def _insert_batched(conn: AsyncConnection, stmt, rows: List[Row], batch_size: int) -> None:
+    for batch in batched(rows, batch_size):
+        await conn.execute(stmt, batch)
+
+
+async def apply_registro_diff(
+    session: AsyncSession, rows: Iterable[Row], usuario: str, batch_size: Optional[int] = None
+) -> DiffReport:
+    """
+    Deja registros igual a `rows` (filas como las de csv_ingest.iter_registros)
+    aplicando sólo inserciones, actualizaciones y eliminaciones. No hace commit.
+    """
+    batch_size = batch_size or BULK_INSERT_BATCH_SIZE
+    conn = await session.connection()
+    started = time.perf_counter()
+
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is not None:
+        rows = itertools.chain([first], rows)
+    with_uuid = first is not None and first["uuid"] is not None
+    columns = LOAD_COLUMNS if with_uuid else tuple(column for column in LOAD_COLUMNS if column != "uuid")
+
+    # Registros actuales: ids por clave y huellas
+    by_numero: Dict[int, int] = {}
+    by_uuid: Dict[str, int] = {}
+    fingerprints: Dict[int, bytes] = {}
+    current = await conn.stream(select(REGISTRO_TABLE.c.id, *(REGISTRO_TABLE.c[column] for column in LOAD_COLUMNS)))
+    async for partition in current.mappings().partitions(batch_size):
+        for row in partition:
+            by_numero[row["numero_inspector"]] = row["id"]
+            if _usable_uuid(row["uuid"]):
+                by_uuid[row["uuid"]] = row["id"]
+            fingerprints[row["id"]] = fingerprint(row, columns)
+    next_id = max(fingerprints, default=0) + 1
+
+    # Filas del archivo: nuevas, modificadas o sin cambios
+    seen = set()
+    new_rows: List[Row] = []
+    changed: Dict[int, Row] = {}
+    unchanged = 0
+    for row in rows:
+        registro_id = by_uuid.get(row["uuid"]) if with_uuid and _usable_uuid(row["uuid"]) else None
+        if registro_id is None or registro_id in seen:
+            registro_id = by_numero.get(row["numero_inspector"])
+        if registro_id is None or registro_id in seen:
+            # Sin registro propio: se inserta (si repite una clave única, falla al aplicar)
+            new_rows.append({**row, "id": next_id + len(new_rows)})
+            continue
+        seen.add(registro_id)
+        if fingerprint(row, columns) == fingerprints[registro_id]:
+            unchanged += 1
+        else:
+            changed[registro_id] = {**row, "id": registro_id}
+    deleted_ids = [registro_id for registro_id in fingerprints if registro_id not in seen]
+    old_rows = await _rows_by_id(conn, list(changed) + deleted_ids, batch_size)
+
+    fecha = datetime.datetime.utcnow()
+    changes: List[Tuple[Optional[Row], Optional[Row]]] = []
+
+    # Eliminaciones: el historial primero, como DELETE /registros/{id}
+    historial = [
+        _historial(old_rows[registro_id], usuario, fecha, "eliminacion", "Registro eliminado (carga CSV)",
+                   valor_anterior=json.dumps(old_rows[registro_id], ensure_ascii=False))
+        for registro_id in deleted_ids
+    ]
+    await _insert_batched(conn, insert(HISTORIAL_TABLE), historial, batch_size)
+    for batch in batched(deleted_ids, batch_size):
+        await conn.execute(delete(REGISTRO_TABLE).where(REGISTRO_TABLE.c.id.in_(batch)))
+    changes.extend((old_rows[registro_id], None) for registro_id in deleted_ids)
+
+    # Nuevos y modificados en un solo upsert por lote
+    upsert_rows = [{column: row[column] for column in ("id",) + columns} for row in (*changed.values(), *new_rows)]
+    await _insert_batched(conn, _upsert(conn.dialect.name, columns), upsert_rows, batch_size)
+    if new_rows and conn.dialect.name == "postgresql":
+        # Los ids se asignaron aquí: la secuencia sigue después del mayor
+        await conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{REGISTRO_TABLE.name}', 'id'), "
+            f"(SELECT max(id) FROM {REGISTRO_TABLE.name}))"
+        ))
+
+    edits = []
+    for registro_id, row in changed.items():
+        old = old_rows[registro_id]
+        new = {**old, **{column: row[column] for column in columns}}
+        for column in columns:
+            if normalize(old[column]) != normalize(row[column]):
+                edits.append(_historial(new, usuario, fecha, "edicion", f"Cambio en campo '{column}' (carga CSV)",
+                                        campo=column, valor_anterior=old[column], valor_nuevo=row[column]))
+        changes.append((old, new))
+    for row in new_rows:
+        edits.append(_historial(row, usuario, fecha, "creacion", f"Registro creado: {row['nombre']} (carga CSV)"))
+        changes.append((None, row))
+    await _insert_batched(conn, insert(HISTORIAL_TABLE), edits, batch_size)
+
+    report = DiffReport(
+        len(new_rows), len(changed), len(deleted_ids), unchanged, len(historial) + len(edits),
+        time.perf_counter() - started, changes,
+    )
+    logger.info(
+        f"Registro diff applied: {report.inserted} inserted, {report.updated} updated, {report.deleted} deleted, "
+        f"{report.unchanged} unchanged, {report.historial} historial rows in {report.seconds:.2f}s"
+    )
+    return report
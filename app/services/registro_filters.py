@@ -0,0 +1,206 @@
+"""
+Filtros de las consultas de registros (listado, total, facetas y exportación).
+
+Los parámetros de la grilla (una columna por filtro, `__EXACT__valor` para
+igualdad exacta o un texto para ILIKE '%valor%', y `q` para la búsqueda global)
+se interpretan una sola vez en un RegistroFilterSpec:
+
+- params: los filtros no vacíos, en el orden de SEARCH_COLUMNS; es lo que se usa
+  en las claves y metadatos del cache y en el snapshot en memoria
+- where(): la condición SQL, construida una vez por combinación de filtros
+- count_statement() / facets_statement(): las sentencias completas, también
+  memorizadas; SQLAlchemy reutiliza su SQL compilado en cada ejecución
+- matches(row): la misma lógica evaluada en Python (invalidación del cache)
+
+Dos especificaciones con los mismos filtros son iguales (NamedTuple), así que
+las peticiones repetidas no vuelven a construir ni compilar sentencias.
+"""
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from fastapi import Query
+from sqlalchemy import String, and_, case, cast, func, literal, null, or_, select, union_all
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.db.models import Registro
+from app.db.search import SEARCH_COLUMNS, global_match, infix_match, like_regex
+
+logger = logging.getLogger(__name__)
+
+# Prefijo de los filtros de igualdad exacta (valores elegidos en los desplegables)
+EXACT_PREFIX = "__EXACT__"
+
+# Combinaciones de filtros con sentencias memorizadas
+FILTER_CACHE_SIZE = 1024
+
+
+def column_condition(field: str, value: Any) -> ColumnElement:
+    """Condición SQL de un filtro de columna: __EXACT__ (igualdad) o ILIKE '%valor%'"""
+    column = getattr(Registro, field)
+    if str(value).startswith(EXACT_PREFIX):
+        return cast(column, String) == str(value)[len(EXACT_PREFIX):]
+    return infix_match(column, value)
+
+
+def _filter_matches(field: str, value: Any, row: Dict[str, Any]) -> bool:
+    """Evalúa en Python un filtro de column_condition() sobre una fila"""
+    actual = row.get(field)
+    if actual is None:
+        return False
+    if str(value).startswith(EXACT_PREFIX):
+        return str(actual) == str(value)[len(EXACT_PREFIX):]
+    return like_regex(str(value)).fullmatch(str(actual)) is not None
+
+
+class RegistroFilterSpec(NamedTuple):
+    """
+    Filtros de una consulta de registros ya interpretados (ver from_params).
+    Con global_or, si hay varios filtros y todos tienen el mismo valor es una búsqueda
+    global y se combinan con OR (compatibilidad con la grilla anterior a q=).
+    """
+    filters: Tuple[Tuple[str, Any], ...] = ()
+    q: Optional[str] = None
+    global_or: bool = True
+
+    @classmethod
+    def from_params(cls, q: Optional[str] = None, global_or: bool = True, **filters) -> "RegistroFilterSpec":
+        """
+        Interpreta los parámetros de la petición; los valores vacíos se ignoran.
+        :raises ValueError: Si algún filtro no es una columna de búsqueda
+        """
+        invalid = [field for field in filters if field not in SEARCH_COLUMNS]
+        if invalid:
+            raise ValueError(f"Columnas de filtro no válidas: {invalid}")
+        items = tuple(
+            (field, filters[field]) for field in SEARCH_COLUMNS
+            if filters.get(field) is not None and filters[field] != ""
+        )
+        return cls(items, q or None, global_or)
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        """Filtros no vacíos como diccionario (claves de cache, metadatos y snapshot)"""
+        params = dict(self.filters)
+        if self.q:
+            params["q"] = self.q
+        return params
+
+    @property
+    def uses_or(self) -> bool:
+        """Los filtros de columna se combinan con OR (mismo valor en todos)"""
+        return self.global_or and len(self.filters) > 1 and len({value for _, value in self.filters}) == 1
+
+    def where(self) -> Optional[ColumnElement]:
+        """Condición WHERE (None si no hay filtros); `q` se combina con AND con el resto"""
+        return _where(self)
+
+    def count_statement(self):
+        """SELECT count(*) de los registros que cumplen los filtros"""
+        return _count_statement(self)
+
+    def facets_statement(self, columns: Sequence[str], dialect: str):
+        """Conteos por valor de `columns` bajo los filtros (ver build_facets_statement)"""
+        return _facets_statement(self, tuple(columns), dialect)
+
+    def matches(self, row: Optional[Dict[str, Any]]) -> bool:
+        """Indica si una fila cumple los filtros, con la misma lógica que where()"""
+        if row is None:
+            return False
+        if self.q and not any(_filter_matches(field, self.q, row) for field in SEARCH_COLUMNS):
+            return False
+        if not self.filters:
+            return True
+        found = (_filter_matches(field, value, row) for field, value in self.filters)
+        return any(found) if self.uses_or else all(found)
+
+
+def registro_filters(
+    q: str = Query(None, description="Búsqueda global: registros con el texto en cualquier columna"),
+    numero_inspector: str = Query(None),
+    uuid: str = Query(None),
+    nombre: str = Query(None),
+    observaciones: str = Query(None),
+    status: str = Query(None),
+    region: str = Query(None),
+    flota: str = Query(None),
+    encargado: str = Query(None),
+    celular: str = Query(None),
+    correo: str = Query(None),
+    direccion: str = Query(None),
+    uso: str = Query(None),
+    departamento: str = Query(None),
+    ciudad: str = Query(None),
+    tecnologia: str = Query(None),
+    cmts_olt: str = Query(None),
+    id_servicio: str = Query(None),
+    mac_sn: str = Query(None),
+) -> RegistroFilterSpec:
+    """Dependencia de FastAPI: parámetros de filtro de las rutas de registros"""
+    return RegistroFilterSpec.from_params(
+        q=q, numero_inspector=numero_inspector, uuid=uuid, nombre=nombre, observaciones=observaciones,
+        status=status, region=region, flota=flota, encargado=encargado, celular=celular, correo=correo,
+        direccion=direccion, uso=uso, departamento=departamento, ciudad=ciudad, tecnologia=tecnologia,
+        cmts_olt=cmts_olt, id_servicio=id_servicio, mac_sn=mac_sn,
+    )
+
+
+def build_facets_statement(columns: Sequence[str], where: Optional[ColumnElement], dialect: str):
+    """
+    Conteos por valor de varias columnas en una sola sentencia: GROUPING SETS en
+    PostgreSQL y, en los motores que no lo soportan (SQLite), UNION ALL de un
+    GROUP BY por columna. Filas: (faceta, *columnas, registros); de las columnas
+    sólo tiene valor la de la faceta.
+    """
+    model_cols = [getattr(Registro, column) for column in columns]
+    if dialect == "postgresql":
+        # Las columnas son NOT NULL: en cada fila sólo es no nula la del grupo
+        facet = case(*((col.isnot(None), column) for column, col in zip(columns, model_cols)))
+        stmt = select(facet, *model_cols, func.count()).group_by(func.grouping_sets(*model_cols))
+        return stmt.where(where) if where is not None else stmt
+    # Con filtros, las filas se filtran una sola vez: SQLite materializa un CTE usado varias veces
+    source = select(*model_cols).where(where).cte("filtrados") if where is not None else Registro.__table__
+    source_cols = [source.c[column] for column in columns]
+    parts = []
+    for column, source_col in zip(columns, source_cols):
+        values = [col if col is source_col else null() for col in source_cols]
+        parts.append(select(literal(column), *values, func.count()).group_by(source_col))
+    return union_all(*parts)
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def _where(spec: RegistroFilterSpec) -> Optional[ColumnElement]:
+    conditions = []
+    if spec.q:
+        conditions.append(global_match([getattr(Registro, field) for field in SEARCH_COLUMNS], spec.q))
+    if spec.uses_or:
+        value = spec.filters[0][1]
+        if str(value).startswith(EXACT_PREFIX):
+            conditions.append(or_(*(column_condition(field, value) for field, _ in spec.filters)))
+        else:
+            conditions.append(global_match([getattr(Registro, field) for field, _ in spec.filters], value))
+    elif spec.filters:
+        conditions.append(and_(*(column_condition(field, value) for field, value in spec.filters)))
+    if not conditions:
+        return None
+    return and_(*conditions)
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def _count_statement(spec: RegistroFilterSpec):
+    stmt = select(func.count()).select_from(Registro)
+    where = spec.where()
+    return stmt.where(where) if where is not None else stmt
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def _facets_statement(spec: RegistroFilterSpec, columns: Tuple[str, ...], dialect: str):
+    return build_facets_statement(columns, spec.where(), dialect)
+
+
+def row_matches_filters(filters: Dict[str, Any], row: Optional[Dict[str, Any]], global_or: bool = True) -> bool:
+    """
+    Indica si una fila cumple los filtros de una consulta de registros (parámetros
+    como los de RegistroFilterSpec.params), con la misma lógica que las consultas
+    """
+    return RegistroFilterSpec.from_params(global_or=global_or, **filters).matches(row)
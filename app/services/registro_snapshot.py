@@ -0,0 +1,574 @@
+"""
+Snapshot columnar en memoria de la tabla registros (motor de lectura opcional).
+
+registros es un inventario pequeño/mediano que se lee mucho más de lo que se
+escribe. Con REGISTROS_SNAPSHOT_ENABLED=true cada proceso guarda una copia
+columnar en arrays de NumPy y responde el listado y los conteos con máscaras
+vectorizadas, sin ir a la base de datos (los valores únicos tienen su propio
+índice, app.services.distinct_values):
+
+- Columnas de baja cardinalidad (DICTIONARY_COLUMNS, o las que al cargar
+  tienen pocos valores distintos): códigos int32 más el diccionario de
+  valores. Un filtro se evalúa sobre el diccionario (pocas entradas) y se
+  expande a las filas indexando con los códigos.
+- Resto de columnas de texto: arrays de bytes UTF-8, el original para ordenar
+  y comparar y otro en minúsculas para los filtros ILIKE '%valor%'.
+- Los cambios de un registro (invalidate_registro_change) se aplican en el
+  lugar; las cargas masivas (invalidate_registro_cache) descartan el snapshot
+  y se recarga en segundo plano. Mientras no está listo, las consultas van a SQL.
+
+Cada worker tiene su propio snapshot: los cambios hechos desde otro proceso
+sólo se ven tras la recarga periódica (REGISTROS_SNAPSHOT_MAX_AGE).
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+
+from app.config import REGISTROS_SNAPSHOT_ENABLED, REGISTROS_SNAPSHOT_MAX_AGE
+from app.db.models import Registro
+from app.db.search import SEARCH_COLUMNS, like_regex
+from app.services.pagination import is_descending
+
+try:
+    import numpy as np
+except ImportError:  # Dependencia opcional: sólo se necesita con REGISTROS_SNAPSHOT_ENABLED
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Columnas con pocos valores distintos: se guardan codificadas con diccionario
+DICTIONARY_COLUMNS = ("region", "ciudad", "departamento", "tecnologia", "flota", "uso", "status")
+# El resto de columnas de texto también se codifican si, al cargar, tienen como
+# mucho esta fracción de valores distintos (observaciones, cmts_olt, ...)
+DICTIONARY_MAX_RATIO = 0.05
+
+# Columnas de Registro (id va aparte; las generadas, como orden_excel, se calculan)
+# y las que admiten nulos (se ordenan al final)
+COLUMNS = tuple(c.name for c in Registro.__table__.columns if c.name != "id" and c.computed is None)
+NULLABLE_COLUMNS = frozenset(c.name for c in Registro.__table__.columns if c.nullable)
+
+
+def _is_literal(value: str) -> bool:
+    """Sin comodines el filtro es una búsqueda de subcadena; con ellos, una regex"""
+    return "%" not in value and "_" not in value
+
+
+class _TextColumn:
+    """Columna de texto: bytes UTF-8 originales y en minúsculas, más máscara de nulos"""
+
+    def __init__(self, values: Sequence[Optional[str]], capacity: int):
+        padding = [b""] * (capacity - len(values))
+        self.raw = np.array([v.encode() if v is not None else b"" for v in values] + padding, dtype=bytes)
+        self.folded = np.array([v.lower().encode() if v is not None else b"" for v in values] + padding,
+                               dtype=bytes)
+        self.null = np.zeros(capacity, dtype=bool)
+        self.null[:len(values)] = [v is None for v in values]
+
+    def grow(self, capacity: int) -> None:
+        extra = capacity - len(self.raw)
+        self.raw = np.concatenate([self.raw, np.zeros(extra, dtype=self.raw.dtype)])
+        self.folded = np.concatenate([self.folded, np.zeros(extra, dtype=self.folded.dtype)])
+        self.null = np.concatenate([self.null, np.zeros(extra, dtype=bool)])
+
+    @staticmethod
+    def _store(array: "np.ndarray", pos: int, value: bytes) -> "np.ndarray":
+        # Los arrays de bytes tienen ancho fijo: un valor más largo obliga a ensanchar la columna
+        if len(value) > array.dtype.itemsize:
+            array = array.astype(f"S{len(value)}")
+        array[pos] = value
+        return array
+
+    def set(self, pos: int, value: Optional[str]) -> None:
+        self.null[pos] = value is None
+        self.raw = self._store(self.raw, pos, value.encode() if value is not None else b"")
+        self.folded = self._store(self.folded, pos, value.lower().encode() if value is not None else b"")
+
+    def get(self, pos: int) -> Optional[str]:
+        return None if self.null[pos] else self.raw[pos].decode()
+
+    def match(self, value: str) -> "np.ndarray":
+        if _is_literal(value):
+            found = np.strings.find(self.folded, value.lower().encode()) >= 0
+        else:
+            pattern = like_regex(value)
+            found = np.fromiter((pattern.fullmatch(v.decode()) is not None for v in self.raw),
+                                dtype=bool, count=len(self.raw))
+        return found & ~self.null
+
+    def equals(self, value: str) -> "np.ndarray":
+        return (self.raw == value.encode()) & ~self.null
+
+    def compare(self, value: Any) -> Tuple["np.ndarray", "np.ndarray"]:
+        encoded = str(value).encode()
+        return self.raw > encoded, self.raw == encoded
+
+    def sort_key(self) -> "np.ndarray":
+        return self.raw
+
+    def unique(self, mask: "np.ndarray") -> List[Any]:
+        return [v.decode() for v in np.unique(self.raw[mask & ~self.null])]
+
+    def counts(self, mask: "np.ndarray") -> List[Tuple[Any, int]]:
+        values, counts = np.unique(self.raw[mask & ~self.null], return_counts=True)
+        return [(v.decode(), int(n)) for v, n in zip(values, counts)]
+
+    @property
+    def nbytes(self) -> int:
+        return self.raw.nbytes + self.folded.nbytes + self.null.nbytes
+
+
+class _DictionaryColumn:
+    """Columna de baja cardinalidad: códigos por fila y diccionario de valores distintos"""
+
+    def __init__(self, values: Sequence[Optional[str]], capacity: int):
+        self.categories: List[Optional[str]] = []
+        self.index: Dict[Optional[str], int] = {}
+        self.codes = np.zeros(capacity, dtype=np.int32)
+        self.codes[:len(values)] = [self._code(v) for v in values]
+
+    def _code(self, value: Optional[str]) -> int:
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.categories)
+            self.categories.append(value)
+        return code
+
+    def grow(self, capacity: int) -> None:
+        self.codes = np.concatenate([self.codes, np.zeros(capacity - len(self.codes), dtype=np.int32)])
+
+    def set(self, pos: int, value: Optional[str]) -> None:
+        self.codes[pos] = self._code(value)
+
+    def get(self, pos: int) -> Optional[str]:
+        return self.categories[self.codes[pos]]
+
+    @property
+    def null(self) -> "np.ndarray":
+        # Se deriva de los códigos, así que set() y las filas nuevas la mantienen al día
+        return self._expand(c is None for c in self.categories)
+
+    def _expand(self, by_category: Iterable[bool]) -> "np.ndarray":
+        if not self.categories:
+            return np.zeros(len(self.codes), dtype=bool)
+        return np.fromiter(by_category, dtype=bool, count=len(self.categories))[self.codes]
+
+    def match(self, value: str) -> "np.ndarray":
+        if _is_literal(value):
+            needle = value.lower()
+            return self._expand(c is not None and needle in c.lower() for c in self.categories)
+        pattern = like_regex(value)
+        return self._expand(c is not None and pattern.fullmatch(c) is not None for c in self.categories)
+
+    def equals(self, value: str) -> "np.ndarray":
+        return self._expand(c is not None and c == value for c in self.categories)
+
+    def compare(self, value: Any) -> Tuple["np.ndarray", "np.ndarray"]:
+        value = str(value)
+        return (self._expand(c is not None and c > value for c in self.categories),
+                self._expand(c == value for c in self.categories))
+
+    def sort_key(self) -> "np.ndarray":
+        # Posición de cada valor del diccionario en orden de bytes UTF-8 (el de SQLite)
+        if not self.categories:
+            return np.zeros(len(self.codes), dtype=np.int32)
+        order = sorted(range(len(self.categories)), key=lambda i: (self.categories[i] or "").encode())
+        rank = np.empty(len(self.categories), dtype=np.int32)
+        rank[order] = np.arange(len(self.categories), dtype=np.int32)
+        return rank[self.codes]
+
+    def unique(self, mask: "np.ndarray") -> List[Any]:
+        present = np.unique(self.codes[mask])
+        values = [self.categories[code] for code in present if self.categories[code] is not None]
+        return sorted(values, key=str.encode)
+
+    def counts(self, mask: "np.ndarray") -> List[Tuple[Any, int]]:
+        # Un solo bincount sobre los códigos, sin tocar el texto de cada fila
+        counts = np.bincount(self.codes[mask], minlength=len(self.categories))
+        return [(c, int(n)) for c, n in zip(self.categories, counts) if n and c is not None]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+
+class _IntegerColumn:
+    """Columna entera (numero_inspector); los filtros de texto usan su representación decimal"""
+
+    def __init__(self, values: Sequence[int], capacity: int):
+        self.values = np.zeros(capacity, dtype=np.int64)
+        self.values[:len(values)] = values
+        self.text = np.array([str(v).encode() for v in values] + [b""] * (capacity - len(values)), dtype=bytes)
+
+    def grow(self, capacity: int) -> None:
+        extra = capacity - len(self.values)
+        self.values = np.concatenate([self.values, np.zeros(extra, dtype=np.int64)])
+        self.text = np.concatenate([self.text, np.zeros(extra, dtype=self.text.dtype)])
+
+    def set(self, pos: int, value: int) -> None:
+        self.values[pos] = value
+        self.text = _TextColumn._store(self.text, pos, str(value).encode())
+
+    def get(self, pos: int) -> int:
+        return int(self.values[pos])
+
+    def match(self, value: str) -> "np.ndarray":
+        if _is_literal(value):
+            return np.strings.find(self.text, value.lower().encode()) >= 0
+        pattern = like_regex(value)
+        return np.fromiter((pattern.fullmatch(v.decode()) is not None for v in self.text),
+                           dtype=bool, count=len(self.text))
+
+    def equals(self, value: str) -> "np.ndarray":
+        return self.text == value.encode()
+
+    def compare(self, value: Any) -> Tuple["np.ndarray", "np.ndarray"]:
+        return self.values > value, self.values == value
+
+    def sort_key(self) -> "np.ndarray":
+        return self.values
+
+    def excel_group(self) -> "np.ndarray":
+        """Equivalente vectorizado de pagination.excel_group(): 1 si empieza por dígito"""
+        return np.where(self.values < 0, 2, 1)
+
+    def unique(self, mask: "np.ndarray") -> List[Any]:
+        return np.unique(self.values[mask]).tolist()
+
+    def counts(self, mask: "np.ndarray") -> List[Tuple[Any, int]]:
+        values, counts = np.unique(self.values[mask], return_counts=True)
+        return list(zip(values.tolist(), counts.tolist()))
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.text.nbytes
+
+
+class SnapshotData:
+    """
+    Arrays columnares de los registros. Las filas borradas quedan como huecos
+    (alive=False) hasta la siguiente recarga; las nuevas se agregan al final.
+    """
+
+    def __init__(self, rows: Sequence[Dict[str, Any]]):
+        size = len(rows)
+        capacity = max(16, size + size // 4)
+        self.size = size
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.ids[:size] = [row["id"] for row in rows]
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.alive[:size] = True
+        self.positions: Dict[int, int] = {int(row["id"]): pos for pos, row in enumerate(rows)}
+        self.columns: Dict[str, Any] = {}
+        for name in COLUMNS:
+            values = [row[name] for row in rows]
+            if name == "numero_inspector":
+                self.columns[name] = _IntegerColumn(values, capacity)
+            elif name in DICTIONARY_COLUMNS or len(set(values)) <= size * DICTIONARY_MAX_RATIO:
+                self.columns[name] = _DictionaryColumn(values, capacity)
+            else:
+                self.columns[name] = _TextColumn(values, capacity)
+        # Permutaciones por orden ya calculadas; se descartan con cada cambio
+        self._orders: Dict[Tuple[str, str], "np.ndarray"] = {}
+
+    @property
+    def capacity(self) -> int:
+        return len(self.ids)
+
+    @property
+    def rows(self) -> int:
+        return len(self.positions)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.alive.nbytes + sum(c.nbytes for c in self.columns.values())
+
+    def _grow(self) -> None:
+        capacity = self.capacity * 2
+        self.ids = np.concatenate([self.ids, np.zeros(capacity - len(self.ids), dtype=np.int64)])
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        for column in self.columns.values():
+            column.grow(capacity)
+
+    def upsert(self, row: Dict[str, Any]) -> None:
+        """Inserta o actualiza un registro (idempotente)"""
+        pos = self.positions.get(row["id"])
+        if pos is None:
+            if self.size == self.capacity:
+                self._grow()
+            pos = self.size
+            self.size += 1
+            self.positions[row["id"]] = pos
+            self.ids[pos] = row["id"]
+            self.alive[pos] = True
+        for name, column in self.columns.items():
+            column.set(pos, row.get(name))
+        self._orders.clear()
+
+    def delete(self, registro_id: int) -> None:
+        """Elimina un registro (idempotente)"""
+        pos = self.positions.pop(registro_id, None)
+        if pos is not None:
+            self.alive[pos] = False
+            self._orders.clear()
+
+    def row(self, pos: int) -> Dict[str, Any]:
+        data = {"id": int(self.ids[pos])}
+        data.update((name, column.get(pos)) for name, column in self.columns.items())
+        return data
+
+    def _filter(self, field: str, value: Any) -> "np.ndarray":
+        """Máscara de un filtro de column_condition(): __EXACT__ o ILIKE '%valor%'"""
+        column = self.columns[field]
+        value = str(value)
+        if value.startswith("__EXACT__"):
+            return column.equals(value[9:])
+        return column.match(value)
+
+    def mask(self, filters: Dict[str, Any], global_or: bool = True) -> "np.ndarray":
+        """
+        Filas vivas que cumplen los filtros, con la misma lógica que las consultas SQL:
+        `q` en todas las columnas de búsqueda y, con global_or, OR cuando todos los
+        filtros tienen el mismo valor (ver RegistroFilterSpec)
+        """
+        mask = self.alive.copy()
+        filters = {field: value for field, value in filters.items() if value is not None}
+        q = filters.pop("q", None)
+        if q:
+            found = np.zeros(self.capacity, dtype=bool)
+            for field in SEARCH_COLUMNS:
+                found |= self._filter(field, q)
+            mask &= found
+        if global_or and len(filters) > 1 and len(set(filters.values())) == 1:
+            found = np.zeros(self.capacity, dtype=bool)
+            for field, value in filters.items():
+                found |= self._filter(field, value)
+            mask &= found
+        else:
+            for field, value in filters.items():
+                mask &= self._filter(field, value)
+        return mask
+
+    def _sort_arrays(self, sort_by: str) -> List["np.ndarray"]:
+        """Claves de orden de menor a mayor prioridad (como espera np.lexsort); id desempata"""
+        if sort_by == "numero_inspector":
+            column = self.columns[sort_by]
+            return [self.ids, column.sort_key(), column.excel_group()]
+        if sort_by in self.columns:
+            return [self.ids, self.columns[sort_by].sort_key()]
+        return [self.ids]
+
+    def order(self, sort_by: str, sort_dir: str) -> "np.ndarray":
+        """
+        Posiciones de las filas vivas en el orden de order_by_clauses(): (clave, id),
+        todo descendente con sort_dir=desc y los nulos al final en ambos sentidos
+        """
+        key = (sort_by, sort_dir)
+        order = self._orders.get(key)
+        if order is not None:
+            return order
+        alive = np.flatnonzero(self.alive)
+        keys = [array[alive] for array in self._sort_arrays(sort_by)]
+        null = self.columns[sort_by].null[alive] if sort_by in NULLABLE_COLUMNS else None
+        if null is not None:
+            keys.append(null)
+        order = alive[np.lexsort(keys)]
+        if is_descending(sort_by, sort_dir):
+            order = order[::-1]
+            if null is not None:
+                # Al invertir, los nulos quedaron al principio: se devuelven al final
+                nulls = int(null.sum())
+                order = np.concatenate([order[nulls:], order[:nulls]])
+        self._orders[key] = order
+        return order
+
+    def after(self, sort_by: str, sort_dir: str, values: Sequence[Any]) -> "np.ndarray":
+        """Filas posteriores a la clave `values` de un cursor (equivalente a seek_condition())"""
+        descending = is_descending(sort_by, sort_dir)
+
+        def compare(array_or_column, value):
+            if hasattr(array_or_column, "compare"):
+                greater, equal = array_or_column.compare(value)
+            else:
+                greater, equal = array_or_column > value, array_or_column == value
+            return (~greater & ~equal if descending else greater), equal
+
+        if sort_by == "numero_inspector":
+            column = self.columns[sort_by]
+            parts = [compare(column.excel_group(), values[0]), compare(column, values[1])]
+        elif sort_by in self.columns:
+            column = self.columns[sort_by]
+            if values[0] is None and sort_by in NULLABLE_COLUMNS:
+                # Dentro del grupo de nulos (al final) sólo queda desempatar por id
+                return column.null & compare(self.ids, values[1])[0]
+            parts = [compare(column, values[0])]
+        else:
+            parts = []
+        result = compare(self.ids, values[-1])[0]
+        for beyond, equal in reversed(parts):
+            result = beyond | (equal & result)
+        if sort_by in NULLABLE_COLUMNS:
+            null = self.columns[sort_by].null
+            result = (result & ~null) | null
+        return result
+
+    def unique(self, column: str, search: str = "") -> List[Any]:
+        mask = self.alive & self.columns[column].match(search) if search else self.alive
+        return self.columns[column].unique(mask)
+
+    def facets(self, filters: Dict[str, Any], columns: Sequence[str]) -> Dict[str, List[Tuple[Any, int]]]:
+        """(valor, registros) por columna bajo los filtros del listado: una sola máscara"""
+        mask = self.mask(filters)
+        return {column: self.columns[column].counts(mask) for column in columns}
+
+
+class RegistroSnapshot:
+    """Ciclo de vida del snapshot: carga, cambios incrementales, recarga y consultas"""
+
+    def __init__(self):
+        self._data: Optional[SnapshotData] = None
+        # Cambios recibidos durante una recarga; se reaplican sobre los datos nuevos
+        self._pending: Optional[List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]] = None
+        self._generation = 0
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory: Optional[Callable[[], Any]] = None
+        self.loaded_at = 0.0
+        self.stats = {"loads": 0, "changes": 0, "queries": 0, "load_seconds": 0.0}
+
+    @property
+    def ready(self) -> bool:
+        return self._data is not None
+
+    def start(self) -> None:
+        """Carga el snapshot en segundo plano si está habilitado (evento de inicio)"""
+        if not REGISTROS_SNAPSHOT_ENABLED:
+            return
+        if np is None:
+            logger.warning("REGISTROS_SNAPSHOT_ENABLED is set but numpy is not installed; using SQL")
+            return
+        self._schedule_reload()
+
+    async def stop(self) -> None:
+        """Cancela la carga en segundo plano si está corriendo (evento de cierre)"""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def load(self, session_factory: Optional[Callable[[], Any]] = None) -> None:
+        """Lee todos los registros y reemplaza el snapshot (las recargas usan la misma sesión)"""
+        if session_factory is None:
+            from app.db.connection import async_session_factory
+            session_factory = self._session_factory or async_session_factory
+        self._session_factory = session_factory
+        generation = self._generation
+        self._pending = []
+        start = time.perf_counter()
+        try:
+            async with session_factory() as session:
+                result = await session.execute(select(*Registro.__table__.columns))
+                rows = result.mappings().all()
+            data = SnapshotData(rows)
+            for old, new in self._pending:
+                self._apply(data, old, new)
+        finally:
+            self._pending = None
+        if generation != self._generation:
+            # Una carga masiva llegó durante la lectura: estos datos ya están viejos
+            return
+        self._data = data
+        self.loaded_at = time.monotonic()
+        self.stats["loads"] += 1
+        self.stats["load_seconds"] = round(time.perf_counter() - start, 3)
+        logger.info(f"Registros snapshot loaded: {data.rows} rows, {data.nbytes / 1e6:.1f} MB")
+
+    async def _reload_loop(self) -> None:
+        try:
+            while True:
+                generation = self._generation
+                await self.load()
+                if generation == self._generation:
+                    return
+        except Exception as e:
+            logger.error(f"Error loading registros snapshot: {e}")
+        finally:
+            self._task = None
+
+    def _schedule_reload(self) -> None:
+        if self._task is not None:
+            return
+        try:
+            self._task = asyncio.get_running_loop().create_task(self._reload_loop())
+        except RuntimeError:
+            # Sin event loop (scripts, tests síncronos): se cargará en la próxima petición con start()
+            pass
+
+    def _maybe_refresh(self) -> None:
+        if REGISTROS_SNAPSHOT_MAX_AGE and time.monotonic() - self.loaded_at > REGISTROS_SNAPSHOT_MAX_AGE:
+            # Sigue respondiendo con los datos actuales mientras se recarga
+            self._schedule_reload()
+
+    @staticmethod
+    def _apply(data: SnapshotData, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        if new is not None:
+            data.upsert(new)
+        elif old is not None:
+            data.delete(old["id"])
+
+    def apply(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """Aplica el cambio de un registro (old -> new, como invalidate_registro_change)"""
+        if self._pending is not None:
+            self._pending.append((old, new))
+        if self._data is not None:
+            self._apply(self._data, old, new)
+            self.stats["changes"] += 1
+
+    def mark_stale(self) -> None:
+        """Descarta el snapshot tras un cambio masivo y lo recarga en segundo plano"""
+        self._generation += 1
+        if self._data is None:
+            return
+        self._data = None
+        self._schedule_reload()
+
+    def page(self, filters: Dict[str, Any], sort_by: str, sort_dir: str, offset: int, limit: int,
+             after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """Filas de una página del listado (lógica de get_cached_registros_list)"""
+        self._maybe_refresh()
+        self.stats["queries"] += 1
+        data = self._data
+        mask = data.mask(filters)
+        if after is not None:
+            mask &= data.after(sort_by, sort_dir, after)
+            offset = 0
+        order = data.order(sort_by, sort_dir)
+        selected = order[mask[order]][offset:offset + limit]
+        return [data.row(pos) for pos in selected]
+
+    def count(self, filters: Dict[str, Any], global_or: bool = True) -> int:
+        """Total de registros que cumplen los filtros"""
+        self._maybe_refresh()
+        self.stats["queries"] += 1
+        return int(self._data.mask(filters, global_or).sum())
+
+    def facets(self, filters: Dict[str, Any], columns: Sequence[str]) -> Dict[str, List[Tuple[Any, int]]]:
+        """Conteos por valor de varias columnas bajo los filtros del listado"""
+        self._maybe_refresh()
+        self.stats["queries"] += 1
+        return self._data.facets(filters, columns)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats, ready=self.ready, reloading=self._task is not None)
+        if self._data is not None:
+            stats.update(rows=self._data.rows, capacity=self._data.capacity, bytes=self._data.nbytes,
+                         age_seconds=round(time.monotonic() - self.loaded_at, 1))
+        return stats
+
+
+# Instancia global (una por proceso)
+registro_snapshot = RegistroSnapshot()
@@ -0,0 +1,254 @@
+"""
+Reemplazo completo de registros por intercambio de tablas (modo "intercambio" de /upload_csv).
+
+El modo "directo" hace DELETE FROM registros y vuelve a insertar todo en una
+sola transacción: cada fila actualiza todos los índices (y el índice FTS5 por
+triggers) y la tabla queda bloqueada para escritura durante toda la carga. Aquí:
+
+1. Carga: las filas se insertan en registros_staging_<token>, una tabla sin
+   índices con un nombre propio de cada carga (dos cargas simultáneas no se
+   pisan la tabla). Cada fila conserva el id del registro actual con su mismo
+   numero_inspector (los nuevos reciben ids posteriores), así
+   historial_cambios.registro_id sigue apuntando al mismo inspector.
+2. Índices: se construyen de una vez sobre la tabla ya cargada. En PostgreSQL
+   los B-tree y los GIN pg_trgm con el sufijo de la carga; en SQLite el índice
+   de búsqueda (registros_fts_staging_<token>, poblado con un solo INSERT ... SELECT).
+3. Intercambio, en una transacción corta: se elimina la tabla anterior y la de
+   carga pasa a llamarse registros. El historial de los registros que ya no
+   están se conserva, como en los modos directo y diferencias (historial_cambios
+   no tiene ON DELETE CASCADE): esas filas quedan con un registro_id sin registro.
+   - PostgreSQL: bajo LOCK ACCESS EXCLUSIVE se renombran índices, clave primaria
+     y secuencia, y se vuelven a crear las claves foráneas hacia registros NOT
+     VALID. No se validan, porque el historial conservado no lo permitiría; siguen
+     comprobando las filas nuevas.
+   - SQLite: no permite renombrar índices, así que los B-tree se crean en esta
+     transacción (en modo WAL las lecturas siguen viendo la tabla anterior hasta
+     el commit). Las claves foráneas de historial_cambios se declaran por nombre
+     de tabla y siguen valiendo sin cambios.
+
+SwapReport informa la carga, la construcción de índices, la ventana de bloqueo
+(duración de la transacción de intercambio) y el historial que quedó sin registro.
+"""
+import itertools
+import logging
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import MetaData, Table, func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.schema import CreateIndex, CreateTable, DropTable
+
+from app.db.models import HistorialCambio
+from app.db.search import SEARCH_COLUMNS, postgresql_search_ddl, sqlite_search_ddl
+from app.services.bulk_load import LOAD_COLUMNS, REGISTRO_TABLE, BulkLoadReport, bulk_insert_registros
+
+logger = logging.getLogger(__name__)
+
+# Modos de reemplazo de /upload_csv
+REPLACE_DIRECT = "directo"
+REPLACE_SWAP = "intercambio"
+REPLACE_DIFF = "diferencias"  # carga incremental, ver registro_diff
+REPLACE_MODES = (REPLACE_DIRECT, REPLACE_SWAP, REPLACE_DIFF)
+
+HISTORIAL_TABLE = HistorialCambio.__table__
+
+FTS_TABLE = f"{REGISTRO_TABLE.name}_fts"
+# Prefijo del sufijo de las tablas de carga (y de sus índices en PostgreSQL)
+STAGING_SUFFIX = "_staging"
+
+
+class SwapReport(NamedTuple):
+    """Resultado de un reemplazo por intercambio de tablas"""
+    load: BulkLoadReport
+    index_seconds: float
+    lock_seconds: float
+    kept_ids: int
+    orphaned_historial: int
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Campos de la respuesta de /upload_csv"""
+        return {
+            **self.load.as_dict(),
+            "indices_segundos": round(self.index_seconds, 3),
+            "ventana_bloqueo_segundos": round(self.lock_seconds, 3),
+            "ids_conservados": self.kept_ids,
+            "historial_sin_registro": self.orphaned_historial,
+        }
+
+
+def staging_table(token: Optional[str] = None) -> Table:
+    """
+    Copia de registros (columnas y clave primaria) con el nombre de una tabla de
+    carga propia: registros_staging_<token> (token aleatorio por defecto)
+    """
+    token = token or uuid.uuid4().hex[:12]
+    return REGISTRO_TABLE.to_metadata(MetaData(), name=f"{REGISTRO_TABLE.name}{STAGING_SUFFIX}_{token}")
+
+
+def _suffix(staging: Table) -> str:
+    """Sufijo de la tabla de carga (_staging_<token>), también el de sus índices"""
+    return staging.name[len(REGISTRO_TABLE.name):]
+
+
+def _staging_fts(staging: Table) -> str:
+    return f"{FTS_TABLE}{_suffix(staging)}"
+
+
+def assign_ids(rows: Iterable[Dict[str, Any]], ids: Dict[int, int], next_id: int) -> Iterator[Dict[str, Any]]:
+    """
+    Agrega el id a cada fila: el del registro actual con el mismo numero_inspector
+    o, si es nuevo, el siguiente a partir de next_id
+    """
+    new_ids = itertools.count(next_id)
+    for row in rows:
+        row["id"] = ids.get(row["numero_inspector"]) or next(new_ids)
+        yield row
+
+
+async def _search_index_exists(conn: AsyncConnection) -> bool:
+    """Si la base SQLite tiene el índice FTS5 de búsqueda"""
+    found = await conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+    )
+    return found.first() is not None
+
+
+async def _build_indexes(conn: AsyncConnection, staging: Table) -> bool:
+    """Construye los índices que se pueden crear antes del intercambio"""
+    if conn.dialect.name == "postgresql":
+        for index in staging.indexes:
+            index.name = f"{index.name}{_suffix(staging)}"
+            await conn.execute(CreateIndex(index))
+        # Sin CREATE EXTENSION: ya existe porque registros tiene los mismos índices
+        for statement in postgresql_search_ddl(staging.name)[1:]:
+            await conn.execute(text(statement))
+        await conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{staging.name}', 'id'), "
+            f"(SELECT coalesce(max(id), 1) FROM {staging.name}))"
+        ))
+        await conn.execute(text(f"ANALYZE {staging.name}"))
+        return False
+    if conn.dialect.name == "sqlite" and await _search_index_exists(conn):
+        cols = ", ".join(SEARCH_COLUMNS)
+        fts = _staging_fts(staging)
+        # content='registros': después del intercambio lee de la tabla nueva
+        await conn.execute(text(sqlite_search_ddl(REGISTRO_TABLE.name, fts=fts)[0]))
+        await conn.execute(text(f"INSERT INTO {fts}(rowid, {cols}) SELECT id, {cols} FROM {staging.name}"))
+        return True
+    return False
+
+
+async def _foreign_keys_postgresql(conn: AsyncConnection) -> List[Tuple[str, str, str]]:
+    """(tabla, nombre, definición) de las claves foráneas que apuntan a registros"""
+    result = await conn.execute(text(
+        "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = CAST(:table AS regclass)"
+    ), {"table": REGISTRO_TABLE.name})
+    return [tuple(row) for row in result.all()]
+
+
+async def _swap_postgresql(conn: AsyncConnection, staging: Table) -> None:
+    table = REGISTRO_TABLE.name
+    await conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+    foreign_keys = await _foreign_keys_postgresql(conn)
+    # CASCADE sólo elimina las claves foráneas de las otras tablas, no sus filas
+    await conn.execute(text(f"DROP TABLE {table} CASCADE"))
+    await conn.execute(text(f"ALTER TABLE {staging.name} RENAME TO {table}"))
+    await conn.execute(text(f"ALTER INDEX {staging.name}_pkey RENAME TO {table}_pkey"))
+    await conn.execute(text(f"ALTER SEQUENCE {staging.name}_id_seq RENAME TO {table}_id_seq"))
+    suffix = _suffix(staging)
+    for index in staging.indexes:
+        await conn.execute(text(f"ALTER INDEX {index.name} RENAME TO {index.name[:-len(suffix)]}"))
+    for col in SEARCH_COLUMNS + ("search_document",):
+        await conn.execute(text(f"ALTER INDEX idx_{staging.name}_{col}_trgm RENAME TO idx_{table}_{col}_trgm"))
+    # NOT VALID y sin VALIDATE: el historial de los registros que ya no están se conserva
+    for referencing, name, definition in foreign_keys:
+        await conn.execute(text(f"ALTER TABLE {referencing} ADD CONSTRAINT {name} {definition} NOT VALID"))
+
+
+async def _swap_sqlite(conn: AsyncConnection, staging: Table, search_index: bool) -> None:
+    table = REGISTRO_TABLE.name
+    if search_index:
+        await conn.execute(text(f"DROP TABLE {FTS_TABLE}"))
+    # Elimina también sus índices y los triggers del índice de búsqueda
+    await conn.execute(text(f"DROP TABLE {table}"))
+    await conn.execute(text(f"ALTER TABLE {staging.name} RENAME TO {table}"))
+    for index in REGISTRO_TABLE.indexes:
+        await conn.execute(CreateIndex(index))
+    if search_index:
+        await conn.execute(text(f"ALTER TABLE {_staging_fts(staging)} RENAME TO {FTS_TABLE}"))
+        # Los triggers de sincronización, sin el 'rebuild' final: el índice ya está poblado
+        for statement in sqlite_search_ddl(table)[1:-1]:
+            await conn.execute(text(statement))
+
+
+async def _drop_staging(session: AsyncSession, staging: Table) -> None:
+    """Elimina las tablas de carga de un intento fallido"""
+    conn = await session.connection()
+    await conn.execute(DropTable(staging, if_exists=True))
+    if conn.dialect.name == "sqlite":
+        await conn.execute(text(f"DROP TABLE IF EXISTS {_staging_fts(staging)}"))
+    await session.commit()
+
+
+async def replace_registros_by_swap(
+    session: AsyncSession, rows: Iterable[Dict[str, Any]], batch_size: Optional[int] = None
+) -> SwapReport:
+    """
+    Reemplaza todos los registros por `rows` cargándolas en una tabla aparte y
+    cambiándola por registros (ver el docstring del módulo). Hace commit de cada fase;
+    si algo falla antes del intercambio, registros no cambia.
+    """
+    conn = await session.connection()
+    dialect = conn.dialect.name
+    staging = staging_table()
+    try:
+        ids = dict((await conn.execute(select(REGISTRO_TABLE.c.numero_inspector, REGISTRO_TABLE.c.id))).all())
+        next_id = max(ids.values(), default=0) + 1
+        await conn.execute(CreateTable(staging))
+        load = await bulk_insert_registros(
+            session, assign_ids(rows, ids, next_id), batch_size, table=staging, columns=("id",) + LOAD_COLUMNS
+        )
+        kept_ids = await conn.scalar(select(func.count()).select_from(staging).where(staging.c.id < next_id))
+
+        started = time.perf_counter()
+        search_index = await _build_indexes(conn, staging)
+        index_seconds = time.perf_counter() - started
+        await session.commit()
+    except Exception:
+        # En SQLite el DDL fuera de una transacción ya quedó confirmado
+        await session.rollback()
+        await _drop_staging(session, staging)
+        raise
+
+    conn = await session.connection()
+    started = time.perf_counter()
+    try:
+        if dialect == "sqlite":
+            # pysqlite sólo abre la transacción antes de un DML: sin BEGIN el DDL del
+            # intercambio iría en autocommit. IMMEDIATE toma ya el bloqueo de escritura
+            await conn.exec_driver_sql("BEGIN IMMEDIATE")
+        # Historial de los registros que no vienen en el archivo: se conserva
+        orphaned = await conn.scalar(
+            select(func.count()).select_from(HISTORIAL_TABLE)
+            .where(HISTORIAL_TABLE.c.registro_id.not_in(select(staging.c.id)))
+        )
+        if dialect == "postgresql":
+            await _swap_postgresql(conn, staging)
+        else:
+            await _swap_sqlite(conn, staging, search_index)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        await _drop_staging(session, staging)
+        raise
+    lock_seconds = time.perf_counter() - started
+
+    report = SwapReport(load, index_seconds, lock_seconds, kept_ids, orphaned)
+    logger.info(
+        f"Registros replaced by table swap: {load.rows} rows ({kept_ids} kept their id), "
+        f"indexes {index_seconds:.2f}s, lock window {lock_seconds:.3f}s, "
+        f"{report.orphaned_historial} historial rows kept for removed registros"
+    )
+    return report
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+📊 Benchmark de tasa de aciertos del cache con lecturas y escrituras mezcladas - Inspector API
+
+Simula la carga de la grilla: lecturas de listas filtradas, totales, valores únicos
+y registros individuales, intercaladas con ediciones de registros sueltos. Compara
+la invalidación completa en cada escritura (comportamiento anterior) con la
+invalidación selectiva por filtros (invalidate_registro_change).
+
+Uso:
+    python scripts/bench_cache_hit_rate.py [--operations 50000] [--write-ratio 0.05]
+"""
+
+import argparse
+import logging
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services import cache as cache_module  # noqa: E402
+from app.services import registro_cache_service as service_module  # noqa: E402
+from app.services.cache import AdvancedCache, generate_cache_key, save_to_cache  # noqa: E402
+
+REGIONES = ["Norte", "Sur", "Centro", "Oriente", "Occidente"]
+CIUDADES = ["Medellín", "Bogotá", "Cali", "Barranquilla", "Cartagena", "Pereira"]
+STATUS = ["Activo", "Baja", "Reparación", "Bodega"]
+COLUMNAS_UNICAS = ["region", "ciudad", "status", "tecnologia"]
+
+
+def make_rows(n: int, rng: random.Random):
+    return {
+        i: {
+            "id": i,
+            "numero_inspector": 1000 + i,
+            "region": rng.choice(REGIONES),
+            "ciudad": rng.choice(CIUDADES),
+            "status": rng.choice(STATUS),
+            "tecnologia": rng.choice(["FTTH", "HFC", "DSL"]),
+            "observaciones": "Sin novedad",
+        }
+        for i in range(1, n + 1)
+    }
+
+
+def read(rng: random.Random, rows):
+    """Una lectura: devuelve (operación, parámetros)"""
+    kind = rng.random()
+    if kind < 0.4:
+        filtros = {"region": rng.choice(REGIONES)}
+        if rng.random() < 0.5:
+            filtros["ciudad"] = rng.choice(CIUDADES)
+        return "registros_lista", dict(limit=10, offset=rng.randint(0, 4) * 10, sort_by="id", sort_dir="asc", **filtros)
+    if kind < 0.6:
+        return "total_registros", {"region": rng.choice(REGIONES), "status": rng.choice(STATUS + [None])}
+    if kind < 0.75:
+        return "valores_unicos", {"column": rng.choice(COLUMNAS_UNICAS), "search": ""}
+    # Registros individuales con popularidad tipo Zipf
+    registro_id = min(len(rows), int(rng.paretovariate(1.2)))
+    return "registro_individual", {"id": registro_id}
+
+
+def run(mode: str, operations: int, write_ratio: float, rows_count: int, seed: int = 7):
+    rng = random.Random(seed)
+    rows = make_rows(rows_count, rng)
+    cache = AdvancedCache()
+    cache_module.cache = cache
+    service_module.cache = cache
+
+    reads = hits = writes = 0
+    for _ in range(operations):
+        if rng.random() < write_ratio:
+            writes += 1
+            registro_id = rng.randint(1, rows_count)
+            old = rows[registro_id]
+            new = dict(old)
+            campo = rng.choice(["observaciones", "observaciones", "status", "ciudad"])
+            if campo == "observaciones":
+                new["observaciones"] = f"Revisión {writes}"
+            elif campo == "status":
+                new["status"] = rng.choice(STATUS)
+            else:
+                new["ciudad"] = rng.choice(CIUDADES)
+            rows[registro_id] = new
+            if mode == "completa":
+                service_module.RegistroCacheService.invalidate_registro_cache(registro_id)
+            else:
+                service_module.RegistroCacheService.invalidate_registro_change(old, new)
+            continue
+
+        reads += 1
+        operation, params = read(rng, rows)
+        if cache.get(generate_cache_key(operation, **params)) is not None:
+            hits += 1
+        else:
+            save_to_cache(operation, b"x", 3600, **params)
+
+    return reads, hits, writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de tasa de aciertos con escrituras")
+    parser.add_argument("--operations", type=int, default=50_000)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--rows", type=int, default=5_000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    print(f"{args.operations} operaciones | {args.write_ratio:.0%} escrituras | {args.rows} registros")
+    for mode in ("completa", "selectiva"):
+        reads, hits, writes = run(mode, args.operations, args.write_ratio, args.rows)
+        print(f"invalidación {mode:<10} lecturas={reads} escrituras={writes} hit_rate={hits / reads:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+📊 Microbenchmark de invalidación del cache - Inspector API
+
+Llena el cache con 100k entradas (listas, totales, valores únicos y registros
+individuales con patrón) y mide el costo de las operaciones que ejecuta
+invalidate_registro_cache() en cada PUT/POST/DELETE, comparando la
+implementación actual contra el recorrido completo de la versión anterior.
+
+Uso:
+    python scripts/bench_cache_invalidation.py [--entries 100000]
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.cache import AdvancedCache  # noqa: E402
+
+
+class LegacyScanCache(AdvancedCache):
+    """Reproduce el algoritmo anterior: recorrido de todos los patrones y todas las claves"""
+
+    def _remove_entry(self, key):
+        entry = self._cache.pop(key)
+        self._current_bytes -= entry.size
+        self._policy.record_remove(key)
+        for tag in entry.tags:
+            if tag in self._tags and key in self._tags[tag]:
+                self._tags[tag].remove(key)
+                if not self._tags[tag]:
+                    del self._tags[tag]
+        for pattern, keys in list(self._patterns.items()):
+            if key in keys:
+                keys.remove(key)
+                if not keys:
+                    del self._patterns[pattern]
+
+    def invalidate_by_pattern(self, pattern):
+        keys_to_delete = [key for key in list(self._cache.keys()) if pattern in key]
+        for key in keys_to_delete:
+            self.delete(key)
+        self._stats['invalidations'] += len(keys_to_delete)
+        return len(keys_to_delete)
+
+
+def fill(cache, entries):
+    individuales = entries // 2
+    for i in range(individuales):
+        cache.set(f"registro_individual:id={i}", {"id": i}, ttl=3600,
+                  tags={"registro_individual"}, pattern=f"registro:{i}")
+    for i in range(entries - individuales):
+        namespace = ("registros_lista", "total_registros", "valores_unicos")[i % 3]
+        cache.set(f"{namespace}:{i:08x}", [i], ttl=3600, tags={namespace, "registros"})
+    # Grupo pequeño para medir invalidación por tag (p.ej. historial de un inspector)
+    for i in range(50):
+        cache.set(f"historial:{i:08x}", [i], ttl=3600, tags={"historial"})
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark de invalidación del cache")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    for nombre, cls in (("anterior (recorrido completo)", LegacyScanCache), ("índices (actual)", AdvancedCache)):
+        cache = cls()
+        fill(cache, args.entries)
+
+        pattern_ms = []
+        delete_ms = []
+        for r in range(args.rounds):
+            _, ms = timed(cache.invalidate_by_pattern, f"registro_individual:id={40_000 + r * 7}")
+            pattern_ms.append(ms)
+            _, ms = timed(cache.delete, f"registro_individual:id={40_000 + r * 7 + 1}")
+            delete_ms.append(ms)
+
+        invalidated, tag_ms = timed(cache.invalidate_by_tag, "historial")
+
+        print(f"\n=== {nombre} | {args.entries} entradas ===")
+        print(f"invalidate_by_pattern (1 clave): {sum(pattern_ms) / len(pattern_ms):9.3f} ms promedio")
+        print(f"delete (1 clave):                {sum(delete_ms) / len(delete_ms):9.3f} ms promedio")
+        print(f"invalidate_by_tag ({invalidated} claves):  {tag_ms:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+📊 Benchmark de memoria del cache - Inspector API
+
+Simula la carga de la grilla de registros: cada petición usa una combinación
+aleatoria de filtros sobre /registros, /registros/total y /registros/unique_values,
+de modo que casi todas las claves son distintas. Mide la memoria retenida por el
+cache (tracemalloc) a lo largo del tiempo con y sin límites de tamaño.
+
+Uso:
+    python scripts/bench_cache_memory.py [--requests 50000] [--max-entries 2000]
+"""
+
+import argparse
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.cache import AdvancedCache, generate_cache_key  # noqa: E402
+
+REGIONES = ["Norte", "Sur", "Centro", "Oriente", "Occidente"]
+CIUDADES = ["Medellín", "Bogotá", "Cali", "Barranquilla", "Cartagena", "Pereira"]
+TECNOLOGIAS = ["FTTH", "HFC", "DSL", "LTE"]
+
+
+def _fake_page(rng: random.Random, size: int = 10):
+    """Página de registros con un tamaño parecido al real"""
+    return [
+        {
+            "id": rng.randint(1, 10**6),
+            "numero_inspector": rng.randint(1, 10**5),
+            "nombre": f"ins{rng.randint(1, 10**5)} Dispositivo",
+            "region": rng.choice(REGIONES),
+            "ciudad": rng.choice(CIUDADES),
+            "tecnologia": rng.choice(TECNOLOGIAS),
+            "observaciones": "x" * rng.randint(10, 80),
+        }
+        for _ in range(size)
+    ]
+
+
+def run(cache: AdvancedCache, requests: int, seed: int = 42):
+    rng = random.Random(seed)
+    samples = []
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+
+    for i in range(1, requests + 1):
+        filtros = {
+            "region": rng.choice(REGIONES + [None]),
+            "ciudad": rng.choice(CIUDADES + [None]),
+            "nombre": rng.choice([None, str(rng.randint(1, 10**4))]),
+            "offset": rng.randint(0, 50) * 10,
+        }
+        operation = rng.choice(["registros_lista", "total_registros", "valores_unicos"])
+        key = generate_cache_key(operation, **filtros)
+        if cache.get(key) is None:
+            value = _fake_page(rng) if operation == "registros_lista" else {"total": rng.randint(0, 5000)}
+            cache.set(key, value, ttl=600, tags={operation, "registros"})
+
+        if i % (requests // 10) == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            samples.append((i, len(cache._cache), (current - base) / 1024 / 1024))
+
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return samples, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de memoria del cache")
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--max-entries", type=int, default=2_000)
+    parser.add_argument("--max-bytes", type=int, default=8 * 1024 * 1024)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    escenarios = [
+        ("sin límite", AdvancedCache()),
+        (f"lru max_entries={args.max_entries}", AdvancedCache(max_entries=args.max_entries, eviction_policy="lru")),
+        (f"lfu max_bytes={args.max_bytes}", AdvancedCache(max_bytes=args.max_bytes, eviction_policy="lfu")),
+        (f"tinylfu max_entries={args.max_entries}", AdvancedCache(max_entries=args.max_entries, eviction_policy="tinylfu")),
+    ]
+
+    for nombre, cache in escenarios:
+        samples, elapsed = run(cache, args.requests)
+        stats = cache.get_stats()
+        print(f"\n=== {nombre} ===")
+        print(f"{'peticiones':>12} {'entradas':>10} {'MB retenidos':>14}")
+        for i, entries, mb in samples:
+            print(f"{i:>12} {entries:>10} {mb:>14.2f}")
+        print(f"hit_rate={stats['hit_rate']} evictions={stats['evictions']} "
+              f"rejections={stats['admission_rejections']} tiempo={elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+📊 Benchmark de validación de CSV de carga masiva - Inspector API
+
+Compara, sobre un CSV generado (200k filas por defecto, ~1% con errores):
+- Validación fila por fila con df.iterrows() (dos pasadas, como hacía /upload_csv)
+  y conversión a filas con una tercera pasada.
+- Validación vectorizada de app.services.csv_ingest (field_errors, nombre_errors,
+  registros), que debe dar exactamente la misma lista de errores y las mismas filas.
+- La primera pasada completa de /upload_csv (validate_csv) en bloques de CSV_CHUNK_ROWS.
+
+Uso:
+    python scripts/bench_csv_validation.py [--rows 200000] [--invalid-every 100]
+"""
+
+import argparse
+import io
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd  # noqa: E402
+
+from app.services.csv_ingest import (  # noqa: E402
+    CSV_COLUMNS, EMAIL_REGEX, CsvFormat, field_errors, nombre_errors, registros, validate_csv
+)
+
+
+def make_csv(rows: int, invalid_every: int) -> bytes:
+    data = []
+    for i in range(1, rows + 1):
+        row = {
+            "Número de inspector": str(i), "Nombre": f"ins{i} Dispositivo", "Observaciones": "Sin novedad",
+            "Status": "Activo", "Región": "Norte", "Flota": "Flota A", "Encargado": "Encargado Prueba",
+            "Celular": "3001234567", "Correo": f"inspector{i}@example.com", "Dirección": f"Calle {i} # 10-20",
+            "Uso": "Interno", "Departamento": "Antioquia", "Ciudad": "Medellín", "Tecnología": "FTTH",
+            "CMTS/OLT": "OLT-01", "ID Servicio": f"SRV-{i}", "MAC/SN": f"AA:BB:CC:{i % 256:02X}",
+        }
+        if invalid_every and i % invalid_every == 0:
+            row[("Celular", "Correo", "Nombre")[i // invalid_every % 3]] = "invalido"
+        data.append(row)
+    return pd.DataFrame(data, columns=list(CSV_COLUMNS)[:-1]).to_csv(index=False).encode("utf-8")
+
+
+def rowwise_errors(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Validación anterior: dos pasadas con iterrows()"""
+    errores = []
+    for idx, row in df.iterrows():
+        num_inspector = str(row.get('Número de inspector', '')).strip()
+        celular = str(row.get('Celular', '')).strip()
+        correo = str(row.get('Correo', '')).strip()
+        if not num_inspector.isdigit():
+            errores.append({"fila": idx + 2, "columna": "Número de inspector", "valor": num_inspector, "error": "Debe ser numérico"})
+        if celular and (not celular.isdigit() or len(celular) != 10):
+            errores.append({"fila": idx + 2, "columna": "Celular", "valor": celular, "error": "Debe ser numérico de 10 dígitos"})
+        if correo and not EMAIL_REGEX.match(correo):
+            errores.append({"fila": idx + 2, "columna": "Correo", "valor": correo, "error": "Debe ser un correo válido"})
+    for idx, row in df.iterrows():
+        num_inspector = str(row.get('Número de inspector', '')).strip()
+        nombre = str(row.get('Nombre', '')).strip()
+        if num_inspector.isdigit():
+            if len(num_inspector) == 1:
+                if f"ins{num_inspector}" not in nombre and f"ins0{num_inspector}" not in nombre:
+                    errores.append({"fila": idx + 2, "columna": "Nombre", "valor": nombre, "error": f"Debe contener 'ins{num_inspector}' o 'ins0{num_inspector}'"})
+            elif f"ins{num_inspector}" not in nombre:
+                errores.append({"fila": idx + 2, "columna": "Nombre", "valor": nombre, "error": f"Debe contener 'ins{num_inspector}'"})
+    return errores
+
+
+def rowwise_registros(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Conversión anterior: tercera pasada con iterrows()"""
+    return [
+        {
+            field: int(row.get(column, 0)) if field == "numero_inspector" else str(row.get(column, ''))
+            for column, field in CSV_COLUMNS.items() if column != "UUID"
+        } | {"uuid": None}
+        for _, row in df.iterrows()
+    ]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de validación de CSV de carga masiva")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--invalid-every", type=int, default=100)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    content = make_csv(args.rows, args.invalid_every)
+    df = pd.read_csv(io.BytesIO(content), dtype=str)
+    print(f"{args.rows} filas | {len(content) / 1_048_576:.1f} MiB")
+
+    expected, t_rowwise = timed(rowwise_errors, df)
+    filas_rowwise, t_rowwise_filas = timed(rowwise_registros, df)
+    errores, t_vectorized = timed(lambda frame: field_errors(frame) + nombre_errors(frame), df)
+    filas, t_vectorized_filas = timed(registros, df)
+    assert errores == expected, "la validación vectorizada no coincide con la fila por fila"
+    assert filas == filas_rowwise, "las filas vectorizadas no coinciden con las fila por fila"
+
+    stream = io.BytesIO(content)
+    scan, t_scan = timed(validate_csv, stream, CsvFormat("utf-8", ","))
+    assert scan.errors == expected
+
+    print(f"{len(expected)} errores")
+    print(f"{'modo':<34} {'segundos':>10} {'filas/s':>12}")
+    for nombre, seconds in (
+        ("validación fila por fila", t_rowwise),
+        ("validación vectorizada", t_vectorized),
+        ("filas a insertar fila por fila", t_rowwise_filas),
+        ("filas a insertar vectorizadas", t_vectorized_filas),
+        ("validate_csv (lectura + validación)", t_scan),
+    ):
+        print(f"{nombre:<34} {seconds:>10.3f} {args.rows / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
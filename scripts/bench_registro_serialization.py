@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+📊 Benchmark de serialización de registros cacheados - Inspector API
+
+Compara el costo por hit del cache y la memoria por entrada entre:
+- Cachear instancias ORM de Registro: cada hit vuelve a validar con RegistroOut,
+  pasar por jsonable_encoder y codificar a JSON (lo que hace FastAPI con response_model).
+- Cachear los bytes JSON ya serializados: cada hit devuelve los bytes tal cual.
+
+Uso:
+    python scripts/bench_registro_serialization.py [--entries 2000] [--page-size 10] [--hits 2000]
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from app.db.models import Registro  # noqa: E402
+from app.schemas.registro import RegistroOut  # noqa: E402
+from app.services.cache import AdvancedCache  # noqa: E402
+from app.services.registro_cache_service import encode_registros  # noqa: E402
+
+
+def make_page(start: int, size: int) -> List[Registro]:
+    return [
+        Registro(
+            id=i,
+            numero_inspector=10_000 + i,
+            uuid=None,
+            nombre=f"ins{i} Dispositivo",
+            observaciones="Sin novedad en la última inspección",
+            status="Activo",
+            region="Norte",
+            flota="Flota A",
+            encargado="Encargado Prueba",
+            celular="3001234567",
+            correo=f"inspector{i}@example.com",
+            direccion=f"Calle {i} # 10-20",
+            uso="Interno",
+            departamento="Antioquia",
+            ciudad="Medellín",
+            tecnologia="FTTH",
+            cmts_olt="OLT-01",
+            id_servicio=f"SRV-{i}",
+            mac_sn=f"AA:BB:CC:{i % 256:02X}",
+        )
+        for i in range(start, start + size)
+    ]
+
+
+def fastapi_response_body(registros: List[Registro]) -> bytes:
+    """Lo que FastAPI hace con response_model=List[RegistroOut] en cada petición"""
+    validated = [RegistroOut.model_validate(r) for r in registros]
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False).encode("utf-8")
+
+
+def measure_memory(entries: int, page_size: int, as_bytes: bool) -> float:
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    cache = AdvancedCache()
+    for n in range(entries):
+        page = make_page(n * page_size, page_size)
+        cache.set(f"registros_lista:{n}", encode_registros(page) if as_bytes else page,
+                  ttl=600, tags={"registros_lista", "registros"})
+        del page
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (current - base) / entries
+
+
+def measure_hits(hits: int, page_size: int, as_bytes: bool) -> float:
+    cache = AdvancedCache()
+    page = make_page(0, page_size)
+    cache.set("registros_lista:0", encode_registros(page) if as_bytes else page,
+              ttl=600, tags={"registros_lista", "registros"})
+
+    start = time.perf_counter()
+    for _ in range(hits):
+        value = cache.get("registros_lista:0")
+        body = value if as_bytes else fastapi_response_body(value)
+    assert body
+    return (time.perf_counter() - start) / hits * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización de registros cacheados")
+    parser.add_argument("--entries", type=int, default=2_000)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--hits", type=int, default=2_000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    print(f"Páginas de {args.page_size} registros | {args.entries} entradas | {args.hits} hits")
+    print(f"{'modo':<22} {'µs por hit':>12} {'bytes por entrada':>20}")
+    for nombre, as_bytes in (("instancias ORM", False), ("bytes JSON", True)):
+        us = measure_hits(args.hits, args.page_size, as_bytes)
+        mem = measure_memory(args.entries, args.page_size, as_bytes)
+        print(f"{nombre:<22} {us:>12.1f} {mem:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
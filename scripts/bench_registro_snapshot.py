@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+📊 Benchmark del snapshot columnar de registros - Inspector API
+
+Crea una base SQLite con N registros (por defecto 200k) y compara, para las
+consultas de listado, conteo y valores únicos:
+- SQL: las mismas sentencias que arma RegistroCacheService (sin cache)
+- Snapshot: máscaras vectorizadas sobre los arrays de NumPy (SnapshotData)
+
+Ambos caminos serializan la página con encode_registros(), y se comprueba que
+devuelvan lo mismo.
+
+Uso:
+    python scripts/bench_registro_snapshot.py [--rows 200000] [--repeat 5] [--db /tmp/bench_snapshot.db] [--reuse]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.db.base import Base  # noqa: E402
+from app.db.models import Registro  # noqa: E402
+from app.db.search import infix_match  # noqa: E402
+from app.services.pagination import order_by_clauses  # noqa: E402
+from app.services.registro_cache_service import encode_registros  # noqa: E402
+from app.services.registro_filters import RegistroFilterSpec  # noqa: E402
+from app.services.registro_snapshot import SnapshotData  # noqa: E402
+
+CIUDADES = ["Medellín", "Bogotá", "Cali", "Barranquilla", "Cartagena", "Pereira", "Manizales"]
+REGIONES = ["Norte", "Sur", "Centro", "Oriente", "Occidente"]
+OBSERVACIONES = ["Sin novedad", "Cable dañado", "Revisar conector", "Equipo reemplazado", "Pendiente visita"]
+
+# (nombre, parámetros del listado) como los pide la grilla
+LISTADOS = [
+    ("sin filtros, por id", dict(limit=50)),
+    ("region ~ nor", dict(limit=50, region="nor")),
+    ("region+tecnologia, ciudad desc", dict(limit=50, sort_by="ciudad", sort_dir="desc", region="sur",
+                                            tecnologia="__EXACT__FTTH")),
+    ("correo ~ 77@", dict(limit=50, correo="77@")),
+    ("q = medel", dict(limit=50, q="medel")),
+    ("numero_inspector desc, offset 5000", dict(limit=50, offset=5000, sort_by="numero_inspector",
+                                                sort_dir="desc")),
+]
+CONTEOS = [
+    ("status ~ activo", dict(status="activo")),
+    ("ciudad+uso", dict(ciudad="cali", uso="__EXACT__Interno")),
+    ("observaciones ~ dañado", dict(observaciones="dañado")),
+]
+UNICOS = [("ciudad", ""), ("cmts_olt", ""), ("correo", "inspector99")]
+
+
+def build(path: str, rows: int, batch: int = 20_000):
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        for first in range(1, rows + 1, batch):
+            conn.execute(Registro.__table__.insert(), [
+                dict(
+                    id=i, numero_inspector=i, uuid=None if i % 10 == 0 else f"uuid-{i}", nombre=f"ins{i} Dispositivo",
+                    observaciones=rng.choice(OBSERVACIONES), status=rng.choice(["Activo", "Inactivo"]),
+                    region=rng.choice(REGIONES), flota=f"Flota {rng.choice('ABC')}", encargado="Encargado",
+                    celular=f"300{i:07d}", correo=f"inspector{i}@example.com", direccion=f"Calle {i % 200} # 10-20",
+                    uso=rng.choice(["Interno", "Externo"]), departamento="Antioquia", ciudad=rng.choice(CIUDADES),
+                    tecnologia=rng.choice(["FTTH", "HFC"]), cmts_olt=f"OLT-{i % 50}", id_servicio=f"SRV-{i}",
+                    mac_sn=f"{rng.getrandbits(48):012x}",
+                )
+                for i in range(first, min(first + batch, rows + 1))
+            ])
+    return engine
+
+
+def best_ms(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def sql_page(conn, params):
+    params = dict(params)
+    limit, offset = params.pop("limit"), params.pop("offset", 0)
+    sort_by, sort_dir = params.pop("sort_by", "id"), params.pop("sort_dir", "asc")
+    query = select(Registro)
+    where = RegistroFilterSpec.from_params(**params).where()
+    if where is not None:
+        query = query.where(where)
+    query = query.order_by(*order_by_clauses(sort_by, sort_dir)).offset(offset).limit(limit)
+    return encode_registros(conn.execute(query).scalars().all())
+
+
+def snapshot_page(data: SnapshotData, params):
+    params = dict(params)
+    limit, offset = params.pop("limit"), params.pop("offset", 0)
+    sort_by, sort_dir = params.pop("sort_by", "id"), params.pop("sort_dir", "asc")
+    order = data.order(sort_by, sort_dir)
+    selected = order[data.mask(params)[order]][offset:offset + limit]
+    return encode_registros([data.row(pos) for pos in selected])
+
+
+def sql_count(conn, filters):
+    return conn.execute(RegistroFilterSpec.from_params(global_or=False, **filters).count_statement()).scalar()
+
+
+def sql_unique(conn, column, search):
+    model_col = getattr(Registro, column)
+    stmt = select(model_col).distinct().order_by(model_col)
+    if search:
+        stmt = stmt.where(infix_match(model_col, search))
+    return [row[0] for row in conn.execute(stmt) if row[0] is not None]
+
+
+def row(name, sql_ms, snapshot_ms):
+    print(f"{name:<38} {sql_ms:>9.2f} {snapshot_ms:>12.3f} {sql_ms / snapshot_ms:>8.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del snapshot columnar de registros")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", default="/tmp/bench_snapshot.db")
+    parser.add_argument("--reuse", action="store_true", help="Usa la base de --db si ya existe")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    engine = create_engine(f"sqlite:///{args.db}") if args.reuse and os.path.exists(args.db) \
+        else build(args.db, args.rows)
+
+    with Session(engine) as conn:
+        start = time.perf_counter()
+        rows = conn.execute(select(*Registro.__table__.columns)).mappings().all()
+        data = SnapshotData(rows)
+        print(f"snapshot de {data.rows} registros: carga {time.perf_counter() - start:.1f}s, "
+              f"{data.nbytes / 1e6:.0f} MB en arrays")
+        del rows
+
+        print(f"\n{'consulta':<38} {'SQL ms':>9} {'snapshot ms':>12} {'mejora':>8}")
+        for name, params in LISTADOS:
+            # La primera llamada calcula la permutación del orden; se mide el estado estable
+            sql_ms, expected = best_ms(lambda: sql_page(conn, params), args.repeat)
+            snapshot_ms, result = best_ms(lambda: snapshot_page(data, params), args.repeat)
+            assert result == expected, name
+            row(f"lista: {name}", sql_ms, snapshot_ms)
+        for name, filters in CONTEOS:
+            sql_ms, expected = best_ms(lambda: sql_count(conn, filters), args.repeat)
+            snapshot_ms, result = best_ms(lambda: int(data.mask(filters, global_or=False).sum()), args.repeat)
+            assert result == expected, name
+            row(f"total: {name}", sql_ms, snapshot_ms)
+        for column, search in UNICOS:
+            sql_ms, expected = best_ms(lambda: sql_unique(conn, column, search), args.repeat)
+            snapshot_ms, result = best_ms(lambda: data.unique(column, search), args.repeat)
+            assert result == expected, column
+            row(f"únicos: {column} ~ '{search}'", sql_ms, snapshot_ms)
+
+        # Costo de un cambio incremental y del primer listado después (recalcula el orden)
+        registro = data.row(data.positions[1])
+        change_ms, _ = best_ms(lambda: data.upsert({**registro, "ciudad": "Cali"}), args.repeat)
+        start = time.perf_counter()
+        snapshot_page(data, LISTADOS[0][1])
+        print(f"\ncambio incremental: {change_ms:.3f} ms | primer listado tras el cambio: "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+📊 Benchmark de búsqueda por subcadena (ILIKE '%valor%') - Inspector API
+
+Crea una base SQLite con N registros (por defecto 1M) usando el mismo esquema de la
+aplicación, que incluye la tabla FTS5 trigram registros_fts, y compara por filtro:
+- CAST(col AS VARCHAR) ILIKE '%valor%': recorre la tabla completa (comportamiento anterior)
+- infix_match(): resuelve el filtro con el índice de trigramas
+
+y para la búsqueda global (q=) sobre las 18 columnas:
+- OR de CAST(col AS VARCHAR) ILIKE por columna (comportamiento anterior)
+- OR de infix_match() por columna (una consulta al índice por columna)
+- global_match(): una sola consulta al índice, y la misma ordenada por relevancia (bm25)
+
+Uso:
+    python scripts/bench_search_index.py [--rows 1000000] [--repeat 5] [--db /tmp/bench_search.db] [--reuse]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import String, cast, create_engine, func, or_, select  # noqa: E402
+
+from app.db.base import Base  # noqa: E402
+from app.db.models import Registro  # noqa: E402
+from app.db.search import SEARCH_COLUMNS, global_match, infix_match, order_by_relevance  # noqa: E402
+
+CIUDADES = ["Medellín", "Bogotá", "Cali", "Barranquilla", "Cartagena", "Pereira", "Manizales"]
+REGIONES = ["Norte", "Sur", "Centro", "Oriente", "Occidente"]
+OBSERVACIONES = ["Sin novedad", "Cable dañado", "Revisar conector", "Equipo reemplazado", "Pendiente visita"]
+
+# (columna, valor) como los escribiría un usuario en los filtros de la grilla
+FILTROS = [
+    ("nombre", "ins4242"),
+    ("correo", "77@"),
+    ("mac_sn", "ab:1c"),
+    ("id_servicio", "SRV-9999"),
+    ("observaciones", "dañado"),
+    ("ciudad", "medel"),
+]
+
+# Textos de la búsqueda global
+BUSQUEDAS = ["ins4242", "SRV-9999", "77@", "medel"]
+
+
+def build(path: str, rows: int, batch: int = 20_000):
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    rng = random.Random(7)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        for first in range(1, rows + 1, batch):
+            conn.execute(Registro.__table__.insert(), [
+                dict(
+                    id=i, numero_inspector=i, uuid=None, nombre=f"ins{i} Dispositivo",
+                    observaciones=rng.choice(OBSERVACIONES), status="Activo", region=rng.choice(REGIONES),
+                    flota="Flota A", encargado="Encargado", celular=f"300{i:07d}",
+                    correo=f"inspector{i}@example.com", direccion=f"Calle {i % 200} # 10-20",
+                    uso="Interno", departamento="Antioquia", ciudad=rng.choice(CIUDADES), tecnologia="FTTH",
+                    cmts_olt=f"OLT-{i % 50}", id_servicio=f"SRV-{i}", mac_sn=f"{rng.getrandbits(48):012x}",
+                )
+                for i in range(first, min(first + batch, rows + 1))
+            ])
+    return engine, time.perf_counter() - start
+
+
+def timed(engine, condition, repeat: int):
+    stmt = select(func.count()).select_from(Registro).where(condition)
+    best = float("inf")
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            total = conn.execute(stmt).scalar()
+            best = min(best, time.perf_counter() - start)
+    return best * 1000, total
+
+
+def timed_page(engine, q: str, repeat: int, limit: int = 10):
+    """Primera página de la búsqueda global ordenada por relevancia"""
+    stmt = select(Registro.id).where(global_match(_columns(), q))
+    stmt = order_by_relevance(stmt, Registro.__table__, q, engine.dialect.name).limit(limit)
+    best = float("inf")
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(stmt).all()
+            best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def _columns():
+    return [getattr(Registro, field) for field in SEARCH_COLUMNS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda por subcadena")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", default="/tmp/bench_search.db")
+    parser.add_argument("--reuse", action="store_true", help="Usa la base de --db si ya existe")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    if args.reuse and os.path.exists(args.db):
+        engine = create_engine(f"sqlite:///{args.db}")
+    else:
+        engine, seconds = build(args.db, args.rows)
+        print(f"{args.rows} registros cargados en {seconds:.1f}s (con triggers FTS) | "
+              f"archivo {os.path.getsize(args.db) / 1e6:.0f} MB")
+    print(f"{'filtro':<28} {'filas':>8} {'ILIKE ms':>10} {'trigram ms':>11} {'mejora':>8}")
+    for field, value in FILTROS:
+        column = getattr(Registro, field)
+        scan_ms, scan_total = timed(engine, cast(column, String).ilike(f"%{value}%"), args.repeat)
+        index_ms, index_total = timed(engine, infix_match(column, value), args.repeat)
+        assert scan_total == index_total, (field, scan_total, index_total)
+        print(f"{field + ' ~ ' + value:<28} {index_total:>8} {scan_ms:>10.1f} {index_ms:>11.1f} "
+              f"{scan_ms / index_ms:>7.1f}x")
+
+    print(f"\n{'q':<12} {'filas':>8} {'OR ILIKE ms':>12} {'OR trigram ms':>14} {'global ms':>10} "
+          f"{'ranking ms':>11}")
+    for q in BUSQUEDAS:
+        scan_ms, scan_total = timed(engine, or_(*(cast(c, String).ilike(f"%{q}%") for c in _columns())), args.repeat)
+        per_column_ms, per_column_total = timed(engine, or_(*(infix_match(c, q) for c in _columns())), args.repeat)
+        global_ms, global_total = timed(engine, global_match(_columns(), q), args.repeat)
+        assert scan_total == per_column_total == global_total, (q, scan_total, per_column_total, global_total)
+        print(f"{q:<12} {global_total:>8} {scan_ms:>12.1f} {per_column_ms:>14.1f} {global_ms:>10.1f} "
+              f"{timed_page(engine, q, args.repeat):>11.1f}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
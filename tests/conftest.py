@@ -2,6 +2,7 @@
 Configuración de pytest para Inspector API
 """
 import pytest
+import pytest_asyncio
 import asyncio
 from typing import AsyncGenerator, Generator
 from fastapi.testclient import TestClient
@@ -110,6 +111,78 @@ def sample_registro_data():
     }
 
 
+def make_registro(i: int, **changes) -> dict:
+    """
+    Valores de un registro de prueba (columnas de Registro) a partir de su número;
+    changes reemplaza o agrega campos (id, region, uuid, ...)
+    """
+    row = {
+        "numero_inspector": i,
+        "nombre": f"ins{i} Dispositivo",
+        "observaciones": "Sin novedad",
+        "status": "Activo",
+        "region": "Norte",
+        "flota": "Flota A",
+        "encargado": "Encargado",
+        "celular": "3001234567",
+        "correo": f"user{i}@example.com",
+        "direccion": "Calle 1",
+        "uso": "Interno",
+        "departamento": "Valle",
+        "ciudad": "Bogotá",
+        "tecnologia": "FTTH",
+        "cmts_olt": "OLT-1",
+        "id_servicio": f"SRV-{i}",
+        "mac_sn": f"AA:{i}",
+        "uuid": None
+    }
+    row.update(changes)
+    return row
+
+
+@pytest_asyncio.fixture
+async def engine():
+    """Base SQLite en memoria con el esquema completo"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    """Fábrica de sesiones sobre la base en memoria"""
+    return async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+
+@pytest.fixture
+def seed_rows() -> list:
+    """Instancias ORM con que se siembra `session`; cada módulo lo sobrescribe con sus datos"""
+    return []
+
+
+@pytest_asyncio.fixture
+async def session(session_factory, seed_rows) -> AsyncGenerator[AsyncSession, None]:
+    """Sesión sobre la base en memoria, sembrada con seed_rows"""
+    async with session_factory() as db_session:
+        db_session.add_all(seed_rows)
+        await db_session.commit()
+        yield db_session
+
+
+@pytest.fixture
+def service_cache(monkeypatch):
+    """Cache en memoria vacío para RegistroCacheService y los helpers de app.services.cache"""
+    from app.services import registro_cache_service as service_module
+    from app.services.cache import AdvancedCache
+
+    cache = AdvancedCache()
+    monkeypatch.setattr(service_module, "cache", cache)
+    monkeypatch.setattr("app.services.cache.cache", cache)
+    return cache
+
+
 @pytest.fixture
 def auth_headers(client, sample_user_data):
     """Obtener headers de autenticación"""
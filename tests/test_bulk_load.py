@@ -0,0 +1,71 @@
+"""
+Tests unitarios para la carga masiva de registros con Core (executemany / COPY)
+"""
+import pytest
+from sqlalchemy import event, select
+
+from app.db.models import Registro
+from app.services.bulk_load import LOAD_COLUMNS, BulkLoadReport, batched, bulk_insert_registros, copy_records
+from tests.conftest import make_registro
+
+
+def _fila(i: int) -> dict:
+    return make_registro(i, uuid=None if i % 2 else f"uuid-{i}")
+
+
+class TestBulkLoad:
+    """Tests para bulk_insert_registros y sus lotes"""
+
+    @pytest.mark.unit
+    def test_batched(self):
+        """Test agrupa cualquier iterable en lotes de tamaño fijo sin materializarlo"""
+        assert [len(batch) for batch in batched(iter(range(23)), 10)] == [10, 10, 3]
+        assert list(batched([], 10)) == []
+
+    @pytest.mark.unit
+    def test_copy_records_follow_load_columns(self):
+        """Test las tuplas del COPY siguen LOAD_COLUMNS, sin id ni columnas generadas"""
+        assert "id" not in LOAD_COLUMNS and "orden_excel" not in LOAD_COLUMNS and "uuid" in LOAD_COLUMNS
+        record = copy_records([_fila(2)])[0]
+        assert dict(zip(LOAD_COLUMNS, record)) == _fila(2)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_executemany_per_batch_without_orm_objects(self, engine, session_factory):
+        """Test en SQLite inserta con un executemany por lote y no deja objetos en la sesión"""
+        statements = []
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO registros"):
+                statements.append((executemany, len(parameters)))
+
+        async with session_factory() as session:
+            async with session.begin():
+                report = await bulk_insert_registros(session, (_fila(i) for i in range(1, 24)), batch_size=10)
+                assert len(session.identity_map) == 0
+            filas = (await session.execute(select(Registro).order_by(Registro.id))).scalars().all()
+
+        assert report.method == "executemany" and report.rows == 23 and report.batches == 3
+        assert statements == [(True, 10), (True, 10), (True, 3)]
+        assert [r.numero_inspector for r in filas] == list(range(1, 24))
+        assert filas[1].uuid == "uuid-2" and filas[0].uuid is None and filas[0].orden_excel == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_rolls_back_with_session(self, session_factory):
+        """Test la carga queda en la transacción de la sesión"""
+        async with session_factory() as session:
+            await bulk_insert_registros(session, [_fila(1), _fila(2)])
+            await session.rollback()
+            assert (await session.execute(select(Registro))).first() is None
+
+    @pytest.mark.unit
+    def test_report(self):
+        """Test el reporte calcula filas por segundo y sus campos de respuesta"""
+        report = BulkLoadReport("copy", 1000, 2, 0.5)
+        assert report.rows_per_second == 2000
+        assert report.as_dict() == {
+            "metodo_carga": "copy", "lotes_carga": 2, "duracion_carga_segundos": 0.5, "filas_por_segundo_carga": 2000,
+        }
+        assert BulkLoadReport("executemany", 0, 0, 0.0).rows_per_second == 0.0
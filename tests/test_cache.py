@@ -0,0 +1,1059 @@
+"""
+Tests unitarios para el cache avanzado
+"""
+import json
+
+import pytest
+
+from app.services.cache import AdvancedCache, create_eviction_policy
+from tests.conftest import make_registro
+
+
+class TestCacheEviction:
+    """Tests para los límites de memoria y las políticas de desalojo"""
+
+    @pytest.mark.unit
+    def test_max_entries_lru(self):
+        """Test LRU desaloja la clave usada hace más tiempo"""
+        cache = AdvancedCache(max_entries=3, eviction_policy="lru")
+        for key in ("a", "b", "c"):
+            cache.set(key, key, tags={"registros"})
+
+        # 'a' se vuelve reciente, 'b' queda como la más antigua
+        assert cache.get("a") == "a"
+        cache.set("d", "d", tags={"registros"})
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "a"
+        assert cache.get("d") == "d"
+        stats = cache.get_stats()
+        assert stats["cache_size"] == 3
+        assert stats["evictions"] == 1
+
+    @pytest.mark.unit
+    def test_max_entries_lfu(self):
+        """Test LFU desaloja la clave menos usada"""
+        cache = AdvancedCache(max_entries=3, eviction_policy="lfu")
+        for key in ("a", "b", "c"):
+            cache.set(key, key, tags={"registros"})
+        for _ in range(3):
+            cache.get("a")
+            cache.get("c")
+        # 'b' es la más reciente, pero la menos usada
+        cache.get("b")
+
+        cache.set("d", "d", tags={"registros"})
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "a"
+        assert cache.get("c") == "c"
+        assert cache.get_stats()["evictions"] == 1
+
+    @pytest.mark.unit
+    def test_tinylfu_rejects_cold_keys(self):
+        """Test TinyLFU no deja que una clave fría desplace a una caliente"""
+        cache = AdvancedCache(max_entries=2, eviction_policy="tinylfu")
+        cache.set("hot1", 1, tags={"registros"})
+        cache.set("hot2", 2, tags={"registros"})
+        for _ in range(5):
+            cache.get("hot1")
+            cache.get("hot2")
+
+        cache.set("cold", 3, tags={"registros"})
+
+        assert cache.get("cold") is None
+        assert cache.get("hot1") == 1
+        assert cache.get("hot2") == 2
+        assert cache.get_stats()["admission_rejections"] == 1
+
+    @pytest.mark.unit
+    def test_max_bytes_budget(self):
+        """Test el presupuesto de bytes se respeta y se libera al eliminar"""
+        cache = AdvancedCache(max_bytes=20_000, eviction_policy="lru")
+        for i in range(50):
+            cache.set(f"k{i}", "x" * 1000, tags={"registros"})
+            assert cache.get_stats()["cache_bytes"] <= 20_000
+
+        stats = cache.get_stats()
+        assert 0 < stats["cache_size"] < 50
+        assert stats["evictions"] > 0
+
+        cache.invalidate_registros()
+        assert cache.get_stats()["cache_bytes"] == 0
+
+    @pytest.mark.unit
+    def test_value_larger_than_budget_is_not_stored(self):
+        """Test un valor mayor que el presupuesto no se almacena"""
+        cache = AdvancedCache(max_bytes=1_000)
+        cache.set("big", "x" * 5_000, tags={"registros"})
+        assert cache.get("big") is None
+        assert cache.get_stats()["admission_rejections"] == 1
+
+    @pytest.mark.unit
+    def test_eviction_cleans_tag_index(self):
+        """Test desalojar una entrada también la retira de los índices de tags"""
+        cache = AdvancedCache(max_entries=1)
+        cache.set("a", 1, tags={"registros"})
+        cache.set("b", 2, tags={"estadisticas"})
+        assert cache.invalidate_registros() == 0
+        assert cache.get_stats()["tags_count"] == 1
+
+    @pytest.mark.unit
+    def test_unknown_policy(self):
+        """Test una política desconocida produce un error claro"""
+        with pytest.raises(ValueError):
+            create_eviction_policy("fifo")
+
+
+class TestCacheInvalidationIndex:
+    """Tests para el índice inverso de patrones y el índice de prefijos"""
+
+    @pytest.mark.unit
+    def test_delete_cleans_only_key_patterns(self):
+        """Test eliminar una clave la retira de sus patrones y deja los demás intactos"""
+        cache = AdvancedCache()
+        cache.set("registro_individual:1", 1, tags={"registros"}, pattern="registro_1")
+        cache.set("registro_individual:2", 2, tags={"registros"}, pattern="registro_2")
+
+        assert cache.delete("registro_individual:1")
+        assert "registro_1" not in cache._patterns
+        assert cache._patterns["registro_2"] == {"registro_individual:2"}
+        assert "registro_individual:1" not in cache._key_patterns
+
+    @pytest.mark.unit
+    def test_invalidate_by_registered_pattern(self):
+        """Test invalidar por un patrón registrado en set()"""
+        cache = AdvancedCache()
+        cache.set("a:1", 1, tags={"registros"}, pattern="grupo")
+        cache.set("b:2", 2, tags={"registros"}, pattern="grupo")
+        cache.set("c:3", 3, tags={"registros"})
+
+        assert cache.invalidate_by_pattern("grupo") == 2
+        assert cache.get("c:3") == 3
+
+    @pytest.mark.unit
+    def test_invalidate_by_key_prefix(self):
+        """Test invalidar por prefijo de clave sin afectar otros namespaces"""
+        cache = AdvancedCache()
+        for i in range(20):
+            cache.set(f"registros_lista:{i:04d}", i, tags={"registros"})
+            cache.set(f"total_registros:{i:04d}", i, tags={"estadisticas"})
+
+        assert cache.invalidate_by_pattern("registros_lista:000") == 10
+        assert cache.invalidate_by_pattern("registros_lista:") == 10
+        assert cache.get("total_registros:0001") == 1
+        assert cache.get_stats()["cache_size"] == 20
+
+    @pytest.mark.unit
+    def test_invalidate_by_tags_in_one_pass(self):
+        """Test invalidar varios tags cuenta una vez las claves con más de uno"""
+        cache = AdvancedCache()
+        cache.set("registros_lista:1", 1, tags={"registros_lista", "registros"})
+        cache.set("total_registros:1", 2, tags={"estadisticas", "registros"})
+        cache.set("historial:1", 3, tags={"historial"})
+        cache.set("usuarios:1", 4, tags={"usuarios"})
+
+        assert cache.invalidate_by_tags(["registros", "estadisticas", "historial", "sin_claves"]) == 3
+        assert cache.get("usuarios:1") == 4
+        assert cache.get_stats()["cache_size"] == 1 and not cache._tags.get("registros")
+
+    @pytest.mark.unit
+    def test_key_trie_prunes_and_aligns_segments(self):
+        """Test el índice de prefijos respeta segmentos completos y se poda al eliminar"""
+        from app.services.cache import _KeyTrie
+
+        trie = _KeyTrie()
+        for key in ("registro_individual:id=5", "registro_individual:id=50", "historial:id=5"):
+            trie.insert(key)
+
+        assert set(trie.iter_prefix("registro_individual:id=5")) == {
+            "registro_individual:id=5", "registro_individual:id=50"
+        }
+        assert set(trie.iter_prefix("registro_individual:id=5", segment_aligned=True)) == {
+            "registro_individual:id=5"
+        }
+
+        trie.remove("registro_individual:id=5")
+        trie.remove("registro_individual:id=50")
+        assert "registro_individual" not in trie._root.children
+
+    @pytest.mark.unit
+    def test_key_trie_sorted_view_only_on_partial_lookup(self):
+        """Test insertar y borrar no mantienen una lista ordenada; la consulta parcial la reconstruye"""
+        from app.services.cache import _KeyTrie
+
+        trie = _KeyTrie()
+        for i in range(100):
+            trie.insert(f"registros_lista:{i:04d}")
+        node = trie._root.children["registros_lista"]
+        assert node.names is None
+
+        assert len(list(trie.iter_prefix("registros_lista:000"))) == 10
+        assert node.names is not None
+        trie.insert("registros_lista:0000x")
+        trie.remove("registros_lista:0001")
+        assert node.names is None
+        assert sorted(trie.iter_prefix("registros_lista:000")) == [
+            "registros_lista:0000", "registros_lista:0000x", *(f"registros_lista:{i:04d}" for i in range(2, 10))
+        ]
+
+
+class TestCacheReaper:
+    """Tests para el reaper de TTL en segundo plano"""
+
+    @pytest.mark.unit
+    def test_reap_expired_only_touches_expired(self):
+        """Test el reaper elimina sólo las entradas vencidas y mide el retraso"""
+        import time
+
+        cache = AdvancedCache()
+        cache.set("corta", 1, ttl=1, tags={"registros"})
+        cache.set("larga", 2, ttl=600, tags={"registros"})
+
+        assert cache.reap_expired(now=time.time() + 2) == 1
+        assert cache.get("larga") == 2
+        stats = cache.get_stats()
+        assert stats["expirations"] == 1
+        assert stats["reaper"]["last_lag_ms"] >= 0
+        assert stats["tags_count"] == 1
+
+    @pytest.mark.unit
+    def test_reap_ignores_replaced_entries(self):
+        """Test una clave reemplazada con TTL mayor no se elimina por su expiración anterior"""
+        import time
+
+        cache = AdvancedCache()
+        cache.set("clave", "vieja", ttl=1, tags={"registros"})
+        cache.set("clave", "nueva", ttl=600, tags={"registros"})
+
+        assert cache.reap_expired(now=time.time() + 2) == 0
+        assert cache.get("clave") == "nueva"
+
+    @pytest.mark.unit
+    def test_reap_respects_max_items(self):
+        """Test el reaper procesa por lotes"""
+        import time
+
+        cache = AdvancedCache()
+        for i in range(10):
+            cache.set(f"k{i}", i, ttl=1, tags={"registros"})
+
+        assert cache.reap_expired(now=time.time() + 2, max_items=4) == 4
+        assert cache.reap_expired(now=time.time() + 2) == 6
+        assert cache.get_stats()["cache_size"] == 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_background_reaper_task(self):
+        """Test la tarea en segundo plano elimina entradas y reporta sus pasadas"""
+        import asyncio
+
+        cache = AdvancedCache()
+        cache.set("corta", 1, ttl=0, tags={"registros"})
+        cache.start_reaper(interval=0.01)
+        try:
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if cache.get_stats()["reaper"]["passes"]:
+                    break
+        finally:
+            await cache.stop_reaper()
+
+        stats = cache.get_stats()
+        assert stats["reaper"]["passes"] >= 1
+        assert stats["reaper"]["reaped"] == 1
+        assert stats["reaper"]["running"] is False
+        assert stats["cache_size"] == 0
+
+
+class TestRedisCacheBackend:
+    """Tests para el backend de cache en Redis (usando fakeredis)"""
+
+    @pytest.fixture
+    def redis_cache(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        from app.services.cache_redis import RedisCacheBackend
+
+        return RedisCacheBackend(client=fakeredis.FakeRedis())
+
+    @pytest.mark.unit
+    def test_set_get_delete(self, redis_cache):
+        """Test operaciones básicas contra Redis"""
+        redis_cache.set("registro_individual:id=1", {"id": 1}, ttl=60, tags={"registros"})
+        assert redis_cache.get("registro_individual:id=1") == {"id": 1}
+        assert redis_cache.delete("registro_individual:id=1")
+        assert redis_cache.get("registro_individual:id=1") is None
+        stats = redis_cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["backend"] == "redis"
+
+    @pytest.mark.unit
+    def test_invalidate_by_tag_is_shared(self):
+        """Test una invalidación desde un worker es visible para otro worker"""
+        fakeredis = pytest.importorskip("fakeredis")
+        from app.services.cache_redis import RedisCacheBackend
+
+        server = fakeredis.FakeServer()
+        worker_a = RedisCacheBackend(client=fakeredis.FakeRedis(server=server))
+        worker_b = RedisCacheBackend(client=fakeredis.FakeRedis(server=server))
+
+        for i in range(5):
+            worker_a.set(f"registros_lista:{i}", [i], ttl=60, tags={"registros_lista", "registros"})
+        worker_a.set("historial:1", [], ttl=60, tags={"historial"})
+        assert worker_b.get("registros_lista:3") == [3]
+
+        assert worker_b.invalidate_registros() == 5
+        assert worker_a.get("registros_lista:3") is None
+        assert worker_a.get("historial:1") == []
+
+    @pytest.mark.unit
+    def test_invalidate_by_tags(self, redis_cache):
+        """Test invalida varios tags con un solo pipeline de lectura"""
+        redis_cache.set("registros_lista:1", [1], ttl=60, tags={"registros"})
+        redis_cache.set("total_registros:1", 2, ttl=60, tags={"estadisticas", "registros"})
+        redis_cache.set("usuarios:1", 3, ttl=60, tags={"usuarios"})
+
+        assert redis_cache.invalidate_by_tags(["registros", "estadisticas"]) == 2
+        assert redis_cache.get("total_registros:1") is None
+        assert redis_cache.get("usuarios:1") == 3
+
+    @pytest.mark.unit
+    def test_invalidate_by_pattern_and_cleanup(self, redis_cache):
+        """Test invalidación por patrón/prefijo y limpieza de índices huérfanos"""
+        redis_cache.set("registro_individual:id=1", 1, ttl=60, tags={"registros"}, pattern="registro:1")
+        redis_cache.set("registro_individual:id=2", 2, ttl=60, tags={"registros"})
+        redis_cache.set("total_registros:abc", 3, ttl=60, tags={"estadisticas"})
+
+        assert redis_cache.invalidate_by_pattern("registro:1") == 1
+        assert redis_cache.invalidate_by_pattern("registro_individual:") == 1
+        assert redis_cache.get("total_registros:abc") == 3
+        # Al borrarlas se retiran también del set 'registros'
+        assert redis_cache._redis.smembers(redis_cache._t("registros")) == set()
+        assert redis_cache.cleanup_expired() == 0
+
+        # Una entrada que expira deja su referencia hasta la limpieza
+        redis_cache.set("registros_lista:1", [1], ttl=60, tags={"registros", "registros_lista"})
+        redis_cache._redis.delete(redis_cache._k("registros_lista:1"))
+        assert redis_cache.cleanup_expired() == 2
+        assert redis_cache._redis.smembers(redis_cache._t("registros_lista")) == set()
+
+    @pytest.mark.unit
+    def test_index_hash_expires_with_entry(self, redis_cache):
+        """Test el hash de tags de una entrada tiene el mismo EX que la entrada"""
+        redis_cache.set("registros_lista:1", [1], ttl=60, stale_ttl=30, tags={"registros"})
+        assert redis_cache._redis.ttl(redis_cache._i("registros_lista:1")) == redis_cache._redis.ttl(
+            redis_cache._k("registros_lista:1")) == 90
+        assert redis_cache.delete("registros_lista:1")
+        assert not redis_cache._redis.exists(redis_cache._i("registros_lista:1"))
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_background_index_cleanup(self, redis_cache):
+        """Test start_reaper programa cleanup_expired en Redis y reporta sus pasadas"""
+        import asyncio
+
+        redis_cache.set("registros_lista:1", [1], ttl=60, tags={"registros"})
+        redis_cache._redis.delete(redis_cache._k("registros_lista:1"))
+        assert redis_cache.start_reaper(interval=0) is None
+        redis_cache.start_reaper(interval=0.01)
+        try:
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if redis_cache.get_stats()["reaper"]["passes"]:
+                    break
+        finally:
+            await redis_cache.stop_reaper()
+
+        stats = redis_cache.get_stats()["reaper"]
+        assert stats["passes"] >= 1 and stats["reaped"] == 1 and stats["running"] is False
+        assert redis_cache._redis.smembers(redis_cache._t("registros")) == set()
+
+    @pytest.mark.unit
+    def test_clear_only_touches_namespace(self, redis_cache):
+        """Test clear() no borra claves ajenas al cache"""
+        redis_cache._redis.set("otra_app:clave", "x")
+        redis_cache.set("registros_lista:1", [1], ttl=60, tags={"registros"})
+        redis_cache.clear()
+        assert redis_cache.get("registros_lista:1") is None
+        assert redis_cache._redis.get("otra_app:clave") == b"x"
+
+
+class TestTwoTierCache:
+    """Tests para el cache de dos niveles (L1 en memoria + L2 Redis)"""
+
+    @pytest.fixture
+    def workers(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        from app.services.cache_redis import RedisCacheBackend, TwoTierCache
+
+        server = fakeredis.FakeServer()
+        pair = [
+            TwoTierCache(RedisCacheBackend(client=fakeredis.FakeRedis(server=server)), l1_ttl=30)
+            for _ in range(2)
+        ]
+        yield pair
+        for worker in pair:
+            worker.close()
+
+    @pytest.mark.unit
+    def test_hits_per_tier(self, workers):
+        """Test la segunda lectura en otro worker se sirve desde su L1"""
+        worker_a, worker_b = workers
+        worker_a.set("registro_individual:abc", {"id": 1}, ttl=300, tags={"registro_individual", "registros"})
+
+        assert worker_b.get("registro_individual:abc") == {"id": 1}  # L2
+        assert worker_b.get("registro_individual:abc") == {"id": 1}  # L1
+        assert worker_b.get("registro_individual:zzz") is None
+
+        stats = worker_b.get_stats()
+        assert stats["l1_hits"] == 1
+        assert stats["l2_hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["l2_hit_rate"] == "50.00%"
+        # La entrada promovida a L1 conserva sus tags
+        assert stats["l1"]["tags_count"] == 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_async_api_keeps_redis_off_the_loop(self, workers, monkeypatch):
+        """Test las variantes async llaman a Redis en un hilo; un hit de L1 no sale del loop"""
+        import asyncio
+
+        worker_a, worker_b = workers
+        calls = []
+        to_thread = asyncio.to_thread
+
+        async def spy(fn, *args, **kwargs):
+            calls.append(fn.__name__)
+            return await to_thread(fn, *args, **kwargs)
+
+        monkeypatch.setattr(asyncio, "to_thread", spy)
+        await worker_a.aset("registros_lista:1", b"[]", ttl=300, tags={"registros"})
+        assert await worker_b.aget("registros_lista:1") == b"[]"  # L2, en un hilo
+        assert await worker_b.aget("registros_lista:1") == b"[]"  # L1, en el loop
+        assert await worker_b.ainvalidate_by_tag("registros") == 1
+        assert calls == ["set", "_get_fresh_l2", "invalidate_by_tag"]
+        # Las estadísticas de Redis son contadores, sin recorrer el namespace
+        assert "cache_size" not in worker_b.l2.get_stats()
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_start_reaper_covers_both_tiers(self, workers):
+        """Test start_reaper arranca el reaper del L1 y la limpieza de índices de Redis"""
+        worker = workers[0]
+        task = worker.start_reaper(interval=60, l2_interval=60)
+        try:
+            assert task is not None and not task.done()
+            assert worker.l2._reaper_task is not None and not worker.l2._reaper_task.done()
+        finally:
+            await worker.stop_reaper()
+        assert worker.l2._reaper_task is None and task.done()
+        # El reaper es del TwoTierCache, no el propio del L1
+        assert worker.l1._reaper_task is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_l1_reaper_holds_lock(self, workers, monkeypatch):
+        """Test el reaper del L1 elimina las entradas vencidas con el lock del listener tomado"""
+        import asyncio
+
+        worker = workers[0]
+        lock = worker._lock
+        held = []
+
+        class RecordingLock:
+            def __enter__(self):
+                lock.acquire()
+                held.append(True)
+
+            def __exit__(self, *exc):
+                held.pop()
+                lock.release()
+
+        reap_expired = worker.l1.reap_expired
+
+        def reap(*args, **kwargs):
+            assert held, "reap_expired sin el lock"
+            return reap_expired(*args, **kwargs)
+
+        monkeypatch.setattr(worker, "_lock", RecordingLock())
+        monkeypatch.setattr(worker.l1, "reap_expired", reap)
+        worker.l1.set("registros_lista:1", b"[]", ttl=0.01, tags={"registros"})
+        worker.start_reaper(interval=0.02, l2_interval=0)
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            await worker.stop_reaper()
+        assert worker.l1.get_stats()["reaper"]["reaped"] == 1
+
+    @pytest.mark.unit
+    def test_invalidation_fans_out_to_other_l1(self, workers):
+        """Test una invalidación publicada limpia el L1 de los demás workers"""
+        import time
+
+        worker_a, worker_b = workers
+        worker_a.set("registros_lista:1", [1], ttl=300, tags={"registros_lista", "registros"})
+        assert worker_b.get("registros_lista:1") == [1]
+        assert worker_b.l1.get("registros_lista:1") == [1]
+
+        worker_a.invalidate_registros()
+
+        deadline = time.time() + 5
+        while worker_b.l1.get("registros_lista:1") is not None and time.time() < deadline:
+            time.sleep(0.02)
+        assert worker_b.get("registros_lista:1") is None
+        assert worker_b.get_stats()["received"] >= 1
+        assert worker_a.get_stats()["received"] == 0
+
+    @pytest.mark.unit
+    def test_apply_local_operations(self, workers):
+        """Test cada tipo de mensaje se aplica sólo al L1 local"""
+        worker_a, _ = workers
+        worker_a.set("registro_individual:id=5", 5, ttl=300, tags={"registros"}, pattern="registro:5")
+        worker_a.set("historial:1", [], ttl=300, tags={"historial"})
+
+        assert worker_a._apply_local("pattern", "registro:5") == 1
+        assert worker_a.l1.get("registro_individual:id=5") is None
+        # L2 no se toca: la entrada vuelve a L1 en la siguiente lectura
+        assert worker_a.get("registro_individual:id=5") == 5
+
+        assert worker_a._apply_local("tag", "historial") == 1
+        worker_a.set("historial:2", [], ttl=300, tags={"historial"})
+        worker_a.set("total_registros:1", 1, ttl=300, tags={"estadisticas"})
+        assert worker_a._apply_local("tags", ["historial", "estadisticas"]) == 2
+        assert worker_a._apply_local("delete", "registro_individual:id=5") == 1
+        assert worker_a._apply_local("desconocida", None) == 0
+
+
+def _registro_data(registro_id: int) -> dict:
+    """Datos válidos para RegistroOut"""
+    return make_registro(
+        100 + registro_id, id=registro_id, nombre="ins Dispositivo", correo="test@example.com",
+        departamento="Antioquia", ciudad="Medellín", id_servicio="SRV-1", mac_sn="AA:BB:CC",
+    )
+
+
+class _CountingSession:
+    """Sesión falsa que cuenta las consultas ejecutadas contra la 'BD'"""
+
+    def __init__(self, delay: float = 0.05):
+        self.executions = 0
+        self.delay = delay
+
+    async def scalar(self, stmt):
+        import asyncio
+
+        self.executions += 1
+        await asyncio.sleep(self.delay)
+        return 42
+
+    async def execute(self, stmt):
+        import asyncio
+
+        self.executions += 1
+        await asyncio.sleep(self.delay)
+
+        class _Result:
+            def scalars(self):
+                return self
+
+            def all(self):
+                return [_registro_data(1)]
+
+        return _Result()
+
+
+class TestSingleFlight:
+    """Tests para la coalescencia de misses concurrentes (single-flight)"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_hit_db_once(self):
+        """Test 50 peticiones concurrentes con la misma clave ejecutan una sola consulta"""
+        import asyncio
+        import uuid
+        from app.services.registro_cache_service import RegistroCacheService
+
+        session = _CountingSession()
+        region = f"sf-{uuid.uuid4().hex}"
+        results = await asyncio.gather(*[
+            RegistroCacheService.get_cached_total_registros(session, region=region)
+            for _ in range(50)
+        ])
+        assert session.executions == 1
+        assert all(r == {"total": 42} for r in results)
+
+        results = await asyncio.gather(*[
+            RegistroCacheService.get_cached_registros_list(session, limit=10, region=region)
+            for _ in range(50)
+        ])
+        assert session.executions == 2
+        assert len(set(results)) == 1
+        assert json.loads(results[0].payload) == [_registro_data(1)]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_cache_decorator_coalesces(self):
+        """Test el decorador de cache ejecuta la función una vez por clave concurrente"""
+        import asyncio
+
+        cache = AdvancedCache()
+        calls = []
+
+        @cache.cache_decorator(ttl=60, key_prefix="sf_test", tags={"registros"})
+        async def compute(x):
+            calls.append(x)
+            await asyncio.sleep(0.05)
+            return x * 2
+
+        results = await asyncio.gather(*[compute(1) for _ in range(20)], compute(2))
+        assert results == [2] * 20 + [4]
+        assert sorted(calls) == [1, 2]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_errors_are_shared_and_not_cached(self):
+        """Test una excepción se propaga a todos los que esperaban y no queda en vuelo"""
+        import asyncio
+        from app.services.cache import SingleFlight
+
+        flight = SingleFlight()
+        calls = 0
+
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(*[flight.do("k", failing) for _ in range(5)], return_exceptions=True)
+        assert calls == 1
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert flight.get_stats() == {"executions": 1, "coalesced": 4, "inflight": 0}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_cancelled_leader_lets_followers_retry(self):
+        """Test si se cancela quien calcula, los demás reintentan el cálculo"""
+        import asyncio
+        from app.services.cache import SingleFlight
+
+        flight = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        leader = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        assert await follower == "ok"
+        assert flight.get_stats()["executions"] == 2
+
+
+class TestStaleWhileRevalidate:
+    """Tests para stale-while-revalidate y la expiración temprana probabilística"""
+
+    @pytest.mark.unit
+    def test_stale_entry_only_served_with_meta(self):
+        """Test una entrada vencida en su ventana de gracia sólo la devuelve get_with_meta"""
+        cache = AdvancedCache()
+        cache.set("total_registros:abc", {"total": 1}, ttl=0, tags={"estadisticas"}, stale_ttl=60, delta=0.2)
+
+        assert cache.get("total_registros:abc") is None
+        value, fresh_until, delta = cache.get_with_meta("total_registros:abc")
+        assert value == {"total": 1}
+        assert delta == 0.2
+        assert cache.get_stats()["stale_hits"] == 1
+
+    @pytest.mark.unit
+    def test_redis_stale_entry(self):
+        """Test el backend Redis conserva la ventana de gracia y los metadatos"""
+        fakeredis = pytest.importorskip("fakeredis")
+        from app.services.cache_redis import RedisCacheBackend
+
+        redis_cache = RedisCacheBackend(client=fakeredis.FakeRedis())
+        redis_cache.set("valores_unicos:abc", {"values": []}, ttl=0, tags={"registros"}, stale_ttl=60)
+        assert redis_cache.get("valores_unicos:abc") is None
+        assert redis_cache.get_with_meta("valores_unicos:abc")[0] == {"values": []}
+        assert redis_cache._redis.ttl(redis_cache._k("valores_unicos:abc")) > 0
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_stale_value_served_while_refreshing(self, monkeypatch):
+        """Test se sirve el valor vencido y se refresca en segundo plano"""
+        import asyncio
+        from app.services import cache as cache_module
+
+        cache = AdvancedCache()
+        monkeypatch.setattr(cache_module, "cache", cache)
+        cache.set("total_registros:k", {"total": 1}, ttl=0, tags={"estadisticas"}, stale_ttl=60)
+        calls = {"load": 0, "refresh": 0}
+
+        async def load():
+            calls["load"] += 1
+            return {"total": 2}
+
+        async def refresh():
+            calls["refresh"] += 1
+            await asyncio.sleep(0.01)
+            return {"total": 3}
+
+        results = await asyncio.gather(*[
+            cache_module.cached_with_refresh("total_registros", "total_registros:k", 60, load, refresh)
+            for _ in range(10)
+        ])
+        assert results == [{"total": 1}] * 10
+
+        await asyncio.gather(*list(cache_module._refresh_tasks))
+        assert calls == {"load": 0, "refresh": 1}
+        assert cache.get("total_registros:k") == {"total": 3}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_miss_loads_synchronously(self, monkeypatch):
+        """Test sin entrada se calcula en primer plano y se guarda con ventana de gracia"""
+        from app.services import cache as cache_module
+
+        cache = AdvancedCache()
+        monkeypatch.setattr(cache_module, "cache", cache)
+
+        async def load():
+            return {"values": ["a"]}
+
+        assert await cache_module.cached_with_refresh("valores_unicos", "valores_unicos:k", 60, load) == {"values": ["a"]}
+        entry = cache._cache["valores_unicos:k"]
+        assert entry.expiry - entry.fresh_until == cache_module.SWR_CONFIG["valores_unicos"]["grace"]
+
+    @pytest.mark.unit
+    def test_xfetch_probability(self, monkeypatch):
+        """Test XFetch refresca antes cuanto más cerca del vencimiento y más caro es el cálculo"""
+        from app.services import cache as cache_module
+
+        monkeypatch.setattr(cache_module.random, "random", lambda: 0.5)
+        now = 1000.0
+        # -log(0.5) ~ 0.69: con delta=1s refresca si faltan menos de ~0.69s
+        assert cache_module._should_refresh_early(now + 0.5, delta=1.0, beta=1.0, now=now)
+        assert not cache_module._should_refresh_early(now + 5, delta=1.0, beta=1.0, now=now)
+        assert cache_module._should_refresh_early(now + 5, delta=1.0, beta=10.0, now=now)
+        assert not cache_module._should_refresh_early(now + 0.5, delta=1.0, beta=0, now=now)
+
+
+class TestSerializedRegistroCache:
+    """Tests para el cache de registros como bytes JSON ya serializados"""
+
+    @pytest.mark.unit
+    def test_encode_matches_response_model(self):
+        """Test los bytes cacheados equivalen a la serialización con RegistroOut"""
+        from app.schemas.registro import RegistroOut
+        from app.services.registro_cache_service import encode_registro, encode_registros
+
+        data = _registro_data(7)
+        assert json.loads(encode_registro(data)) == RegistroOut.model_validate(data).model_dump(mode="json")
+        assert json.loads(encode_registros([data, _registro_data(8)]))[1]["id"] == 8
+        assert encode_registros([]) == b"[]"
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_registro_by_id_caches_bytes(self, monkeypatch):
+        """Test el registro individual se guarda en cache como bytes, no como objeto ORM"""
+        from app.services import registro_cache_service as service_module
+
+        cache = AdvancedCache()
+        monkeypatch.setattr(service_module, "cache", cache)
+        monkeypatch.setattr("app.services.cache.cache", cache)
+
+        class _Session:
+            executions = 0
+
+            async def execute(self, stmt):
+                self.executions += 1
+
+                class _Result:
+                    def scalar_one_or_none(self):
+                        return _registro_data(3)
+
+                return _Result()
+
+        session = _Session()
+        first = await service_module.RegistroCacheService.get_cached_registro_by_id(session, 3)
+        second = await service_module.RegistroCacheService.get_cached_registro_by_id(session, 3)
+
+        assert isinstance(first, bytes)
+        assert first is second
+        assert session.executions == 1
+        assert all(isinstance(entry.value, bytes) for entry in cache._cache.values())
+
+
+class TestFilterAwareInvalidation:
+    """Tests para la invalidación selectiva según los filtros de cada entrada"""
+
+    @pytest.mark.unit
+    def test_row_matches_filters(self):
+        """Test la evaluación en Python replica ILIKE, __EXACT__ y la búsqueda global OR"""
+        from app.services.registro_cache_service import row_matches_filters
+
+        row = _registro_data(5)
+        assert row_matches_filters({"region": "nor"}, row)
+        assert row_matches_filters({"region": "N_rte"}, row)
+        assert not row_matches_filters({"region": "sur"}, row)
+        assert row_matches_filters({"numero_inspector": "__EXACT__105"}, row)
+        assert not row_matches_filters({"numero_inspector": "__EXACT__10"}, row)
+        assert row_matches_filters({"region": "cali", "ciudad": "cali"}, {**row, "ciudad": "Cali"})
+        assert not row_matches_filters({"region": "norte", "ciudad": "cali"}, row)
+        assert not row_matches_filters({"uuid": "a"}, row)
+        assert row_matches_filters({}, row)
+        assert not row_matches_filters({}, None)
+
+    @pytest.mark.unit
+    def test_row_matches_global_search(self):
+        """Test q= coincide si cualquier columna de búsqueda contiene el valor"""
+        from app.services.registro_cache_service import row_matches_filters
+
+        row = _registro_data(5)
+        assert row_matches_filters({"q": "MEDEL"}, row)
+        assert row_matches_filters({"q": "medel", "region": "nor"}, row)
+        assert not row_matches_filters({"q": "medel", "region": "sur"}, row)
+        assert not row_matches_filters({"q": "bogot"}, row)
+
+    @pytest.mark.unit
+    def test_change_affects_entry(self):
+        """Test cada tipo de entrada se invalida sólo si el cambio la puede alterar"""
+        from app.services.registro_cache_service import change_affects_entry
+
+        old = _registro_data(5)
+        new = {**old, "status": "Baja"}
+
+        def meta(operation, **params):
+            return {"operation": operation, "params": params}
+
+        lista_norte = meta("registros_lista", limit=10, offset=0, region="norte")
+        assert change_affects_entry(lista_norte, old, new)
+        assert not change_affects_entry(meta("registros_lista", limit=10, region="sur"), old, new)
+        # El conteo no cambia si el registro sigue dentro (o fuera) del resultado
+        assert not change_affects_entry(meta("total_registros", region="norte"), old, new)
+        assert change_affects_entry(meta("total_registros", status="activo"), old, new)
+        assert change_affects_entry(meta("total_registros", region="norte"), None, new)
+        # Valores únicos: sólo si cambia la columna
+        assert not change_affects_entry(meta("valores_unicos", column="ciudad", search=""), old, new)
+        assert change_affects_entry(meta("valores_unicos", column="status", search=""), old, new)
+        assert not change_affects_entry(meta("valores_unicos", column="status", search="zzz"), old, new)
+        # Facetas: dentro del resultado sólo si cambia una de las columnas contadas
+        assert change_affects_entry(meta("registros_facetas", region="norte", facetas="region,status"), old, new)
+        assert not change_affects_entry(meta("registros_facetas", region="norte", facetas="region,ciudad"), old, new)
+        assert not change_affects_entry(meta("registros_facetas", region="sur", facetas="status"), old, new)
+        assert change_affects_entry(meta("registros_facetas", status="activo", facetas="ciudad"), old, new)
+        assert change_affects_entry(meta("registro_individual", id=5), old, new)
+        assert not change_affects_entry(meta("registro_individual", id=6), old, new)
+        assert change_affects_entry(meta("historial", numero_inspector=105, days=15), old, new)
+        assert not change_affects_entry(meta("historial", numero_inspector=7, days=15), old, new)
+        assert change_affects_entry(None, old, new)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_registro_change_keeps_unaffected_entries(self, service_cache):
+        """Test editar un registro sólo elimina las entradas afectadas"""
+        from app.services.cache import save_to_cache, generate_cache_key
+        from app.services.registro_cache_service import RegistroCacheService
+
+        save_to_cache("registros_lista", b"[]", 60, limit=10, offset=0, sort_by="id", sort_dir="asc", region="norte")
+        save_to_cache("registros_lista", b"[]", 60, limit=10, offset=0, sort_by="id", sort_dir="asc", region="sur")
+        save_to_cache("total_registros", {"total": 3}, 60, region="norte")
+        save_to_cache("registro_individual", b"{}", 60, id=5)
+        save_to_cache("registro_individual", b"{}", 60, id=6)
+        service_cache.set("registros:sin:meta", [], ttl=60)
+        service_cache.set("estadisticas:sin:meta", {"total": 3}, ttl=60, tags={"estadisticas"})
+
+        old = _registro_data(5)
+        assert await RegistroCacheService.invalidate_registro_change(old, {**old, "status": "Inactivo"}) == 4
+
+        assert service_cache.get(generate_cache_key(
+            "registros_lista", limit=10, offset=0, sort_by="id", sort_dir="asc", region="norte")) is None
+        assert service_cache.get(generate_cache_key(
+            "registros_lista", limit=10, offset=0, sort_by="id", sort_dir="asc", region="sur")) == b"[]"
+        assert service_cache.get(generate_cache_key("total_registros", region="norte")) == {"total": 3}
+        assert service_cache.get(generate_cache_key("registro_individual", id=5)) is None
+        assert service_cache.get(generate_cache_key("registro_individual", id=6)) == b"{}"
+        # Las entradas sin meta (p.ej. /view) se invalidan siempre, también las de estadísticas
+        assert service_cache.get("registros:sin:meta") is None
+        assert service_cache.get("estadisticas:sin:meta") is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_registro_change_reaches_unique_values(self, service_cache):
+        """Test una entrada real de valores_unicos se invalida al cambiar un registro de esa columna"""
+        from app.services.cache import cached_with_refresh, generate_cache_key
+        from app.services.registro_cache_service import RegistroCacheService
+
+        async def load(values):
+            return values
+
+        for column, values in (("correo", [["test@example.com", 1]]), ("ciudad", [["Medellín", 1]])):
+            params = {"column": column, "search": "", "mode": "contains", "order": "value", "limit": 100}
+            await cached_with_refresh("valores_unicos", generate_cache_key("valores_unicos", **params), 60,
+                                      lambda values=values: load(values), params=params)
+
+        old = _registro_data(5)
+        assert await RegistroCacheService.invalidate_registro_change(old, {**old, "correo": "otro@example.com"}) == 1
+        correo = {"column": "correo", "search": "", "mode": "contains", "order": "value", "limit": 100}
+        ciudad = {**correo, "column": "ciudad"}
+        assert service_cache.get(generate_cache_key("valores_unicos", **correo)) is None
+        assert service_cache.get(generate_cache_key("valores_unicos", **ciudad)) == [["Medellín", 1]]
+        assert await RegistroCacheService.invalidate_bulk_replace() == 1
+
+    @pytest.mark.unit
+    def test_redis_invalidate_where(self):
+        """Test el backend Redis evalúa el predicado sobre los metas guardados"""
+        fakeredis = pytest.importorskip("fakeredis")
+        from app.services.cache_redis import RedisCacheBackend
+
+        redis_cache = RedisCacheBackend(client=fakeredis.FakeRedis())
+        redis_cache.set("a", 1, ttl=60, tags={"registros"}, meta={"operation": "x", "params": {"id": 1}})
+        redis_cache.set("b", 2, ttl=60, tags={"registros"}, meta={"operation": "x", "params": {"id": 2}})
+        redis_cache.set("c", 3, ttl=60, tags={"registros"})
+
+        assert redis_cache.invalidate_where("registros", lambda m: m is None or m["params"]["id"] == 1) == 2
+        assert redis_cache.get("b") == 2
+        assert redis_cache.get("a") is None
+        assert redis_cache._redis.smembers(redis_cache._t("registros")) == {b"b"}
+
+    @pytest.mark.unit
+    def test_redis_invalidate_where_prunes_expired(self):
+        """Test los metas expiran con su entrada y invalidate_where retira las referencias muertas"""
+        fakeredis = pytest.importorskip("fakeredis")
+        from app.services.cache_redis import RedisCacheBackend
+
+        redis_cache = RedisCacheBackend(client=fakeredis.FakeRedis())
+        for i in range(200):
+            redis_cache.set(f"k{i}", i, ttl=60, tags={"registros"}, meta={"operation": "x", "params": {"id": i}})
+            assert redis_cache._redis.ttl(redis_cache._i(f"k{i}")) == 60
+        # Simula la expiración de las entradas (y de su hash, que tiene el mismo EX)
+        for i in range(200):
+            redis_cache._redis.delete(redis_cache._k(f"k{i}"), redis_cache._i(f"k{i}"))
+        redis_cache.set("viva", 1, ttl=60, tags={"registros"}, meta={"operation": "x", "params": {"id": 1}})
+
+        assert redis_cache.invalidate_where("registros", lambda m: False) == 0
+        assert redis_cache._redis.smembers(redis_cache._t("registros")) == {b"viva"}
+        assert redis_cache.get("viva") == 1
+
+
+class TestCacheKeys:
+    """Tests para las claves canónicas de cache y la invalidación por prefijo legible"""
+
+    @pytest.mark.unit
+    def test_generate_cache_key_is_canonical(self):
+        """Test la clave no depende del orden ni de los parámetros nulos, y respeta el tipo"""
+        from app.services.cache import generate_cache_key
+
+        key = generate_cache_key("registros_lista", limit=10, offset=0, region="norte")
+        assert key == generate_cache_key("registros_lista", region="norte", offset=0, limit=10, ciudad=None)
+        assert key.startswith("registros_lista:")
+        assert generate_cache_key("registro_individual", id=5) != generate_cache_key("registro_individual", id="5")
+
+    @pytest.mark.unit
+    def test_generate_cache_key_no_collisions(self):
+        """Test un valor con '&' o '=' no colisiona con otro conjunto de parámetros"""
+        from app.services.cache import generate_cache_key
+
+        assert generate_cache_key("registros_lista", region="a&ciudad=b") != \
+            generate_cache_key("registros_lista", region="a", ciudad="b")
+        assert generate_cache_key("total_registros", region="1") != generate_cache_key("total_registros", status="1")
+
+    @pytest.mark.unit
+    def test_readable_prefix(self):
+        """Test las operaciones con campos legibles los exponen en la clave"""
+        from app.services.cache import generate_cache_key, cache_key_prefix
+
+        assert generate_cache_key("registro_individual", id=5).startswith("registro_individual:id=5:")
+        assert generate_cache_key("historial", numero_inspector=105, days=15).startswith(
+            "historial:numero_inspector=105:")
+        assert cache_key_prefix("registro_individual", id=5) == "registro_individual:id=5:"
+        assert cache_key_prefix("registro_individual") == "registro_individual:"
+
+    @pytest.mark.unit
+    def test_invalidate_single_registro_by_prefix(self):
+        """Test invalidar id=5 elimina sólo su entrada (no id=50 ni id=6)"""
+        from app.services.cache import generate_cache_key, cache_key_prefix
+
+        cache = AdvancedCache()
+        for registro_id in (5, 50, 6):
+            cache.set(generate_cache_key("registro_individual", id=registro_id), registro_id, ttl=60)
+
+        assert cache.invalidate_by_pattern(cache_key_prefix("registro_individual", id=5)) == 1
+        assert cache.get(generate_cache_key("registro_individual", id=5)) is None
+        assert cache.get(generate_cache_key("registro_individual", id=50)) == 50
+        assert cache.get(generate_cache_key("registro_individual", id=6)) == 6
+
+    @pytest.mark.unit
+    def test_invalidate_single_registro_by_prefix_redis(self):
+        """Test la invalidación por prefijo legible también acierta en Redis"""
+        fakeredis = pytest.importorskip("fakeredis")
+        from app.services.cache import generate_cache_key, cache_key_prefix
+        from app.services.cache_redis import RedisCacheBackend
+
+        redis_cache = RedisCacheBackend(client=fakeredis.FakeRedis())
+        for registro_id in (5, 50):
+            redis_cache.set(generate_cache_key("registro_individual", id=registro_id), registro_id, ttl=60)
+
+        assert redis_cache.invalidate_by_pattern(cache_key_prefix("registro_individual", id=5)) == 1
+        assert redis_cache.get(generate_cache_key("registro_individual", id=5)) is None
+        assert redis_cache.get(generate_cache_key("registro_individual", id=50)) == 50
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_invalidate_bulk_replace(self, monkeypatch):
+        """Test la invalidación tras reemplazar la tabla cubre registros, historial y estadísticas"""
+        from app.services import registro_cache_service as service_module
+
+        cache = AdvancedCache()
+        monkeypatch.setattr(service_module, "cache", cache)
+        for tag in ("registros", "historial", "estadisticas", "usuarios"):
+            cache.set(f"{tag}:1", 1, ttl=60, tags={tag})
+
+        assert await service_module.RegistroCacheService.invalidate_bulk_replace() == 3
+        assert cache.get("usuarios:1") == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_invalidate_registro_changes_falls_back_to_bulk(self, monkeypatch):
+        """Test la carga incremental invalida cambio por cambio y, pasado el límite, todo de una vez"""
+        from app.services import registro_cache_service as service_module
+        from app.services.cache import generate_cache_key
+
+        cache = AdvancedCache()
+        monkeypatch.setattr(service_module, "cache", cache)
+        monkeypatch.setattr(service_module, "CSV_DIFF_INVALIDATION_LIMIT", 2)
+        for registro_id in (5, 6):
+            cache.set(generate_cache_key("registro_individual", id=registro_id), b"{}", ttl=60, tags={"registros"},
+                      meta={"operation": "registro_individual", "params": {"id": registro_id}})
+        cache.set("estadisticas:1", 1, ttl=60, tags={"estadisticas"})
+        old = _registro_data(5)
+        changes = [(old, {**old, "status": "Inactivo"}), (None, _registro_data(7))]
+
+        assert await service_module.RegistroCacheService.invalidate_registro_changes([]) == 0
+        assert await service_module.RegistroCacheService.invalidate_registro_changes(changes) == 2
+        assert cache.get(generate_cache_key("registro_individual", id=6)) == b"{}"
+        assert await service_module.RegistroCacheService.invalidate_registro_changes(changes * 2) == 1
+        assert cache.get(generate_cache_key("registro_individual", id=6)) is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_invalidate_registro_cache_hits_registro(self, monkeypatch):
+        """Test el patrón por ID de invalidate_registro_cache acierta aunque la entrada no tenga el tag 'registros'"""
+        from app.services import registro_cache_service as service_module
+        from app.services.cache import generate_cache_key
+
+        cache = AdvancedCache()
+        monkeypatch.setattr(service_module, "cache", cache)
+        for registro_id in (5, 50):
+            cache.set(generate_cache_key("registro_individual", id=registro_id), b"{}", ttl=60,
+                      tags={"registro_individual"})
+
+        await service_module.RegistroCacheService.invalidate_registro_cache(5)
+
+        assert cache.get(generate_cache_key("registro_individual", id=5)) is None
+        assert cache.get(generate_cache_key("registro_individual", id=50)) == b"{}"
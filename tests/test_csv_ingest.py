@@ -0,0 +1,257 @@
+"""
+Tests unitarios para la lectura por bloques de los CSV de carga masiva (/upload_csv)
+"""
+import io
+from tempfile import SpooledTemporaryFile
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import select
+
+from app.db.models import Registro
+from app.services.csv_ingest import (
+    CSV_COLUMNS, EMAIL_REGEX, CsvFormat, CsvFormatError, field_errors, iter_registros, nombre_errors, registros,
+    sniff_csv_format, validate_csv
+)
+from tests.conftest import make_registro
+
+HEADER = list(CSV_COLUMNS)[:-1]
+
+
+def _row(i: int, **changes) -> dict:
+    row = {
+        "Número de inspector": str(i), "Nombre": f"ins{i} Dispositivo", "Observaciones": "Sin novedad",
+        "Status": "Activo", "Región": "Norte", "Flota": "Flota A", "Encargado": "Encargado",
+        "Celular": "3001234567", "Correo": f"user{i}@example.com", "Dirección": "Calle 1", "Uso": "Interno",
+        "Departamento": "Valle", "Ciudad": "Bogotá", "Tecnología": "FTTH", "CMTS/OLT": "OLT-1",
+        "ID Servicio": f"{i:05d}", "MAC/SN": f"AA:{i}",
+    }
+    row.update(changes)
+    return row
+
+
+def _csv(rows, sep: str = ",", encoding: str = "utf-8") -> bytes:
+    return pd.DataFrame(rows, columns=HEADER).to_csv(index=False, sep=sep).encode(encoding)
+
+
+def _stream(content: bytes) -> SpooledTemporaryFile:
+    stream = SpooledTemporaryFile(max_size=1024)
+    stream.write(content)
+    stream.seek(0)
+    return stream
+
+
+class CountingStream(io.BytesIO):
+    """BytesIO que recuerda cuántos bytes se leyeron"""
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def _reference_errors(df: pd.DataFrame) -> list:
+    """Validación fila por fila anterior a la vectorizada (referencia)"""
+    errores = []
+    for idx, row in df.iterrows():
+        num_inspector = str(row.get('Número de inspector', '')).strip()
+        celular = str(row.get('Celular', '')).strip()
+        correo = str(row.get('Correo', '')).strip()
+        if not num_inspector.isdigit():
+            errores.append({"fila": idx + 2, "columna": "Número de inspector", "valor": num_inspector, "error": "Debe ser numérico"})
+        if celular and (not celular.isdigit() or len(celular) != 10):
+            errores.append({"fila": idx + 2, "columna": "Celular", "valor": celular, "error": "Debe ser numérico de 10 dígitos"})
+        if correo and not EMAIL_REGEX.match(correo):
+            errores.append({"fila": idx + 2, "columna": "Correo", "valor": correo, "error": "Debe ser un correo válido"})
+    for idx, row in df.iterrows():
+        num_inspector = str(row.get('Número de inspector', '')).strip()
+        nombre = str(row.get('Nombre', '')).strip()
+        if num_inspector.isdigit():
+            if len(num_inspector) == 1:
+                if f"ins{num_inspector}" not in nombre and f"ins0{num_inspector}" not in nombre:
+                    errores.append({"fila": idx + 2, "columna": "Nombre", "valor": nombre, "error": f"Debe contener 'ins{num_inspector}' o 'ins0{num_inspector}'"})
+            elif f"ins{num_inspector}" not in nombre:
+                errores.append({"fila": idx + 2, "columna": "Nombre", "valor": nombre, "error": f"Debe contener 'ins{num_inspector}'"})
+    return errores
+
+
+# Filas con todos los tipos de error, en distintos bloques según chunk_rows
+INVALID_ROWS = [
+    _row(1), _row(2, **{"Celular": "123"}), _row(3, **{"Número de inspector": "x3"}),
+    _row(4, **{"Nombre": "ins5"}), _row(5, **{"Correo": "malo"}), _row(7, **{"Nombre": "ins07"}),
+    _row(8, **{"Nombre": "ins8", "Celular": ""}), _row(12, **{"Nombre": "ins1"}),
+]
+
+
+class TestCsvIngest:
+    """Tests para la detección de formato y la validación/lectura por bloques"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("sep,encoding,expected", [
+        (",", "utf-8", "utf-8"), (";", "utf-8", "utf-8"), ("\t", "latin-1", "latin-1"),
+        ("|", "utf-8-sig", "utf-8-sig"),
+    ])
+    def test_sniff_format(self, sep, encoding, expected):
+        """Test detecta separador y encoding (incluido el BOM de UTF-8)"""
+        stream = _stream(_csv([_row(1), _row(2)], sep, encoding))
+        assert sniff_csv_format(stream) == CsvFormat(expected, sep)
+        assert stream.tell() == 0
+
+    @pytest.mark.unit
+    def test_sniff_reads_only_sample(self):
+        """Test la detección lee sólo la muestra aunque el archivo sea grande"""
+        stream = CountingStream(_csv([_row(i) for i in range(1, 2001)]))
+        assert sniff_csv_format(stream, sample_bytes=4096) == CsvFormat("utf-8", ",")
+        assert stream.bytes_read <= 4097
+        with pytest.raises(CsvFormatError):
+            sniff_csv_format(_stream(b"una sola columna\nsin separador\n"))
+
+    @pytest.mark.unit
+    def test_falls_back_to_next_encoding_past_sample(self):
+        """Test un byte no UTF-8 después de la muestra hace releer el archivo en latin-1"""
+        content = b"Nombre,Ciudad\n" + b"ins1,Bogota\n" * 299 + "ins300,Bogotá\n".encode("latin-1")
+        stream = _stream(content)
+        fmt = sniff_csv_format(stream, sample_bytes=1024)
+        assert fmt == CsvFormat("utf-8", ",")
+        scan = validate_csv(stream, fmt, chunk_rows=50)
+        assert scan.format == CsvFormat("latin-1", ",") and scan.rows == 300
+        last = [fila for filas in iter_registros(stream, scan.format, chunk_rows=50) for fila in filas][-1]
+        assert last["ciudad"] == "Bogotá" and last["nombre"] == "ins300"
+
+    @pytest.mark.unit
+    def test_bom_falls_back_to_next_encoding(self):
+        """Test con BOM un byte no UTF-8 después de la muestra también hace releer en latin-1"""
+        content = b"\xef\xbb\xbfNombre,Ciudad\n" + b"ins1,Bogota\n" * 299 + "ins300,Bogotá\n".encode("latin-1")
+        stream = _stream(content)
+        fmt = sniff_csv_format(stream, sample_bytes=1024)
+        assert fmt == CsvFormat("utf-8-sig", ",")
+        scan = validate_csv(stream, fmt, chunk_rows=50)
+        assert scan.format == CsvFormat("latin-1", ",") and scan.rows == 300
+        filas = [fila for filas in iter_registros(stream, scan.format, chunk_rows=50) for fila in filas]
+        # El BOM no queda pegado al nombre de la primera columna
+        assert filas[0]["nombre"] == "ins1" and filas[-1]["ciudad"] == "Bogotá"
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("chunk_rows", [1, 3, 10_000])
+    def test_errors_independent_of_chunk_size(self, chunk_rows):
+        """Test los errores (y su orden) no dependen del tamaño de bloque"""
+        content = _csv(INVALID_ROWS)
+        full = pd.read_csv(io.BytesIO(content), dtype=str)
+        scan = validate_csv(_stream(content), CsvFormat("utf-8", ","), chunk_rows)
+        assert scan.rows == len(INVALID_ROWS)
+        assert scan.errors == field_errors(full) + nombre_errors(full) == _reference_errors(full)
+        assert [(e["fila"], e["columna"]) for e in scan.errors] == [
+            (3, "Celular"), (4, "Número de inspector"), (6, "Correo"), (8, "Celular"),
+            (5, "Nombre"), (9, "Nombre"),
+        ]
+        assert scan.errors[-1]["error"] == "Debe contener 'ins12'"
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("drop", [None, "Celular", "Nombre", "Número de inspector"])
+    def test_vectorized_errors_match_row_by_row(self, drop):
+        """Test la validación vectorizada da la misma lista que la validación fila por fila"""
+        rows = INVALID_ROWS + [
+            _row(13, **{"Número de inspector": " 13 ", "Celular": " 3001234567 "}), _row(14, **{"Celular": "30012345678"}),
+            _row(15, **{"Número de inspector": "", "Correo": ""}), _row(16, **{"Nombre": "", "Celular": "300123456x"}),
+            _row(17, **{"Correo": "a@b"}), _row(18, **{"Número de inspector": "0", "Nombre": "ins00"}),
+            _row(19, **{"Número de inspector": "-19", "Nombre": "Ins19"}), _row(20, **{"Nombre": "xins020"}),
+        ]
+        df = pd.read_csv(io.BytesIO(_csv(rows)), dtype=str)
+        if drop:
+            df = df.drop(columns=drop)
+        expected = _reference_errors(df)
+        assert field_errors(df) + nombre_errors(df) == expected
+        assert len(expected) > 5
+        assert field_errors(df.iloc[:0]) == nombre_errors(df.iloc[:0]) == []
+
+    @pytest.mark.unit
+    def test_registros_as_str_of_each_cell(self):
+        """Test las filas a insertar tienen str() de cada celda, como la conversión fila por fila"""
+        df = pd.read_csv(io.BytesIO(_csv([_row(1, **{"Observaciones": ""}), _row(2)])), dtype=str)
+        df.index += 5
+        filas = registros(df.drop(columns="Uso").assign(UUID=["u-1", None]))
+        assert filas[0]["observaciones"] == "nan" and filas[0]["uso"] == "" and filas[1]["uuid"] == "nan"
+        assert filas[0]["uuid"] == "u-1" and filas[1]["numero_inspector"] == 2 and type(filas[1]["numero_inspector"]) is int
+        assert set(filas[0]) == set(CSV_COLUMNS.values())
+        assert registros(df)[0]["uuid"] is None
+
+    @pytest.mark.unit
+    def test_duplicates_in_order_of_first_appearance(self):
+        """Test los duplicados se reportan en el orden en que aparecen por primera vez"""
+        rows = [_row(i) for i in (9, 4, 5, 4, 6, 9, 9)]
+        scan = validate_csv(_stream(_csv(rows)), CsvFormat("utf-8", ","), chunk_rows=2)
+        assert scan.duplicates == [9, 4]
+
+    @pytest.mark.unit
+    def test_duplicates_compare_numbers_not_text(self):
+        """Test '7' y '07' son el mismo número de inspector (ambos se guardan como 7)"""
+        rows = [_row(7), _row(8), _row(7, **{"Número de inspector": "07"}), _row(8, **{"Número de inspector": " 8"})]
+        scan = validate_csv(_stream(_csv(rows)), CsvFormat("utf-8", ","), chunk_rows=2)
+        assert scan.duplicates == [7, 8]
+
+    @pytest.mark.unit
+    def test_iter_registros_in_bounded_chunks(self):
+        """Test la segunda pasada entrega bloques de hasta chunk_rows filas con los valores del archivo"""
+        stream = _stream(_csv([_row(i) for i in range(1, 24)]))
+        chunks = list(iter_registros(stream, CsvFormat("utf-8", ","), chunk_rows=10))
+        assert [len(chunk) for chunk in chunks] == [10, 10, 3]
+        first = chunks[0][0]
+        assert first["numero_inspector"] == 1 and first["id_servicio"] == "00001" and first["uuid"] is None
+
+
+@pytest.fixture
+def seed_rows():
+    """Un registro previo (999) con los campos vacíos"""
+    empty = dict.fromkeys(make_registro(999), "")
+    return [Registro(**(empty | {"numero_inspector": 999, "nombre": "ins999", "status": "Activo", "uuid": None}))]
+
+
+@pytest.mark.usefixtures("service_cache")
+class TestUploadCsv:
+    """Tests de la ruta /upload_csv con la lectura por bloques"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_replaces_registros(self, session, monkeypatch):
+        """Test reemplaza la tabla leyendo el archivo en bloques e informa filas por segundo"""
+        from app.routes import upload_excel
+
+        monkeypatch.setattr("app.services.csv_ingest.CSV_CHUNK_ROWS", 4)
+        upload = UploadFile(_stream(_csv([_row(i) for i in range(1, 11)], sep=";")), filename="registros.csv")
+        result = await upload_excel.upload_csv(file=upload, modo="directo", session=session, user=None)
+        assert result["total_registros"] == 10 and result["filas_por_segundo"] >= 0
+        assert result["metodo_carga"] == "executemany" and result["lotes_carga"] == 1
+        numeros = (await session.execute(select(Registro.numero_inspector).order_by(Registro.id))).scalars().all()
+        assert numeros == list(range(1, 11))
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_invalid_file_keeps_registros(self, session):
+        """Test con errores de validación responde 400 y no toca la base"""
+        from app.routes import upload_excel
+
+        upload = UploadFile(_stream(_csv(INVALID_ROWS)), filename="registros.csv")
+        with pytest.raises(HTTPException) as exc:
+            await upload_excel.upload_csv(file=upload, modo="directo", session=session, user=None)
+        assert exc.value.status_code == 400 and len(exc.value.detail["errores"]) == 6
+        numeros = (await session.execute(select(Registro.numero_inspector))).scalars().all()
+        assert numeros == [999]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_unreadable_file_is_bad_request(self, session, monkeypatch):
+        """Test si la validación no puede decodificar el archivo responde 400, no 500"""
+        from app.routes import upload_excel
+
+        def validate_csv(stream, fmt):
+            raise CsvFormatError("CSV is not valid cp1252")
+
+        monkeypatch.setattr(upload_excel, "validate_csv", validate_csv)
+        upload = UploadFile(_stream(_csv([_row(1), _row(2)])), filename="registros.csv")
+        with pytest.raises(HTTPException) as exc:
+            await upload_excel.upload_csv(file=upload, modo="directo", session=session, user=None)
+        assert exc.value.status_code == 400 and exc.value.detail["error"] == "Error al leer archivo CSV"
+        numeros = (await session.execute(select(Registro.numero_inspector))).scalars().all()
+        assert numeros == [999]
@@ -0,0 +1,214 @@
+"""
+Tests unitarios para el índice de valores distintos (/registros/unique_values)
+"""
+import pytest
+from sqlalchemy import delete, select, update
+
+from app.db.models import Registro
+from app.db.search import infix_match
+from app.services.distinct_values import (
+    MATCH_PREFIX, ORDER_FREQUENCY, ColumnValues, DistinctValueIndex, sort_key_for
+)
+from tests.conftest import make_registro
+
+CIUDADES = ["Medellín", "Cali", "Bogotá", "Pereira", "Ñuñoa", "cali"]
+
+
+def _registro(i: int) -> dict:
+    return make_registro(
+        i * 7, id=i, nombre=f"ins{i} Dispositivo", status="Activo" if i % 3 else "Inactivo",
+        region=["Norte", "Sur", "Centro"][i % 3], flota=f"Flota {'AB'[i % 2]}", correo=f"user{i}@example.com",
+        direccion=f"Calle {i % 7}", ciudad=CIUDADES[i % len(CIUDADES)], tecnologia="FTTH" if i % 2 else "HFC",
+        cmts_olt=f"OLT_{i % 4}", id_servicio=f"SRV-{i}", mac_sn=f"AA:{i:02d}",
+    )
+
+
+@pytest.fixture
+def seed_rows():
+    return [Registro(**_registro(i)) for i in range(1, 61)]
+
+
+@pytest.fixture
+def env(session, service_cache, monkeypatch):
+    """Base SQLite en memoria, cache vacío y un índice vacío en el servicio"""
+    from app.services import registro_cache_service as service_module
+
+    index = DistinctValueIndex()
+    monkeypatch.setattr(service_module, "distinct_values", index)
+    return session, index
+
+
+async def _sql_distinct(session, column: str, search: str = ""):
+    """La consulta que resolvía antes cada petición"""
+    model_col = getattr(Registro, column)
+    stmt = select(model_col).distinct().order_by(model_col)
+    if search:
+        stmt = stmt.where(infix_match(model_col, search))
+    return [row[0] for row in (await session.execute(stmt)).fetchall() if row[0] is not None]
+
+
+class TestDistinctValueIndex:
+    """Tests para el índice de valores distintos por columna"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("column,search", [
+        ("ciudad", ""), ("ciudad", "CALI"), ("ciudad", "ÑUÑ"), ("numero_inspector", "4"),
+        ("cmts_olt", "t_1"), ("cmts_olt", "olt%2"), ("correo", "user1"), ("nombre", "zzz"),
+    ])
+    async def test_same_values_as_select_distinct(self, env, column, search):
+        """Test los valores (y su orden) coinciden con SELECT DISTINCT ... ORDER BY"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        session, index = env
+        result = await RegistroCacheService.get_cached_unique_values(session, column, search)
+        assert result == {"values": await _sql_distinct(session, column, search)}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_one_read_per_column(self, env):
+        """Test escribir en el filtro no genera una consulta por pulsación"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        session, index = env
+        for search in ["", "c", "ca", "cal", "cali"]:
+            await RegistroCacheService.get_cached_unique_values(session, "ciudad", search)
+        assert index.stats["builds"] == 1 and index.stats["queries"] == 5
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_prefix_frequency_limit_and_counts(self, env):
+        """Test búsqueda por prefijo, top-N por frecuencia, limit y conteos"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        session, index = env
+        prefix = await RegistroCacheService.get_cached_unique_values(session, "ciudad", "ca", mode=MATCH_PREFIX)
+        assert prefix == {"values": ["Cali", "cali"]}
+        for search, expected in [("14", [14, 140, 147]), ("1_5", [105, 175])]:
+            result = await RegistroCacheService.get_cached_unique_values(
+                session, "numero_inspector", search, mode=MATCH_PREFIX)
+            assert result == {"values": expected}
+
+        top = await RegistroCacheService.get_cached_unique_values(
+            session, "region", order=ORDER_FREQUENCY, limit=2, counts=True)
+        assert top == {"values": ["Centro", "Norte"], "counts": [20, 20]}
+        limited = await RegistroCacheService.get_cached_unique_values(session, "direccion", "calle", limit=3)
+        assert limited == {"values": ["Calle 0", "Calle 1", "Calle 2"]}
+        assert await RegistroCacheService.get_cached_unique_values(session, "uuid") is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_changes_keep_index_in_sync(self, env):
+        """Test los cambios de un registro actualizan valores y conteos sin releer la columna"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        session, index = env
+        for column in ("ciudad", "numero_inspector"):
+            await RegistroCacheService.get_cached_unique_values(session, column)
+
+        changes = [
+            (None, _registro(61) | {"ciudad": "Manizales"}),
+            (_registro(2), _registro(2) | {"ciudad": "Pasto", "numero_inspector": 1000}),
+            (_registro(5), None),
+        ]
+        session.add(Registro(**changes[0][1]))
+        await session.execute(update(Registro).where(Registro.id == 2).values(ciudad="Pasto", numero_inspector=1000))
+        await session.execute(delete(Registro).where(Registro.id == 5))
+        await session.commit()
+        for old, new in changes:
+            await RegistroCacheService.invalidate_registro_change(old, new)
+
+        for column in ("ciudad", "numero_inspector"):
+            result = await RegistroCacheService.get_cached_unique_values(session, column, counts=True)
+            assert result["values"] == await _sql_distinct(session, column)
+            rebuilt = await index._read(session, column)
+            assert result["counts"] == [rebuilt.counts[value] for value in result["values"]]
+        assert index.stats["builds"] == 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_bulk_invalidation_rereads_columns(self, env):
+        """Test una carga masiva descarta el índice y la columna se vuelve a leer"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        session, index = env
+        await RegistroCacheService.get_cached_unique_values(session, "ciudad")
+        await session.execute(update(Registro).values(ciudad="Pasto"))
+        await session.commit()
+        await RegistroCacheService.invalidate_registro_cache()
+        assert await RegistroCacheService.get_cached_unique_values(session, "ciudad") == {"values": ["Pasto"]}
+        assert index.stats["builds"] == 2
+
+    @pytest.mark.unit
+    def test_counts_drop_to_zero(self):
+        """Test un valor sin registros desaparece del índice y de la búsqueda por prefijo"""
+        values = ColumnValues({"Cali": 1, "Bogotá": 2})
+        values.add("Cali", -1)
+        values.add("Armenia", 1)
+        assert values.lookup() == [("Armenia", 1), ("Bogotá", 2)]
+        assert values.lookup("ca", MATCH_PREFIX) == []
+
+    @pytest.mark.unit
+    def test_sort_follows_database_collation(self):
+        """Test en SQLite el orden es el de BINARY; en otros motores se aproxima la collation lingüística"""
+        counts = {"cali": 1, "Cali": 1, "Bogotá": 1, "Ñuñoa": 1, "Neiva": 1, "Ábrego": 1}
+        assert sort_key_for("sqlite") is None
+        assert ColumnValues(dict(counts)).values == ["Bogotá", "Cali", "Neiva", "cali", "Ábrego", "Ñuñoa"]
+
+        values = ColumnValues(dict(counts), sort_key_for("postgresql"))
+        assert values.values == ["Ábrego", "Bogotá", "Cali", "cali", "Neiva", "Ñuñoa"]
+        # Los cambios y la búsqueda por prefijo conservan el mismo orden
+        values.add("Neiva", -1)
+        values.add("Armenia", 1)
+        assert [value for value, _ in values.lookup()] == ["Ábrego", "Armenia", "Bogotá", "Cali", "cali", "Ñuñoa"]
+        assert [value for value, _ in values.lookup("c", MATCH_PREFIX)] == ["Cali", "cali"]
+        assert ColumnValues({7: 1, 10: 1}, sort_key_for("postgresql")).values == [7, 10]
+
+    @pytest.mark.unit
+    def test_route_not_shadowed_by_registro_id(self):
+        """Test /registros/unique_values se declara antes que /registros/{id}"""
+        from app.routes.registros import router
+
+        names = [route.name for route in router.routes]
+        assert names.index("unique_values") < names.index("obtener_registro_por_id")
+
+    @pytest.mark.unit
+    def test_route_requires_authentication(self, client):
+        """Test /registros/unique_values sin token responde 401, como /registros/facets"""
+        from fastapi import status
+
+        for url in ("/registros/unique_values?col=correo", "/registros/facets"):
+            assert client.get(url).status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_oversized_columns_use_database(self, env, monkeypatch):
+        """Test una columna con demasiados valores se consulta a la base con los mismos parámetros"""
+        from app.services import distinct_values as distinct_module
+        from app.services.registro_cache_service import RegistroCacheService
+
+        session, index = env
+        monkeypatch.setattr(distinct_module, "DISTINCT_MAX_VALUES", 10)
+        result = await RegistroCacheService.get_cached_unique_values(session, "correo", "user1")
+        assert result == {"values": await _sql_distinct(session, "correo", "user1")}
+        assert index.get_stats()["oversized"] == ["correo"]
+
+        prefix = await RegistroCacheService.get_cached_unique_values(
+            session, "numero_inspector", "14", mode=MATCH_PREFIX, counts=True)
+        assert prefix == {"values": [14, 140, 147], "counts": [1, 1, 1]}
+        top = await RegistroCacheService.get_cached_unique_values(
+            session, "correo", order=ORDER_FREQUENCY, limit=2)
+        assert top == {"values": ["user10@example.com", "user11@example.com"]}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_stop_cancels_refreshes(self, env):
+        """Test stop() cancela las relecturas en segundo plano (evento de cierre)"""
+        session, index = env
+        values = await index.get(session, "ciudad")
+        values.built_at -= index.max_age + 1
+        await index.get(session, "ciudad")
+        task = index._refreshing["ciudad"]
+
+        await index.stop()
+        assert task.done() and not index._refreshing
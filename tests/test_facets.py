@@ -0,0 +1,109 @@
+"""
+Tests unitarios para los conteos por valor de los filtros (/registros/facets)
+"""
+from collections import Counter
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql
+
+from app.db.models import Registro
+from app.services.registro_cache_service import FACET_COLUMNS, RegistroCacheService
+from app.services.registro_filters import RegistroFilterSpec, row_matches_filters
+from tests.conftest import make_registro
+
+pytestmark = pytest.mark.usefixtures("service_cache")
+
+REGIONES = ["Norte", "Sur", "Centro", "Oriente"]
+CIUDADES = ["Medellín", "Cali", "Bogotá"]
+
+
+def _registro(i: int) -> dict:
+    return make_registro(
+        i, id=i, status="Activo" if i % 3 else "Inactivo", region=REGIONES[i % 4], flota=f"Flota {'AB'[i % 2]}",
+        uso="Interno" if i % 5 else "Externo", ciudad=CIUDADES[i % 3], tecnologia="FTTH" if i % 2 else "HFC",
+        cmts_olt=f"OLT-{i % 2}",
+    )
+
+
+@pytest.fixture
+def seed_rows():
+    return [Registro(**_registro(i)) for i in range(1, 51)]
+
+
+def _expected(filters: dict, columns):
+    """Conteos calculados fila a fila en Python con la lógica de los filtros del listado"""
+    rows = [r for r in (_registro(i) for i in range(1, 51)) if row_matches_filters(filters, r)]
+    facets = {}
+    for column in columns:
+        counts = Counter(r[column] for r in rows)
+        facets[column] = [{"value": v, "count": n} for v, n in sorted(counts.items(), key=lambda vc: (-vc[1], vc[0]))]
+    return {"total": len(rows), "facets": facets}
+
+
+class TestRegistroFacets:
+    """Tests para los conteos por valor de varias columnas en una sola consulta"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("filters", [
+        {}, {"region": "nor"}, {"q": "cali"}, {"q": "medel", "tecnologia": "__EXACT__FTTH"},
+        {"region": "sur", "ciudad": "sur"}, {"status": "zzz"},
+    ])
+    async def test_counts_match_filtered_rows(self, session, filters):
+        """Test los conteos coinciden con las filas del listado con los mismos filtros"""
+        columns = list(FACET_COLUMNS) + ["cmts_olt", "numero_inspector"]
+        result = await RegistroCacheService.get_cached_facets(session, columns, **filters)
+        assert result == _expected(filters, columns)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_cached_per_filter_signature(self, session):
+        """Test se cachea por filtros y columnas, y una carga masiva lo invalida"""
+        from app.services import registro_cache_service as service_module
+
+        first = await RegistroCacheService.get_cached_facets(session, ["region"], ciudad="cali")
+        await session.execute(update(Registro).values(region="Norte"))
+        await session.commit()
+        assert await RegistroCacheService.get_cached_facets(session, ["region"], ciudad="cali") == first
+        keys = [key for key in service_module.cache._cache if key.startswith("registros_facetas")]
+        assert len(keys) == 1
+
+        other = await RegistroCacheService.get_cached_facets(session, ["region", "uso"], ciudad="cali")
+        assert other["facets"]["region"] == [{"value": "Norte", "count": other["total"]}]
+        await RegistroCacheService.invalidate_registro_cache()
+        refreshed = await RegistroCacheService.get_cached_facets(session, ["region"], ciudad="cali")
+        assert refreshed["facets"]["region"] == [{"value": "Norte", "count": first["total"]}]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_invalid_columns(self, session):
+        """Test columnas no permitidas devuelven None"""
+        assert await RegistroCacheService.get_cached_facets(session, ["uuid"]) is None
+        assert await RegistroCacheService.get_cached_facets(session, []) is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_single_statement(self, session):
+        """Test en SQLite es un solo UNION ALL que filtra una vez (CTE)"""
+        stmt = RegistroFilterSpec.from_params(q="cali").facets_statement(["region", "ciudad"], "sqlite")
+        sql = str(stmt.compile(session.bind))
+        assert sql.count("UNION ALL") == 1 and sql.count("registros_fts MATCH") == 1
+        rows = (await session.execute(stmt)).all()
+        assert {row[0] for row in rows} == {"region", "ciudad"}
+
+    @pytest.mark.unit
+    def test_postgresql_uses_grouping_sets(self):
+        """Test en PostgreSQL se agrupa con GROUPING SETS en una sola pasada"""
+        stmt = RegistroFilterSpec.from_params(region="nor").facets_statement(["region", "ciudad"], "postgresql")
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        assert "GROUP BY GROUPING SETS(registros.region, registros.ciudad)" in sql
+        assert "UNION" not in sql
+
+    @pytest.mark.unit
+    def test_route_not_shadowed_by_registro_id(self):
+        """Test /registros/facets se declara antes que /registros/{id}"""
+        from app.routes.registros import router
+
+        names = [route.name for route in router.routes]
+        assert names.index("facetas_registros") < names.index("obtener_registro_por_id")
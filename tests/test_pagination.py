@@ -0,0 +1,240 @@
+"""
+Tests unitarios para la paginación por cursor (keyset)
+"""
+import json
+
+import pytest
+
+from app.db.models import Registro
+from app.services.pagination import InvalidCursorError, decode_cursor, encode_cursor
+from tests.conftest import make_registro
+
+pytestmark = pytest.mark.usefixtures("service_cache")
+
+REGIONES = ["Norte", "Sur", "Centro"]
+
+
+@pytest.fixture
+def seed_rows():
+    return [
+        Registro(**make_registro(
+            (i * 37) % 50 + 1, id=i, uuid=None if i % 3 == 0 else f"uuid-{i % 5}", nombre=f"ins{i} Dispositivo",
+            region=REGIONES[i % 3], correo="test@example.com", ciudad="Cali", id_servicio=f"SRV-{i}",
+            mac_sn=f"AA:{i:02d}",
+        ))
+        for i in range(1, 24)
+    ]
+
+
+async def _walk(session, limit, **params):
+    """Recorre todas las páginas siguiendo los cursores y devuelve los ids en orden"""
+    from app.services.registro_cache_service import RegistroCacheService
+
+    ids, cursor = [], None
+    while True:
+        page = await RegistroCacheService.get_cached_registros_list(session, limit=limit, cursor=cursor, **params)
+        ids.extend(r["id"] for r in json.loads(page.payload))
+        if page.next_cursor is None:
+            return ids
+        cursor = page.next_cursor
+
+
+class TestKeysetPagination:
+    """Tests para la paginación por cursor de GET /registros"""
+
+    @pytest.mark.unit
+    def test_cursor_roundtrip(self):
+        """Test el cursor es opaco y conserva la clave de la última fila"""
+        cursor = encode_cursor("region", "asc", ["Ñuñoa", 12])
+        assert "Ñuñoa" not in cursor
+        assert decode_cursor(cursor, "region", "asc") == ["Ñuñoa", 12]
+
+    @pytest.mark.unit
+    def test_cursor_rejects_other_sort_or_garbage(self):
+        """Test un cursor de otro orden o mal formado se rechaza"""
+        cursor = encode_cursor("region", "asc", ["Norte", 3])
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor, "region", "desc")
+        with pytest.raises(InvalidCursorError):
+            decode_cursor("no-es-un-cursor", "region", "asc")
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(encode_cursor("region", "asc", [None, 3]), "region", "asc")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("sort_by", ["id", "region", "numero_inspector", "uuid", "columna_inexistente"])
+    @pytest.mark.parametrize("sort_dir", ["asc", "desc"])
+    async def test_cursor_pages_match_single_query(self, session, sort_by, sort_dir):
+        """Test recorrer con cursores da las mismas filas y en el mismo orden que una sola consulta"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        full = await RegistroCacheService.get_cached_registros_list(
+            session, limit=100, sort_by=sort_by, sort_dir=sort_dir)
+        expected = [r["id"] for r in json.loads(full.payload)]
+
+        assert len(expected) == 23
+        assert await _walk(session, 4, sort_by=sort_by, sort_dir=sort_dir) == expected
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_cursor_with_filters(self, session):
+        """Test el cursor respeta los filtros de la consulta"""
+        ids = await _walk(session, 2, sort_by="numero_inspector", sort_dir="asc", region="Norte")
+        assert len(ids) == len(set(ids)) == 7
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_numero_inspector_order(self, session):
+        """Test el orden tipo Excel por numero_inspector es numérico, no alfabético"""
+        ids = await _walk(session, 5, sort_by="numero_inspector", sort_dir="asc")
+        assert ids == sorted(range(1, 24), key=lambda i: (i * 37) % 50 + 1)
+
+
+class TestExcelSortKey:
+    """Tests para la columna generada orden_excel frente a la expresión CASE original"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("sort_dir", ["asc", "desc"])
+    async def test_same_order_as_case_expression(self, session, sort_dir):
+        """Test ordenar por orden_excel da el mismo orden que el CASE ... LIKE '0%'..'9%'"""
+        from sqlalchemy import select, update
+
+        from app.services.pagination import excel_group, excel_group_expr, order_by_clauses, row_key, seek_condition
+
+        # Negativos (el texto empieza por '-') y el cero caen en grupos distintos; el esquema
+        # ya no los admite, pero pueden existir en bases antiguas
+        for registro_id, numero in [(3, -7), (6, 0), (9, -120), (12, -1)]:
+            await session.execute(update(Registro).where(Registro.id == registro_id).values(numero_inspector=numero))
+        await session.commit()
+
+        descending = sort_dir == "desc"
+        legacy = [
+            expr.desc() if descending else expr.asc()
+            for expr in (excel_group_expr(), Registro.numero_inspector, Registro.id)
+        ]
+        expected = (await session.execute(select(Registro.id).order_by(*legacy))).scalars().all()
+        result = (await session.execute(
+            select(Registro.id).order_by(*order_by_clauses("numero_inspector", sort_dir))
+        )).scalars().all()
+        assert result == expected
+
+        # Recorrido por cursor (seek sobre la clave completa) en páginas de 4
+        walked, after = [], None
+        while True:
+            stmt = select(Registro).order_by(*order_by_clauses("numero_inspector", sort_dir)).limit(4)
+            if after is not None:
+                stmt = stmt.where(seek_condition("numero_inspector", sort_dir, after))
+            page = (await session.execute(stmt)).scalars().all()
+            if not page:
+                break
+            walked.extend(r.id for r in page)
+            after = row_key(page[-1], "numero_inspector")
+        assert walked == expected
+
+        rows = (await session.execute(select(Registro.numero_inspector, Registro.orden_excel,
+                                             excel_group_expr()))).all()
+        assert all(orden == legacy_group == excel_group(numero) for numero, orden, legacy_group in rows)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_order_walks_index(self, session):
+        """Test ORDER BY numero_inspector + LIMIT recorre idx_orden_excel sin ordenar en memoria"""
+        from sqlalchemy import select, text
+
+        from app.services.pagination import order_by_clauses, seek_condition
+
+        for sort_dir in ("asc", "desc"):
+            stmt = select(Registro).order_by(*order_by_clauses("numero_inspector", sort_dir)).limit(5)
+            for query in (stmt, stmt.where(seek_condition("numero_inspector", sort_dir, [1, 10, 4]))):
+                compiled = query.compile(session.bind, compile_kwargs={"literal_binds": True})
+                plan = " ".join(row[-1] for row in await session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+                assert "idx_orden_excel" in plan and "TEMP B-TREE" not in plan
+
+    @pytest.mark.unit
+    def test_generated_column_is_not_a_sort_option(self):
+        """Test sort_by=orden_excel se trata como columna desconocida (orden por id)"""
+        from app.services.pagination import sort_keys
+
+        assert sort_keys("orden_excel") == [Registro.id]
+
+
+class TestListTotal:
+    """Tests para include_total: página y conteo en una sola consulta"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_total_in_same_query_and_reused(self, session):
+        """Test el total sale de count(*) over() y los cambios de página lo reutilizan"""
+        from sqlalchemy import event
+
+        from app.services.registro_cache_service import RegistroCacheService
+
+        statements = []
+        event.listen(session.bind.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, stmt, *args: statements.append(stmt))
+
+        first = await RegistroCacheService.get_cached_registros_list(
+            session, limit=3, region="Norte", include_total=True)
+        assert first.total == 7
+        assert len(statements) == 1 and "OVER" in statements[0].upper()
+
+        second = await RegistroCacheService.get_cached_registros_list(
+            session, limit=3, offset=3, region="Norte", include_total=True)
+        by_cursor = await RegistroCacheService.get_cached_registros_list(
+            session, limit=3, cursor=first.next_cursor, region="Norte", include_total=True)
+        assert second.total == by_cursor.total == 7
+        assert json.loads(second.payload) == json.loads(by_cursor.payload)
+        # Sólo las dos páginas nuevas, sin consultas de conteo
+        assert len(statements) == 3
+        assert not any("count" in stmt.lower() for stmt in statements[1:])
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_total_matches_global_search(self, session):
+        """Test el total usa la misma lógica OR de búsqueda global que la página"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        page = await RegistroCacheService.get_cached_registros_list(
+            session, limit=100, region="Sur", nombre="Sur", include_total=True)
+        total = await RegistroCacheService.get_cached_list_total(session, region="Centro", nombre="Centro")
+        assert page.total == len(json.loads(page.payload)) == 8
+        assert total == {"total": 8}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_page_without_total(self, session):
+        """Test sin include_total no se calcula ni se devuelve el total"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        page = await RegistroCacheService.get_cached_registros_list(session, limit=3)
+        assert page.total is None
+
+
+class TestGlobalSearchList:
+    """Tests para la búsqueda global q= del listado de registros"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_q_combines_with_filters(self, session):
+        """Test q busca en todas las columnas y se combina con AND con los filtros"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        page = await RegistroCacheService.get_cached_registros_list(
+            session, limit=100, q="SRV-1", region="Norte", include_total=True)
+        ids = [r["id"] for r in json.loads(page.payload)]
+        assert ids == [i for i in range(1, 24) if str(i).startswith("1") and i % 3 == 0]
+        assert page.total == len(ids)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_relevance_sort_uses_offset(self, session):
+        """Test el orden por relevancia no emite cursor y rechaza uno recibido"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        page = await RegistroCacheService.get_cached_registros_list(
+            session, limit=2, q="dispositivo", sort_by="relevancia")
+        assert len(json.loads(page.payload)) == 2 and page.next_cursor is None
+        with pytest.raises(InvalidCursorError):
+            await RegistroCacheService.get_cached_registros_list(
+                session, limit=2, q="dispositivo", sort_by="relevancia", cursor=encode_cursor("relevancia", "asc", [1]))
@@ -0,0 +1,188 @@
+"""
+Tests unitarios para la carga incremental de registros (modo "diferencias" de /upload_csv)
+"""
+from tempfile import SpooledTemporaryFile
+
+import pandas as pd
+import pytest
+from fastapi import UploadFile
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import HistorialCambio, Registro
+from app.services.cache import generate_cache_key
+from app.services.csv_ingest import CSV_COLUMNS
+from app.services.registro_diff import apply_registro_diff, fingerprint
+from tests.conftest import make_registro
+
+
+def _fila(numero: int, ciudad: str = "Bogotá", uuid=None) -> dict:
+    return make_registro(numero, ciudad=ciudad, id_servicio=f"{numero:05d}", uuid=uuid)
+
+
+def _csv_upload(filas) -> UploadFile:
+    """Archivo CSV (encabezados en español, sin UUID) con las filas dadas"""
+    columns = {field: column for column, field in CSV_COLUMNS.items() if column != "UUID"}
+    content = pd.DataFrame(filas)[list(columns)].rename(columns=columns).to_csv(index=False).encode("utf-8")
+    stream = SpooledTemporaryFile(max_size=1024)
+    stream.write(content)
+    stream.seek(0)
+    return UploadFile(stream, filename="registros.csv")
+
+
+@pytest.fixture
+def seed_rows():
+    """Registros 1 a 4 (ids 10, 20, ...) en Cali y uuids u1 a u4"""
+    return [Registro(id=numero * 10, **_fila(numero, "Cali", f"u{numero}")) for numero in range(1, 5)]
+
+
+async def _registros(session: AsyncSession) -> list:
+    result = await session.execute(
+        select(Registro.id, Registro.numero_inspector, Registro.ciudad, Registro.uuid).order_by(Registro.id)
+    )
+    return result.all()
+
+
+async def _historial(session: AsyncSession) -> list:
+    result = await session.execute(
+        select(HistorialCambio.accion, HistorialCambio.registro_id, HistorialCambio.campo,
+               HistorialCambio.valor_anterior, HistorialCambio.valor_nuevo).order_by(HistorialCambio.id)
+    )
+    return result.all()
+
+
+class TestRegistroDiff:
+    """Tests para apply_registro_diff en SQLite"""
+
+    @pytest.mark.unit
+    def test_fingerprint(self):
+        """Test la huella depende de los valores y de su tipo, no del orden de las claves"""
+        columns = ("numero_inspector", "ciudad")
+        fila = _fila(1)
+        assert fingerprint(fila, columns) == fingerprint(dict(reversed(list(fila.items()))), columns)
+        assert fingerprint(fila, columns) != fingerprint({**fila, "ciudad": "Cali"}, columns)
+        assert fingerprint(fila, columns) != fingerprint({**fila, "numero_inspector": "1"}, columns)
+        assert fingerprint({**fila, "ciudad": None}, columns) == fingerprint({**fila, "ciudad": "nan"}, columns)
+        assert fingerprint({**fila, "ciudad": ""}, columns) == fingerprint({**fila, "ciudad": "nan"}, columns)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_applies_only_changes(self, session):
+        """Test inserta, actualiza y elimina sólo lo necesario y registra el historial por campo"""
+        filas = [_fila(1, "Cali"), _fila(2, "Bogotá"), _fila(4, "Cali"), _fila(5, "Cali")]
+        report = await apply_registro_diff(session, filas, "admin", batch_size=2)
+        await session.commit()
+
+        assert await _registros(session) == [
+            (10, 1, "Cali", "u1"), (20, 2, "Bogotá", "u2"), (40, 4, "Cali", "u4"), (41, 5, "Cali", None)
+        ]
+        assert (report.inserted, report.updated, report.deleted, report.unchanged) == (1, 1, 1, 2)
+        historial = await _historial(session)
+        assert [fila[:3] for fila in historial] == [
+            ("eliminacion", 30, None), ("edicion", 20, "ciudad"), ("creacion", 41, None)
+        ]
+        assert historial[1][3:] == ("Cali", "Bogotá") and '"numero_inspector": 3' in historial[0][3]
+        assert report.historial == 3
+        assert report.as_dict()["actualizados"] == 1
+
+        changes = {(old and old["id"], new and new["id"]) for old, new in report.changes}
+        assert changes == {(30, None), (20, 20), (None, 41)}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_same_file_is_a_no_op(self, session):
+        """Test cargar los mismos datos no escribe nada"""
+        filas = [_fila(numero, "Cali", f"u{numero}") for numero in range(1, 5)]
+        report = await apply_registro_diff(session, filas, "admin")
+        await session.commit()
+
+        assert (report.inserted, report.updated, report.deleted, report.unchanged) == (0, 0, 0, 4)
+        assert report.changes == [] and await _historial(session) == []
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_empty_fields_from_api_match_empty_csv_cells(self, session):
+        """Test un registro creado por la API con campos vacíos no cambia con un CSV de celdas vacías"""
+        from app.schemas.registro import RegistroCreate
+
+        # La API guarda None en el uuid omitido; otros campos pueden estar vacíos ('')
+        session.add(Registro(**RegistroCreate(**{**_fila(5), "uuid": None}).model_dump()))
+        session.add(Registro(**{**_fila(6), "observaciones": ""}))
+        await session.commit()
+        # Así llegan del CSV (csv_ingest.registros): str() de una celda vacía
+        filas = [_fila(numero, "Cali", f"u{numero}") for numero in range(1, 5)]
+        filas += [{**_fila(5), "uuid": "nan"}, {**_fila(6), "observaciones": "nan", "uuid": "nan"}]
+
+        report = await apply_registro_diff(session, filas, "admin")
+        await session.commit()
+
+        assert (report.inserted, report.updated, report.deleted, report.unchanged) == (0, 0, 0, 6)
+        assert await _historial(session) == []
+
+        # Un cambio real en esa fila sólo registra el campo que cambió
+        filas[-2]["ciudad"] = "Pasto"
+        report = await apply_registro_diff(session, filas, "admin")
+        await session.commit()
+        assert report.updated == 1
+        assert [fila[:3] for fila in await _historial(session)] == [("edicion", 41, "ciudad")]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_keyed_by_uuid_when_present(self, session):
+        """Test con la columna UUID la clave es el uuid: cambiar el número es una edición"""
+        report = await apply_registro_diff(
+            session, [_fila(numero, "Cali", f"u{numero}") for numero in (1, 2, 3)] + [_fila(7, "Cali", "u4")], "admin"
+        )
+        await session.commit()
+
+        assert (report.inserted, report.updated, report.deleted) == (0, 1, 0)
+        assert (await _registros(session))[-1] == (40, 7, "Cali", "u4")
+        assert ("edicion", 40, "numero_inspector", "4", "7") in await _historial(session)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_upsert_is_one_executemany_per_batch(self, engine, session):
+        """Test nuevos y modificados van en un INSERT ... ON CONFLICT con executemany"""
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, executemany))
+
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            filas = [_fila(numero, "Medellín") for numero in range(1, 9)]
+            await apply_registro_diff(session, filas, "admin", batch_size=5)
+            await session.commit()
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+        upserts = [executemany for statement, executemany in statements if "ON CONFLICT" in statement]
+        assert upserts == [True, True]
+        # Sin columna UUID los uuid existentes no se tocan
+        assert [uuid for *_, uuid in await _registros(session)] == ["u1", "u2", "u3", "u4", None, None, None, None]
+
+
+class TestUploadCsvDiff:
+    """Tests de /upload_csv con modo=diferencias"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_invalidates_only_affected_entries(self, session, service_cache):
+        """Test aplica los cambios del archivo e invalida sólo las entradas afectadas"""
+        from app.routes import upload_excel
+
+        cache = service_cache
+        for registro_id in (10, 20, 30):
+            cache.set(generate_cache_key("registro_individual", id=registro_id), b"{}", ttl=60, tags={"registros"},
+                      meta={"operation": "registro_individual", "params": {"id": registro_id}})
+
+        filas = [_fila(1, "Cali"), _fila(2, "Cali"), _fila(3, "Pasto"), _fila(4, "Cali")]
+        result = await upload_excel.upload_csv(
+            file=_csv_upload(filas), modo="diferencias", session=session, user={"sub": "ana"}
+        )
+
+        assert result["modo"] == "diferencias" and result["actualizados"] == 1 and result["sin_cambios"] == 3
+        assert ("edicion", 30, "ciudad", "Cali", "Pasto") in await _historial(session)
+        assert cache.get(generate_cache_key("registro_individual", id=10)) == b"{}"
+        assert cache.get(generate_cache_key("registro_individual", id=20)) == b"{}"
+        assert cache.get(generate_cache_key("registro_individual", id=30)) is None
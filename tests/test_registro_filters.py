@@ -0,0 +1,126 @@
+"""
+Tests unitarios para los filtros de las consultas de registros (RegistroFilterSpec)
+"""
+import csv
+import io
+
+import pytest
+from sqlalchemy import select
+
+from app.db.models import Registro
+from app.services.registro_filters import RegistroFilterSpec, registro_filters
+from tests.conftest import make_registro
+
+pytestmark = pytest.mark.usefixtures("service_cache")
+
+CIUDADES = ["Medellín", "Cali", "Bogotá"]
+
+
+def _registro(i: int) -> dict:
+    return make_registro(
+        i, id=i, status="Activo" if i % 3 else "Inactivo", region=["Norte", "Sur", "Centro"][i % 3],
+        flota=f"Flota {'AB'[i % 2]}", uso="Interno" if i % 5 else "Externo", ciudad=CIUDADES[i % 3],
+        tecnologia="FTTH" if i % 2 else "HFC", cmts_olt=f"OLT-{i % 2}",
+    )
+
+
+@pytest.fixture
+def seed_rows():
+    return [Registro(**_registro(i)) for i in range(1, 31)]
+
+
+FILTERS = [
+    {}, {"region": "nor"}, {"region": "__EXACT__Sur", "uso": "inter"}, {"q": "medel", "flota": "a"},
+    {"region": "cali", "ciudad": "cali"}, {"region": "__EXACT__Cali", "ciudad": "__EXACT__Cali"},
+    {"numero_inspector": "__EXACT__12"}, {"correo": "user1_@"},
+]
+
+
+class TestRegistroFilterSpec:
+    """Tests para la interpretación única de los filtros y sus sentencias memorizadas"""
+
+    @pytest.mark.unit
+    def test_from_params_normalizes(self):
+        """Test los vacíos se ignoran y el orden de los parámetros no cambia la especificación"""
+        first = RegistroFilterSpec.from_params(ciudad="cali", region="nor", uso=None, flota="", q="")
+        second = RegistroFilterSpec.from_params(region="nor", ciudad="cali")
+        assert first == second and hash(first) == hash(second)
+        assert first.params == {"region": "nor", "ciudad": "cali"}
+        assert RegistroFilterSpec.from_params(q="x", region="nor").params == {"region": "nor", "q": "x"}
+        with pytest.raises(ValueError):
+            RegistroFilterSpec.from_params(orden_excel="1")
+
+    @pytest.mark.unit
+    def test_dependency_matches_from_params(self):
+        """Test la dependencia de las rutas produce la misma especificación"""
+        params = {name: None for name in registro_filters.__code__.co_varnames[:registro_filters.__code__.co_argcount]}
+        spec = registro_filters(**{**params, "q": "medel", "region": "nor"})
+        assert spec == RegistroFilterSpec.from_params(region="nor", q="medel")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("filters", FILTERS)
+    @pytest.mark.parametrize("global_or", [True, False])
+    async def test_sql_and_python_agree(self, session, filters, global_or):
+        """Test where() y matches() seleccionan las mismas filas"""
+        spec = RegistroFilterSpec.from_params(global_or=global_or, **filters)
+        query = select(Registro.id).order_by(Registro.id)
+        if spec.where() is not None:
+            query = query.where(spec.where())
+        result = (await session.execute(query)).scalars().all()
+        assert result == [i for i in range(1, 31) if spec.matches(_registro(i))]
+        assert await session.scalar(spec.count_statement()) == len(result)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_statements_built_and_compiled_once(self, session):
+        """Test los mismos filtros reutilizan la sentencia y su SQL compilado"""
+        spec = RegistroFilterSpec.from_params(region="nor", q="medel")
+        assert RegistroFilterSpec.from_params(q="medel", region="nor").count_statement() is spec.count_statement()
+        assert spec.facets_statement(["region"], "sqlite") is spec.facets_statement(("region",), "sqlite")
+
+        conn = await session.connection()
+        first = await conn.execute(spec.count_statement())
+        second = await conn.execute(RegistroFilterSpec.from_params(region="nor", q="medel").count_statement())
+        # Otros valores con la misma forma también usan el SQL compilado
+        other = await conn.execute(RegistroFilterSpec.from_params(region="sur", q="bogot").count_statement())
+        assert "generated" in first.context._get_cache_stats()
+        assert "cached" in second.context._get_cache_stats()
+        assert "cached" in other.context._get_cache_stats()
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_total_uses_and_and_list_uses_or(self, session):
+        """Test /registros/total combina con AND y el listado con OR los filtros de igual valor"""
+        from app.services.registro_cache_service import RegistroCacheService, change_affects_entry
+
+        filters = {"region": "cali", "ciudad": "cali"}
+        total = await RegistroCacheService.get_cached_total_registros(session, **filters)
+        list_total = await RegistroCacheService.get_cached_list_total(session, **filters)
+        assert total == {"total": 0} and list_total == {"total": 10}
+
+        meta = lambda operation: {"operation": operation, "params": filters}  # noqa: E731
+        old, new = _registro(1), {**_registro(1), "ciudad": "Bogotá"}
+        assert not change_affects_entry(meta("total_registros"), old, new)
+        assert change_affects_entry(meta("registros_total"), old, new)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_export_applies_filters(self, session):
+        """Test /registros/exportar exporta sólo los registros que cumplen los filtros"""
+        from app.routes.registros import exportar_registros_csv
+
+        spec = RegistroFilterSpec.from_params(region="__EXACT__Sur", q="cali")
+        response = await exportar_registros_csv(filtros=spec, session=session, user=None)
+        body = "".join([chunk async for chunk in response.body_iterator])
+        rows = list(csv.DictReader(io.StringIO(body)))
+        assert [int(row["id"]) for row in rows] == [i for i in range(1, 31) if spec.matches(_registro(i))]
+        assert rows
+
+    @pytest.mark.unit
+    def test_export_route_not_shadowed_by_registro_id(self):
+        """Test /registros/exportar se declara antes que /registros/{id}"""
+        from app.routes.registros import router
+
+        names = [route.name for route in router.routes]
+        assert names.index("exportar_registros_csv") < names.index("obtener_registro_por_id")
@@ -0,0 +1,155 @@
+"""
+Tests unitarios para el reemplazo de registros por intercambio de tablas
+"""
+import datetime
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import CreateTable
+
+from app.db.models import HistorialCambio, Registro
+from app.db.search import global_match
+from app.services.registro_swap import assign_ids, replace_registros_by_swap, staging_table
+from tests.conftest import make_registro
+
+
+def _fila(numero: int, ciudad: str = "Bogotá") -> dict:
+    return make_registro(numero, ciudad=ciudad)
+
+
+def _historial(registro_id: int, numero: int) -> HistorialCambio:
+    return HistorialCambio(
+        registro_id=registro_id, numero_inspector=numero, fecha=datetime.datetime(2026, 1, 1), usuario="admin",
+        accion="edicion", campo="ciudad", valor_anterior="Cali", valor_nuevo="Bogotá",
+    )
+
+
+async def _schema(session: AsyncSession) -> set:
+    result = await session.execute(text(
+        "SELECT type, name, tbl_name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' AND name NOT LIKE 'registros_fts_%'"
+    ))
+    return set(result.all())
+
+
+@pytest.fixture
+def seed_rows():
+    """Registros 1 a 5 (ids 10, 20, ...) en Cali e historial de 2, 4 y 5"""
+    registros = [Registro(id=numero * 10, **_fila(numero, "Cali")) for numero in range(1, 6)]
+    return registros + [_historial(20, 2), _historial(40, 4), _historial(50, 5)]
+
+
+class TestRegistroSwap:
+    """Tests para replace_registros_by_swap en SQLite"""
+
+    @pytest.mark.unit
+    def test_assign_ids(self):
+        """Test conserva el id por numero_inspector y numera los nuevos a continuación"""
+        filas = list(assign_ids([_fila(4), _fila(9), _fila(2), _fila(8)], {2: 20, 4: 40}, 51))
+        assert [fila["id"] for fila in filas] == [40, 51, 20, 52]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_swap_replaces_and_keeps_historial_links(self, session):
+        """Test reemplaza la tabla, conserva ids y todo el historial y deja el mismo esquema"""
+        schema = await _schema(session)
+        report = await replace_registros_by_swap(session, [_fila(4), _fila(2), _fila(6), _fila(7)], batch_size=3)
+
+        registros = (await session.execute(select(Registro.numero_inspector, Registro.id).order_by(Registro.id))).all()
+        assert registros == [(2, 20), (4, 40), (6, 51), (7, 52)]
+        historial = (await session.execute(select(HistorialCambio.registro_id).order_by(HistorialCambio.id))).scalars().all()
+        # El historial del registro eliminado (id 50) se conserva, como con modo=directo
+        assert historial == [20, 40, 50]
+        huerfanos = (await session.execute(text("PRAGMA foreign_key_check"))).all()
+        assert [(tabla, padre) for tabla, _, padre, _ in huerfanos] == [("historial_cambios", "registros")]
+
+        assert report.load.rows == 4 and report.load.batches == 2
+        assert report.kept_ids == 2 and report.orphaned_historial == 1 and report.lock_seconds >= 0
+        assert report.as_dict()["ventana_bloqueo_segundos"] == round(report.lock_seconds, 3)
+        # Mismos índices, triggers y tablas que antes; sin tablas de carga
+        assert await _schema(session) == schema
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_staging_table_per_upload(self, session):
+        """Test cada carga usa su propia tabla de carga y no toca la de otra carga en curso"""
+        assert staging_table().name != staging_table().name
+        otra = staging_table("otra")
+        async with session.bind.begin() as conn:
+            await conn.execute(CreateTable(otra))
+            await conn.execute(otra.insert(), [{"id": 1, **_fila(9)}])
+
+        await replace_registros_by_swap(session, [_fila(1), _fila(2)])
+
+        assert (await session.execute(select(otra.c.numero_inspector))).scalars().all() == [9]
+        tablas = await session.execute(text("SELECT name FROM sqlite_master WHERE name LIKE 'registros_staging%'"))
+        assert tablas.scalars().all() == [otra.name]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_search_index_follows_new_table(self, session):
+        """Test el índice de búsqueda queda poblado y los triggers lo mantienen después del intercambio"""
+        await replace_registros_by_swap(session, [_fila(1, "Medellín"), _fila(2)])
+
+        async def search(value):
+            query = select(Registro.numero_inspector).where(global_match([Registro.ciudad], value))
+            return (await session.execute(query.order_by(Registro.numero_inspector))).scalars().all()
+
+        assert await search("medel") == [1] and await search("cali") == []
+        session.add(Registro(**_fila(3, "Medellín")))
+        await session.commit()
+        assert await search("medel") == [1, 3]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_failed_load_keeps_registros(self, session):
+        """Test si la carga falla (numero_inspector repetido) registros no cambia"""
+        schema = await _schema(session)
+        with pytest.raises(IntegrityError):
+            await replace_registros_by_swap(session, [_fila(2), _fila(6), _fila(2)])
+        numeros = (await session.execute(select(Registro.numero_inspector).order_by(Registro.id))).scalars().all()
+        assert numeros == [1, 2, 3, 4, 5]
+        assert await _schema(session) == schema
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_failed_swap_keeps_registros(self, session):
+        """Test si el intercambio falla (nombre repetido al crear los índices) registros no cambia"""
+        schema = await _schema(session)
+        repetido = {**_fila(7), "nombre": "ins6 Dispositivo"}
+        with pytest.raises(IntegrityError):
+            await replace_registros_by_swap(session, [_fila(2), _fila(6), repetido])
+        numeros = (await session.execute(select(Registro.numero_inspector).order_by(Registro.id))).scalars().all()
+        assert numeros == [1, 2, 3, 4, 5]
+        assert (await session.execute(select(HistorialCambio.registro_id))).scalars().all() == [20, 40, 50]
+        assert await _schema(session) == schema
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_upload_csv_swap_mode(self, session, service_cache):
+        """Test /upload_csv con modo=intercambio reemplaza, informa la ventana de bloqueo e invalida el cache"""
+        from tempfile import SpooledTemporaryFile
+
+        import pandas as pd
+        from fastapi import UploadFile
+
+        from app.routes import upload_excel
+        from app.services.csv_ingest import CSV_COLUMNS
+
+        cache = service_cache
+        cache.set("registros_lista:1", [1], ttl=60, tags={"registros"})
+        fields = {field: column for column, field in CSV_COLUMNS.items()}
+        rows = [{fields[k]: v for k, v in _fila(n).items() if k != "uuid"} for n in (3, 8)]
+        stream = SpooledTemporaryFile()
+        stream.write(pd.DataFrame(rows).to_csv(index=False).encode("utf-8"))
+        stream.seek(0)
+
+        result = await upload_excel.upload_csv(
+            file=UploadFile(stream, filename="registros.csv"), modo="intercambio", session=session, user=None
+        )
+        assert result["modo"] == "intercambio" and result["ids_conservados"] == 1
+        assert result["ventana_bloqueo_segundos"] >= 0 and result["historial_sin_registro"] == 3
+        assert (await session.execute(select(func.count()).select_from(HistorialCambio))).scalar() == 3
+        assert (await session.execute(select(Registro.id).order_by(Registro.id))).scalars().all() == [30, 51]
+        assert cache.get("registros_lista:1") is None
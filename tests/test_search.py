@@ -0,0 +1,178 @@
+"""
+Tests unitarios para el índice de búsqueda por subcadena (FTS5 trigram / pg_trgm)
+"""
+import pytest
+from sqlalchemy import String, cast, create_engine, delete, func, or_, select, text, update
+from sqlalchemy.dialects import postgresql
+
+from app.db.base import Base
+from app.db.models import Registro
+from app.db.search import (
+    SEARCH_COLUMNS, GlobalMatch, InfixMatch, global_match, infix_match, order_by_relevance,
+    postgresql_document, postgresql_search_ddl,
+)
+
+
+@pytest.fixture
+def engine():
+    """Base SQLite en memoria creada con create_all (incluye registros_fts y sus triggers)"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Registro.__table__.insert(), [
+            dict(id=i, numero_inspector=1000 + i, uuid=None if i % 2 else f"uuid-{i}",
+                 nombre=f"ins{1000 + i} Dispositivo", observaciones=obs, status="Activo",
+                 region=region, flota="Flota A", encargado="Encargado", celular="3001234567",
+                 correo=f"user{i}@example.com", direccion="Calle 1", uso="Interno", departamento="Antioquia",
+                 ciudad=ciudad, tecnologia="FTTH", cmts_olt="OLT-1", id_servicio=f"SRV-{i}", mac_sn=f"AA:BB:{i:02d}")
+            for i, (obs, region, ciudad) in enumerate([
+                ("Sin novedad", "Norte", "Medellín"),
+                ("Cable dañado", "Sur", "Cali"),
+                ("Revisar 100% del equipo", "Centro", "Bogotá"),
+                ("sin NOVEDAD", "Norte", "MEDELLIN"),
+                ("Equipo_nuevo", "Occidente", "Pereira"),
+            ], start=1)
+        ])
+    yield engine
+    engine.dispose()
+
+
+def _ids(engine, condition):
+    with engine.connect() as conn:
+        return sorted(conn.execute(select(Registro.id).where(condition)).scalars())
+
+
+class TestInfixSearchIndex:
+    """Tests para los filtros ILIKE '%valor%' servidos por el índice de trigramas"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("field,value", [
+        ("observaciones", "novedad"),
+        ("observaciones", "NOVEDAD"),
+        ("observaciones", "100%"),
+        ("observaciones", "o_nu"),
+        ("region", "nor"),
+        ("ciudad", "medel"),
+        ("ciudad", "li"),
+        ("numero_inspector", "100"),
+        ("uuid", "uid-"),
+        ("mac_sn", "bb:0"),
+        ("correo", "zzz"),
+        ("direccion", 'Calle "1'),
+    ])
+    def test_same_rows_as_ilike(self, engine, field, value):
+        """Test el índice devuelve las mismas filas que CAST(col AS VARCHAR) ILIKE"""
+        column = getattr(Registro, field)
+        assert _ids(engine, infix_match(column, value)) == _ids(engine, cast(column, String).ilike(f"%{value}%"))
+
+    @pytest.mark.unit
+    def test_statement_cache_keeps_values(self, engine):
+        """Test la caché de sentencias de SQLAlchemy no reutiliza el valor de otra consulta"""
+        assert _ids(engine, infix_match(Registro.ciudad, "cali")) == [2]
+        assert _ids(engine, infix_match(Registro.ciudad, "pereira")) == [5]
+        assert _ids(engine, infix_match(Registro.observaciones, "o_nu")) == [5]
+        assert _ids(engine, infix_match(Registro.observaciones, "%equipo")) == [3, 5]
+
+    @pytest.mark.unit
+    def test_short_values_skip_index(self):
+        """Test con menos de 3 caracteres no se usa el índice"""
+        assert not isinstance(infix_match(Registro.ciudad, "li"), InfixMatch)
+        assert isinstance(infix_match(Registro.ciudad, "cal"), InfixMatch)
+
+    @pytest.mark.unit
+    def test_triggers_keep_index_in_sync(self, engine):
+        """Test los triggers reflejan inserciones, ediciones y borrados en registros_fts"""
+        with engine.begin() as conn:
+            conn.execute(update(Registro).where(Registro.id == 2).values(ciudad="Manizales"))
+            conn.execute(delete(Registro).where(Registro.id == 1))
+
+        assert _ids(engine, infix_match(Registro.ciudad, "cali")) == []
+        assert _ids(engine, infix_match(Registro.ciudad, "maniz")) == [2]
+        assert _ids(engine, infix_match(Registro.ciudad, "medel")) == [4]
+
+    @pytest.mark.unit
+    def test_sqlite_plan_uses_fts(self, engine):
+        """Test el plan de SQLite consulta el índice FTS5 en lugar de recorrer registros"""
+        stmt = select(func.count()).select_from(Registro).where(infix_match(Registro.nombre, "dispo"))
+        sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+        with engine.connect() as conn:
+            plan = " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+        assert "registros_fts VIRTUAL TABLE INDEX" in plan
+
+    @pytest.mark.unit
+    def test_postgresql_compiles_to_trigram_indexable_ilike(self):
+        """Test en PostgreSQL el filtro coincide con las expresiones de los índices GIN"""
+        dialect = postgresql.dialect()
+        sql = str(select(Registro.id).where(infix_match(Registro.ciudad, "medel")).compile(dialect=dialect))
+        assert "registros.ciudad ILIKE" in sql and "CAST" not in sql
+
+        sql = str(select(Registro.id).where(infix_match(Registro.numero_inspector, "123")).compile(dialect=dialect))
+        assert "CAST(registros.numero_inspector AS VARCHAR) ILIKE" in sql
+        assert any("(CAST(numero_inspector AS VARCHAR)) gin_trgm_ops" in ddl for ddl in postgresql_search_ddl())
+
+
+def _all_columns():
+    return [getattr(Registro, field) for field in SEARCH_COLUMNS]
+
+
+def _or_ilike(columns, value):
+    return or_(*(cast(column, String).ilike(f"%{value}%") for column in columns))
+
+
+class TestGlobalSearch:
+    """Tests para la búsqueda global (q=) sobre el documento combinado de cada registro"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("value", ["novedad", "NORTE", "medel", "100%", "o_nu", "1003", "uid-4", "li", 'Calle "1', "zzz"])
+    def test_same_rows_as_or_of_ilike(self, engine, value):
+        """Test la búsqueda global devuelve las mismas filas que el OR de ILIKE por columna"""
+        columns = _all_columns()
+        assert _ids(engine, global_match(columns, value)) == _ids(engine, _or_ilike(columns, value))
+
+    @pytest.mark.unit
+    def test_subset_of_columns(self, engine):
+        """Test la búsqueda sobre algunas columnas no encuentra el valor en las demás"""
+        columns = [Registro.region, Registro.ciudad]
+        assert _ids(engine, global_match(columns, "norte")) == [1, 4]
+        assert _ids(engine, global_match(columns, "cable")) == []
+        assert _ids(engine, global_match(columns, "cali")) == _ids(engine, _or_ilike(columns, "cali")) == [2]
+
+    @pytest.mark.unit
+    def test_short_values_skip_index(self):
+        """Test con menos de 3 caracteres se usa el OR por columna"""
+        assert not isinstance(global_match(_all_columns(), "li"), GlobalMatch)
+        assert isinstance(global_match(_all_columns(), "cal"), GlobalMatch)
+
+    @pytest.mark.unit
+    def test_single_index_probe(self, engine):
+        """Test el plan de SQLite hace una sola consulta a registros_fts para todas las columnas"""
+        stmt = select(func.count()).select_from(Registro).where(global_match(_all_columns(), "medel"))
+        sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+        with engine.connect() as conn:
+            plan = " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+        assert plan.count("registros_fts VIRTUAL TABLE INDEX") == 1
+        assert "SEARCH registros USING" in plan
+
+    @pytest.mark.unit
+    def test_relevance_order(self, engine):
+        """Test bm25 ordena primero el registro con más coincidencias"""
+        with engine.begin() as conn:
+            conn.execute(update(Registro).where(Registro.id == 2).values(ciudad="Pereira"))
+            conn.execute(update(Registro).where(Registro.id == 5).values(
+                nombre="Pereira Pereira", direccion="Calle Pereira"))
+        stmt = order_by_relevance(select(Registro.id).where(global_match(_all_columns(), "pereira")),
+                                  Registro.__table__, "pereira", "sqlite")
+        with engine.connect() as conn:
+            assert conn.execute(stmt).scalars().all() == [5, 2]
+
+    @pytest.mark.unit
+    def test_postgresql_uses_document_index(self):
+        """Test en PostgreSQL la búsqueda global filtra por la expresión del índice del documento"""
+        dialect = postgresql.dialect()
+        stmt = select(Registro.id).where(global_match(_all_columns(), "medel"))
+        sql = str(stmt.compile(dialect=dialect))
+        assert f"{postgresql_document('registros')} ILIKE" in sql
+        assert any(f"({postgresql_document()} gin_trgm_ops)" in ddl for ddl in postgresql_search_ddl())
+
+        sql = str(order_by_relevance(stmt, Registro.__table__, "medel", "postgresql").compile(dialect=dialect))
+        assert f"<<-> {postgresql_document('registros')}" in sql
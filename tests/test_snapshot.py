@@ -0,0 +1,226 @@
+"""
+Tests unitarios para el snapshot columnar en memoria de registros
+"""
+import json
+
+import pytest
+from sqlalchemy import delete, update
+
+from app.db.models import Registro
+from app.services.distinct_values import DistinctValueIndex
+from app.services.registro_snapshot import RegistroSnapshot, _DictionaryColumn
+from tests.conftest import make_registro
+
+REGIONES = ["Norte", "Sur", "Centro", "Occidente"]
+CIUDADES = ["Medellín", "Cali", "Bogotá", "Pereira", "Ñuñoa"]
+
+
+def _registro(i: int) -> dict:
+    return make_registro(
+        (i * 37) % 97 + 1, id=i, uuid=None if i % 4 == 0 else f"uuid-{i % 6}", nombre=f"ins{i} Dispositivo",
+        observaciones="Cable dañado" if i % 5 == 0 else "Sin novedad", status="Activo" if i % 3 else "Inactivo",
+        region=REGIONES[i % 4], flota=f"Flota {'AB'[i % 2]}", correo=f"user{i}@example.com",
+        direccion=f"Calle {i % 7}", ciudad=CIUDADES[i % 5], tecnologia="FTTH" if i % 2 else "HFC",
+        cmts_olt=f"OLT-{i % 3}", id_servicio=f"SRV-{i}", mac_sn=f"AA:{i:02d}",
+    )
+
+
+@pytest.fixture
+def seed_rows():
+    return [Registro(**_registro(i)) for i in range(1, 41)]
+
+
+@pytest.fixture
+def env(session, session_factory, service_cache, monkeypatch):
+    """Base SQLite en memoria, cache vacío y un snapshot (sin cargar) del servicio"""
+    from app.services import registro_cache_service as service_module
+
+    snapshot = RegistroSnapshot()
+    monkeypatch.setattr(service_module, "registro_snapshot", snapshot)
+    monkeypatch.setattr(service_module, "distinct_values", DistinctValueIndex())
+    return session, session_factory, snapshot
+
+
+async def _answers(session, queries):
+    """Resultados del servicio para cada consulta (listado, totales y valores únicos)"""
+    from app.services.registro_cache_service import RegistroCacheService
+
+    results = []
+    for kind, params in queries:
+        if kind == "lista":
+            page = await RegistroCacheService.get_cached_registros_list(session, include_total=True, **params)
+            results.append((json.loads(page.payload), page.next_cursor, page.total))
+        elif kind == "facetas":
+            results.append(await RegistroCacheService.get_cached_facets(session, **params))
+        elif kind == "total":
+            results.append(await RegistroCacheService.get_cached_total_registros(session, **params))
+        else:
+            results.append(await RegistroCacheService.get_cached_unique_values(session, **params))
+    return results
+
+
+QUERIES = [
+    ("lista", dict(limit=100)),
+    ("lista", dict(limit=7, offset=3, sort_by="numero_inspector", sort_dir="desc")),
+    ("lista", dict(limit=100, sort_by="uuid", sort_dir="asc", region="nor")),
+    ("lista", dict(limit=100, sort_by="uuid", sort_dir="desc")),
+    ("lista", dict(limit=100, sort_by="ciudad", sort_dir="asc", tecnologia="__EXACT__HFC")),
+    ("lista", dict(limit=100, sort_by="region", sort_dir="desc", observaciones="DAÑADO")),
+    ("lista", dict(limit=100, region="cali", ciudad="cali")),
+    ("lista", dict(limit=100, q="ñuñoa", flota="b")),
+    ("lista", dict(limit=100, nombre="ins1_ D%")),
+    ("total", dict(region="nor", ciudad="nor")),
+    ("total", dict(numero_inspector="1", status="activo")),
+    ("unicos", dict(column="ciudad")),
+    ("unicos", dict(column="ciudad", search="l")),
+    ("unicos", dict(column="numero_inspector", search="9")),
+    ("unicos", dict(column="correo", search="user3")),
+    ("facetas", dict(columns=["region", "ciudad", "numero_inspector", "cmts_olt"])),
+    ("facetas", dict(columns=["status", "tecnologia"], q="cali", flota="b")),
+    ("facetas", dict(columns=["region"], region="nor", ciudad="nor")),
+]
+
+
+class TestRegistroSnapshot:
+    """Tests para el motor de lectura columnar: mismas respuestas que SQL"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_same_answers_as_sql(self, env):
+        """Test listado, conteos, valores únicos y facetas coinciden con las consultas SQL"""
+        session, factory, snapshot = env
+        expected = await _answers(session, QUERIES)
+        await snapshot.load(factory)
+        assert snapshot.ready
+        assert await _answers(session, QUERIES) == expected
+        assert snapshot.stats["queries"] >= len(QUERIES)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("sort_by,sort_dir", [
+        ("id", "desc"), ("numero_inspector", "asc"), ("uuid", "asc"), ("uuid", "desc"), ("region", "desc"),
+    ])
+    async def test_cursor_walk(self, env, sort_by, sort_dir):
+        """Test recorrer con cursores del snapshot da el mismo orden que SQL"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        session, factory, snapshot = env
+        full = await RegistroCacheService.get_cached_registros_list(
+            session, limit=100, sort_by=sort_by, sort_dir=sort_dir, flota="a")
+        expected = [r["id"] for r in json.loads(full.payload)]
+
+        await snapshot.load(factory)
+        ids, cursor = [], None
+        while True:
+            page = await RegistroCacheService.get_cached_registros_list(
+                session, limit=3, sort_by=sort_by, sort_dir=sort_dir, cursor=cursor, flota="a")
+            ids.extend(r["id"] for r in json.loads(page.payload))
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+        assert ids == expected
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("sort_dir", ["asc", "desc"])
+    async def test_mostly_null_dictionary_column(self, env, sort_dir):
+        """Test ordenar y paginar por una columna casi toda nula (codificada con diccionario)"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        session, factory, snapshot = env
+        await session.execute(update(Registro).values(uuid=None))
+        await session.execute(update(Registro).where(Registro.id.in_((3, 7))).values(uuid="uuid-a"))
+        await session.commit()
+        # Los nulos van al final en ambos sentidos
+        nulls = [i for i in range(1, 41) if i not in (3, 7)]
+        expected = [3, 7] + nulls if sort_dir == "asc" else [7, 3] + nulls[::-1]
+        full = await RegistroCacheService.get_cached_registros_list(
+            session, limit=100, sort_by="uuid", sort_dir=sort_dir)
+        assert [r["id"] for r in json.loads(full.payload)] == expected
+
+        await snapshot.load(factory)
+        assert isinstance(snapshot._data.columns["uuid"], _DictionaryColumn)
+        # Una fila nueva sin uuid también entra en la máscara de nulos
+        await RegistroCacheService.invalidate_registro_change(None, _registro(41) | {"uuid": None})
+        expected = expected + [41] if sort_dir == "asc" else expected[:2] + [41] + expected[2:]
+
+        ids, cursor = [], None
+        while True:
+            page = await RegistroCacheService.get_cached_registros_list(
+                session, limit=3, sort_by="uuid", sort_dir=sort_dir, cursor=cursor)
+            ids.extend(r["id"] for r in json.loads(page.payload))
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+        assert ids == expected
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_incremental_changes(self, env):
+        """Test los cambios de un registro se aplican al snapshot sin recargarlo"""
+        from app.services import registro_cache_service as service_module
+        from app.services.registro_cache_service import RegistroCacheService
+
+        session, factory, snapshot = env
+        await snapshot.load(factory)
+
+        changes = [
+            (None, _registro(41) | {"ciudad": "Manizales", "observaciones": "Equipo con un texto mucho más largo"}),
+            (_registro(2), _registro(2) | {"region": "Oriente", "uuid": None}),
+            (_registro(5), None),
+        ]
+        for old, new in changes:
+            await RegistroCacheService.invalidate_registro_change(old, new)
+        after_changes = await _answers(session, QUERIES)
+        assert (snapshot.stats["loads"], snapshot.stats["changes"]) == (1, 3)
+
+        # Los mismos cambios en la base dan las mismas respuestas por SQL
+        session.add(Registro(**changes[0][1]))
+        await session.execute(update(Registro).where(Registro.id == 2).values(region="Oriente", uuid=None))
+        await session.execute(delete(Registro).where(Registro.id == 5))
+        await session.commit()
+        service_module.registro_snapshot = RegistroSnapshot()
+        assert await _answers(session, QUERIES) == after_changes
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_bulk_invalidation_discards_snapshot(self, env):
+        """Test una carga masiva descarta el snapshot y las consultas vuelven a SQL"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        session, factory, snapshot = env
+        await snapshot.load(factory)
+        await RegistroCacheService.invalidate_registro_cache()
+        assert not snapshot.ready
+
+        # Se recarga en segundo plano con la misma sesión
+        await snapshot._task
+        assert snapshot.ready and snapshot.stats["loads"] == 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_stop_cancels_reload(self, env):
+        """Test stop() cancela la recarga en segundo plano y permite programar otra"""
+        from app.services.registro_cache_service import RegistroCacheService
+
+        session, factory, snapshot = env
+        await snapshot.load(factory)
+        await RegistroCacheService.invalidate_registro_cache()
+        task = snapshot._task
+
+        await snapshot.stop()
+        assert task.done() and snapshot._task is None and not snapshot.ready
+        snapshot._schedule_reload()
+        await snapshot._task
+        assert snapshot.ready
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_low_cardinality_columns_are_dictionary_encoded(self, env):
+        """Test region y ciudad se guardan como códigos sobre un diccionario pequeño"""
+        session, factory, snapshot = env
+        await snapshot.load(factory)
+        region = snapshot._data.columns["region"]
+        assert isinstance(region, _DictionaryColumn)
+        assert sorted(region.categories) == sorted(REGIONES)
+        assert region.codes.dtype.itemsize == 4
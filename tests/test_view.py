@@ -0,0 +1,79 @@
+"""
+Tests unitarios para los filtros de /view/registros
+"""
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from app.db.models import Registro
+from app.routes.view import EQUALITY_FILTERS, view_filters
+from tests.conftest import make_registro
+
+CIUDADES = ["Medellín", "CALI", "Bogotá", "cali"]
+
+
+def _registro(i: int) -> dict:
+    return make_registro(
+        i, id=i, region=["Norte", "SUR", "sur"][i % 3], flota=f"Flota {'Ab'[i % 2]}",
+        uso="Interno" if i % 5 else "EXTERNO", ciudad=CIUDADES[i % 4], tecnologia="FTTH" if i % 2 else "hfc",
+        id_servicio=f"Srv-{i % 6}", mac_sn=f"aa:BB:{i % 8}",
+    )
+
+
+@pytest.fixture
+def seed_rows():
+    return [Registro(**_registro(i)) for i in range(1, 41)]
+
+
+async def _plan(session, stmt) -> str:
+    compiled = stmt.compile(session.bind, compile_kwargs={"literal_binds": True})
+    return " ".join(row[-1] for row in await session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+
+
+class TestViewFilters:
+    """Tests para los filtros de igualdad sin distinguir mayúsculas"""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("filters", [
+        {"region": "sur"}, {"ciudad": "Cali"}, {"region": "SUR", "ciudad": "cali"}, {"tecnologia": "HFC"},
+        {"flota": "flota a"}, {"uso": "externo"}, {"mac_sn": "AA:bb:3"}, {"id_servicio": "SRV-2"},
+        {"busqueda": "medel", "uso": "Interno"}, {"region": "Nada"},
+    ])
+    async def test_same_rows_as_python(self, session, filters):
+        """Test filtra igual que comparar los valores en minúsculas"""
+        stmt = select(Registro.id).where(*view_filters(**filters)).order_by(Registro.id)
+        result = (await session.execute(stmt)).scalars().all()
+        expected = [
+            i for i in range(1, 41)
+            if all(_registro(i)[column].lower() == value.lower()
+                   for column, value in filters.items() if column != "busqueda")
+            and ("busqueda" not in filters or "medel" in _registro(i)["ciudad"].lower())
+        ]
+        assert result == expected
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("column", EQUALITY_FILTERS)
+    async def test_each_filter_uses_index(self, session, column):
+        """Test cada filtro busca en su índice lower(col) en lugar de recorrer la tabla"""
+        stmt = select(Registro).where(*view_filters(**{column: "Valor"}))
+        plan = await _plan(session, stmt)
+        assert "SEARCH registros USING INDEX idx_" in plan and "_lower" in plan
+        assert "SCAN registros" not in plan
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_region_and_ciudad_use_composite_index(self, session):
+        """Test region + ciudad usan idx_region_ciudad_lower con ambas columnas"""
+        stmt = select(Registro).where(*view_filters(region="Sur", ciudad="Cali"))
+        plan = await _plan(session, stmt)
+        assert "idx_region_ciudad_lower (<expr>=? AND <expr>=?)" in plan
+
+    @pytest.mark.unit
+    def test_postgresql_expression_matches_index(self):
+        """Test en PostgreSQL la condición es lower(col) sin CAST, como en el índice"""
+        stmt = select(Registro.id).where(*view_filters(id_servicio="SRV-1", region="Sur"))
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        assert "lower(registros.id_servicio) = " in sql and "lower(registros.region) = " in sql
+        assert "CAST" not in sql